@@ -0,0 +1,371 @@
+"""Two-tier cache for the Scryfall, TCGdex and ScryDex responses Next.js fetches.
+
+lib/api-cache.ts keeps every response as a JSONB row in api_cache and asks
+Postgres even for the hottest keys. Not-found answers (Scryfall returns 404
+for a search without results) are never cached, so they are refetched every
+time, and expired rows stay until cleanExpiredCache runs. The gateway puts a
+cache in front of the same table:
+
+    L1  an in-process LRU bounded by API_CACHE_MAX_BYTES. Entries expire
+        with the TTLs of CACHE_TTL in lib/api-cache.ts, and upstream 4xx
+        answers are kept for API_CACHE_NEGATIVE_TTL seconds.
+    L2  the api_cache table, shared with Next.js and read by
+        search_index.CacheSource. Keys and rows look the same as the ones
+        lib/api-cache.ts writes. Negative entries stay in L1 only, because
+        getFromCache would take any row for a hit.
+
+Concurrent misses for one key share a single L2 read and upstream request.
+A sweeper deletes expired rows API_CACHE_SWEEP_BATCH at a time, so it never
+holds long locks on the table. Next.js reaches the cache over the loopback
+/_gateway/cache routes in server.py, authenticated with GATEWAY_ADMIN_TOKEN.
+"""
+import asyncio
+import collections
+import logging
+import os
+import time
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+import httpx
+
+import eventlog
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "")
+API_CACHE_MAX_BYTES = int(os.environ.get("API_CACHE_MAX_BYTES", str(64 << 20)))
+API_CACHE_NEGATIVE_TTL = float(os.environ.get("API_CACHE_NEGATIVE_TTL", "300"))
+# Seconds between sweeps of expired api_cache rows; 0 disables the sweeper
+API_CACHE_SWEEP_INTERVAL = float(os.environ.get("API_CACHE_SWEEP_INTERVAL", "300"))
+API_CACHE_SWEEP_BATCH = int(os.environ.get("API_CACHE_SWEEP_BATCH", "500"))
+API_CACHE_TIMEOUT = float(os.environ.get("API_CACHE_TIMEOUT", "10"))
+SCRYDEX_API_KEY = os.environ.get("SCRYDEX_API_KEY", "")
+# Same default as fetchScrydex
+SCRYDEX_TEAM_ID = os.environ.get("SCRYDEX_TEAM_ID", "hatakekb")
+
+# Cache TTL in seconds, as in lib/api-cache.ts
+CACHE_TTL = {
+    "scryfall_card": 86400,
+    "scryfall_search": 3600,
+    "tcgdex_card": 86400,
+    "tcgdex_search": 3600,
+    "tcgdex_set": 86400,
+    "scrydex_default": 3600,
+}
+
+# Where each source may fetch from; the key prefix is the source name
+ORIGINS = {
+    "scryfall": "https://api.scryfall.com/",
+    "tcgdex": "https://api.tcgdex.net/",
+    "scrydex": "https://api.scrydex.com/",
+}
+
+# Bookkeeping per L1 entry on top of key and body (dict slot, list node, tuple)
+ENTRY_OVERHEAD = 200
+# Pause between sweeper batches, so other queries get the table in between
+SWEEP_PAUSE = 0.05
+
+logger = logging.getLogger("gateway.api_cache")
+
+
+def ttl_for(source: str, url: str) -> int:
+    """The TTL fetchScryfallCached, fetchTCGdexCached or fetchScrydex would use"""
+    if source == "scryfall":
+        return CACHE_TTL["scryfall_search" if "/search" in url else "scryfall_card"]
+    if source == "tcgdex":
+        if "/cards?" in url or "/search" in url:
+            return CACHE_TTL["tcgdex_search"]
+        return CACHE_TTL["tcgdex_set" if "/sets" in url else "tcgdex_card"]
+    return CACHE_TTL["scrydex_default"]
+
+
+class Entry(NamedTuple):
+    status: int
+    # None for a negative entry
+    body: Optional[bytes]
+    expires: float
+
+
+class Lookup(NamedTuple):
+    status: int
+    body: Optional[bytes]
+    # l1, l2, upstream, coalesced, negative, miss or error
+    source: str
+
+
+class LRU:
+    """Least recently used entries, bounded by the bytes of keys and bodies"""
+
+    def __init__(self, max_bytes: int = API_CACHE_MAX_BYTES, clock: Callable[[], float] = time.monotonic):
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.entries: "collections.OrderedDict[str, Entry]" = collections.OrderedDict()
+        self.bytes = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def _size(key: str, entry: Entry) -> int:
+        return len(key) + len(entry.body or b"") + ENTRY_OVERHEAD
+
+    def get(self, key: str) -> Optional[Entry]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= self.clock():
+            self.delete(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, status: int, body: Optional[bytes], ttl: float):
+        entry = Entry(status, body, self.clock() + ttl)
+        size = self._size(key, entry)
+        self.delete(key)
+        # One response taking most of the cache would evict everything else
+        if ttl <= 0 or size > self.max_bytes // 4:
+            return
+        self.entries[key] = entry
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            old_key, old = self.entries.popitem(last=False)
+            self.bytes -= self._size(old_key, old)
+            self.evictions += 1
+
+    def delete(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= self._size(key, entry)
+
+    def purge_expired(self) -> int:
+        now = self.clock()
+        expired = [key for key, entry in self.entries.items() if entry.expires <= now]
+        for key in expired:
+            self.delete(key)
+        return len(expired)
+
+
+class PostgresL2:
+    """The api_cache table (see initCache in lib/api-cache.ts)"""
+
+    def __init__(self, dsn: str = DATABASE_URL):
+        self.dsn = dsn
+        self.pool = None
+
+    async def open(self):
+        import asyncpg
+
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=4)
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """(body, seconds left) of a live row"""
+        row = await self.pool.fetchrow(
+            """
+            SELECT response_data::text AS data, EXTRACT(EPOCH FROM expires_at - NOW())::float8 AS ttl
+            FROM api_cache WHERE cache_key = $1 AND expires_at > NOW()
+            """,
+            key,
+        )
+        return (row["data"].encode(), row["ttl"]) if row else None
+
+    async def set(self, key: str, body: bytes, ttl: float):
+        await self.pool.execute(
+            """
+            INSERT INTO api_cache (cache_key, response_data, expires_at)
+            VALUES ($1, $2::jsonb, NOW() + $3 * INTERVAL '1 second')
+            ON CONFLICT (cache_key) DO UPDATE SET
+              response_data = EXCLUDED.response_data,
+              expires_at = EXCLUDED.expires_at
+            """,
+            key, body.decode(), float(ttl),
+        )
+
+    async def delete_expired(self, limit: int) -> int:
+        """Delete up to `limit` expired rows; returns how many went"""
+        status = await self.pool.execute(
+            """
+            DELETE FROM api_cache WHERE cache_key IN (
+              SELECT cache_key FROM api_cache WHERE expires_at < NOW() LIMIT $1
+            )
+            """,
+            limit,
+        )
+        return int(status.rsplit(" ", 1)[-1])
+
+
+class ApiCache:
+    """L1 in front of L2 in front of the upstream APIs"""
+
+    def __init__(
+        self,
+        l1: Optional[LRU] = None,
+        l2: Optional[PostgresL2] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        origins: Optional[Dict[str, str]] = None,
+        negative_ttl: float = API_CACHE_NEGATIVE_TTL,
+    ):
+        self.l1 = l1 if l1 is not None else LRU()
+        self.l2 = l2
+        self.client = client
+        self.origins = origins or ORIGINS
+        self.negative_ttl = negative_ttl
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.lookups = collections.Counter()
+        self.swept = 0
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self, sweep_interval: float = API_CACHE_SWEEP_INTERVAL):
+        if self.l2 is None and DATABASE_URL:
+            l2 = PostgresL2()
+            try:
+                await l2.open()
+                self.l2 = l2
+            except Exception as e:
+                # L1 alone still saves the upstream requests
+                eventlog.emit(logger, "api_cache_l2_unavailable", logging.WARNING, error=f"{type(e).__name__}: {e}")
+        if self.l2 is not None and sweep_interval > 0:
+            self.task = asyncio.get_running_loop().create_task(self._sweep_loop(sweep_interval))
+
+    async def stop(self):
+        tasks = [task for task in (self.task, *self.inflight.values()) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.task = None
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+        if self.l2 is not None:
+            await self.l2.close()
+
+    async def _sweep_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                eventlog.emit(logger, "api_cache_sweep_error", logging.WARNING, error=f"{type(e).__name__}: {e}")
+
+    async def sweep(self, batch: int = API_CACHE_SWEEP_BATCH) -> dict:
+        """Drop expired L1 entries, then delete expired L2 rows in batches"""
+        result = {"l1": self.l1.purge_expired(), "l2": 0}
+        while self.l2 is not None:
+            deleted = await self.l2.delete_expired(batch)
+            result["l2"] += deleted
+            if deleted < batch:
+                break
+            await asyncio.sleep(SWEEP_PAUSE)
+        self.swept += result["l2"]
+        if result["l1"] or result["l2"]:
+            eventlog.emit(logger, "api_cache_sweep", **result)
+        return result
+
+    def _count(self, lookup: Lookup) -> Lookup:
+        self.lookups[lookup.source] += 1
+        return lookup
+
+    async def _l2_get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        if self.l2 is None:
+            return None
+        try:
+            return await self.l2.get(key)
+        except Exception as e:
+            eventlog.emit(logger, "api_cache_l2_error", logging.WARNING, op="get", error=f"{type(e).__name__}: {e}")
+            return None
+
+    async def _l2_set(self, key: str, body: bytes, ttl: float):
+        if self.l2 is None:
+            return
+        try:
+            await self.l2.set(key, body, ttl)
+        except Exception as e:
+            eventlog.emit(logger, "api_cache_l2_error", logging.WARNING, op="set", error=f"{type(e).__name__}: {e}")
+
+    async def get(self, key: str) -> Lookup:
+        """getFromCache: a live entry from L1 or L2, or a 404 miss"""
+        entry = self.l1.get(key)
+        if entry is not None and entry.body is not None:
+            return self._count(Lookup(200, entry.body, "l1"))
+        found = await self._l2_get(key)
+        if found is None:
+            return self._count(Lookup(404, None, "miss"))
+        body, ttl = found
+        self.l1.put(key, 200, body, ttl)
+        return self._count(Lookup(200, body, "l2"))
+
+    async def set(self, key: str, body: bytes, ttl: float):
+        """setToCache: write through both tiers"""
+        self.l1.put(key, 200, body, ttl)
+        await self._l2_set(key, body, ttl)
+
+    async def fetch(self, source: str, url: str, ttl: Optional[float] = None) -> Lookup:
+        """A cached upstream GET, as fetchScryfallCached and friends do it.
+
+        Raises ValueError for unknown sources and URLs outside their origin.
+        """
+        origin = self.origins.get(source)
+        if origin is None or not url.startswith(origin):
+            raise ValueError(f"Cannot fetch {url!r} for {source!r}")
+        key = f"{source}:{url}"
+        entry = self.l1.get(key)
+        if entry is not None:
+            return self._count(Lookup(entry.status, entry.body, "l1" if entry.body is not None else "negative"))
+        task = self.inflight.get(key)
+        if task is not None:
+            # Shielded, so a caller going away does not cancel the others' load
+            lookup = await asyncio.shield(task)
+            return self._count(lookup._replace(source="coalesced"))
+        task = asyncio.get_running_loop().create_task(self._load(key, source, url, ttl))
+        self.inflight[key] = task
+        task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return self._count(await asyncio.shield(task))
+
+    async def _load(self, key: str, source: str, url: str, ttl: Optional[float]) -> Lookup:
+        found = await self._l2_get(key)
+        if found is not None:
+            body, remaining = found
+            self.l1.put(key, 200, body, remaining)
+            return Lookup(200, body, "l2")
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=API_CACHE_TIMEOUT, headers={"Accept": "application/json"})
+        headers = {}
+        if source == "scrydex":
+            headers = {"X-Api-Key": SCRYDEX_API_KEY, "X-Team-ID": SCRYDEX_TEAM_ID}
+        try:
+            response = await self.client.get(url, headers=headers)
+        except httpx.HTTPError as e:
+            eventlog.emit(logger, "api_cache_upstream_error", logging.WARNING, source=source,
+                          error=f"{type(e).__name__}: {e}")
+            return Lookup(502, None, "error")
+        if response.status_code == 200:
+            if "json" not in response.headers.get("content-type", ""):
+                return Lookup(502, None, "error")
+            ttl = ttl_for(source, url) if ttl is None else ttl
+            await self.set(key, response.content, ttl)
+            return Lookup(200, response.content, "upstream")
+        # Rate limits and server errors are worth retrying right away
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            self.l1.put(key, response.status_code, None, self.negative_ttl)
+        return Lookup(response.status_code, None, "upstream")
+
+    def status(self) -> dict:
+        return {
+            "l1": {
+                "entries": len(self.l1),
+                "bytes": self.l1.bytes,
+                "max_bytes": self.l1.max_bytes,
+                "evictions": self.l1.evictions,
+            },
+            "l2": self.l2 is not None,
+            "inflight": len(self.inflight),
+            "lookups": dict(self.lookups),
+            "swept": self.swept,
+        }
+
+
+cache = ApiCache()
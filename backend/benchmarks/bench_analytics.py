@@ -0,0 +1,73 @@
+"""Benchmark: deck analytics for community-sized batches, in decks per second.
+
+Builds --decks synthetic 100-card Commander decks over --cards distinct cards
+with Scryfall-style mana costs, type lines and legalities, then times
+analysing them one request per deck, in batches of --batch (as the
+community listing does), and again from the content hash cache.
+
+    cd backend && python benchmarks/bench_analytics.py --decks 2000 --batch 50
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from common import percentile  # noqa: F401  (puts backend/ on sys.path)
+
+import deck_analytics  # noqa: E402
+
+COSTS = ("{R}", "{1}{G}", "{2}{U}{U}", "{W/U}{W/U}", "{X}{B}{B}", "{3}{R}{G}", "{5}", "{2/W}{2/W}", "{0}")
+TYPES = ("Creature — Elf", "Instant", "Sorcery", "Legendary Artifact", "Enchantment — Aura",
+         "Legendary Planeswalker — Jace", "Land", "Artifact Creature — Golem")
+BASICS = ("Plains", "Island", "Swamp", "Mountain", "Forest")
+STATUSES = ("legal", "legal", "legal", "not_legal", "banned", "restricted")
+
+
+def synthetic_cards(count: int, rng: random.Random) -> list:
+    cards = [{"name": f"Basic {name}", "type_line": f"Basic Land — {name}",
+              "legalities": {fmt: "legal" for fmt in deck_analytics.LEGALITY_FORMATS["mtg"]}} for name in BASICS]
+    # Real cards share a few hundred combinations of format statuses
+    profiles = [{fmt: rng.choice(STATUSES) for fmt in deck_analytics.LEGALITY_FORMATS["mtg"]} for _ in range(300)]
+    for i in range(count):
+        cards.append({"name": f"Card {i}", "mana_cost": rng.choice(COSTS), "type_line": rng.choice(TYPES),
+                      "legalities": dict(rng.choice(profiles))})
+    return cards
+
+
+def commander_deck(cards: list, rng: random.Random) -> deck_analytics.Deck:
+    rows = [(f"id-{card['name']}", card, 1, "main") for card in rng.sample(cards[len(BASICS):], 64)]
+    rows[0] = (rows[0][0], rows[0][1], 1, "commander")
+    rows.extend((f"id-{card['name']}", card, 7, "main") for card in cards[:len(BASICS)])
+    rows.extend((f"id-sb-{i}", card, 1, "sideboard") for i, card in enumerate(rng.sample(cards, 10)))
+    return deck_analytics.Deck("mtg", "Commander", rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--decks", type=int, default=2000)
+    parser.add_argument("--cards", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    cards = synthetic_cards(args.cards, rng)
+    decks = [commander_deck(cards, rng) for _ in range(args.decks)]
+
+    async def run(batch: int, analytics: deck_analytics.DeckAnalytics) -> float:
+        start = time.perf_counter()
+        for i in range(0, len(decks), batch):
+            await analytics.analyse(decks[i:i + batch])
+        return time.perf_counter() - start
+
+    for label, batch in (("one per request", 1), (f"batches of {args.batch}", args.batch)):
+        analytics = deck_analytics.DeckAnalytics(max_bytes=1 << 30)
+        elapsed = asyncio.run(run(batch, analytics))
+        print(f"{label}: {args.decks / elapsed:,.0f} decks/s")
+    elapsed = asyncio.run(run(args.batch, analytics))
+    print(f"cached, batches of {args.batch}: {args.decks / elapsed:,.0f} decks/s ({analytics.stats()['entries']} "
+          f"entries, {analytics.stats()['bytes'] / 2 ** 20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
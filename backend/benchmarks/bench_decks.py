@@ -0,0 +1,98 @@
+"""Benchmark: 100-card Commander deck lists imported per second.
+
+Builds a synthetic card store like bench_search.py does, indexes it, then
+writes --decks Commander lists (a commander, 99 cards with basic lands
+repeated) split between MTGA lines with set and number, Archidekt lines
+with categories and plain names, and times tokenising plus resolving each
+list against the index, and rendering each resolved deck back as MTGA.
+
+    cd backend && python benchmarks/bench_decks.py --cards 100000 --decks 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from bench_search import synthetic_cards
+from common import percentile
+
+import card_store  # noqa: E402  (backend/ is put on sys.path by common)
+import deck_lists  # noqa: E402
+import search_index  # noqa: E402
+
+
+def commander_list(cards: list, rng: random.Random) -> str:
+    picks = rng.sample(cards, 70)
+    lines = [f"Commander: {picks[0]['name']}"]
+    for card in picks[1:]:
+        style = rng.random()
+        if style < 0.4:
+            lines.append(f"1 {card['name']} ({card['set'].upper()}) {card['collector_number']}")
+        elif style < 0.7:
+            lines.append(f"1x {card['name']} ({card['set'].upper()}) {card['collector_number']} [Ramp]")
+        else:
+            lines.append(f"1 {card['name']}")
+    basics = rng.sample(cards[:50], 3)
+    lines.extend(f"10 {card['name']}" for card in basics[:2])
+    lines.append(f"{99 - 69 - 20} {basics[2]['name']}")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cards", type=int, default=100000)
+    parser.add_argument("--names", type=int, default=30000)
+    parser.add_argument("--sets", type=int, default=500)
+    parser.add_argument("--decks", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cards.store")
+        cards = list(synthetic_cards(args.cards, args.names, args.sets, rng))
+        card_store.ingest([json.dumps(cards).encode()], path, changes=False)
+        card_store.CARD_STORE = path
+        asyncio.run(search_index.service.sync())
+        lists = [commander_list(cards, rng) for _ in range(args.decks)]
+        del cards
+
+        timings, resolved, entries, decks = [], 0, 0, []
+        start = time.perf_counter()
+        for text in lists:
+            deck_start = time.perf_counter()
+            deck_list = deck_lists.parse(text)
+            found = deck_lists.resolve("mtg", deck_list.entries)
+            timings.append(time.perf_counter() - deck_start)
+            entries += len(deck_list.entries)
+            resolved += sum(card is not None for card in found)
+            decks.append(deck_lists.deck_rows(deck_list.entries, found))
+        elapsed = time.perf_counter() - start
+        timings.sort()
+        print(f"import: {args.decks / elapsed:,.0f} decks/s ({entries / args.decks:.0f} lines each, "
+              f"{resolved / entries:.1%} resolved), p50 {percentile(timings, 0.5) * 1e3:.2f} ms, "
+              f"p99 {percentile(timings, 0.99) * 1e3:.2f} ms")
+
+        async def render():
+            size = 0
+            for rows in decks:
+                async def deck_rows(rows=rows):
+                    for card_id, card, quantity, category in rows:
+                        yield card_id, json.loads(card), quantity, category
+
+                async for chunk in deck_lists.export("mtga", {}, deck_rows()):
+                    size += len(chunk)
+            return size
+
+        start = time.perf_counter()
+        size = asyncio.run(render())
+        elapsed = time.perf_counter() - start
+        print(f"export: {args.decks / elapsed:,.0f} decks/s ({size / args.decks:.0f} bytes each)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Benchmark: what the gateway (server.py) costs per proxied request.
+
+Starts the stub Next.js app and the gateway under uvicorn, then drives the
+same requests at the stub directly and through the gateway for each response
+size and concurrency level. Reports throughput, p50/p95/p99 latency and the
+gateway's CPU time per request and resident memory, and saves everything as
+JSON so runs on different commits can be compared:
+
+    cd backend && python benchmarks/bench_gateway.py --output before.json
+    git checkout my-branch
+    python benchmarks/bench_gateway.py --output after.json --compare before.json
+
+The load generator runs in this process; on a small machine it competes with
+the gateway for CPU, so compare runs from the same machine only.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import time
+
+import httpx
+
+from common import BACKEND_DIR, BENCH_DIR, ProcessStats, drive, free_port, gateway_process, stub_upstream
+
+# 1 KB API JSON up to a 5 MB JS bundle
+DEFAULT_SIZES = [1024, 16 * 1024, 256 * 1024, 1024 * 1024, 5 * 1024 * 1024]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run_case(base_url: str, path: str, concurrency: int, total: int, stats: ProcessStats = None):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        # Warm up connections (and the gateway's upstream pool) before measuring
+        await drive(client, concurrency, concurrency, path)
+        cpu_before = stats.cpu_seconds() if stats else None
+        result = await drive(client, concurrency, total, path)
+    if stats:
+        cpu = stats.cpu_seconds() - cpu_before
+        result["gateway_cpu_s"] = cpu
+        result["gateway_cpu_us_per_request"] = cpu / total * 1e6
+        result["gateway_cpu_utilisation"] = cpu / result["seconds"]
+        result.update({f"gateway_{key}": value for key, value in stats.memory_mb().items()})
+    return result
+
+
+def compare(baseline_path: str, results: list):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {(r["target"], r["size"], r["concurrency"]): r for r in baseline["results"]}
+    print(f"\nvs {baseline_path} ({baseline.get('commit', '?')})")
+    print(f"{'target':>8} {'bytes':>8} {'clients':>7} {'req/s':>8} {'p50':>8} {'p99':>8} {'cpu/req':>8}")
+    for result in results:
+        old = before.get((result["target"], result["size"], result["concurrency"]))
+        if old is None:
+            continue
+
+        def delta(key):
+            if not old.get(key) or result.get(key) is None:
+                return "n/a"
+            return f"{(result[key] / old[key] - 1) * 100:+.1f}%"
+
+        print(f"{result['target']:>8} {result['size']:>8} {result['concurrency']:>7} {delta('rps'):>8} "
+              f"{delta('p50_ms'):>8} {delta('p99_ms'):>8} {delta('gateway_cpu_us_per_request'):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000, help="requests per case (fewer for large bodies)")
+    parser.add_argument("--max-mb", type=int, default=2000, help="cap on bytes transferred per case")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    # /api/search is answered from the local index since the search routes moved into the gateway
+    parser.add_argument("--path", default="/api/marketplace",
+                        help="gateway route to request (must not need auth and must be proxied as-is)")
+    parser.add_argument("--no-direct", action="store_true", help="skip the direct-to-stub baseline")
+    parser.add_argument("--access-log", action="store_true", help="keep the gateway access log on (to /dev/null)")
+    parser.add_argument("--output", default=None, help="JSON results file (default: results/gateway-<commit>.json)")
+    parser.add_argument("--compare", default=None, help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    stub_bind = f"127.0.0.1:{free_port()}"
+    gateway_port = free_port()
+    gateway_env = {"ACCESS_LOG": "1" if args.access_log else "0", "LOG_FILE": "/dev/null", "LOG_LEVEL": "WARNING"}
+    results = []
+
+    with stub_upstream(stub_bind), gateway_process(f"http://{stub_bind}", gateway_port, gateway_env) as gateway:
+        stats = ProcessStats(gateway.pid)
+        targets = [("gateway", f"http://127.0.0.1:{gateway_port}", stats)]
+        if not args.no_direct:
+            targets.insert(0, ("direct", f"http://{stub_bind}", None))
+
+        print(f"{'target':>8} {'bytes':>8} {'clients':>7} {'reqs':>6} {'req/s':>8} {'MB/s':>7} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'cpu us':>7} {'rss MB':>7} {'err':>4}", flush=True)
+        for size in args.sizes:
+            total = max(50, min(args.requests, args.max_mb * 1024 * 1024 // size))
+            path = f"{args.path}?size={size}"
+            for concurrency in args.concurrency:
+                for target, base_url, target_stats in targets:
+                    result = asyncio.run(run_case(base_url, path, concurrency, total, target_stats))
+                    result.update({"target": target, "size": size, "concurrency": concurrency})
+                    results.append(result)
+                    cpu = result.get("gateway_cpu_us_per_request")
+                    rss = result.get("gateway_rss_mb")
+                    print(f"{target:>8} {size:>8} {concurrency:>7} {total:>6} {result['rps']:>8.0f} "
+                          f"{result['mb_per_s']:>7.1f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+                          f"{result['p99_ms']:>8.2f} {cpu if cpu is not None else float('nan'):>7.0f} "
+                          f"{rss if rss is not None else float('nan'):>7.1f} {result['errors']:>4}", flush=True)
+
+    output = args.output
+    if output is None:
+        os.makedirs(os.path.join(BENCH_DIR, "results"), exist_ok=True)
+        output = os.path.join(BENCH_DIR, "results", f"gateway-{commit}.json")
+    with open(output, "w") as f:
+        json.dump({
+            "benchmark": "gateway",
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "config": vars(args),
+            "results": results,
+        }, f, indent=2)
+    print(f"\nwrote {output}")
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
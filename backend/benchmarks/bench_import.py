@@ -0,0 +1,118 @@
+"""Benchmark: collection import throughput in rows per second.
+
+Writes a synthetic ManaBox export (--rows rows over --cards distinct printings,
+most rows with a Scryfall ID and the rest by set and collector number, a few
+by name only), loads the printings into a local card store and runs one import
+job against a sink that only counts rows, so the number is the parser, the
+resolver and the row builder, not the database.
+
+    cd backend && python benchmarks/bench_import.py --rows 50000
+
+--unknown makes that share of rows miss the local store; their lookups go to
+a mocked Scryfall that answers after --latency seconds, through the API cache.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench_search import synthetic_cards
+from common import percentile  # noqa: F401  (puts backend/ on sys.path)
+
+import api_cache  # noqa: E402
+import card_store  # noqa: E402
+import collection_import  # noqa: E402
+import search_index  # noqa: E402
+
+HEADER = ["Name", "Set code", "Set name", "Collector number", "Foil", "Rarity", "Quantity",
+          "ManaBox ID", "Scryfall ID", "Purchase price", "Condition"]
+CONDITIONS = ("near_mint", "lightly_played", "moderately_played", "heavily_played", "damaged")
+
+
+class CountingSink:
+    def __init__(self):
+        self.rows = 0
+        self.writes = 0
+
+    async def insert_items(self, records):
+        self.rows += len(records)
+        self.writes += 1
+        return len(records)
+
+
+def write_export(path: str, cards: list, rows: int, unknown: float, rng: random.Random):
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(HEADER)
+        for i in range(rows):
+            card = rng.choice(cards)
+            name, set_code, number, scryfall_id = card["name"], card["set"], card["collector_number"], card["id"]
+            roll = rng.random()
+            if roll < unknown:
+                name, set_code, number, scryfall_id = f"Missing {i}", "zzz", str(i), ""
+            elif roll < unknown + 0.1:
+                scryfall_id = ""
+            elif roll < unknown + 0.12:
+                scryfall_id, number = "", ""
+            writer.writerow([name, set_code.upper(), f"Set {set_code}", number, rng.choice(("normal", "foil")),
+                             card["rarity"], rng.randint(1, 4), i, scryfall_id,
+                             f"{rng.randint(0, 2000) / 100:.2f}", rng.choice(CONDITIONS)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--cards", type=int, default=20000, help="distinct printings in the export")
+    parser.add_argument("--chunk", type=int, default=collection_import.IMPORT_CHUNK_ROWS, help="rows per chunk")
+    parser.add_argument("--unknown", type=float, default=0.0, help="share of rows not in the local store")
+    parser.add_argument("--latency", type=float, default=0.05, help="mocked Scryfall latency in seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cards = list(synthetic_cards(args.cards, args.cards // 2, 300, rng))
+        store_path = os.path.join(tmp, "cards.store")
+        card_store.ingest([json.dumps(cards).encode()], store_path, changes=False)
+        card_store.CARD_STORE = store_path
+        asyncio.run(search_index.service.sync())
+        export = os.path.join(tmp, "export.csv")
+        write_export(export, cards, args.rows, args.unknown, rng)
+        size = os.path.getsize(export)
+        del cards
+
+        async def scryfall(request):
+            await asyncio.sleep(args.latency)
+            return httpx.Response(404, json={"object": "error"})
+
+        async def run():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(scryfall))
+            scryfall_collection = collection_import.ScryfallCollection(client, rate=0)
+            resolver = collection_import.Resolver(api_cache.ApiCache(client=client), scryfall_collection)
+            sink = CountingSink()
+            jobs = collection_import.ImportJobs(store=sink, resolver=resolver)
+            job = collection_import.ImportJob("bench", export, "mtg", args.chunk)
+            jobs.jobs[job.id] = job
+            start = time.perf_counter()
+            await jobs._run(job)
+            elapsed = time.perf_counter() - start
+            await client.aclose()
+            return job, sink, elapsed
+
+        job, sink, elapsed = asyncio.run(run())
+        status = job.status()
+        print(f"{status['state']}: {status['rows']} rows ({size / 2 ** 20:.1f} MB) in {elapsed:.2f}s "
+              f"= {status['rows'] / elapsed:,.0f} rows/s")
+        print(f"{sink.writes} writes of up to {args.chunk} rows, {status['unresolved']} unresolved, "
+              f"{status['uniqueCards']} unique cards, {status['totalCopies']} copies")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""Load test: weighted user journeys against a running gateway.
+
+Virtual users log in once, then loop over the journeys in journeys.py (the
+flows from the API regression suites), picked at random by weight, with an
+exponentially distributed think time between journeys. Every request is
+timed and labelled with its Next.js route template, so the report lists
+latency percentiles and error rates per endpoint, e.g.
+`GET /api/feed/{postId}/comments`, plus the duration of each journey.
+
+    cd backend && python benchmarks/bench_journeys.py \\
+        --base-url http://localhost:8001 --users 50 --duration 120 \\
+        --weights feed=50,collection=20,decks=10,marketplace=10,messages=5,sealed=5
+
+The users log in as --email/--password (the suites' test account by default)
+and only create records named LOADTEST_<run>_..., which they delete again.
+Results are also written as JSON (see bench_gateway.py).
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import time
+
+import httpx
+
+from common import BENCH_DIR, percentile
+from bench_gateway import git_commit
+from journeys import DEFAULT_WEIGHTS, JOURNEYS
+
+import routes  # noqa: E402  (backend/ is put on sys.path by common)
+
+
+class Stats:
+    def __init__(self):
+        # (method, route) -> latencies in seconds
+        self.latencies = collections.defaultdict(list)
+        # (method, route) -> status code (or exception name) -> count
+        self.statuses = collections.defaultdict(collections.Counter)
+        self.journeys = collections.defaultdict(list)
+        self.journey_failures = collections.Counter()
+
+    def record(self, method: str, route: str, seconds: float, status):
+        self.latencies[(method, route)].append(seconds)
+        self.statuses[(method, route)][status] += 1
+
+
+def route_label(path: str) -> str:
+    path = path.split("?", 1)[0]
+    return routes.route_table.template_for(path) or path
+
+
+class VirtualUser:
+    def __init__(self, index: int, client: httpx.AsyncClient, stats: Stats, prefix: str):
+        self.index = index
+        self.client = client
+        self.stats = stats
+        self.prefix = f"{prefix}{index}_"
+        self.created = 0
+        self.errors = 0
+
+    def name(self, kind: str) -> str:
+        self.created += 1
+        return f"{self.prefix}{kind}_{self.created}"
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        route = route_label(path)
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            self.stats.record(method, route, time.perf_counter() - start, type(e).__name__)
+            self.errors += 1
+            raise
+        self.stats.record(method, route, time.perf_counter() - start, response.status_code)
+        if response.status_code >= 400:
+            self.errors += 1
+        return response
+
+    async def get(self, path: str, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs):
+        return await self.request("POST", path, **kwargs)
+
+    async def patch(self, path: str, **kwargs):
+        return await self.request("PATCH", path, **kwargs)
+
+    async def delete(self, path: str, **kwargs):
+        return await self.request("DELETE", path, **kwargs)
+
+
+def parse_weights(spec: str):
+    weights = dict(DEFAULT_WEIGHTS)
+    if spec:
+        weights = {name: 0 for name in weights}
+        for item in spec.split(","):
+            name, _, value = item.partition("=")
+            if name.strip() not in JOURNEYS:
+                raise SystemExit(f"unknown journey {name!r}; choose from {', '.join(JOURNEYS)}")
+            weights[name.strip()] = float(value or 1)
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+async def virtual_user(index: int, args, weights, stats: Stats, prefix: str, deadline: float):
+    await asyncio.sleep(args.ramp_up * index / args.users)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+        vu = VirtualUser(index, client, stats, prefix)
+        response = await vu.post("/api/auth/login", json={"email": args.email, "password": args.password})
+        if response.status_code != 200:
+            stats.journey_failures["login"] += 1
+            return
+        names, values = list(weights), list(weights.values())
+        while time.monotonic() < deadline:
+            name = random.choices(names, values)[0]
+            start = time.perf_counter()
+            errors = vu.errors
+            try:
+                await JOURNEYS[name](vu)
+            except (httpx.HTTPError, ValueError, KeyError, AttributeError):
+                vu.errors += 1
+            # A journey fails if any of its requests did
+            if vu.errors > errors:
+                stats.journey_failures[name] += 1
+            stats.journeys[name].append(time.perf_counter() - start)
+            if args.think > 0:
+                await asyncio.sleep(random.expovariate(1 / args.think))
+
+
+def summarise(stats: Stats, elapsed: float):
+    endpoints = []
+    for (method, route), latencies in sorted(stats.latencies.items(), key=lambda item: -len(item[1])):
+        latencies.sort()
+        statuses = stats.statuses[(method, route)]
+        errors = sum(count for status, count in statuses.items() if not isinstance(status, int) or status >= 400)
+        endpoints.append({
+            "method": method,
+            "route": route,
+            "count": len(latencies),
+            "rps": len(latencies) / elapsed,
+            "error_rate": errors / len(latencies),
+            "statuses": {str(status): count for status, count in statuses.items()},
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+        })
+    journeys = []
+    for name, durations in sorted(stats.journeys.items()):
+        durations.sort()
+        journeys.append({
+            "journey": name,
+            "count": len(durations),
+            "failures": stats.journey_failures[name],
+            "p50_ms": percentile(durations, 0.50) * 1000,
+            "p95_ms": percentile(durations, 0.95) * 1000,
+        })
+    return endpoints, journeys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default=os.environ.get("BASE_URL", "http://localhost:8001"))
+    parser.add_argument("--users", type=int, default=20, help="virtual users")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run after ramp-up starts")
+    parser.add_argument("--ramp-up", type=float, default=10, help="seconds over which users start")
+    parser.add_argument("--think", type=float, default=1.0, help="mean think time between journeys (s)")
+    parser.add_argument("--weights", default="", help="journey=weight,... (default: %s)" % ",".join(
+        f"{name}={weight}" for name, weight in DEFAULT_WEIGHTS.items()))
+    parser.add_argument("--email", default=os.environ.get("TEST_EMAIL", "test@test.com"))
+    parser.add_argument("--password", default=os.environ.get("TEST_PASSWORD", "password"))
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default=None, help="JSON results file (default: results/journeys-<commit>.json)")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    weights = parse_weights(args.weights)
+    prefix = f"LOADTEST_{int(time.time())}_"
+    stats = Stats()
+
+    async def run():
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(*(
+            virtual_user(i, args, weights, stats, prefix, deadline) for i in range(args.users)
+        ))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    endpoints, journeys = summarise(stats, elapsed)
+
+    print(f"{args.users} virtual users for {elapsed:.1f}s against {args.base_url}")
+    if stats.journey_failures["login"]:
+        print(f"{stats.journey_failures['login']} users could not log in as {args.email}")
+    print(f"\n{'endpoint':<44} {'count':>6} {'req/s':>7} {'err %':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for row in endpoints:
+        label = f"{row['method']} {row['route']}"
+        print(f"{label:<44} {row['count']:>6} {row['rps']:>7.1f} {row['error_rate'] * 100:>6.1f} "
+              f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+    print(f"\n{'journey':<12} {'count':>6} {'failed':>6} {'p50 ms':>8} {'p95 ms':>8}")
+    for row in journeys:
+        print(f"{row['journey']:<12} {row['count']:>6} {row['failures']:>6} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f}")
+
+    commit = git_commit()
+    output = args.output
+    if output is None:
+        os.makedirs(os.path.join(BENCH_DIR, "results"), exist_ok=True)
+        output = os.path.join(BENCH_DIR, "results", f"journeys-{commit}.json")
+    with open(output, "w") as f:
+        json.dump({
+            "benchmark": "journeys",
+            "commit": commit,
+            "seconds": elapsed,
+            "config": {**vars(args), "password": None, "weights": weights},
+            "endpoints": endpoints,
+            "journeys": journeys,
+        }, f, indent=2)
+    print(f"\nwrote {output}")
+
+
+if __name__ == "__main__":
+    main()
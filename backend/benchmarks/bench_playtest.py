@@ -0,0 +1,50 @@
+"""Benchmark: sampled playtests of a 60-card deck and a Commander library.
+
+Times playtest.simulate() for --hands opening hands and --turns turns of
+each deck, uncached, and the cached lookup through Playtests.run().
+
+    cd backend && python benchmarks/bench_playtest.py --hands 20000 --turns 8
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from common import percentile  # noqa: F401  (puts backend/ on sys.path)
+
+import deck_analytics  # noqa: E402
+import playtest  # noqa: E402
+
+COSTS = ("{R}", "{1}{G}", "{2}{U}", "{3}{B}", "{4}{W}", "{5}")
+
+
+def deck(lands: int, spells: int, copies: int) -> deck_analytics.Deck:
+    rows = [("forest", {"name": "Forest", "type_line": "Basic Land — Forest"}, lands, "main")]
+    rows.extend((f"card-{i}", {"name": f"Card {i}", "mana_cost": COSTS[i % len(COSTS)], "type_line": "Creature"},
+                 copies, "main") for i in range(spells))
+    return deck_analytics.Deck("mtg", None, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hands", type=int, default=playtest.PLAYTEST_MAX_HANDS)
+    parser.add_argument("--turns", type=int, default=8)
+    args = parser.parse_args()
+
+    for label, sample in (("60 cards, 9 spells x4", deck(24, 9, 4)), ("Commander, 99 cards", deck(37, 62, 1))):
+        cards = playtest.library(sample.game, sample.rows)
+        start = time.perf_counter()
+        playtest.simulate(sample.game, cards, args.hands, args.turns, False, 1)
+        elapsed = time.perf_counter() - start
+        print(f"{label}: {args.hands:,} hands in {elapsed * 1000:.0f} ms")
+
+        playtests = playtest.Playtests()
+        asyncio.run(playtests.run(sample, args.hands, args.turns))
+        start = time.perf_counter()
+        for _ in range(100):
+            asyncio.run(playtests.run(sample, args.hands, args.turns))
+        print(f"{label}, cached: {(time.perf_counter() - start) * 10:.2f} ms")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Micro-benchmark: per-request header handling in proxy_request.
+
+Compares the previous dict-based pipeline (lowercasing every name, re-parsing
+cookies into a dict, rebuilding response headers) with the raw header-list
+pipeline in proxy_headers.py.
+
+    cd backend && python benchmarks/bench_proxy_headers.py
+"""
+import os
+import sys
+import timeit
+
+import httpx
+from starlette.datastructures import Headers
+from starlette.requests import cookie_parser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import proxy_headers  # noqa: E402
+
+# A typical browser API request through the gateway
+REQUEST_HEADERS = [
+    (b"host", b"hatake.social"),
+    (b"connection", b"keep-alive"),
+    (b"content-length", b"48"),
+    (b"sec-ch-ua", b'"Chromium";v="130", "Google Chrome";v="130"'),
+    (b"accept", b"application/json, text/plain, */*"),
+    (b"content-type", b"application/json"),
+    (b"user-agent", b"Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/130.0 Safari/537.36"),
+    (b"origin", b"https://hatake.social"),
+    (b"referer", b"https://hatake.social/collection"),
+    (b"accept-encoding", b"gzip, deflate, br"),
+    (b"accept-language", b"en-US,en;q=0.9"),
+    (b"cookie", b"session_token=session_abc123; theme=dark; _ga=GA1.1.123.456"),
+]
+
+# A typical Next.js API response
+RESPONSE_HEADERS = [
+    (b"Vary", b"RSC, Next-Router-State-Tree, Next-Router-Prefetch"),
+    (b"Content-Type", b"application/json"),
+    (b"Access-Control-Allow-Credentials", b"true"),
+    (b"Access-Control-Allow-Origin", b"*"),
+    (b"Access-Control-Allow-Methods", b"GET,OPTIONS,PATCH,DELETE,POST,PUT"),
+    (b"Set-Cookie", b"session_token=session_abc123; Path=/; HttpOnly; SameSite=lax"),
+    (b"Date", b"Sun, 18 Oct 2026 12:00:00 GMT"),
+    (b"Connection", b"keep-alive"),
+    (b"Keep-Alive", b"timeout=5"),
+    (b"Transfer-Encoding", b"chunked"),
+]
+
+
+def legacy_pipeline():
+    request_headers = Headers(raw=REQUEST_HEADERS)
+    headers = {}
+    for key, value in request_headers.items():
+        if key.lower() not in ['host', 'content-length']:
+            headers[key] = value
+    cookies = {}
+    for cookie_name, cookie_value in cookie_parser(request_headers.get("cookie", "")).items():
+        cookies[cookie_name] = cookie_value
+
+    response_headers = httpx.Headers(RESPONSE_HEADERS)
+    excluded_headers = ['content-encoding', 'content-length', 'transfer-encoding', 'connection']
+    return headers, cookies, {
+        key: value for key, value in response_headers.items()
+        if key.lower() not in excluded_headers
+    }
+
+
+def raw_pipeline():
+    return (
+        proxy_headers.filter_request_headers(REQUEST_HEADERS),
+        proxy_headers.filter_response_headers(RESPONSE_HEADERS),
+    )
+
+
+def main():
+    number = 50_000
+    for name, func in (("dict pipeline", legacy_pipeline), ("raw pipeline", raw_pipeline)):
+        best = min(timeit.repeat(func, number=number, repeat=5))
+        print(f"{name:>14}: {best / number * 1e6:6.2f} us/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Micro-benchmark: query latency and footprint of the card search index.
+
+Builds a synthetic card store shaped like Scryfall's default_cards (--cards
+printings of --names distinct names drawn from a Zipf-distributed vocabulary,
+spread over --sets sets), indexes it the way the gateway does and times a
+query mix as users type it: every prefix of a name, names with one typo,
+"set number" pairs and set-filtered names.
+
+    cd backend && python benchmarks/bench_search.py --cards 100000 --names 30000
+
+--memory traces allocations while indexing (which makes the build slower).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from common import percentile
+
+import card_store  # noqa: E402  (backend/ is put on sys.path by common)
+import search_index  # noqa: E402
+
+SYLLABLES = (
+    "ka ra to ne mi sa lo ve th dr ag on el an ir us or ith ul ga sh ar en "
+    "bo lt li gh ni ng se rr wi zz ar d ma st er gob li n ho rr or cr yp t"
+).split()
+
+
+def vocabulary(size: int, rng: random.Random):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    words = sorted(words)
+    rng.shuffle(words)
+    # Zipf: a few words ("of", "the", "dragon") are in many names
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    return words, weights
+
+
+def synthetic_cards(count: int, names: int, sets: int, rng: random.Random):
+    words, weights = vocabulary(names // 2, rng)
+    distinct = set()
+    while len(distinct) < names:
+        distinct.add(" ".join(rng.choices(words, weights, k=rng.randint(1, 4))).title())
+    distinct = sorted(distinct)
+    set_codes = [f"s{i:03d}" for i in range(sets)]
+    for i in range(count):
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "name": distinct[i] if i < len(distinct) else rng.choice(distinct),
+            "set": rng.choice(set_codes),
+            "collector_number": str(rng.randint(1, 400)),
+            "rarity": rng.choice(("common", "uncommon", "rare", "mythic")),
+            "released_at": f"20{rng.randint(0, 25):02d}-01-01",
+            "type_line": "Creature", "oracle_text": "Flying. " * 8,
+            "prices": {"eur": "0.25"},
+        }
+
+
+def typo(word: str, rng: random.Random) -> str:
+    i = rng.randrange(len(word) - 1)
+    return rng.choice((
+        word[:i] + word[i + 1:],                              # missing letter
+        word[:i] + word[i + 1] + word[i] + word[i + 2:],      # swapped letters
+        word[:i] + rng.choice("aeiou") + word[i + 1:],        # wrong letter
+    ))
+
+
+def query_mix(index: search_index.SearchIndex, rng: random.Random, count: int):
+    segment = index.segments["mtg"]
+    docs = [doc for doc in segment.docs if doc is not None]
+    queries = {"prefix": [], "typo": [], "set+number": [], "set filter": []}
+    for _ in range(count):
+        doc = rng.choice(docs)
+        name = doc.name.lower()
+        queries["prefix"].append((name[:rng.randint(1, len(name))], {}))
+        words = name.split()
+        long_words = [i for i, word in enumerate(words) if len(word) >= 5]
+        if long_words:
+            i = rng.choice(long_words)
+            words[i] = typo(words[i], rng)
+            queries["typo"].append((" ".join(words), {}))
+        queries["set+number"].append((f"{doc.set} {doc.number}", {}))
+        queries["set filter"].append((name.split()[0][:4], {"set": doc.set}))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cards", type=int, default=100000)
+    parser.add_argument("--names", type=int, default=30000)
+    parser.add_argument("--sets", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=2000, help="queries per kind")
+    parser.add_argument("--limit", type=int, default=20, help="results per query")
+    parser.add_argument("--memory", action="store_true", help="trace allocations while indexing")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cards.store")
+        cards = list(synthetic_cards(args.cards, args.names, args.sets, rng))
+        card_store.ingest([json.dumps(cards).encode()], path, changes=False)
+        del cards
+        card_store.CARD_STORE = path
+        service = search_index.SearchService()
+        if args.memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        asyncio.run(service.sync())
+        build = time.perf_counter() - start
+        traced = tracemalloc.get_traced_memory()[0] if args.memory else None
+        tracemalloc.stop()
+        index = service.index
+        stats = index.stats()["mtg"]
+        print(f"indexed {stats['documents']} printings, {stats['names']} names, "
+              f"{stats['trigrams']} trigrams in {build:.2f}s")
+        if traced is not None:
+            print(f"index memory: {traced / 2 ** 20:.1f} MB")
+
+        print(f"\n{'query':<12} {'count':>6} {'p50 us':>8} {'p99 us':>8} {'max us':>8} {'hits':>6}")
+        for kind, queries in query_mix(index, rng, args.queries).items():
+            timings, found = [], 0
+            for q, filters in queries:
+                start = time.perf_counter()
+                results = index.search(q, limit=args.limit, **filters)
+                timings.append(time.perf_counter() - start)
+                found += bool(results.total)
+            timings.sort()
+            print(f"{kind:<12} {len(timings):>6} {percentile(timings, 0.5) * 1e6:>8.0f} "
+                  f"{percentile(timings, 0.99) * 1e6:>8.0f} {timings[-1] * 1e6:>8.0f} {found / len(queries):>6.0%}")
+
+        hits = index.search("a", limit=args.limit).hits
+        start = time.perf_counter()
+        for _ in range(200):
+            index.cards(hits)
+        print(f"\nreading {len(hits)} results back from the store: "
+              f"{(time.perf_counter() - start) / 200 * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
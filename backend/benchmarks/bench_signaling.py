@@ -0,0 +1,249 @@
+"""Load test: the WebRTC signaling server in server.py.
+
+Starts the gateway under uvicorn, opens `--connections` WebSockets to
+/ws/signaling/{user_id} and pairs them into call rooms. Every pair then
+replays call setup the way the app's video call client does: call_user,
+call_accepted, an SDP offer and answer, a burst of ice_candidate messages
+from both sides and call_ended. Reports:
+
+  * relay latency percentiles per message type (sender to receiver)
+  * relayed messages per second across all calls
+  * gateway memory per open connection and per room member
+  * join/leave fan-out cost as the room grows: time until the joiner has
+    room_joined and every member has user_joined (or user_left)
+
+    cd backend && python benchmarks/bench_signaling.py --connections 2000
+
+Each connection needs a file descriptor on both ends; raise `ulimit -n` for
+large runs. Results are also written as JSON (see bench_gateway.py).
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import time
+
+import websockets
+
+from common import BENCH_DIR, ProcessStats, free_port, gateway_process, percentile
+from bench_gateway import git_commit
+
+# Roughly the size of a browser's SDP offer with audio, video and data channels
+SDP = "v=0\r\n" + "a=candidate:1 1 udp 2122260223 192.168.1.2 54400 typ host\r\n" * 60
+CANDIDATE = {
+    "candidate": "candidate:842163049 1 udp 1677729535 203.0.113.7 46154 typ srflx raddr 0.0.0.0 rport 0",
+    "sdpMid": "0",
+    "sdpMLineIndex": 0,
+}
+
+
+class Peer:
+    """One signaling connection; incoming messages are queued by type"""
+
+    def __init__(self, user_id: str, ws, latencies):
+        self.user_id = user_id
+        self.ws = ws
+        self.latencies = latencies
+        self.inbox = collections.defaultdict(asyncio.Queue)
+        self.reader = asyncio.get_running_loop().create_task(self._read())
+
+    async def _read(self):
+        try:
+            async for raw in self.ws:
+                received = time.perf_counter()
+                message = json.loads(raw)
+                # offer/answer/ice_candidate payloads carry the send time
+                payload = message.get("offer") or message.get("answer") or message.get("candidate")
+                if isinstance(payload, dict) and "sent" in payload:
+                    self.latencies[message["type"]].append(received - payload["sent"])
+                self.inbox[message["type"]].put_nowait(message)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def send(self, message: dict):
+        await self.ws.send(json.dumps(message))
+
+    async def expect(self, message_type: str, timeout: float = 30.0) -> dict:
+        return await asyncio.wait_for(self.inbox[message_type].get(), timeout)
+
+    async def close(self):
+        await self.ws.close()
+        await self.reader
+
+
+async def timed(latencies, message_type: str, send, receive):
+    start = time.perf_counter()
+    await send
+    await receive
+    latencies[message_type].append(time.perf_counter() - start)
+
+
+async def call(a: Peer, b: Peer, ice: int, latencies) -> int:
+    """Replay one call between a and b; returns the number of relayed messages"""
+    await timed(latencies, "incoming_call",
+                a.send({"type": "call_user", "target": b.user_id, "call_type": "video", "caller_name": a.user_id}),
+                b.expect("incoming_call"))
+    await timed(latencies, "call_accepted",
+                b.send({"type": "call_accepted", "target": a.user_id}), a.expect("call_accepted"))
+    await a.send({"type": "offer", "target": b.user_id,
+                  "offer": {"type": "offer", "sdp": SDP, "sent": time.perf_counter()}})
+    await b.expect("offer")
+    await b.send({"type": "answer", "target": a.user_id,
+                  "answer": {"type": "answer", "sdp": SDP, "sent": time.perf_counter()}})
+    await a.expect("answer")
+
+    async def trickle(sender: Peer, receiver: Peer):
+        for _ in range(ice):
+            await sender.send({"type": "ice_candidate", "target": receiver.user_id,
+                               "candidate": {**CANDIDATE, "sent": time.perf_counter()}})
+        for _ in range(ice):
+            await receiver.expect("ice_candidate")
+
+    await asyncio.gather(trickle(a, b), trickle(b, a))
+    await timed(latencies, "call_ended",
+                a.send({"type": "call_ended", "target": b.user_id}), b.expect("call_ended"))
+    return 5 + 2 * ice
+
+
+async def connect_all(url: str, count: int, prefix: str, latencies, parallel: int = 100):
+    semaphore = asyncio.Semaphore(parallel)
+
+    async def connect(i):
+        async with semaphore:
+            user_id = f"{prefix}{i}"
+            ws = await websockets.connect(f"{url}/ws/signaling/{user_id}", max_size=None, open_timeout=60)
+            return Peer(user_id, ws, latencies)
+
+    return await asyncio.gather(*(connect(i) for i in range(count)))
+
+
+async def join(peer: Peer, room_id: str, members) -> float:
+    """Join `room_id`; returns seconds until the joiner and all `members` are notified"""
+    start = time.perf_counter()
+    await peer.send({"type": "join_room", "room_id": room_id})
+    await asyncio.gather(peer.expect("room_joined"), *(m.expect("user_joined") for m in members))
+    return time.perf_counter() - start
+
+
+async def leave(peer: Peer, members) -> float:
+    start = time.perf_counter()
+    await peer.send({"type": "leave_room"})
+    await asyncio.gather(peer.expect("room_left"), *(m.expect("user_left") for m in members))
+    return time.perf_counter() - start
+
+
+async def fanout(url: str, room_sizes, repeats: int):
+    """Per room size, the median join and leave cost for the last member"""
+    results = []
+    for size in room_sizes:
+        peers = await connect_all(url, size, f"fanout{size}_", collections.defaultdict(list))
+        room_id = f"fanout_{size}"
+        for i, peer in enumerate(peers[:-1]):
+            await join(peer, room_id, peers[:i])
+        last, members = peers[-1], peers[:-1]
+        joins, leaves = [], []
+        for _ in range(repeats):
+            joins.append(await join(last, room_id, members))
+            leaves.append(await leave(last, members))
+        await asyncio.gather(*(peer.close() for peer in peers))
+        joins.sort()
+        leaves.sort()
+        results.append({
+            "room_size": size,
+            "join_ms": percentile(joins, 0.5) * 1000,
+            "leave_ms": percentile(leaves, 0.5) * 1000,
+        })
+    return results
+
+
+async def run(url: str, stats: ProcessStats, args):
+    latencies = collections.defaultdict(list)
+    baseline = stats.memory_mb()["rss_mb"]
+
+    peers = await connect_all(url, args.connections, "load_", latencies)
+    connected = stats.memory_mb()["rss_mb"]
+
+    pairs = [(peers[i], peers[i + 1]) for i in range(0, len(peers) - 1, 2)]
+    await asyncio.gather(*(
+        join(a, f"room_{i}", []) for i, (a, _) in enumerate(pairs)
+    ))
+    await asyncio.gather(*(
+        join(b, f"room_{i}", [a]) for i, (a, b) in enumerate(pairs)
+    ))
+    in_rooms = stats.memory_mb()["rss_mb"]
+
+    cpu_before = stats.cpu_seconds()
+    start = time.perf_counter()
+    relayed = 0
+    for _ in range(args.rounds):
+        relayed += sum(await asyncio.gather(*(call(a, b, args.ice, latencies) for a, b in pairs)))
+    elapsed = time.perf_counter() - start
+    cpu = stats.cpu_seconds() - cpu_before
+
+    await asyncio.gather(*(peer.close() for peer in peers))
+
+    relay = {}
+    for message_type, values in sorted(latencies.items()):
+        values.sort()
+        relay[message_type] = {
+            "count": len(values),
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+        }
+    return {
+        "connections": len(peers),
+        "calls": len(pairs) * args.rounds,
+        "relayed_messages": relayed,
+        "seconds": elapsed,
+        "messages_per_s": relayed / elapsed,
+        "gateway_cpu_us_per_message": cpu / relayed * 1e6,
+        "rss_baseline_mb": baseline,
+        "kb_per_connection": (connected - baseline) * 1024 / len(peers),
+        "kb_per_room_member": (in_rooms - connected) * 1024 / len(peers),
+        "relay": relay,
+        "fanout": await fanout(url, args.room_sizes, args.repeats),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=3, help="calls per pair")
+    parser.add_argument("--ice", type=int, default=20, help="ICE candidates sent by each side per call")
+    parser.add_argument("--room-sizes", type=int, nargs="+", default=[2, 8, 32, 128, 512])
+    parser.add_argument("--repeats", type=int, default=20, help="join/leave cycles per room size")
+    parser.add_argument("--output", default=None, help="JSON results file (default: results/signaling-<commit>.json)")
+    args = parser.parse_args()
+
+    port = free_port()
+    # Signaling never reaches Next.js; nothing needs to listen there
+    with gateway_process("http://127.0.0.1:9", port, {"LOG_FILE": "/dev/null", "LOG_LEVEL": "WARNING"}) as gateway:
+        result = asyncio.run(run(f"ws://127.0.0.1:{port}", ProcessStats(gateway.pid), args))
+
+    print(f"{result['connections']} connections, {result['calls']} calls, "
+          f"{result['relayed_messages']} relayed messages in {result['seconds']:.2f}s "
+          f"= {result['messages_per_s']:.0f} msg/s, {result['gateway_cpu_us_per_message']:.0f} us CPU/msg")
+    print(f"memory: {result['kb_per_connection']:.1f} KB per connection, "
+          f"{result['kb_per_room_member']:.1f} KB per room member (baseline {result['rss_baseline_mb']:.1f} MB)")
+    print(f"\n{'message':>14} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for message_type, stats in result["relay"].items():
+        print(f"{message_type:>14} {stats['count']:>7} {stats['p50_ms']:>8.2f} "
+              f"{stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+    print(f"\n{'room size':>9} {'join ms':>8} {'leave ms':>8}")
+    for row in result["fanout"]:
+        print(f"{row['room_size']:>9} {row['join_ms']:>8.2f} {row['leave_ms']:>8.2f}")
+
+    commit = git_commit()
+    output = args.output
+    if output is None:
+        os.makedirs(os.path.join(BENCH_DIR, "results"), exist_ok=True)
+        output = os.path.join(BENCH_DIR, "results", f"signaling-{commit}.json")
+    with open(output, "w") as f:
+        json.dump({"benchmark": "signaling", "commit": commit, "config": vars(args), **result}, f, indent=2)
+    print(f"\nwrote {output}")
+
+
+if __name__ == "__main__":
+    main()
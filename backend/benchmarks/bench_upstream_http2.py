@@ -0,0 +1,39 @@
+"""Benchmark: HTTP/1.1 keep-alive vs HTTP/2 (h2c) upstream pools.
+
+Starts the stub Next.js app under hypercorn (which speaks both protocols on
+one cleartext port) and drives it through an UpstreamPool at increasing
+concurrency, reporting throughput, latency percentiles and the number of TCP
+connections the pool opened.
+
+    cd backend && python benchmarks/bench_upstream_http2.py --requests 20000
+"""
+import argparse
+import asyncio
+
+from common import drive_pool, free_port, stub_upstream, upstream
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--max-connections", type=int, default=100)
+    args = parser.parse_args()
+
+    bind = f"127.0.0.1:{free_port()}"
+    with stub_upstream(bind):
+        print(f"{'protocol':>8} {'clients':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'conns':>6} {'errors':>6}", flush=True)
+        for concurrency in args.concurrency:
+            for http_version in ("1.1", "h2c"):
+                pool = upstream.UpstreamPool(
+                    "bench", f"http://{bind}",
+                    http_version=http_version, max_connections=args.max_connections,
+                )
+                result = asyncio.run(drive_pool(pool, concurrency, args.requests, f"/api/bench?size={args.size}"))
+                print(f"{http_version:>8} {concurrency:>7} {result['rps']:>9.0f} "
+                      f"{result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['connections']:>6} {result['errors']:>6}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Benchmark: loopback TCP vs Unix domain socket to Next.js.
+
+Binds the stub Next.js app to both a loopback port and a Unix socket and
+sends small JSON requests through an HTTP/1.1 UpstreamPool over each.
+
+    cd backend && python benchmarks/bench_upstream_uds.py --requests 10000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+
+from common import drive_pool, free_port, stub_upstream, upstream
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[128, 1024])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 50])
+    args = parser.parse_args()
+
+    tcp_bind = f"127.0.0.1:{free_port()}"
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, "next.sock")
+        with stub_upstream(tcp_bind, f"unix:{socket_path}"):
+            print(f"{'transport':>9} {'bytes':>6} {'clients':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}", flush=True)
+            for size in args.sizes:
+                for concurrency in args.concurrency:
+                    for transport, uds in (("tcp", None), ("uds", socket_path)):
+                        pool = upstream.UpstreamPool("bench", f"http://{tcp_bind}", uds=uds)
+                        result = asyncio.run(drive_pool(pool, concurrency, args.requests, f"/api/bench?size={size}"))
+                        print(f"{transport:>9} {size:>6} {concurrency:>7} {result['rps']:>9.0f} "
+                              f"{result['p50_ms']:>8.3f} {result['p99_ms']:>8.3f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark: valuing every collection at once, and chart queries on the series.
+
+Builds --items synthetic collection_items rows for --users users over
+--cards cards (a few unpriced), times one valuation (the key join, the
+totals per user and game, the holdings) against the per-user loop the
+Next.js route runs (its arithmetic only: the route also makes a query per
+user, which this leaves out), then merges --days daily valuations into a
+series and times one user's weekly chart with movers.
+
+    cd backend && python benchmarks/bench_valuation.py --items 1000000 --users 20000
+"""
+import argparse
+import random
+import sys
+import time
+
+from common import percentile  # noqa: F401  (puts backend/ on sys.path)
+
+import numpy as np  # noqa: E402
+
+import portfolio  # noqa: E402
+
+GAMES = ("mtg", "pokemon", "lorcana")
+
+
+def per_user_loop(user_ids, card_ids, games, quantities, prices: dict) -> dict:
+    """The route's valuation: one pass per user over their items"""
+    by_user = {}
+    for i, user_id in enumerate(user_ids):
+        by_user.setdefault(user_id, []).append(i)
+    totals = {}
+    for user_id, rows in by_user.items():
+        total = 0.0
+        for i in rows:
+            total += (prices.get(f"{card_ids[i]}:{games[i]}") or 0) * (quantities[i] or 1)
+        totals[user_id] = round(total, 2)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--cards", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    cards = [(f"card-{i:06d}", rng.choice(GAMES)) for i in range(args.cards)]
+    price_ids, price_games = [card_id for card_id, _ in cards], [game for _, game in cards]
+    price_values = [None if rng.random() < 0.05 else round(rng.lognormvariate(0, 1.5), 2) for _ in cards]
+    picks = [rng.randrange(args.cards) for _ in range(args.items)]
+    user_ids = [f"user-{rng.randrange(args.users):06d}" for _ in range(args.items)]
+    card_ids, games = [cards[i][0] for i in picks], [cards[i][1] for i in picks]
+    quantities = [rng.choice((1, 1, 1, 2, 4, None)) for _ in range(args.items)]
+    names = [f"Card {i}" for i in picks]
+
+    start = time.perf_counter()
+    valuation = portfolio.value(0, user_ids, card_ids, games, quantities, names, price_ids, price_games, price_values)
+    elapsed = time.perf_counter() - start
+    print(f"value: {args.items:,} items, {len(valuation.users):,} users in {elapsed:.2f}s "
+          f"= {args.items / elapsed:,.0f} items/s")
+
+    lookup = {f"{card_id}:{game}": price for card_id, game, price in zip(price_ids, price_games, price_values)}
+    start = time.perf_counter()
+    totals = per_user_loop(user_ids, card_ids, games, quantities, lookup)
+    elapsed = time.perf_counter() - start
+    print(f"per-user loop: {elapsed:.2f}s = {args.items / elapsed:,.0f} items/s")
+    assert all(abs(totals[u] - t) < 0.011 for u, t in zip(valuation.users.tolist(), valuation.totals.tolist()))
+
+    series = portfolio.Portfolio()
+    start = time.perf_counter()
+    for day in range(args.days):
+        drift = np.random.default_rng(day).uniform(0.95, 1.05, len(valuation.prices)).astype(np.float32)
+        series = series.merged(valuation._replace(day=day, prices=valuation.prices * drift))
+    elapsed = time.perf_counter() - start
+    print(f"merge: {args.days} days in {elapsed:.2f}s, {len(series):,} rows, "
+          f"{sum(a.nbytes for a in vars(series).values()) / 2 ** 20:.1f} MB")
+
+    timings = []
+    for _ in range(1000):
+        user_id = valuation.users[rng.randrange(len(valuation.users))]
+        start = time.perf_counter()
+        series.points(series.rows(user_id, resolution="weekly"))
+        series.movers(user_id, args.days - 7)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"chart query: p50 {percentile(timings, 0.5) * 1e3:.2f} ms, p99 {percentile(timings, 0.99) * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Shared helpers for the gateway benchmarks."""
+import asyncio
+import contextlib
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import upstream  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_bind(bind: str, timeout: float = 10.0):
+    """Wait until `host:port` or `unix:/path` accepts connections"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if bind.startswith("unix:"):
+                with socket.socket(socket.AF_UNIX) as sock:
+                    sock.connect(bind[5:])
+            else:
+                host, port = bind.rsplit(":", 1)
+                socket.create_connection((host, int(port)), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"server did not start on {bind}")
+
+
+@contextlib.contextmanager
+def gateway_process(nextjs_url: str, port: int, env=None):
+    """Run server.py under uvicorn in a subprocess; yields the Popen"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "NEXTJS_URL": nextjs_url, **(env or {})},
+    )
+    try:
+        wait_for_bind(f"127.0.0.1:{port}")
+        yield process
+    finally:
+        process.terminate()
+        process.wait()
+
+
+class ProcessStats:
+    """CPU time and memory of another process, read from /proc (Linux only)"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.ticks = os.sysconf("SC_CLK_TCK")
+
+    def cpu_seconds(self) -> float:
+        with open(f"/proc/{self.pid}/stat") as f:
+            # Fields after the parenthesised command name; utime and stime are 14 and 15
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.ticks
+
+    def memory_mb(self) -> dict:
+        """Current (VmRSS) and peak (VmHWM) resident set size in MB"""
+        values = {}
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    name, kb = line.split()[:2]
+                    values[name[:-1]] = int(kb) / 1024
+        return {"rss_mb": values.get("VmRSS"), "peak_rss_mb": values.get("VmHWM")}
+
+
+@contextlib.contextmanager
+def stub_upstream(*binds: str):
+    """Run benchmarks/stub_nextjs.py in a subprocess on the given binds"""
+    args = [sys.executable, os.path.join(BENCH_DIR, "stub_nextjs.py")]
+    for bind in binds:
+        args += ["--bind", bind]
+    process = subprocess.Popen(args)
+    try:
+        for bind in binds:
+            wait_for_bind(bind)
+        yield
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+async def drive(client: httpx.AsyncClient, concurrency: int, total: int, path: str):
+    """Send `total` GETs for `path` from `concurrency` workers sharing `client`"""
+    latencies = []
+    errors = 0
+    remaining = total
+    received = 0
+
+    async def worker():
+        nonlocal remaining, errors, received
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await client.get(path)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            received += len(response.content)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "seconds": elapsed,
+        "rps": total / elapsed,
+        "mb_per_s": received / elapsed / 1e6,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "errors": errors,
+    }
+
+
+async def drive_pool(pool: upstream.UpstreamPool, concurrency: int, total: int, path: str):
+    """Send `total` GETs for `path` through `pool` from `concurrency` workers"""
+    result = await drive(pool.client, concurrency, total, path)
+    result["connections"] = pool.stats().get("connections")
+    await pool.aclose()
+    return result
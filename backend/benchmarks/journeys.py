@@ -0,0 +1,135 @@
+"""User journeys for bench_journeys.py, taken from the API regression suites.
+
+Each journey replays the requests of one flow from test_reports/pytest,
+with the same endpoints and payloads, as a logged-in user would make them:
+
+    feed         test_feed_features.py, test_iteration14/15.py
+    collection   test_iteration3/10/13.py
+    decks        test_iteration11/15.py
+    marketplace  test_iteration12.py
+    messages     test_iteration16/18.py
+    sealed       test_iteration11.py
+
+Unlike the tests they assert nothing beyond the status code, and they delete
+what they create so long runs don't grow the database. Records they create
+are named with the virtual user's prefix.
+"""
+import random
+
+# Relative share of virtual users' journeys; override with --weights
+DEFAULT_WEIGHTS = {
+    "feed": 30,
+    "collection": 20,
+    "decks": 15,
+    "marketplace": 15,
+    "messages": 10,
+    "sealed": 10,
+}
+
+MTG_CSV = """Manabox ID,Scryfall ID,Name,Set code,Set name,Collector number,Foil,Rarity,Quantity,Mana box ID,Purchase price,Condition
+,8f4f5e3e-6e9c-4c85-9d26-27b8c4c36ed1,Lightning Bolt,lea,Limited Edition Alpha,161,false,common,1,,2.50,Near Mint
+,7d1f4d5e-5f5c-4e7a-8f5e-6b4e8c9a7f2d,Counterspell,5ed,Fifth Edition,85,false,common,2,,0.50,Lightly Played"""
+
+POKEMON_CSV = """Name,Set Code,Edition Name,Collector Number,Quantity,Condition,Price
+Pikachu,swsh1,Sword & Shield,65,1,Near Mint,5.00
+Charizard,sv03,Obsidian Flames,125,2,Lightly Played,25.00"""
+
+LIGHTNING_BOLT = {
+    "cardId": "test-lightning-bolt",
+    "cardData": {
+        "id": "test-lightning-bolt",
+        "name": "Lightning Bolt",
+        "set": "2xm",
+        "collector_number": "141",
+        "type_line": "Instant",
+        "mana_cost": "{R}",
+    },
+    "quantity": 4,
+    "category": "main",
+}
+
+
+async def feed(vu):
+    response = await vu.get("/api/feed?tab=public")
+    await vu.get("/api/feed?tab=friends")
+    posts = response.json().get("posts", []) if response.status_code == 200 else []
+    if not posts:
+        return
+    post_id = random.choice(posts[:10]).get("post_id")
+    await vu.get(f"/api/feed/{post_id}/comments")
+    await vu.get(f"/api/feed/{post_id}/reactions")
+    if random.random() < 0.2:
+        # Reactions toggle, so the second request removes the first
+        await vu.post(f"/api/feed/{post_id}/reactions", json={"emoji": "👍"})
+        await vu.post(f"/api/feed/{post_id}/reactions", json={"emoji": "👍"})
+
+
+async def collection(vu):
+    await vu.get("/api/collection")
+    await vu.get(f"/api/collection?game={random.choice(['mtg', 'pokemon'])}")
+    await vu.get("/api/cards/mtg?q=Lightning+Bolt")
+    if random.random() < 0.5:
+        await vu.post("/api/collection/import", json={"csvContent": MTG_CSV, "action": "preview", "gameType": "mtg"})
+    else:
+        await vu.post("/api/collection/import",
+                      json={"csvContent": POKEMON_CSV, "action": "preview", "gameType": "pokemon"})
+
+
+async def decks(vu):
+    await vu.get("/api/decks")
+    await vu.get("/api/decks/community")
+    response = await vu.post("/api/decks", json={
+        "name": vu.name("Deck"),
+        "game": "mtg",
+        "format": "Modern",
+        "description": "Load test deck",
+    })
+    if response.status_code != 200:
+        return
+    deck_id = response.json().get("deckId")
+    await vu.post(f"/api/decks/{deck_id}/cards", json=LIGHTNING_BOLT)
+    await vu.get(f"/api/decks/{deck_id}")
+    await vu.delete(f"/api/decks/{deck_id}")
+
+
+async def marketplace(vu):
+    await vu.get("/api/marketplace")
+    await vu.get(f"/api/marketplace?game={random.choice(['mtg', 'pokemon'])}")
+    await vu.get("/api/marketplace/my-listings")
+
+
+async def messages(vu):
+    await vu.get("/api/messages")
+    await vu.get("/api/users/search?q=test")
+
+
+async def sealed(vu):
+    response = await vu.post("/api/sealed", json={
+        "name": vu.name("Sealed"),
+        "game": "pokemon",
+        "productType": "Elite Trainer Box (ETB)",
+        "setName": "Prismatic Evolutions",
+        "setCode": "SVE",
+        "language": "EN",
+        "quantity": 2,
+        "purchasePrice": 59.99,
+        "currentValue": 89.99,
+        "notes": "Load test sealed product",
+    })
+    await vu.get("/api/sealed")
+    if response.status_code != 200:
+        return
+    product_id = response.json().get("productId")
+    await vu.get(f"/api/sealed/{product_id}")
+    await vu.patch(f"/api/sealed/{product_id}", json={"currentValue": 110.00})
+    await vu.delete(f"/api/sealed/{product_id}")
+
+
+JOURNEYS = {
+    "feed": feed,
+    "collection": collection,
+    "decks": decks,
+    "marketplace": marketplace,
+    "messages": messages,
+    "sealed": sealed,
+}
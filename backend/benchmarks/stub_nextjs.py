@@ -0,0 +1,77 @@
+"""Stand-in for Next.js used by the gateway benchmarks.
+
+A bare ASGI app that answers every request with a fixed-size body, so the
+numbers measure the gateway and transport rather than page rendering.
+`?size=<bytes>` picks the body size (default 1 KB of JSON).
+
+Served by hypercorn, which speaks HTTP/1.1 and h2c on the same port:
+
+    python benchmarks/stub_nextjs.py --bind 127.0.0.1:3100
+"""
+import argparse
+import asyncio
+from urllib.parse import parse_qs
+
+_bodies = {}
+
+
+def _body(size: int) -> bytes:
+    body = _bodies.get(size)
+    if body is None:
+        # Valid JSON padded to exactly `size` bytes
+        padding = max(size - len(b'{"data":""}'), 0)
+        body = _bodies[size] = b'{"data":"' + b"x" * padding + b'"}'
+    return body
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    more_body = True
+    while more_body:
+        message = await receive()
+        more_body = message.get("more_body", False)
+
+    size = int(parse_qs(scope["query_string"].decode()).get("size", ["1024"])[0])
+    body = _body(size)
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def main():
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    parser = argparse.ArgumentParser(description="Stub Next.js upstream for benchmarks")
+    parser.add_argument("--bind", action="append", default=None)
+    args = parser.parse_args()
+
+    config = Config()
+    config.bind = args.bind or ["127.0.0.1:3100"]
+    config.loglevel = "WARNING"
+    config.backlog = 4096
+    # The default recycles connections every 1000 requests, which would make
+    # the benchmarks measure reconnects
+    config.keep_alive_max_requests = 10_000_000
+    config.h2_max_concurrent_streams = 1000
+    # Match Node's http.Server keepAliveTimeout, as Next.js would
+    config.keep_alive_timeout = 5
+    asyncio.run(serve(app, config))
+
+
+if __name__ == "__main__":
+    main()
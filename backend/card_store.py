@@ -0,0 +1,451 @@
+"""Local MTG card store built from Scryfall's bulk data.
+
+Scryfall publishes the whole card database as one JSON array that is
+refreshed daily (https://scryfall.com/docs/api/bulk-data). `ingest()` streams
+that file through an incremental parser, so the multi-hundred-MB dump is
+never held in memory, and writes a compact store that lookups read through
+mmap:
+
+    header   magic "HCS1", u32 card count, u64 offsets of the sections below
+    ids      per card: 16-byte Scryfall ID, u64 record offset, u32 record
+             length, 8-byte content hash; sorted by ID
+    prices   per card, in ID order: float32 eur, eur_foil, usd, usd_foil
+             (NaN when Scryfall has none)
+    prints   per card: 8-byte hash of "set/collector_number", 16-byte ID;
+             sorted by hash
+    records  compact JSON per card, without prices
+
+Prices live apart from the card data so the content hash only changes when
+the card itself does. Each ingest writes a new store next to the old one,
+swaps it in atomically and records what changed since the previous day in
+cards-changes/<date>.json: added, removed and changed IDs plus the number of
+price changes. Readers holding the old mapping keep working until they
+reopen.
+
+    cd backend && python card_store.py ingest            # download default_cards
+    python card_store.py ingest --source default-cards.json.gz
+    python card_store.py get 0000579f-7b35-4ed3-b44c-db2a538066fe
+    python card_store.py find 2xm 117
+
+CARD_STORE sets the store path (default cards.store in this directory).
+"""
+import argparse
+import codecs
+import datetime
+import hashlib
+import json
+import math
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import time
+import uuid
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+CARD_STORE = os.environ.get("CARD_STORE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cards.store"))
+SCRYFALL_URL = os.environ.get("SCRYFALL_URL", "https://api.scryfall.com")
+
+MAGIC = b"HCS1"
+HEADER = struct.Struct("<4sIQQQQ")
+ID_ENTRY = struct.Struct("<16sQI8s")
+PRICE_ENTRY = struct.Struct("<4f")
+PRINT_ENTRY = struct.Struct("<8s16s")
+PRICE_FIELDS = ("eur", "eur_foil", "usd", "usd_foil")
+
+# What the app reads from Scryfall cards; the rest of each object (API URIs,
+# vendor IDs, preview data, ...) is dropped
+CARD_FIELDS = (
+    "id", "oracle_id", "name", "lang", "released_at", "layout", "mana_cost", "cmc", "type_line",
+    "oracle_text", "power", "toughness", "loyalty", "colors", "color_identity", "keywords",
+    "legalities", "games", "foil", "nonfoil", "finishes", "reserved", "set", "set_name", "set_type",
+    "collector_number", "rarity", "artist", "border_color", "frame", "full_art", "promo",
+    "image_uris", "card_faces", "purchase_uris", "scryfall_uri", "edhrec_rank",
+)
+FACE_FIELDS = (
+    "name", "mana_cost", "type_line", "oracle_text", "power", "toughness", "loyalty", "colors", "image_uris",
+)
+IMAGE_SIZES = ("small", "normal", "large", "png", "art_crop")
+
+_WHITESPACE = " \t\r\n,"
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator:
+    """Yield the elements of a JSON array read as a stream of byte chunks.
+
+    Only the current element and one chunk are held in memory. Each element is
+    decoded with the C JSON decoder; an element cut off at the end of the
+    buffer is retried once more data has arrived.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buffer, pos, started = "", 0, False
+
+    def more() -> bool:
+        nonlocal buffer, pos
+        chunk = next(chunks, None)
+        if chunk is None:
+            tail = text.decode(b"", final=True)
+            if not tail:
+                return False
+        else:
+            tail = text.decode(chunk)
+        buffer = buffer[pos:] + tail
+        pos = 0
+        return True
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        if pos == len(buffer):
+            if not more():
+                raise ValueError("unexpected end of JSON array")
+            continue
+        if not started:
+            if buffer[pos] != "[":
+                raise ValueError("expected a JSON array")
+            started = True
+            pos += 1
+            continue
+        if buffer[pos] == "]":
+            return
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if not more():
+                raise
+            continue
+        pos = end
+        yield value
+
+
+def iter_file(path: str, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+    """Byte chunks of a file, gunzipped if it ends in .gz"""
+    inflate = zlib.decompressobj(16 + zlib.MAX_WBITS) if path.endswith(".gz") else None
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield inflate.decompress(chunk) if inflate else chunk
+    if inflate:
+        yield inflate.flush()
+
+
+def _trim_images(images: Optional[dict]) -> Optional[dict]:
+    if not images:
+        return images
+    return {size: images[size] for size in IMAGE_SIZES if size in images}
+
+
+def compact_card(card: dict) -> dict:
+    """The stored subset of a Scryfall card object (prices are kept separately)"""
+    out = {field: card[field] for field in CARD_FIELDS if field in card}
+    if "image_uris" in out:
+        out["image_uris"] = _trim_images(out["image_uris"])
+    if "card_faces" in out:
+        faces = []
+        for face in out["card_faces"]:
+            face = {field: face[field] for field in FACE_FIELDS if field in face}
+            if "image_uris" in face:
+                face["image_uris"] = _trim_images(face["image_uris"])
+            faces.append(face)
+        out["card_faces"] = faces
+    return out
+
+
+def _price(value) -> float:
+    try:
+        return float(value) if value is not None else math.nan
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def print_key(set_code: str, collector_number: str) -> bytes:
+    key = f"{set_code.strip().lower()}/{collector_number.strip().lower()}"
+    return hashlib.blake2b(key.encode(), digest_size=8).digest()
+
+
+class CardStore:
+    """Read-only view of a store file; lookups are binary searches over mmap"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.stat = os.fstat(f.fileno())
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.ids_at, self.prices_at, self.prints_at, self.records_at = HEADER.unpack_from(self.mm)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a card store")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self):
+        self.mm.close()
+
+    def _id_at(self, ordinal: int) -> bytes:
+        start = self.ids_at + ordinal * ID_ENTRY.size
+        return self.mm[start:start + 16]
+
+    def _ordinal(self, card_id: str) -> int:
+        try:
+            key = uuid.UUID(card_id).bytes
+        except (ValueError, AttributeError, TypeError):
+            return -1
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._id_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.count and self._id_at(lo) == key else -1
+
+    def _entry(self, ordinal: int):
+        return ID_ENTRY.unpack_from(self.mm, self.ids_at + ordinal * ID_ENTRY.size)
+
+    def _prices(self, ordinal: int) -> Dict[str, Optional[str]]:
+        values = PRICE_ENTRY.unpack_from(self.mm, self.prices_at + ordinal * PRICE_ENTRY.size)
+        return {name: None if math.isnan(v) else f"{v:.2f}" for name, v in zip(PRICE_FIELDS, values)}
+
+    def _card(self, ordinal: int) -> dict:
+        _, offset, length, _ = self._entry(ordinal)
+        start = self.records_at + offset
+        card = json.loads(self.mm[start:start + length])
+        card["prices"] = self._prices(ordinal)
+        return card
+
+    def get(self, card_id: str) -> Optional[dict]:
+        """The card with this Scryfall ID, in Scryfall's shape, or None"""
+        ordinal = self._ordinal(card_id)
+        return self._card(ordinal) if ordinal >= 0 else None
+
+    def get_json(self, card_id: str) -> Optional[bytes]:
+        """get() as JSON bytes, without decoding the stored record"""
+        ordinal = self._ordinal(card_id)
+        if ordinal < 0:
+            return None
+        _, offset, length, _ = self._entry(ordinal)
+        start = self.records_at + offset
+        prices = json.dumps(self._prices(ordinal), separators=(",", ":")).encode()
+        return self.mm[start:start + length - 1] + b',"prices":' + prices + b"}"
+
+    def price_eur(self, card_id: str) -> Optional[float]:
+        """EUR price; 0.0 for a known card without one, None for an unknown card"""
+        ordinal = self._ordinal(card_id)
+        if ordinal < 0:
+            return None
+        eur = PRICE_ENTRY.unpack_from(self.mm, self.prices_at + ordinal * PRICE_ENTRY.size)[0]
+        return 0.0 if math.isnan(eur) else round(eur, 2)
+
+    def find(self, set_code: str, collector_number: str) -> Optional[dict]:
+        """The printing with this set code and collector number, or None"""
+        key = print_key(set_code, collector_number)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self.prints_at + mid * PRINT_ENTRY.size
+            if self.mm[start:start + 8] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        while lo < self.count:
+            hash_, card_id = PRINT_ENTRY.unpack_from(self.mm, self.prints_at + lo * PRINT_ENTRY.size)
+            if hash_ != key:
+                break
+            card = self.get(str(uuid.UUID(bytes=card_id)))
+            # A hash collision is possible in principle, so check the card
+            if card and card.get("set", "").lower() == set_code.strip().lower() \
+                    and card.get("collector_number", "").lower() == collector_number.strip().lower():
+                return card
+            lo += 1
+        return None
+
+    def ids(self) -> Iterator[str]:
+        for ordinal in range(self.count):
+            yield str(uuid.UUID(bytes=self._id_at(ordinal)))
+
+    def versions(self) -> Iterator[Tuple[str, bytes]]:
+        """(ID, content hash) for every card in ID order; the hash ignores prices"""
+        for ordinal in range(self.count):
+            card_id, _, _, digest = self._entry(ordinal)
+            yield str(uuid.UUID(bytes=card_id)), digest
+
+    def cards(self) -> Iterator[dict]:
+        """Every card in ID order"""
+        for ordinal in range(self.count):
+            yield self._card(ordinal)
+
+
+def _diff(old: Optional[CardStore], entries: List[bytes], prices: List[bytes]) -> dict:
+    """Merge-walk the old and new ID tables, both sorted by ID"""
+    added, removed, changed, prices_changed = [], [], [], 0
+    old_count = len(old) if old else 0
+    i = j = 0
+    while i < old_count or j < len(entries):
+        old_id = old._id_at(i) if i < old_count else None
+        new_id = entries[j][:16] if j < len(entries) else None
+        if new_id is None or (old_id is not None and old_id < new_id):
+            removed.append(str(uuid.UUID(bytes=old_id)))
+            i += 1
+        elif old_id is None or new_id < old_id:
+            added.append(str(uuid.UUID(bytes=new_id)))
+            j += 1
+        else:
+            if old._entry(i)[3] != entries[j][28:36]:
+                changed.append(str(uuid.UUID(bytes=new_id)))
+            start = old.prices_at + i * PRICE_ENTRY.size
+            old_prices = old.mm[start:start + PRICE_ENTRY.size]
+            if old_prices != prices[j]:
+                prices_changed += 1
+            i += 1
+            j += 1
+    return {"added": added, "removed": removed, "changed": changed, "prices_changed": prices_changed}
+
+
+def ingest(chunks: Iterable[bytes], path: str = CARD_STORE, source: str = "", changes: bool = True) -> dict:
+    """Build a store from a bulk data stream and swap it in at `path`.
+
+    Returns a summary including the changes since the previous store.
+    """
+    started = time.monotonic()
+    directory = os.path.dirname(os.path.abspath(path))
+    # ID entries (without final record offsets fixed up) and print entries
+    # are small; card records go straight to a temporary file
+    entries: Dict[bytes, bytes] = {}
+    prints: List[bytes] = []
+    offset = 0
+    with tempfile.TemporaryFile(dir=directory) as records:
+        for card in iter_json_array(chunks):
+            try:
+                key = uuid.UUID(card["id"]).bytes
+            except (KeyError, ValueError, TypeError, AttributeError):
+                continue
+            if key in entries:
+                continue
+            record = json.dumps(compact_card(card), separators=(",", ":"), ensure_ascii=False).encode()
+            records.write(record)
+            prices = card.get("prices") or {}
+            entries[key] = (
+                ID_ENTRY.pack(key, offset, len(record), hashlib.blake2b(record, digest_size=8).digest())
+                + PRICE_ENTRY.pack(*(_price(prices.get(name)) for name in PRICE_FIELDS))
+            )
+            offset += len(record)
+            if card.get("set") and card.get("collector_number"):
+                prints.append(PRINT_ENTRY.pack(print_key(card["set"], card["collector_number"]), key))
+
+        ordered = [entries[key] for key in sorted(entries)]
+        del entries
+        prints.sort()
+        ids_table = [entry[:ID_ENTRY.size] for entry in ordered]
+        price_table = [entry[ID_ENTRY.size:] for entry in ordered]
+        count = len(ordered)
+        ids_at = HEADER.size
+        prices_at = ids_at + count * ID_ENTRY.size
+        prints_at = prices_at + count * PRICE_ENTRY.size
+        records_at = prints_at + count * PRINT_ENTRY.size
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".cards-", suffix=".store")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(HEADER.pack(MAGIC, count, ids_at, prices_at, prints_at, records_at))
+                out.writelines(ids_table)
+                out.writelines(price_table)
+                out.writelines(prints)
+                records.seek(0)
+                shutil.copyfileobj(records, out, 1 << 20)
+            summary = {"cards": count, "bytes": records_at + offset, "source": source}
+            if changes:
+                old = CardStore(path) if os.path.exists(path) else None
+                try:
+                    summary.update(_diff(old, ids_table, price_table))
+                finally:
+                    if old:
+                        old.close()
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    summary["seconds"] = round(time.monotonic() - started, 3)
+    if changes:
+        day = datetime.date.today().isoformat()
+        changes_dir = changes_path(path)
+        os.makedirs(changes_dir, exist_ok=True)
+        with open(os.path.join(changes_dir, f"{day}.json"), "w") as f:
+            json.dump(dict(summary, date=day), f)
+    return summary
+
+
+def changes_path(path: str = CARD_STORE) -> str:
+    """Directory of the daily change lists, e.g. cards-changes/ for cards.store"""
+    return os.path.splitext(os.path.abspath(path))[0] + "-changes"
+
+
+def download(bulk_type: str = "default_cards", chunk_size: int = 1 << 20) -> Iterator[bytes]:
+    """Stream the current bulk file of this type from Scryfall"""
+    import httpx
+
+    with httpx.Client(timeout=60.0, follow_redirects=True) as client:
+        meta = client.get(f"{SCRYFALL_URL}/bulk-data/{bulk_type}")
+        meta.raise_for_status()
+        with client.stream("GET", meta.json()["download_uri"]) as response:
+            response.raise_for_status()
+            yield from response.iter_bytes(chunk_size)
+
+
+_store: Optional[CardStore] = None
+_checked = 0.0
+
+
+def current(path: Optional[str] = None, recheck: float = 5.0) -> Optional[CardStore]:
+    """The store at CARD_STORE, reopened after an ingest replaced it; None without one"""
+    global _store, _checked
+    path = path or CARD_STORE
+    now = time.monotonic()
+    if _store is not None and _store.path == path and now - _checked < recheck:
+        return _store
+    _checked = now
+    try:
+        stat = os.stat(path)
+    except OSError:
+        _store = None
+        return None
+    if _store is None or _store.path != path or (stat.st_ino, stat.st_mtime_ns) != (
+            _store.stat.st_ino, _store.stat.st_mtime_ns):
+        _store = CardStore(path)
+    return _store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", default=CARD_STORE)
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest_cmd = commands.add_parser("ingest", help="build the store from a bulk data file or download")
+    ingest_cmd.add_argument("--source", help="local .json or .json.gz file (default: download)")
+    ingest_cmd.add_argument("--type", default="default_cards", help="Scryfall bulk data type")
+    get_cmd = commands.add_parser("get", help="look up a card by Scryfall ID")
+    get_cmd.add_argument("id")
+    find_cmd = commands.add_parser("find", help="look up a printing by set and collector number")
+    find_cmd.add_argument("set")
+    find_cmd.add_argument("number")
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        chunks = iter_file(args.source) if args.source else download(args.type)
+        summary = ingest(chunks, args.store, source=args.source or args.type)
+        for key in ("added", "removed", "changed"):
+            summary[key] = len(summary.get(key, ()))
+        print(json.dumps(summary, indent=2))
+        return
+    store = CardStore(args.store)
+    card = store.get(args.id) if args.command == "get" else store.find(args.set, args.number)
+    print(json.dumps(card, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
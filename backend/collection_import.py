@@ -0,0 +1,732 @@
+"""Collection CSV imports as background jobs.
+
+POST /api/collection/import (app/api/collection/import/route.ts) parses
+the whole upload inside one request, then resolves and inserts cards one
+row at a time: one or more Scryfall or TCGdex lookups and one INSERT per
+row. Large ManaBox, CardMarket and Pokemon exports run past the request
+timeout. Here the upload is streamed to a spool file and the request
+returns a job at once. The job then works through the file in chunks of
+IMPORT_CHUNK_ROWS rows:
+
+  * parse the chunk with the csv module in a worker thread (the next chunk
+    is parsed while the current one is resolved and written);
+  * resolve the chunk's distinct cards, skipping any the job already
+    resolved. MTG cards come from the local card store by Scryfall ID or by
+    set and number (set codes through set_codes.py's aliases), and names
+    come from the search index, without network.
+    Cards the store doesn't have go through the gateway API cache (one
+    coalesced request per distinct card), and names that are still unknown
+    go to Scryfall /cards/collection 75 at a time. Pokemon cards go through
+    the API cache to TCGdex;
+  * insert the chunk's collection_items rows with a single COPY.
+
+Rows are mapped to the card_data the route writes. A card that cannot be
+resolved is imported with what the CSV says about it, as the route does.
+Job status and progress can be polled or followed as server-sent events.
+
+    POST   /api/collection/import/jobs?gameType=   CSV body (or the route's JSON)
+    GET    /api/collection/import/jobs/{id}         status
+    GET    /api/collection/import/jobs/{id}/events  status on every change (SSE)
+    DELETE /api/collection/import/jobs/{id}         cancel
+"""
+import asyncio
+import csv
+import io
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import time
+import urllib.parse
+import uuid
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import httpx
+
+import api_cache
+import card_store
+import eventlog
+import search_index
+import set_codes
+from price_worker import TokenBucket
+from set_codes import map_pokemon_set_code
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "")
+SCRYFALL_URL = os.environ.get("SCRYFALL_URL", "https://api.scryfall.com")
+IMPORT_CHUNK_ROWS = int(os.environ.get("IMPORT_CHUNK_ROWS", "1000"))
+IMPORT_MAX_BYTES = int(os.environ.get("IMPORT_MAX_BYTES", str(64 << 20)))
+# Jobs running at once; the rest wait in "queued"
+IMPORT_MAX_RUNNING = int(os.environ.get("IMPORT_MAX_RUNNING", "2"))
+# Uncached cards fetched at once per job
+IMPORT_FETCH_CONCURRENCY = int(os.environ.get("IMPORT_FETCH_CONCURRENCY", "8"))
+IMPORT_SPOOL_DIR = os.environ.get("IMPORT_SPOOL_DIR") or tempfile.gettempdir()
+
+# Finished jobs kept for status requests
+KEPT_JOBS = 100
+# Error messages kept per job; the rest are only counted
+MAX_ERRORS = 100
+SCRYFALL_COLLECTION_BATCH = 75
+SCRYFALL_RATE = 10.0
+TCGDEX_URL = "https://api.tcgdex.net/v2/en"
+
+logger = logging.getLogger("gateway.collection_import")
+
+_LEADING_ZEROS = re.compile(r"^0+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def map_condition(condition: Optional[str]) -> str:
+    """mapCondition from the route"""
+    if not condition:
+        return "Near Mint"
+    c = condition.lower().strip()
+    if c == "nm" or "near mint" in c or "near" in c:
+        return "Near Mint"
+    if c in ("ex", "excellent"):
+        return "Excellent"
+    if c in ("gd", "good"):
+        return "Good"
+    if c == "lp" or "light" in c:
+        return "Lightly Played"
+    if c == "mp" or "moderate" in c:
+        return "Moderately Played"
+    if c == "hp" or "heavy" in c:
+        return "Heavily Played"
+    if c == "dmg" or "damag" in c or c == "poor":
+        return "Poor"
+    return "Near Mint"
+
+
+def detect_format(headers: List[str], game_type: Optional[str] = None) -> str:
+    """cardmarket, manabox or pokemon, from the header row as parseCSV does"""
+    names = {header.lower() for header in headers}
+    if "cardmarketid" in names or {"name", "setcode", "price", "issigned"} <= names:
+        return "cardmarket"
+    if "manabox id" in names or "scryfall id" in names:
+        return "manabox"
+    if "set code" in names:
+        return "pokemon"
+    return "pokemon" if game_type == "pokemon" else "manabox"
+
+
+def _int(value: Optional[str], default: int = 1) -> int:
+    try:
+        return int(value) or default
+    except (TypeError, ValueError):
+        return default
+
+
+def _float(value: Optional[str]) -> float:
+    try:
+        number = float(str(value or "0").replace(",", "."))
+    except ValueError:
+        return 0.0
+    return number if math.isfinite(number) else 0.0
+
+
+class Row(NamedTuple):
+    line: int
+    game: str
+    name: str
+    set_code: str
+    set_name: str
+    number: str
+    quantity: int
+    condition: str
+    foil: bool
+    price: float
+    scryfall_id: str = ""
+
+
+def parse_row(fmt: str, record: Dict[str, str], line: int) -> Row:
+    """A CSV record as the route reads it for each format"""
+    if fmt == "cardmarket":
+        return Row(
+            line, "mtg", record.get("name", ""), record.get("setCode", ""), record.get("set", ""),
+            record.get("cn", ""), _int(record.get("quantity")), map_condition(record.get("condition")),
+            record.get("isFoil") in ("foil", "true", "1"), _float(record.get("price")),
+        )
+    if fmt == "pokemon":
+        return Row(
+            line, "pokemon", record.get("Name", ""), record.get("Set Code", ""), record.get("Edition Name", ""),
+            record.get("Collector Number", ""), _int(record.get("Quantity")), map_condition(record.get("Condition")),
+            record.get("Foil") in ("true", "foil"), _float(record.get("Price")),
+        )
+    return Row(
+        line, "mtg", record.get("Name", ""), record.get("Set code", ""), record.get("Set name", ""),
+        record.get("Collector number", ""), _int(record.get("Quantity")), map_condition(record.get("Condition")),
+        record.get("Foil") in ("true", "foil"), _float(record.get("Purchase price")),
+        record.get("Scryfall ID", ""),
+    )
+
+
+# What a row is resolved by: ("id", scryfall ID), ("print", set, number) or
+# ("name", lowercased name, set, name) for MTG, ("pokemon", set, number, name, set name)
+# for Pokemon
+Key = Tuple[str, ...]
+
+
+def row_key(row: Row) -> Key:
+    if row.game == "pokemon":
+        return ("pokemon", map_pokemon_set_code(row.set_code), row.number, row.name, row.set_name)
+    if row.scryfall_id:
+        return ("id", row.scryfall_id.lower())
+    if row.set_code and row.number:
+        return ("print", set_codes.codes.canonical("mtg", row.set_code), row.number)
+    return ("name", row.name.lower(), row.set_code.lower(), row.name)
+
+
+def card_id_for(row: Row, card: Optional[dict]) -> str:
+    """The card_id the route stores for a row"""
+    if row.game == "pokemon":
+        set_code, number = map_pokemon_set_code(row.set_code), _LEADING_ZEROS.sub("", row.number)
+        # Found by name in another set or under another number: TCGdex's ID
+        if card and card.get("id") and ((card.get("set") or {}).get("id") != set_code
+                                        or _LEADING_ZEROS.sub("", card.get("localId") or "") != number):
+            return card["id"]
+        return f"{set_code}-{number}"
+    if row.scryfall_id:
+        return row.scryfall_id
+    if card and card.get("id"):
+        return card["id"]
+    if row.number:
+        return f"{row.set_code.lower()}-{row.number}"
+    return f"{row.set_code.lower()}-{_WHITESPACE.sub('-', row.name[:20].lower())}"
+
+
+def card_data(fmt: str, row: Row, card: Optional[dict], card_id: str) -> dict:
+    """card_data as the route builds it for each format"""
+    sf = card or {}
+    if fmt == "cardmarket":
+        return {
+            "id": card_id,
+            "name": sf.get("name") or row.name,
+            "set_code": (sf.get("set") or "").upper() or row.set_code,
+            "set_name": sf.get("set_name") or row.set_name,
+            "collector_number": sf.get("collector_number") or row.number,
+            "rarity": sf.get("rarity") or "unknown",
+            "type_line": sf.get("type_line") or "",
+            "mana_cost": sf.get("mana_cost") or "",
+            "image_uris": sf.get("image_uris"),
+            "prices": sf.get("prices"),
+            "purchase_price": row.price,
+        }
+    if fmt == "pokemon":
+        tcg = sf
+        pricing = tcg.get("pricing") or {}
+        tcg_prices = pricing.get("tcgplayer") or {}
+        cm_prices = pricing.get("cardmarket") or {}
+        image = tcg.get("image")
+        return {
+            "id": card_id,
+            "name": row.name or tcg.get("name"),
+            "set": {"id": row.set_code, "name": row.set_name or (tcg.get("set") or {}).get("name")},
+            "localId": row.number,
+            "rarity": tcg.get("rarity") or "Unknown",
+            "images": {"small": f"{image}/low.webp", "large": f"{image}/high.webp"} if image else None,
+            "pricing": {
+                **pricing,
+                "cardmarket": {
+                    **cm_prices,
+                    "avg": cm_prices.get("avg") or row.price,
+                    "trend": cm_prices.get("trend") or row.price,
+                },
+            },
+            "tcgplayer": {
+                **tcg_prices,
+                "prices": tcg_prices.get("normal") or tcg_prices.get("holofoil") or {
+                    "normal": {"market": row.price},
+                    "holofoil": {"market": row.price},
+                },
+            },
+            "purchase_price": row.price,
+        }
+    price = str(int(row.price)) if row.price == int(row.price) else str(row.price)
+    return {
+        "id": card_id,
+        "name": row.name or sf.get("name"),
+        "set": {"id": row.set_code, "name": row.set_name or sf.get("set_name")},
+        "set_name": row.set_name or sf.get("set_name"),
+        "set_code": row.set_code,
+        "collector_number": row.number,
+        "rarity": sf.get("rarity") or "Unknown",
+        "type_line": sf.get("type_line") or "",
+        "mana_cost": sf.get("mana_cost") or "",
+        "image_uris": sf.get("image_uris"),
+        "prices": sf.get("prices") or {"usd": price, "eur": price},
+        "purchase_price": row.price,
+    }
+
+
+class CountingReader(io.RawIOBase):
+    """A binary file that counts the bytes read from it, for progress"""
+
+    def __init__(self, file):
+        self.file = file
+        self.count = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = self.file.readinto(buffer)
+        self.count += n or 0
+        return n
+
+
+def iter_records(raw, game_type: Optional[str] = None) -> Tuple[str, Iterator[Tuple[int, Dict[str, str]]]]:
+    """(format, (line, record) pairs) of a CSV export in a binary file"""
+    text = io.TextIOWrapper(raw, encoding="utf-8-sig", errors="replace", newline="")
+    reader = csv.reader(text)
+    header: List[str] = []
+    for values in reader:
+        if any(value.strip() for value in values):
+            # Mis-decoded BOMs ("ï»¿") are stripped like the route does
+            header = [value.strip().lstrip("﻿").replace("ï»¿", "") for value in values]
+            break
+    fmt = detect_format(header, game_type)
+
+    def records():
+        for values in reader:
+            if not any(value.strip() for value in values):
+                continue
+            yield reader.line_num, {name: (values[i].strip() if i < len(values) else "") for i, name in enumerate(header)}
+
+    return fmt, records()
+
+
+class ScryfallCollection:
+    """POST /cards/collection with name and set identifiers, 75 per request"""
+
+    def __init__(self, client: httpx.AsyncClient, base_url: str = SCRYFALL_URL, rate: float = SCRYFALL_RATE):
+        self.client = client
+        self.url = f"{base_url.rstrip('/')}/cards/collection"
+        self.bucket = TokenBucket(rate)
+
+    async def lookup(self, names: List[Tuple[str, str]]) -> Dict[Tuple[str, str], dict]:
+        """(lowercased name, set) -> card for (name, set) pairs"""
+        found: Dict[Tuple[str, str], dict] = {}
+        by_name: Dict[str, dict] = {}
+        for start in range(0, len(names), SCRYFALL_COLLECTION_BATCH):
+            batch = names[start:start + SCRYFALL_COLLECTION_BATCH]
+            identifiers = [{"name": name, "set": set_code} if set_code else {"name": name} for name, set_code in batch]
+            await self.bucket.acquire()
+            try:
+                response = await self.client.post(self.url, json={"identifiers": identifiers},
+                                                   headers={"User-Agent": "Hatake/1.0"})
+                cards = response.json().get("data") or [] if response.status_code == 200 else []
+            except (httpx.HTTPError, ValueError) as e:
+                eventlog.emit(logger, "import_scryfall_error", logging.WARNING, error=f"{type(e).__name__}: {e}")
+                continue
+            for card in cards:
+                found[(card["name"].lower(), (card.get("set") or "").lower())] = card
+                by_name.setdefault(card["name"].lower(), card)
+        # A name found in another set is better than nothing, as in the route
+        for name, set_code in names:
+            key = (name.lower(), set_code.lower())
+            if key not in found and name.lower() in by_name:
+                found[key] = by_name[name.lower()]
+        return found
+
+
+class Resolver:
+    """Cards for row keys, from local data first and the network last"""
+
+    def __init__(self, cache: Optional[api_cache.ApiCache] = None, scryfall: Optional[ScryfallCollection] = None,
+                 concurrency: int = IMPORT_FETCH_CONCURRENCY):
+        self.cache = cache
+        self.scryfall = scryfall
+        self.concurrency = concurrency
+
+    def match_local(self, keys: List[Key]) -> Dict[Key, str]:
+        """Card IDs for the MTG keys the search index can answer.
+
+        The index is changed on the event loop, so it is read there too; only
+        the card store reads in resolve_local() go to a worker thread.
+        """
+        if card_store.current() is None:
+            return {}
+        index = search_index.service.index
+        printings = set_codes.resolve("mtg", [key[1:] for key in keys if key[0] == "print"], index.segments["mtg"])
+        ids: Dict[Key, str] = {}
+        for key in keys:
+            if key[0] == "id":
+                ids[key] = key[1]
+            elif key[0] == "print" and key[1:] in printings:
+                ids[key] = printings[key[1:]]
+            elif key[0] == "name" and key[1]:
+                # Exact name matches only; the newest printing in the set wins
+                for game, doc in index.search(key[1], games=("mtg",), set=key[2] or None, limit=10).hits:
+                    if doc.name.lower() == key[1]:
+                        ids[key] = doc.id
+                        break
+        return ids
+
+    def resolve_local(self, keys: List[Key], ids: Dict[Key, str]) -> Dict[Key, dict]:
+        """MTG keys the card store can answer, from match_local()'s IDs; runs in a worker thread"""
+        store = card_store.current()
+        if store is None:
+            return {}
+        # Printings the index does not have may still be in the card store
+        printings = set_codes.resolve("mtg", [key[1:] for key in keys if key[0] == "print" and key not in ids],
+                                      None, store)
+        found: Dict[Key, dict] = {}
+        for key in keys:
+            card_id = ids.get(key) or (printings.get(key[1:]) if key[0] == "print" else None)
+            card = store.get(card_id) if card_id else None
+            if card is not None:
+                found[key] = card
+        return found
+
+    async def _fetch(self, source: str, url: str) -> Optional[dict]:
+        lookup = await self.cache.fetch(source, url)
+        if lookup.status != 200:
+            return None
+        try:
+            return json.loads(lookup.body)
+        except ValueError:
+            return None
+
+    async def _fetch_pokemon(self, key: Key) -> Optional[dict]:
+        """The route's lookups: set-number, set-number without zeros, then by name within the set or number"""
+        _, set_code, number, name, set_name = key
+        card = await self._fetch("tcgdex", f"{TCGDEX_URL}/cards/{set_code}-{number}")
+        clean = _LEADING_ZEROS.sub("", number)
+        if card is None and clean != number:
+            card = await self._fetch("tcgdex", f"{TCGDEX_URL}/cards/{set_code}-{clean}")
+        if card is None and name:
+            results = await self._fetch("tcgdex", f"{TCGDEX_URL}/cards?name={urllib.parse.quote(name, safe='')}")
+            if isinstance(results, list):
+                csv_set = set_name.lower()
+                api_sets = [((c.get("set") or {}).get("name") or "").lower() for c in results]
+                card = next((c for c, api_set in zip(results, api_sets) if csv_set in api_set or api_set in csv_set), None)
+                if card is None:
+                    card = next((c for c in results if clean and _LEADING_ZEROS.sub("", c.get("localId") or "") == clean),
+                                None)
+                if card is None and 0 < len(results) < 3:
+                    card = results[0]
+        return card
+
+    async def _fetch_mtg(self, key: Key) -> Optional[dict]:
+        base = f"{api_cache.ORIGINS['scryfall']}cards"
+        if key[0] == "id":
+            return await self._fetch("scryfall", f"{base}/{key[1]}")
+        return await self._fetch("scryfall", f"{base}/{key[1]}/{key[2]}")
+
+    async def resolve(self, keys: List[Key]) -> Dict[Key, dict]:
+        local = [key for key in keys if key[0] != "pokemon"]
+        found = await asyncio.to_thread(self.resolve_local, local, self.match_local(local))
+        missing = [key for key in keys if key not in found]
+        names = [key for key in missing if key[0] == "name" and key[1]]
+        fetched = [key for key in missing if key[0] != "name"]
+        if self.cache is not None and fetched:
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def fetch(key: Key):
+                async with semaphore:
+                    card = await (self._fetch_pokemon(key) if key[0] == "pokemon" else self._fetch_mtg(key))
+                if card is not None:
+                    found[key] = card
+
+            await asyncio.gather(*(fetch(key) for key in fetched))
+        if self.scryfall is not None and names:
+            by_name = await self.scryfall.lookup([(key[3], key[2]) for key in names])
+            for key in names:
+                if (key[1], key[2]) in by_name:
+                    found[key] = by_name[(key[1], key[2])]
+        return found
+
+
+class PostgresImportStore:
+    """The job's queries against the app database (asyncpg)"""
+
+    COLUMNS = ("user_id", "card_id", "game", "card_data", "quantity", "condition", "foil", "notes")
+
+    def __init__(self, dsn: str = DATABASE_URL):
+        self.dsn = dsn
+        self.pool = None
+
+    async def open(self):
+        import asyncpg
+
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=IMPORT_MAX_RUNNING + 1)
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def session_user(self, session_token: str) -> Optional[str]:
+        """getSessionUser from lib/auth.ts, for web clients' session cookies"""
+        return await self.pool.fetchval(
+            "SELECT user_id FROM user_sessions WHERE session_token = $1 AND expires_at > NOW()",
+            session_token,
+        )
+
+    async def insert_items(self, records: List[tuple]) -> int:
+        """One COPY for a chunk of collection_items rows"""
+        async with self.pool.acquire() as connection:
+            await connection.copy_records_to_table("collection_items", records=records, columns=self.COLUMNS)
+        return len(records)
+
+
+class ImportJob:
+    """One upload being imported; `status()` is what the status routes return"""
+
+    def __init__(self, user_id: str, path: str, game_type: Optional[str] = None,
+                 chunk_rows: int = IMPORT_CHUNK_ROWS):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.path = path
+        self.game_type = game_type
+        self.chunk_rows = chunk_rows
+        self.state = "queued"
+        self.format: Optional[str] = None
+        self.bytes_total = os.path.getsize(path)
+        self.reader: Optional[CountingReader] = None
+        self.rows = 0
+        self.imported = 0
+        self.unresolved = 0
+        self.failed = 0
+        self.names = set()
+        self.copies = 0
+        self.errors: List[str] = []
+        self.error_count = 0
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.version = 0
+        self._changed = asyncio.Event()
+
+    def error(self, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(message)
+
+    def changed(self):
+        self.version += 1
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self, version: int):
+        """Until the status is newer than `version`"""
+        while self.version <= version and self.state in ("queued", "running"):
+            await self._changed.wait()
+
+    def status(self) -> dict:
+        elapsed = (self.finished or time.time()) - self.started if self.started else 0
+        read = self.reader.count if self.reader else (self.bytes_total if self.finished else 0)
+        return {
+            "id": self.id,
+            "state": self.state,
+            "format": self.format,
+            "rows": self.rows,
+            "imported": self.imported,
+            "unresolved": self.unresolved,
+            "failed": self.failed,
+            "uniqueCards": len(self.names),
+            "totalCopies": self.copies,
+            "bytes": read,
+            "bytesTotal": self.bytes_total,
+            "percent": round(100 * min(read, self.bytes_total) / self.bytes_total, 1) if self.bytes_total else 100.0,
+            "rowsPerSecond": round(self.rows / elapsed) if elapsed > 0 else None,
+            "errors": self.errors,
+            "errorCount": self.error_count,
+            "createdAt": self.created,
+            "startedAt": self.started,
+            "finishedAt": self.finished,
+        }
+
+
+class ImportRun:
+    """Works through one job's file"""
+
+    def __init__(self, job: ImportJob, resolver: Resolver, insert: Callable):
+        self.job = job
+        self.resolver = resolver
+        self.insert = insert
+        self.resolved: Dict[Key, Optional[dict]] = {}
+
+    def _read_chunk(self, records: Iterator) -> List[Row]:
+        rows = []
+        for line, record in records:
+            rows.append(parse_row(self.job.format, record, line))
+            if len(rows) >= self.job.chunk_rows:
+                break
+        return rows
+
+    def _build(self, rows: List[Row]) -> List[tuple]:
+        job = self.job
+        records = []
+        for row in rows:
+            if not row.name and not row.scryfall_id:
+                job.failed += 1
+                job.error(f"Row {row.line}: no card name")
+                continue
+            card = self.resolved.get(row_key(row))
+            card_id = card_id_for(row, card)
+            data = card_data(job.format, row, card, card_id)
+            records.append((job.user_id, card_id, row.game, json.dumps(data), row.quantity, row.condition,
+                            row.foil, "Imported via CSV"))
+            job.unresolved += card is None
+            if row.name:
+                job.names.add(row.name.lower())
+            job.copies += row.quantity
+        return records
+
+    async def run(self):
+        job = self.job
+        with open(job.path, "rb") as file:
+            job.reader = CountingReader(file)
+            job.format, records = await asyncio.to_thread(iter_records, io.BufferedReader(job.reader), job.game_type)
+            job.changed()
+            next_chunk = asyncio.ensure_future(asyncio.to_thread(self._read_chunk, records))
+            try:
+                while True:
+                    rows = await next_chunk
+                    if not rows:
+                        break
+                    # Parse ahead while this chunk is resolved and written
+                    next_chunk = asyncio.ensure_future(asyncio.to_thread(self._read_chunk, records))
+                    keys = list(dict.fromkeys(row_key(row) for row in rows if row.name or row.scryfall_id))
+                    keys = [key for key in keys if key not in self.resolved]
+                    if keys:
+                        found = await self.resolver.resolve(keys)
+                        for key in keys:
+                            self.resolved[key] = found.get(key)
+                    items = await asyncio.to_thread(self._build, rows)
+                    job.rows += len(rows)
+                    if items:
+                        try:
+                            job.imported += await self.insert(items)
+                        except Exception as e:
+                            job.failed += len(items)
+                            job.error(f"Rows {rows[0].line}-{rows[-1].line}: {type(e).__name__}: {e}")
+                    job.changed()
+            finally:
+                next_chunk.cancel()
+
+
+class ImportJobs:
+    """The gateway's import jobs: queued, running and recently finished"""
+
+    def __init__(self, store=None, resolver: Optional[Resolver] = None, max_running: int = IMPORT_MAX_RUNNING):
+        self.store = store
+        self.resolver = resolver
+        self.jobs: Dict[str, ImportJob] = {}
+        self.running = asyncio.Semaphore(max_running)
+        self.client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def available(self) -> bool:
+        return self.store is not None or bool(DATABASE_URL)
+
+    async def open(self):
+        if self.store is None:
+            store = PostgresImportStore()
+            await store.open()
+            self.store = store
+        if self.resolver is None:
+            self.client = httpx.AsyncClient(timeout=30)
+            self.resolver = Resolver(api_cache.cache, ScryfallCollection(self.client))
+
+    async def session_user(self, session_token: str) -> Optional[str]:
+        await self.open()
+        return await self.store.session_user(session_token)
+
+    async def spool(self, chunks, max_bytes: int) -> Optional[str]:
+        """Write an upload to a spool file; None (and no file) when it is too large"""
+        file = tempfile.NamedTemporaryFile(prefix="import-", suffix=".csv", dir=IMPORT_SPOOL_DIR, delete=False)
+        size = 0
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    file.close()
+                    os.unlink(file.name)
+                    return None
+                file.write(chunk)
+        except BaseException:
+            file.close()
+            os.unlink(file.name)
+            raise
+        file.close()
+        return file.name
+
+    async def start(self, user_id: str, path: str, game_type: Optional[str] = None) -> ImportJob:
+        await self.open()
+        job = ImportJob(user_id, path, game_type)
+        self.jobs[job.id] = job
+        self._forget_old()
+        job.task = asyncio.get_running_loop().create_task(self._run(job))
+        return job
+
+    def _forget_old(self):
+        finished = [job for job in self.jobs.values() if job.finished]
+        for job in sorted(finished, key=lambda job: job.finished)[:max(0, len(finished) - KEPT_JOBS)]:
+            del self.jobs[job.id]
+
+    async def _run(self, job: ImportJob):
+        try:
+            async with self.running:
+                job.state = "running"
+                job.started = time.time()
+                job.changed()
+                await ImportRun(job, self.resolver, self.store.insert_items).run()
+            job.state = "done"
+        except asyncio.CancelledError:
+            job.state = "cancelled"
+        except Exception as e:
+            job.state = "failed"
+            job.error(f"{type(e).__name__}: {e}")
+        finally:
+            self._finish(job)
+
+    def _finish(self, job: ImportJob):
+        job.finished = time.time()
+        job.reader = None
+        try:
+            os.unlink(job.path)
+        except OSError:
+            pass
+        job.changed()
+        eventlog.emit(logger, "import_job", **{key: value for key, value in job.status().items()
+                                                if key in ("id", "state", "format", "rows", "imported",
+                                                           "unresolved", "failed", "rowsPerSecond")})
+
+    def get(self, job_id: str, user_id: str) -> Optional[ImportJob]:
+        job = self.jobs.get(job_id)
+        return job if job is not None and job.user_id == user_id else None
+
+    async def cancel(self, job: ImportJob):
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+            await asyncio.gather(job.task, return_exceptions=True)
+        # A task cancelled before it started never ran its cleanup
+        if job.finished is None:
+            job.state = "cancelled"
+            self._finish(job)
+
+    async def events(self, job: ImportJob):
+        """Server-sent events: the status now and after every change until the job ends"""
+        while True:
+            version = job.version
+            yield f"data: {json.dumps(job.status())}\n\n"
+            if job.state not in ("queued", "running"):
+                return
+            await job.wait(version)
+
+    async def stop(self):
+        for job in list(self.jobs.values()):
+            await self.cancel(job)
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+        if self.store is not None and isinstance(self.store, PostgresImportStore):
+            await self.store.close()
+
+
+jobs = ImportJobs()
@@ -0,0 +1,382 @@
+"""Deck statistics and legality checks, many decks at a time.
+
+components/DeckAnalytics.tsx works these out in the browser, one deck and
+one card at a time: the mana curve, colour and type counts, the main deck
+and sideboard sizes and the format rules (deck size, copies per card). The
+same numbers are computed here for a whole batch of decks at once, such as
+every public deck /api/decks/community lists.
+
+Each card is reduced once to a few numbers: its mana value, its coloured
+pips, a colour bitmask, a type bitmask and, per format of its game, a legal
+and a restricted bit read from Scryfall's `legalities` or TCGdex's `legal`.
+The rows of every deck in a batch are then laid end to end in NumPy arrays
+with a deck index column, and each statistic is one bincount or ufunc.at
+over them; only the issue messages are built in Python, for the few cards
+that break a rule. Parsing mana costs and type lines is memoised, since
+the same cards turn up in deck after deck.
+
+Results are cached by a hash of the deck's content (game, format, and per
+row the quantity, category and the card fields read), so an unchanged deck
+is never analysed twice, whoever asks. Reducing the rows and hashing them
+run in a worker thread, as the analysis does. A request may send at most
+ANALYTICS_MAX_TOTAL_ROWS rows and ANALYTICS_MAX_BYTES bytes.
+
+    POST /api/decks/analytics                 {game, format, cards} or {decks: [...]}
+    GET  /api/decks/{deckId}/analytics
+    GET  /api/decks/community/analytics?game=&format=
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+import pickle
+import re
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+import api_cache
+import eventlog
+
+ANALYTICS_CACHE_BYTES = int(os.environ.get("ANALYTICS_CACHE_BYTES", str(8 << 20)))
+ANALYTICS_CACHE_TTL = float(os.environ.get("ANALYTICS_CACHE_TTL", "3600"))
+# Most decks one request may send, rows per deck and copies per row
+ANALYTICS_MAX_DECKS = int(os.environ.get("ANALYTICS_MAX_DECKS", "200"))
+ANALYTICS_MAX_ROWS = int(os.environ.get("ANALYTICS_MAX_ROWS", "1000"))
+ANALYTICS_MAX_QUANTITY = int(os.environ.get("ANALYTICS_MAX_QUANTITY", "1000"))
+# Rows across all the decks of one request, and bytes of its body
+ANALYTICS_MAX_TOTAL_ROWS = int(os.environ.get("ANALYTICS_MAX_TOTAL_ROWS", "20000"))
+ANALYTICS_MAX_BYTES = int(os.environ.get("ANALYTICS_MAX_BYTES", str(16 << 20)))
+
+logger = logging.getLogger("gateway.deck_analytics")
+
+
+class Rules(NamedTuple):
+    min_cards: int
+    max_cards: Optional[int]
+    max_copies: int
+    # "minimum", or "required" where the deck size is exact
+    min_word: str = "minimum"
+
+
+# As in DeckAnalytics.tsx; basic lands and basic energy are not limited
+FORMAT_RULES: Dict[str, Dict[str, Rules]] = {
+    "mtg": {
+        "standard": Rules(60, None, 4), "modern": Rules(60, None, 4), "legacy": Rules(60, None, 4),
+        "vintage": Rules(60, None, 4), "pioneer": Rules(60, None, 4), "commander": Rules(100, 100, 1),
+        "pauper": Rules(60, None, 4), "draft": Rules(40, None, 99), "sealed": Rules(40, None, 99),
+    },
+    "pokemon": {
+        "standard": Rules(60, 60, 4, "required"), "expanded": Rules(60, 60, 4, "required"),
+        "legacy": Rules(60, 60, 4, "required"), "unlimited": Rules(60, 60, 4, "required"),
+    },
+}
+
+# Formats with per-card legality in the card data: Scryfall `legalities`, TCGdex `legal`
+LEGALITY_FORMATS: Dict[str, Tuple[str, ...]] = {
+    "mtg": ("standard", "pioneer", "modern", "legacy", "vintage", "pauper", "commander"),
+    "pokemon": ("standard", "expanded"),
+}
+
+COLORS = ("W", "U", "B", "R", "G", "C")
+# Type line words by precedence: a card counts as the first one it has
+TYPES = ("Creature", "Instant", "Sorcery", "Enchantment", "Artifact", "Planeswalker", "Land", "Battle")
+OTHER = len(TYPES)
+LAND = 1 << TYPES.index("Land")
+CURVE_MAX = 6
+# Gleemax costs {1000000}; larger numbers in a posted mana cost count as this
+MAX_MANA_VALUE = 1000000
+# The commander is part of the 100 cards
+MAIN_CATEGORIES = ("main", "commander", "", None)
+
+_SYMBOL = re.compile(r"\{([^}]+)\}")
+_LEADING_INT = re.compile(r"^\s*[+-]?\d+")
+
+# Primary type index of every type bitmask
+_PRIMARY = np.array([next((i for i in range(len(TYPES)) if mask >> i & 1), OTHER)
+                     for mask in range(1 << len(TYPES))], dtype=np.int64)
+
+
+class Deck(NamedTuple):
+    game: str
+    format: Optional[str]
+    # (card_id, card_data, quantity, category), as deck_cards rows
+    rows: Sequence[tuple]
+
+
+class Card(NamedTuple):
+    """The fields of a deck row the analysis reads"""
+    name: str
+    mana_cost: str
+    type_line: str
+    # Pokemon: the first energy type, else the card category
+    kind: str
+    # Not limited in copies: basic lands, basic energy
+    unlimited: bool
+    # Bits per LEGALITY_FORMATS entry; None when the card data has no legality
+    legal: Optional[int]
+    restricted: int
+    quantity: int
+    main: bool
+    sideboard: bool
+
+
+@functools.lru_cache(maxsize=16384)
+def mana(mana_cost: str) -> Tuple[int, Tuple[int, ...], int]:
+    """(mana value, pips per COLORS, colour bitmask) as getCMC and parseManaCost count them"""
+    cmc, pips = 0, [0] * len(COLORS)
+    for symbol in _SYMBOL.findall(mana_cost or ""):
+        number = _LEADING_INT.match(symbol)
+        if number:
+            digits = number.group().strip()
+            cmc += int(digits) if len(digits) <= 8 else MAX_MANA_VALUE
+        elif symbol in COLORS:
+            cmc += 1
+        elif "/" in symbol:
+            cmc += 1
+        if symbol in COLORS:
+            pips[COLORS.index(symbol)] += 1
+    colors = sum(1 << i for i in range(5) if pips[i])
+    return min(max(cmc, 0), MAX_MANA_VALUE), tuple(pips), colors
+
+
+@functools.lru_cache(maxsize=4096)
+def types(type_line: str) -> int:
+    """Bitmask of the TYPES words in a type line"""
+    lower = (type_line or "").lower()
+    return sum(1 << i for i, word in enumerate(TYPES) if word.lower() in lower)
+
+
+@functools.lru_cache(maxsize=1024)
+def _bits(statuses: tuple) -> Tuple[int, int]:
+    legal = sum(1 << i for i, status in enumerate(statuses) if status in ("legal", "restricted", True))
+    return legal, sum(1 << i for i, status in enumerate(statuses) if status == "restricted")
+
+
+def legality(game: str, card: dict) -> Tuple[Optional[int], int]:
+    """(legal bits, restricted bits) over LEGALITY_FORMATS[game]"""
+    formats = LEGALITY_FORMATS.get(game)
+    table = card.get("legalities" if game == "mtg" else "legal") if formats else None
+    if not isinstance(table, dict):
+        return None, 0
+    # Few distinct combinations of statuses exist, so the bits are memoised
+    return _bits(tuple(map(table.get, formats)))
+
+
+def card(game: str, card_id: str, data: Optional[dict], quantity: int, category: Optional[str]) -> Card:
+    data = data if isinstance(data, dict) else {}
+    name = str(data.get("name") or card_id)
+    type_line = str(data.get("type_line") or "")
+    if game == "pokemon":
+        category_name = data.get("category") or "Unknown"
+        energy = data.get("types")
+        kind = str(energy[0] if isinstance(energy, list) and energy else category_name)
+        unlimited = "basic" in name.lower() and category_name == "Energy"
+    else:
+        kind, unlimited = "", "basic land" in type_line.lower()
+    legal, restricted = legality(game, data)
+    return Card(name, str(data.get("mana_cost") or ""), type_line, kind, unlimited, legal, restricted,
+                int(quantity or 0), category in MAIN_CATEGORIES, category == "sideboard")
+
+
+def from_json(data) -> Deck:
+    """A deck from a request body: {game, format, cards: [{card_id, card_data, quantity, category}]}"""
+    if not isinstance(data, dict):
+        raise ValueError("Each deck must be an object")
+    game = data.get("game") or "mtg"
+    cards = data.get("cards")
+    if not isinstance(cards, list):
+        raise ValueError("cards must be a list")
+    if len(cards) > ANALYTICS_MAX_ROWS:
+        raise ValueError(f"Decks are limited to {ANALYTICS_MAX_ROWS} cards")
+    rows = []
+    for row in cards:
+        if not isinstance(row, dict):
+            raise ValueError("Each card must be an object")
+        try:
+            quantity = int(row.get("quantity") or 1)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError("quantity must be a number") from None
+        if not 1 <= quantity <= ANALYTICS_MAX_QUANTITY:
+            raise ValueError(f"quantity must be between 1 and {ANALYTICS_MAX_QUANTITY}")
+        card_data = row.get("card_data") or row.get("cardData")
+        rows.append((str(row.get("card_id") or row.get("cardId") or ""), card_data, quantity, row.get("category")))
+    return Deck(str(game), data.get("format") or None, rows)
+
+
+def content_hash(game: str, fmt: Optional[str], cards: List[Card]) -> str:
+    return hashlib.sha1(pickle.dumps((game, fmt, cards), protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+
+
+def prepare(decks: Sequence[Deck]) -> Tuple[list, List[str]]:
+    """Each deck as (game, format, cards) for analyse(), and its content hash"""
+    prepared = [(deck.game, deck.format, [card(deck.game, *row) for row in deck.rows]) for deck in decks]
+    return prepared, [content_hash(*deck) for deck in prepared]
+
+
+def analyse(decks: Sequence[Tuple[str, Optional[str], List[Card]]]) -> List[dict]:
+    """Statistics and legality issues for each (game, format, cards) in one pass over all rows"""
+    count = len(decks)
+    deck, names, kinds = [], {}, {}
+    name_ids, kind_ids, cmc, pips, colors, type_masks = [], [], [], [], [], []
+    quantity, main, sideboard, unlimited, legal, known, restricted = [], [], [], [], [], [], []
+    for index, (game, _, cards) in enumerate(decks):
+        for row in cards:
+            row_cmc, row_pips, row_colors = mana(row.mana_cost)
+            deck.append(index)
+            name_ids.append(names.setdefault(row.name, len(names)))
+            kind_ids.append(kinds.setdefault(row.kind, len(kinds)))
+            cmc.append(row_cmc)
+            pips.append(row_pips)
+            colors.append(row_colors)
+            type_masks.append(types(row.type_line))
+            quantity.append(row.quantity)
+            main.append(row.main)
+            sideboard.append(row.sideboard)
+            unlimited.append(row.unlimited)
+            legal.append(row.legal or 0)
+            known.append(row.legal is not None)
+            restricted.append(row.restricted)
+
+    deck = np.array(deck, dtype=np.int64)
+    quantity = np.array(quantity, dtype=np.int64)
+    main = np.array(main, dtype=bool)
+    cmc = np.array(cmc, dtype=np.int64)
+    pips = np.array(pips, dtype=np.int64).reshape(-1, len(COLORS))
+    colors = np.array(colors, dtype=np.int64)
+    type_masks = np.array(type_masks, dtype=np.int64)
+    land = (type_masks & LAND) != 0
+    legal = np.array(legal, dtype=np.int64)
+    known = np.array(known, dtype=bool)
+
+    def per_deck(weights, bins: int = 1, key=None):
+        key = deck if key is None else deck * bins + key
+        return np.bincount(key, weights=weights, minlength=count * bins).astype(np.int64).reshape(count, bins)
+
+    spell = quantity * ~land
+    curve = per_deck(spell, CURVE_MAX + 1, np.minimum(cmc, CURVE_MAX))
+    color_counts = np.stack([per_deck(pips[:, i] * quantity)[:, 0] for i in range(len(COLORS))], axis=1) \
+        if len(deck) else np.zeros((count, len(COLORS)), dtype=np.int64)
+    type_counts = per_deck(quantity, OTHER + 1, _PRIMARY[type_masks])
+    kind_counts = per_deck(quantity, max(len(kinds), 1), np.array(kind_ids, dtype=np.int64))
+    total_main = per_deck(quantity * main)[:, 0]
+    total_sideboard = per_deck(quantity * np.array(sideboard, dtype=bool))[:, 0]
+    unique = per_deck(None)[:, 0]
+    main_spell = spell * main
+    cmc_average = per_deck(main_spell * cmc)[:, 0] / np.maximum(1, per_deck(main_spell)[:, 0])
+    deck_colors = np.zeros(count, dtype=np.int64)
+    np.bitwise_or.at(deck_colors, deck, colors)
+    # Formats every main deck card with legality data is legal in
+    deck_legal = np.full(count, -1, dtype=np.int64)
+    checked = main & known
+    np.bitwise_and.at(deck_legal, deck[checked], legal[checked])
+    deck_legal[per_deck(checked)[:, 0] == 0] = 0
+
+    # Copies per (deck, name) over the main deck; a name is unlimited, and
+    # restricted, as the first row with that name in the deck is
+    keys = deck * max(len(names), 1) + np.array(name_ids, dtype=np.int64)
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    copies = np.bincount(inverse, weights=quantity * main, minlength=len(first)).astype(np.int64)
+    rules = [FORMAT_RULES.get(game, {}).get((fmt or "").lower()) for game, fmt, _ in decks]
+    formats = [LEGALITY_FORMATS.get(game, ()) for game, _, _ in decks]
+    bits = np.array([formats[i].index(fmt.lower()) if fmt and fmt.lower() in formats[i] else -1
+                     for i, (_, fmt, _) in enumerate(decks)], dtype=np.int64)
+    max_copies = np.array([r.max_copies if r else -1 for r in rules], dtype=np.int64)
+    key_deck = deck[first]
+    key_bit = bits[key_deck]
+    key_restricted = (np.array(restricted, dtype=np.int64)[first] >> np.maximum(key_bit, 0) & 1) & (key_bit >= 0)
+    limit = np.where(key_restricted == 1, np.minimum(max_copies[key_deck], 1), max_copies[key_deck])
+    over = (limit >= 0) & (copies > limit) & ~np.array(unlimited, dtype=bool)[first]
+    # Main deck cards not legal in the deck's format
+    row_bit = bits[deck]
+    banned = main & known & (row_bit >= 0) & ((legal >> np.maximum(row_bit, 0) & 1) == 0)
+    banned_keys = np.bincount(inverse, weights=banned, minlength=len(first)) > 0
+
+    issues: List[List[str]] = [[] for _ in range(count)]
+    for index, rule in enumerate(rules):
+        total = int(total_main[index])
+        if rule is None:
+            continue
+        if total < rule.min_cards:
+            issues[index].append(f"Deck has {total} cards ({rule.min_word}: {rule.min_cards})")
+        if rule.max_cards and total > rule.max_cards:
+            issues[index].append(f"Deck has {total} cards (maximum: {rule.max_cards})")
+    row_names = list(names)
+    for key in np.flatnonzero(over | banned_keys)[np.argsort(first[over | banned_keys], kind="stable")]:
+        index = int(key_deck[key])
+        name = row_names[name_ids[first[key]]]
+        if banned_keys[key]:
+            issues[index].append(f"{name}: not legal in {decks[index][1]}")
+        if over[key]:
+            issues[index].append(f"{name}: {int(copies[key])} copies (max: {int(limit[key])})")
+
+    kind_names = list(kinds)
+    results = []
+    for index, (game, fmt, _) in enumerate(decks):
+        result = {
+            "game": game,
+            "format": fmt,
+            "manaCurve": {},
+            "colorDistribution": {},
+            "typeDistribution": {},
+            "pokemonTypeDistribution": {},
+            "colors": "",
+            "legalityIssues": issues[index],
+            "legalFormats": [name for i, name in enumerate(LEGALITY_FORMATS.get(game, ()))
+                             if deck_legal[index] >> i & 1],
+            "stats": {
+                "totalMain": int(total_main[index]),
+                "totalSideboard": int(total_sideboard[index]),
+                "uniqueCards": int(unique[index]),
+                "averageCMC": f"{cmc_average[index]:.2f}" if game == "mtg" else "N/A",
+            },
+        }
+        if game == "mtg":
+            result["manaCurve"] = {str(i): int(n) for i, n in enumerate(curve[index])}
+            result["colorDistribution"] = {c: int(n) for c, n in zip(COLORS, color_counts[index]) if n}
+            result["typeDistribution"] = {t: int(n) for t, n in zip((*TYPES, "Other"), type_counts[index]) if n}
+            result["colors"] = "".join(c for i, c in enumerate(COLORS[:5]) if deck_colors[index] >> i & 1)
+        elif game == "pokemon":
+            result["pokemonTypeDistribution"] = {kind_names[i]: int(n) for i, n in enumerate(kind_counts[index]) if n}
+        results.append(result)
+    return results
+
+
+class DeckAnalytics:
+    """analyse() behind an LRU keyed by deck content hash"""
+
+    def __init__(self, max_bytes: int = ANALYTICS_CACHE_BYTES, ttl: float = ANALYTICS_CACHE_TTL):
+        self.cache = api_cache.LRU(max_bytes)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def analyse(self, decks: Sequence[Deck]) -> List[dict]:
+        """Results in the order of `decks`; only the ones not cached are computed, together, off the loop"""
+        start = time.perf_counter()
+        prepared, keys = await asyncio.to_thread(prepare, decks)
+        results: List[Optional[dict]] = []
+        for key in keys:
+            entry = self.cache.get(key)
+            results.append(json.loads(entry.body) if entry is not None else None)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            computed = await asyncio.to_thread(analyse, [prepared[i] for i in missing])
+            for i, result in zip(missing, computed):
+                results[i] = result
+                self.cache.put(keys[i], 200, json.dumps(result).encode(), self.ttl)
+        self.hits += len(decks) - len(missing)
+        self.misses += len(missing)
+        eventlog.emit(logger, "deck_analytics", decks=len(decks), computed=len(missing),
+                      rows=sum(len(deck.rows) for deck in decks),
+                      duration_ms=round((time.perf_counter() - start) * 1000, 1))
+        return results
+
+    def stats(self) -> dict:
+        return {"entries": len(self.cache), "bytes": self.cache.bytes, "hits": self.hits, "misses": self.misses}
+
+
+analytics = DeckAnalytics()
@@ -0,0 +1,460 @@
+"""Deck list import and export.
+
+The deck editor (app/decks/[deckId]/page.tsx) parses pasted lists in the
+browser, then searches for each card and adds it with one request per card,
+so a 100-card Commander list makes about 200 round trips. Here a list is
+tokenised in one pass with a single pattern per line, which covers:
+
+    MTGA        4 Lightning Bolt (2XM) 117, under Deck/Sideboard/Commander
+                headers, with an About section
+    Archidekt   1x Sol Ring (C21) 263 *F* [Ramp], or [C21] for the set
+    plain text  4 Lightning Bolt, 4x Lightning Bolt, Lightning Bolt,
+                SB: 2 Negate, Commander: Atraxa, // and # comments
+
+Every entry of a list is then resolved against the local search index in
+one go: set and collector number pairs through set_codes.printings() (MTG
+misses also from the card store), the rest by exact name, newest printing
+first, with MTG double-faced cards found by their front face. The index is
+read on the event loop (match) and only the card store and JSON in a
+worker thread (load). Nothing is fetched over the network; what the index
+does not know is reported back.
+Exports are rendered as the deck editor writes them and streamed from the
+database as the rows arrive.
+
+    POST /api/decks/parse?game=              list -> resolved cards
+    POST /api/decks/{deckId}/import          list -> deck_cards, one write
+    GET  /api/decks/{deckId}/export?format=  mtga, archidekt or text
+"""
+import json
+import logging
+import os
+import random
+import re
+import string
+import time
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import card_store
+import eventlog
+import search_index
+import set_codes
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "")
+# Longest list accepted, in lines
+DECK_MAX_LINES = int(os.environ.get("DECK_MAX_LINES", "2000"))
+
+EXPORT_FORMATS = ("mtga", "archidekt", "text")
+# Export rows per streamed chunk
+EXPORT_CHUNK_ROWS = 200
+# Public decks per community listing, as app/api/decks/community
+COMMUNITY_LIMIT = 50
+
+logger = logging.getLogger("gateway.deck_lists")
+
+_LINE = re.compile(
+    r"""^(?:(?:SB|Sideboard):\s*(?P<sb>))?
+    (?:(?P<quantity>\d+)(?P<x>x)?\s+)?
+    (?P<name>.+?)
+    (?:\s+(?P<open>[(\[])(?P<set>[\w-]+)[)\]](?:\s+(?P<number>[\w★†-]+))?)?
+    (?:\s+(?P<foil>\*[FE]\*))?
+    (?:\s+\[(?P<tags>[^\]]*)\])?
+    \s*$""",
+    re.IGNORECASE | re.VERBOSE,
+)
+_COMMANDER = re.compile(r"^commander(?:\s*:\s*(.*))?$", re.IGNORECASE)
+_QUANTITY = re.compile(r"^\d+x?\s+", re.IGNORECASE)
+_BASE36 = string.digits + string.ascii_lowercase
+
+# Section headers -> the category entries under them get; None skips the section
+SECTIONS = {
+    "deck": "main", "main": "main", "main deck": "main", "maindeck": "main", "mainboard": "main",
+    "sideboard": "sideboard", "sb": "sideboard",
+    "companion": "sideboard",
+    "maybeboard": None, "about": None,
+}
+_CATEGORIES = {*SECTIONS, "commander"}
+
+
+class Entry(NamedTuple):
+    line: int
+    quantity: int
+    name: str
+    set_code: str = ""
+    number: str = ""
+    category: str = "main"
+    foil: bool = False
+
+
+class DeckList(NamedTuple):
+    format: str
+    entries: List[Entry]
+
+
+def parse(text: str) -> DeckList:
+    """The entries of a pasted deck list and the format it looks like"""
+    entries: List[Entry] = []
+    category: Optional[str] = "main"
+    votes = {"mtga": 0, "archidekt": 0}
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith("//") or line.startswith("#"):
+            continue
+        header = line.lower().rstrip(":")
+        if header in SECTIONS:
+            category = SECTIONS[header]
+            votes["mtga"] += header in ("deck", "about", "companion")
+            continue
+        commander = _COMMANDER.match(line)
+        if commander:
+            category = "main"
+            name = _QUANTITY.sub("", (commander.group(1) or "").strip())
+            if name:
+                entries.append(Entry(number, 1, name))
+            continue
+        if category is None:
+            continue
+        match = _LINE.match(line)
+        if match is None:
+            continue
+        quantity = int(match.group("quantity") or 1)
+        name = match.group("name").strip()
+        if quantity <= 0 or not name:
+            continue
+        set_code, tags = match.group("set") or "", (match.group("tags") or "").lower()
+        # "1x Island [Maybeboard]": an Archidekt category, not a set
+        if match.group("open") == "[" and not match.group("number") and set_code.lower() in _CATEGORIES:
+            set_code, tags = "", set_code.lower()
+        if "maybeboard" in tags:
+            continue
+        in_sideboard = match.group("sb") is not None or "sideboard" in tags
+        entries.append(Entry(number, quantity, name, set_code, match.group("number") or "",
+                             "sideboard" if in_sideboard else category, match.group("foil") is not None))
+        if tags or match.group("open") == "[" or (match.group("x") and set_code):
+            votes["archidekt"] += 1
+        elif set_code:
+            votes["mtga"] += 1
+    if not votes["mtga"] and not votes["archidekt"]:
+        return DeckList("text", entries)
+    return DeckList("archidekt" if votes["archidekt"] > votes["mtga"] else "mtga", entries)
+
+
+def _front_face(name: str) -> str:
+    return search_index.normalize(name.split(" // ")[0])
+
+
+class Matches(NamedTuple):
+    """What the search index knows of a list's entries"""
+    # Entry -> its printing, else the newest printing of its name
+    docs: Dict[int, search_index.Document]
+    # Entry -> (set code, collector number) the index lacks, for the card store
+    missing: Dict[int, set_codes.Printing]
+
+
+def match(game: str, entries: List[Entry], index: Optional[search_index.SearchIndex] = None) -> Matches:
+    """Look the entries up in the search index.
+
+    The index is changed on the event loop (SearchService.apply), and
+    lookups fill caches in its segments, so this runs on the loop too. The
+    lookups are cheap next to reading and decoding the cards.
+    """
+    index = index if index is not None else search_index.service.index
+    segment = index.segments[game]
+    docs: Dict[int, search_index.Document] = {}
+    missing: Dict[int, set_codes.Printing] = {}
+
+    printed = [(i, (entry.set_code, entry.number)) for i, entry in enumerate(entries)
+               if entry.set_code and entry.number]
+    found = set_codes.printings(game, [pair for _, pair in printed], segment)
+    for i, pair in printed:
+        doc = found.get(pair)
+        # A printing of another card (a wrong number) falls back to the name
+        if doc is not None and _front_face(doc.name) == _front_face(entries[i].name):
+            docs[i] = doc
+        elif doc is None:
+            missing[i] = pair
+
+    by_name: Dict[Tuple[str, str], Optional[search_index.Document]] = {}
+    for i, entry in enumerate(entries):
+        if i in docs:
+            continue
+        key = (search_index.normalize(entry.name), entry.set_code)
+        if key not in by_name:
+            by_name[key] = _by_name(game, segment, index, *key)
+        if by_name[key] is not None:
+            docs[i] = by_name[key]
+    return Matches(docs, missing)
+
+
+def load(game: str, entries: List[Entry], matches: Matches, index: Optional[search_index.SearchIndex] = None,
+         store: Optional[card_store.CardStore] = None) -> List[Optional[dict]]:
+    """The card for each matched entry, in the shape the search routes return, or None.
+
+    MTG printings the index lacks are looked up in the card store first.
+    Only the card store and the matched documents are read, so this runs in
+    a worker thread.
+    """
+    index = index if index is not None else search_index.service.index
+    if game == "mtg" and store is None:
+        store = card_store.current()
+    stored: Dict[int, bytes] = {}
+    if store is not None:
+        for i, pair in matches.missing.items():
+            card = set_codes.find_stored(store, *pair)
+            if card is not None and _front_face(card["name"]) == _front_face(entries[i].name):
+                stored[i] = store.get_json(card["id"])[:-1] + b',"game":"mtg"}'
+
+    bodies: Dict[str, Optional[dict]] = {}
+    cards: List[Optional[dict]] = []
+    for i in range(len(entries)):
+        if i in stored:
+            cards.append(json.loads(stored[i]))
+        elif i in matches.docs:
+            doc = matches.docs[i]
+            if doc.id not in bodies:
+                body = index.cards([(game, doc)])
+                bodies[doc.id] = json.loads(body[0]) if body else None
+            cards.append(bodies[doc.id])
+        else:
+            cards.append(None)
+    return cards
+
+
+def resolve(game: str, entries: List[Entry], index: Optional[search_index.SearchIndex] = None,
+            store: Optional[card_store.CardStore] = None) -> List[Optional[dict]]:
+    """match() then load(), in one call"""
+    return load(game, entries, match(game, entries, index), index, store)
+
+
+def _by_name(game: str, segment: search_index.Segment, index: search_index.SearchIndex, name: str,
+             set_code: str) -> Optional[search_index.Document]:
+    """The newest printing with this name, in the set when the list names one"""
+    name_id = segment.name_ids.get(name)
+    if name_id is None:
+        # "Fable of the Mirror-Breaker" is indexed as "... // Reflection of Kiki-Jiki"
+        for _, doc in index.search(name, games=(game,), limit=10).hits:
+            if _front_face(doc.name) == name:
+                name_id = segment.name_ids.get(search_index.normalize(doc.name))
+                break
+    if name_id is None:
+        return None
+    if set_code:
+        for code in set_codes.codes.same(game, set_code, segment.by_set):
+            slots = segment.printings(name_id, search_index.Filters(set=code))
+            if slots:
+                return segment.docs[slots[0]]
+    slots = segment.printings(name_id, search_index.NO_FILTERS)
+    return segment.docs[slots[0]] if slots else None
+
+
+def _card_line(fmt: str, card_id: str, card: dict, quantity: int) -> str:
+    """One card as exportDecklist writes it"""
+    name = card.get("name") or card_id
+    if fmt == "text":
+        return f"{quantity} {name}\n"
+    set_code = card.get("set") if isinstance(card.get("set"), str) else ""
+    number = card.get("collector_number") or ""
+    if fmt == "archidekt":
+        return f"{quantity}x {name} ({set_code.upper() or 'XXX'}) {number or '1'}\n"
+    if set_code and number:
+        return f"{quantity} {name} ({set_code.upper()}) {number}\n"
+    return f"{quantity} {name}\n"
+
+
+async def export(fmt: str, deck: dict, rows: AsyncIterator[tuple]) -> AsyncIterator[str]:
+    """A deck as exportDecklist writes it, a chunk of lines at a time.
+
+    `rows` are (card_id, card_data, quantity, category), main deck first.
+    """
+    if fmt == "mtga":
+        yield "Deck\n"
+    elif fmt == "text":
+        yield f"// {deck['name']}\n"
+        if deck.get("format"):
+            yield f"// Format: {deck['format']}\n"
+        yield f"// Total: {deck['main_total']} cards\n\n"
+    lines: List[str] = []
+    in_sideboard = False
+    async for card_id, card, quantity, category in rows:
+        if category == "sideboard" and not in_sideboard:
+            in_sideboard = True
+            lines.append("\nSideboard:\n" if fmt == "text" else "\nSideboard\n")
+        lines.append(_card_line(fmt, card_id, card or {}, quantity))
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+def generate_id(prefix: str) -> str:
+    """generateId from lib/utils.ts: prefix, base-36 milliseconds, random base-36"""
+    millis, digits = int(time.time() * 1000), []
+    while millis:
+        millis, digit = divmod(millis, 36)
+        digits.append(_BASE36[digit])
+    return f"{prefix}_{''.join(reversed(digits))}{''.join(random.choices(_BASE36, k=11))}"
+
+
+def deck_rows(entries: Iterable[Entry], cards: Iterable[Optional[dict]]) -> List[tuple]:
+    """(card_id, card_data JSON, quantity, category) per distinct card, as the deck cards route adds them"""
+    rows: Dict[str, list] = {}
+    for entry, card in zip(entries, cards):
+        if card is None or not card.get("id"):
+            continue
+        card_id = str(card["id"])
+        if card_id in rows:
+            # The route adds to an existing card's quantity, whatever the category
+            rows[card_id][2] += entry.quantity
+        else:
+            rows[card_id] = [card_id, json.dumps(card), entry.quantity, entry.category]
+    return [tuple(row) for row in rows.values()]
+
+
+class PostgresDeckStore:
+    """The deck queries of app/api/decks (asyncpg)"""
+
+    def __init__(self, dsn: str = DATABASE_URL):
+        self.dsn = dsn
+        self.pool = None
+
+    async def open(self):
+        import asyncpg
+
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=4)
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def deck(self, deck_id: str) -> Optional[dict]:
+        """Owner, visibility, name, format, game and main deck card count"""
+        row = await self.pool.fetchrow(
+            """
+            SELECT d.user_id, d.is_public, d.name, d.format, d.game,
+                   COALESCE(SUM(c.quantity) FILTER (WHERE c.category IS DISTINCT FROM 'sideboard'), 0) AS main_total
+            FROM decks d LEFT JOIN deck_cards c ON c.deck_id = d.deck_id
+            WHERE d.deck_id = $1
+            GROUP BY d.deck_id
+            """,
+            deck_id,
+        )
+        return dict(row) if row is not None else None
+
+    async def cards(self, deck_id: str) -> AsyncIterator[tuple]:
+        """The deck's cards, main deck then sideboard, by name, read with a cursor"""
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                async for row in connection.cursor(
+                    """
+                    SELECT card_id, card_data, quantity, category FROM deck_cards
+                    WHERE deck_id = $1
+                    ORDER BY category IS NOT DISTINCT FROM 'sideboard', card_data->>'name'
+                    """,
+                    deck_id, prefetch=EXPORT_CHUNK_ROWS,
+                ):
+                    yield row["card_id"], json.loads(row["card_data"]), row["quantity"], row["category"]
+
+    async def public_decks(self, game: Optional[str], fmt: Optional[str], limit: int) -> List[Tuple[dict, List[tuple]]]:
+        """The public decks /api/decks/community lists, newest first, each with its cards, in one query"""
+        rows = await self.pool.fetch(
+            """
+            WITH listed AS (
+                SELECT deck_id, name, game, format, updated_at FROM decks
+                WHERE is_public = true AND ($1::text IS NULL OR game = $1) AND ($2::text IS NULL OR format = $2)
+                ORDER BY updated_at DESC
+                LIMIT $3
+            )
+            SELECT l.deck_id, l.name, l.game, l.format, c.card_id, c.card_data, c.quantity, c.category
+            FROM listed l LEFT JOIN deck_cards c ON c.deck_id = l.deck_id
+            ORDER BY l.updated_at DESC, l.deck_id
+            """,
+            game, fmt, limit,
+        )
+        found: Dict[str, Tuple[dict, List[tuple]]] = {}
+        for row in rows:
+            deck = found.get(row["deck_id"])
+            if deck is None:
+                deck = found[row["deck_id"]] = ({"deck_id": row["deck_id"], "name": row["name"], "game": row["game"],
+                                                 "format": row["format"]}, [])
+            if row["card_id"] is not None:
+                deck[1].append((row["card_id"], json.loads(row["card_data"]), row["quantity"], row["category"]))
+        return list(found.values())
+
+    async def add_cards(self, deck_id: str, rows: List[tuple]) -> int:
+        """Add cards in one statement: existing cards get the quantity added, new ones are inserted"""
+        if not rows:
+            return 0
+        card_ids, card_data, quantities, categories = (list(column) for column in zip(*rows))
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute(
+                    """
+                    WITH incoming AS (
+                        SELECT * FROM unnest($2::text[], $3::text[], $4::jsonb[], $5::int[], $6::text[])
+                            AS i(entry_id, card_id, card_data, quantity, category)
+                    ), updated AS (
+                        UPDATE deck_cards d
+                        SET quantity = d.quantity + i.quantity, updated_at = CURRENT_TIMESTAMP
+                        FROM incoming i
+                        WHERE d.deck_id = $1 AND d.card_id = i.card_id
+                        RETURNING d.card_id
+                    )
+                    INSERT INTO deck_cards (entry_id, deck_id, card_id, card_data, quantity, category)
+                    SELECT i.entry_id, $1, i.card_id, i.card_data, i.quantity, i.category
+                    FROM incoming i
+                    WHERE i.card_id NOT IN (SELECT card_id FROM updated)
+                    """,
+                    deck_id, [generate_id("dcard") for _ in rows], card_ids, card_data, quantities, categories,
+                )
+                await connection.execute("UPDATE decks SET updated_at = CURRENT_TIMESTAMP WHERE deck_id = $1", deck_id)
+        return len(rows)
+
+
+class Decks:
+    """Deck list parsing plus the database side of imports and exports"""
+
+    def __init__(self, store=None):
+        self.store = store
+
+    @property
+    def available(self) -> bool:
+        return self.store is not None or bool(DATABASE_URL)
+
+    async def open(self):
+        if self.store is None:
+            store = PostgresDeckStore()
+            await store.open()
+            self.store = store
+
+    async def deck(self, deck_id: str) -> Optional[dict]:
+        await self.open()
+        return await self.store.deck(deck_id)
+
+    async def add(self, deck_id: str, deck_list: DeckList, cards: List[Optional[dict]]) -> int:
+        start = time.perf_counter()
+        rows = deck_rows(deck_list.entries, cards)
+        added = await self.store.add_cards(deck_id, rows)
+        eventlog.emit(logger, "deck_import", deck_id=deck_id, format=deck_list.format,
+                      entries=len(deck_list.entries), added=added,
+                      unresolved=sum(card is None for card in cards),
+                      write_ms=round((time.perf_counter() - start) * 1000, 1))
+        return added
+
+    def export(self, fmt: str, deck_id: str, deck: dict) -> AsyncIterator[str]:
+        return export(fmt, deck, self.store.cards(deck_id))
+
+    async def cards(self, deck_id: str) -> List[tuple]:
+        return [row async for row in self.store.cards(deck_id)]
+
+    async def public_decks(self, game: Optional[str], fmt: Optional[str],
+                           limit: int = COMMUNITY_LIMIT) -> List[Tuple[dict, List[tuple]]]:
+        await self.open()
+        return await self.store.public_decks(game, fmt, limit)
+
+    async def stop(self):
+        if isinstance(self.store, PostgresDeckStore):
+            await self.store.close()
+
+
+decks = Decks()
@@ -0,0 +1,262 @@
+"""Slow-request logging and on-demand profiling of the gateway event loop.
+
+Requests slower than their route's threshold are logged as a `slow_request`
+event on the `gateway.slow_requests` logger, with the time split between Next.js
+(and its queue/connect/ttfb/body phases) and the gateway itself.
+SLOW_REQUEST_MS sets the default threshold; SLOW_REQUEST_ROUTES overrides it
+per route template, e.g. "/api/prices/update=30000,/api/search=250".
+
+SamplingProfiler samples the event loop thread's Python stack from a helper
+thread and aggregates the samples as collapsed stacks, the input format of
+flamegraph.pl, speedscope and inferno. While it runs, a probe task measures
+how late the event loop wakes up timers, which is the delay every other
+callback waiting on the loop sees.
+
+LoopMonitor measures that lag continuously into a histogram. With
+GATEWAY_DEBUG set, a watchdog thread also logs the event loop's stack
+whenever a single callback blocks the loop for longer than
+LOOP_BLOCK_THRESHOLD_MS, which points straight at the synchronous code
+responsible.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter as StackCounter
+from typing import Dict, List, Optional
+
+import eventlog
+
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "1000"))
+SLOW_REQUEST_ROUTES = os.environ.get("SLOW_REQUEST_ROUTES", "")
+
+PROFILE_INTERVAL = 0.005
+PROFILE_MAX_SECONDS = 60.0
+LAG_PROBE_INTERVAL = 0.01
+
+LOOP_MONITOR_INTERVAL = float(os.environ.get("LOOP_MONITOR_INTERVAL_MS", "100")) / 1000
+LOOP_BLOCK_THRESHOLD = float(os.environ.get("LOOP_BLOCK_THRESHOLD_MS", "100")) / 1000
+DEBUG = os.environ.get("GATEWAY_DEBUG", "").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger("gateway.slow_requests")
+loop_logger = logging.getLogger("gateway.event_loop")
+
+
+def parse_thresholds(spec: str) -> Dict[str, float]:
+    """Parse "route=ms,route=ms" into route -> threshold in seconds"""
+    thresholds = {}
+    for item in spec.split(","):
+        route, sep, value = item.strip().rpartition("=")
+        if not sep or not route:
+            continue
+        try:
+            thresholds[route.strip()] = float(value) / 1000
+        except ValueError:
+            continue
+    return thresholds
+
+
+class SlowRequestLog:
+    def __init__(self, default_ms: float = SLOW_REQUEST_MS, routes: Optional[Dict[str, float]] = None):
+        self.default = default_ms / 1000
+        self.routes = routes if routes is not None else parse_thresholds(SLOW_REQUEST_ROUTES)
+
+    def threshold(self, route: str) -> float:
+        return self.routes.get(route, self.default)
+
+    def observe(self, scope, route: str, status: int, elapsed: float, upstream: Optional[float]) -> bool:
+        """Log the request if it was slow; returns whether it was"""
+        threshold = self.threshold(route)
+        if elapsed < threshold:
+            return False
+        state = scope.get("state", {})
+        record = {
+            "route": route,
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 3),
+            "threshold_ms": round(threshold * 1000, 3),
+        }
+        if upstream is not None:
+            record["upstream_ms"] = round(upstream * 1000, 3)
+            record["gateway_ms"] = round(max(elapsed - upstream, 0.0) * 1000, 3)
+        trace = state.get("trace")
+        if trace is not None:
+            record["request_id"] = trace.request_id
+            record["trace_id"] = trace.trace_id
+            phases = trace.phase_durations_ms(state.get("upstream_start_ns"))
+            if phases:
+                record["phases_ms"] = phases
+        eventlog.emit(logger, "slow_request", logging.WARNING, **record)
+        return True
+
+
+slow_log = SlowRequestLog()
+
+
+def _short_filename(filename: str) -> str:
+    marker = filename.rfind("site-packages" + os.sep)
+    if marker != -1:
+        return filename[marker + len("site-packages") + 1:]
+    return os.path.basename(filename)
+
+
+def format_stack(frame) -> str:
+    """Collapsed-stack form of a frame's call stack, outermost call first"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({_short_filename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":"))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def lag_summary(lags: List[float]) -> Dict[str, float]:
+    """Count, mean, p50, p99 and max of lag samples, in milliseconds"""
+    if not lags:
+        return {"samples": 0}
+    ordered = sorted(lags)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        "samples": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": pick(0.50),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval; one profile at a time"""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.running = False
+
+    def _sample(self, thread_id: int, stacks: StackCounter, stop: threading.Event):
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                stacks[format_stack(frame)] += 1
+
+    async def _probe_lag(self, lags: List[float], stop: threading.Event):
+        while not stop.is_set():
+            expected = time.perf_counter() + LAG_PROBE_INTERVAL
+            await asyncio.sleep(LAG_PROBE_INTERVAL)
+            lags.append(max(time.perf_counter() - expected, 0.0))
+
+    async def profile(self, seconds: float) -> dict:
+        """Profile the calling event loop for `seconds`.
+
+        Returns {"stacks": {collapsed stack: samples}, "samples": n,
+        "loop_lag": lag_summary(...)}.
+        """
+        if self.running:
+            raise RuntimeError("A profile is already running")
+        self.running = True
+        stacks: StackCounter = StackCounter()
+        lags: List[float] = []
+        stop = threading.Event()
+        sampler = threading.Thread(
+            target=self._sample, args=(threading.get_ident(), stacks, stop),
+            name="gateway-profiler", daemon=True,
+        )
+        probe = asyncio.get_running_loop().create_task(self._probe_lag(lags, stop))
+        sampler.start()
+        try:
+            await asyncio.sleep(min(seconds, PROFILE_MAX_SECONDS))
+        finally:
+            stop.set()
+            await asyncio.to_thread(sampler.join)
+            await probe
+            self.running = False
+        return {"stacks": dict(stacks), "samples": sum(stacks.values()), "loop_lag": lag_summary(lags)}
+
+
+def collapsed(stacks: Dict[str, int]) -> str:
+    """Render {stack: count} as "frame;frame;frame count" lines"""
+    lines = [f"{stack} {count}" for stack, count in sorted(stacks.items(), key=lambda item: -item[1])]
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+profiler = SamplingProfiler()
+
+
+class LoopMonitor:
+    """Background event loop lag probe with an optional blocked-loop watchdog"""
+
+    def __init__(self, lag_histogram, blocked_counter=None, interval: float = LOOP_MONITOR_INTERVAL,
+                 block_threshold: float = LOOP_BLOCK_THRESHOLD, debug: bool = DEBUG):
+        self.lag_histogram = lag_histogram
+        self.blocked_counter = blocked_counter
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.debug = debug
+        # perf_counter() of the probe's last wake-up, read by the watchdog thread
+        self.heartbeat = time.perf_counter()
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self.heartbeat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._probe())
+        if self.debug:
+            self._watchdog = threading.Thread(
+                target=self._watch, args=(asyncio.get_running_loop(), threading.get_ident()),
+                name="gateway-loop-watchdog", daemon=True,
+            )
+            self._watchdog.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+
+    async def _probe(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self.lag_histogram.observe((), max(now - expected, 0.0))
+            self.heartbeat = now
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, thread_id: int):
+        reported = None
+        while not self._stop.wait(self.block_threshold / 2):
+            beat = self.heartbeat
+            blocked = time.perf_counter() - beat - self.interval
+            if blocked < self.block_threshold or beat == reported:
+                continue
+            # Report each stall once, with the stack of whatever is running now
+            reported = beat
+            frame = sys._current_frames().get(thread_id)
+            if self.blocked_counter is not None:
+                # Metrics belong to the loop thread; the count lands once the stall ends
+                try:
+                    loop.call_soon_threadsafe(self.blocked_counter.inc)
+                except RuntimeError:
+                    pass
+            # The event goes out now, while the loop is still stuck; eventlog is safe from any thread
+            eventlog.emit(
+                loop_logger, "event_loop_blocked", logging.WARNING,
+                blocked_ms=round(blocked * 1000, 3),
+                threshold_ms=round(self.block_threshold * 1000, 3),
+                stack="".join(traceback.format_stack(frame)) if frame is not None else "",
+            )
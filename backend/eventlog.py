@@ -0,0 +1,234 @@
+"""Structured JSON logging that never blocks the event loop.
+
+Loggers under `gateway.` (gateway.access, gateway.signaling,
+gateway.slow_requests, gateway.event_loop) hand records to a bounded queue;
+a writer thread formats them as one JSON object per line and writes them in
+batches to stdout or, with LOG_FILE, to a size-rotated file. When the queue
+is full, records are dropped and counted rather than waited on.
+
+Use `emit(logger, "event_name", **fields)` for events, from the event loop
+or any other thread. High-volume events
+can be sampled with LOG_SAMPLE_RATES, e.g. "signal.ice_candidate=0.01" keeps
+one in a hundred; kept records carry `sample_rate` so counts can be scaled
+back up.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FILE = os.environ.get("LOG_FILE", "")
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", "5"))
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE = int(os.environ.get("LOG_BATCH_SIZE", "256"))
+LOG_SAMPLE_RATES = os.environ.get("LOG_SAMPLE_RATES", "signal.ice_candidate=0.01,signal.ping=0")
+ACCESS_LOG = os.environ.get("ACCESS_LOG", "1").lower() not in ("0", "false", "no")
+
+root_logger = logging.getLogger("gateway")
+access_logger = logging.getLogger("gateway.access")
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse "event=rate,event=rate" with rates between 0.0 and 1.0"""
+    rates = {}
+    for item in spec.split(","):
+        event, sep, value = item.strip().rpartition("=")
+        if not sep or not event:
+            continue
+        try:
+            rates[event.strip()] = min(max(float(value), 0.0), 1.0)
+        except ValueError:
+            continue
+    return rates
+
+
+class Sampler:
+    """Keeps exactly `rate` of each event's records, spread evenly"""
+
+    def __init__(self, rates: Dict[str, float]):
+        self.rates = rates
+        self.credit: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def keep(self, event: str, rate: float) -> bool:
+        if rate <= 0.0:
+            return False
+        with self._lock:
+            credit = self.credit.get(event, 1.0 - rate) + rate
+            if credit >= 1.0:
+                self.credit[event] = credit - 1.0
+                return True
+            self.credit[event] = credit
+            return False
+
+
+sampler = Sampler(parse_sample_rates(LOG_SAMPLE_RATES))
+
+
+def emit(logger: logging.Logger, event: str, level: int = logging.INFO, **fields):
+    """Log a structured event; sampling is decided before a record is built"""
+    if not logger.isEnabledFor(level):
+        return
+    rate = sampler.rates.get(event)
+    if rate is not None:
+        if not sampler.keep(event, rate):
+            return
+        fields["sample_rate"] = rate
+    # makeRecord + handle skips logger.log's caller lookup, a stack walk per record
+    logger.handle(logger.makeRecord(logger.name, level, "", 0, event, None, None, extra={"fields": fields}))
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+                  + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        data.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, separators=(",", ":"), default=str)
+
+
+class StreamSink:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def write(self, data: str):
+        self.stream.write(data)
+        self.stream.flush()
+
+    def close(self):
+        pass
+
+
+class RotatingFileSink(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler that writes whole batches and rotates between them"""
+
+    def __init__(self, filename: str, max_bytes: int = LOG_MAX_BYTES, backup_count: int = LOG_BACKUP_COUNT):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+
+    def write(self, data: str):
+        if self.stream is None:
+            self.stream = self._open()
+        if self.maxBytes and self.stream.tell() and self.stream.tell() + len(data) > self.maxBytes:
+            self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+        self.stream.write(data)
+        self.stream.flush()
+
+
+class QueueHandler(logging.Handler):
+    """Enqueues records without blocking; a writer thread formats and batches them"""
+
+    def __init__(self, sink, maxsize: int = LOG_QUEUE_SIZE, batch_size: int = LOG_BATCH_SIZE):
+        super().__init__()
+        self.sink = sink
+        self.queue: "queue.Queue[Optional[logging.LogRecord]]" = queue.Queue(maxsize)
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.setFormatter(JsonFormatter())
+        self._writer: Optional[threading.Thread] = None
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        # The queue does its own locking; skip the handler lock
+        if self.filter(record):
+            self.emit(record)
+            return True
+        return False
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        self._writer = threading.Thread(target=self._run, name="gateway-log-writer", daemon=True)
+        self._writer.start()
+
+    def stop(self):
+        """Write everything queued so far and stop the writer thread"""
+        if self._writer is None:
+            return
+        # The sentinel may have to wait for room; the writer is draining
+        self.queue.put(None)
+        self._writer.join()
+        self._writer = None
+        self.sink.close()
+
+    def _run(self):
+        # Write whatever has queued up since the last write as one batch: one
+        # write per record when idle, large batches under load
+        while True:
+            record = self.queue.get()
+            if record is None:
+                return
+            batch = [record]
+            stopping = False
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+            self._write(batch)
+            if stopping:
+                return
+
+    def _write(self, batch: List[logging.LogRecord]):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        try:
+            self.sink.write("\n".join(lines) + "\n")
+        except Exception:
+            self.dropped += len(lines)
+
+
+handler: Optional[QueueHandler] = None
+
+
+def start():
+    """Attach the queue handler to the `gateway` logger and start writing"""
+    global handler
+    if handler is not None:
+        return
+    sink = RotatingFileSink(LOG_FILE) if LOG_FILE else StreamSink()
+    handler = QueueHandler(sink)
+    handler.start()
+    root_logger.addHandler(handler)
+    root_logger.setLevel(LOG_LEVEL)
+
+
+def stop():
+    """Flush queued records and detach the handler (blocks; call from a thread)"""
+    global handler
+    if handler is None:
+        return
+    root_logger.removeHandler(handler)
+    handler.stop()
+    handler = None
+
+
+def dropped() -> int:
+    return handler.dropped if handler is not None else 0
@@ -0,0 +1,201 @@
+"""Gateway-side JWT verification for proxied /api/* requests.
+
+Mirrors lib/auth.ts: mobile clients send `Authorization: Bearer <jwt>` signed
+with JWT_SECRET (HS256, jsonwebtoken defaults) and web clients send an opaque
+`session_token` cookie that only the database can resolve. The gateway can
+therefore verify bearer tokens itself, reject requests to protected routes
+that carry no usable credentials, and tell Next.js who the caller is.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+# Must match config.jwt.secret in lib/config.ts
+JWT_SECRET = os.environ.get("JWT_SECRET", "default-secret-change-me")
+
+GATEWAY_AUTH_ENABLED = os.environ.get("GATEWAY_AUTH_ENABLED", "true").lower() == "true"
+
+# Trusted identity headers injected for Next.js (see getGatewayUserId in lib/auth.ts).
+# Any client-supplied copies are stripped before proxying.
+USER_ID_HEADER = "x-gateway-user-id"
+USER_EXPIRES_HEADER = "x-gateway-user-expires"
+USER_SIGNATURE_HEADER = "x-gateway-user-signature"
+TRUSTED_HEADERS = (USER_ID_HEADER, USER_EXPIRES_HEADER, USER_SIGNATURE_HEADER)
+
+# Routes whose every handler returns 401 without a user. Matched on path
+# segments, so "api/decks" covers "api/decks/abc/cards" but not "api/decksx".
+PROTECTED_API_PREFIXES = (
+    "api/admin/migrate",
+    "api/admin/orders",
+    "api/admin/posts",
+    "api/admin/shop",
+    "api/admin/stats",
+    "api/admin/users",
+    "api/auth/change-password",
+    "api/auth/me",
+    "api/bookmarks",
+    "api/calls",
+    "api/collection",
+    "api/convention",
+    "api/decks",
+    "api/favorites",
+    "api/friends",
+    "api/groups",
+    "api/livekit",
+    "api/marketplace/my-listings",
+    "api/messages",
+    "api/notifications",
+    "api/prices/snapshot",
+    "api/prices/update",
+    "api/profile",
+    "api/push-tokens",
+    "api/referral",
+    "api/reputation",
+    "api/sealed",
+    "api/trades",
+    "api/upload",
+    "api/users",
+)
+
+# Public subtrees inside the protected prefixes above
+PUBLIC_API_PREFIXES = (
+    "api/collection/public",
+    "api/decks/community",
+    "api/sealed/search",
+    "api/trades/ratings",
+    "api/users/search/",
+)
+
+PROTECTED_API_EXACT = {"api/feed"}
+
+# How long a verification result may be reused, in seconds
+TOKEN_CACHE_TTL = float(os.environ.get("GATEWAY_AUTH_CACHE_TTL", "300"))
+TOKEN_CACHE_NEGATIVE_TTL = float(os.environ.get("GATEWAY_AUTH_NEGATIVE_TTL", "60"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get("GATEWAY_AUTH_CACHE_SIZE", "10000"))
+
+
+def _segment_prefix(path: str, prefix: str) -> bool:
+    if prefix.endswith("/"):
+        return path.startswith(prefix)
+    return path == prefix or path.startswith(prefix + "/")
+
+
+def is_protected_path(path: str) -> bool:
+    """Return True if every method on this API path requires a user"""
+    path = path.strip("/")
+    if path in PROTECTED_API_EXACT:
+        return True
+    for prefix in PUBLIC_API_PREFIXES:
+        if _segment_prefix(path, prefix):
+            return False
+    for prefix in PROTECTED_API_PREFIXES:
+        if _segment_prefix(path, prefix):
+            return True
+    return False
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def decode_jwt(token: str, secret: str = JWT_SECRET, now: Optional[float] = None) -> Optional[dict]:
+    """Verify an HS256 JWT and return its claims, or None if it is not valid"""
+    try:
+        header_b64, payload_b64, signature_b64 = token.split(".")
+        header = json.loads(_b64decode(header_b64))
+        if header.get("alg") != "HS256":
+            return None
+        expected = hmac.new(
+            secret.encode(), f"{header_b64}.{payload_b64}".encode(), hashlib.sha256
+        ).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature_b64)):
+            return None
+        claims = json.loads(_b64decode(payload_b64))
+    except (ValueError, TypeError):
+        return None
+
+    if not isinstance(claims, dict) or not claims.get("user_id"):
+        return None
+    now = time.time() if now is None else now
+    if "exp" in claims and now >= claims["exp"]:
+        return None
+    if "nbf" in claims and now < claims["nbf"]:
+        return None
+    return claims
+
+
+class TokenCache:
+    """Bounded cache of bearer token -> (user_id or None, cache expiry)"""
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: Dict[str, Tuple[Optional[str], float]] = {}
+
+    def verify(self, token: str) -> Optional[str]:
+        now = time.time()
+        entry = self.entries.get(token)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+
+        claims = decode_jwt(token, now=now)
+        if claims is None:
+            user_id, expires = None, now + TOKEN_CACHE_NEGATIVE_TTL
+        else:
+            user_id = str(claims["user_id"])
+            expires = min(claims.get("exp", now + TOKEN_CACHE_TTL), now + TOKEN_CACHE_TTL)
+
+        if len(self.entries) >= self.max_entries:
+            # Dicts keep insertion order, so this drops the oldest entry
+            del self.entries[next(iter(self.entries))]
+        self.entries[token] = (user_id, expires)
+        return user_id
+
+
+token_cache = TokenCache()
+
+
+def sign_user(user_id: str, expires: int, secret: str = JWT_SECRET) -> str:
+    return hmac.new(secret.encode(), f"{user_id}.{expires}".encode(), hashlib.sha256).hexdigest()
+
+
+def trusted_user_headers(user_id: str) -> Dict[str, str]:
+    """Headers that let Next.js skip JWT verification for this request"""
+    expires = int(time.time() + TOKEN_CACHE_TTL)
+    return {
+        USER_ID_HEADER: user_id,
+        USER_EXPIRES_HEADER: str(expires),
+        USER_SIGNATURE_HEADER: sign_user(user_id, expires),
+    }
+
+
+def _has_session_cookie(cookie_header: str) -> bool:
+    for part in cookie_header.split(";"):
+        name, _, value = part.strip().partition("=")
+        if name == "session_token" and value:
+            return True
+    return False
+
+
+def authenticate(path: str, method: str, authorization: Optional[str], cookie: Optional[str]):
+    """Decide what to do with a proxied request.
+
+    Returns (reject, user_id): reject is True when the request should get a
+    401 without reaching Next.js; user_id is set when a bearer token verified.
+    """
+    user_id = None
+    if authorization and authorization.startswith("Bearer "):
+        user_id = token_cache.verify(authorization[7:])
+
+    if user_id or not GATEWAY_AUTH_ENABLED or method == "OPTIONS":
+        return False, user_id
+    if not is_protected_path(path):
+        return False, None
+
+    # Session cookies are opaque; let Next.js check them against user_sessions
+    if cookie and _has_session_cookie(cookie):
+        return False, None
+    return True, None
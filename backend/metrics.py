@@ -0,0 +1,258 @@
+"""Prometheus-style metrics for the gateway.
+
+Everything runs on the event loop thread, so metric updates are plain dict
+and list operations with no locks; other threads, like the loop watchdog,
+hand their updates to the loop with call_soon_threadsafe. Histograms keep per-bucket counts and only
+turn them into cumulative Prometheus buckets when /metrics is scraped.
+"""
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import diagnostics
+import eventlog
+import routes
+
+LabelValues = Tuple[str, ...]
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOOP_LAG_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+OVERHEAD_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, labels: LabelValues = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+
+
+class Gauge:
+    """A gauge set directly or, with `collect`, read when scraped"""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Tuple[str, ...] = (),
+        collect: Optional[Callable[[], Dict[LabelValues, float]]] = None,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.collect = collect
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, labels: LabelValues = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, labels: LabelValues = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, labels: LabelValues, value: float):
+        self.values[labels] = value
+
+    def render(self) -> Iterable[str]:
+        values = self.collect() if self.collect else self.values
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in values.items():
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self.series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, labels: LabelValues, value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(series[-1])}"
+            yield f"{self.name}_count{_format_labels(self.labels, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+requests_total = registry.register(Counter(
+    "gateway_requests_total", "HTTP requests handled by the gateway",
+    ("route", "method", "status_class"),
+))
+request_duration = registry.register(Histogram(
+    "gateway_request_duration_seconds", "Total time spent handling a request", ("route",),
+))
+upstream_duration = registry.register(Histogram(
+    "gateway_upstream_duration_seconds", "Time spent waiting on Next.js for a request", ("route",),
+))
+overhead_duration = registry.register(Histogram(
+    "gateway_overhead_seconds", "Request time not spent waiting on Next.js", ("route",),
+    buckets=OVERHEAD_BUCKETS,
+))
+request_bytes = registry.register(Counter(
+    "gateway_request_bytes_total", "Request body bytes received", ("route",),
+))
+response_bytes = registry.register(Counter(
+    "gateway_response_bytes_total", "Response body bytes sent", ("route",),
+))
+in_flight = registry.register(Gauge(
+    "gateway_requests_in_flight", "HTTP requests currently being handled",
+))
+in_flight.set((), 0)
+event_loop_lag = registry.register(Histogram(
+    "gateway_event_loop_lag_seconds", "How late the event loop ran a timer callback", buckets=LOOP_LAG_BUCKETS,
+))
+event_loop_blocked = registry.register(Counter(
+    "gateway_event_loop_blocked_total", "Callbacks that blocked the event loop past the threshold (debug mode)",
+))
+slow_requests = registry.register(Counter(
+    "gateway_slow_requests_total", "Requests slower than their route's slow-request threshold", ("route",),
+))
+
+
+def route_label(scope) -> str:
+    """Next.js route template for the request, else the gateway route it hit"""
+    template = routes.route_table.template_for(scope["path"])
+    if template is not None:
+        return template
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route request metrics, the slow-request
+    log and the access log"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        bytes_in = 0
+        bytes_out = 0
+        in_flight.values[()] += 1
+
+        async def receive_wrapper():
+            nonlocal bytes_in
+            message = await receive()
+            if message["type"] == "http.request":
+                bytes_in += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status, bytes_out
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                bytes_out += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            in_flight.values[()] -= 1
+            elapsed = time.perf_counter() - start
+            route = route_label(scope)
+            status_class = STATUS_CLASSES[status // 100 - 1] if 100 <= status < 600 else "other"
+            requests_total.inc((route, scope["method"], status_class))
+            request_duration.observe((route,), elapsed)
+            upstream = scope.get("state", {}).get("upstream_seconds")
+            if upstream is not None:
+                upstream_duration.observe((route,), upstream)
+                overhead_duration.observe((route,), max(elapsed - upstream, 0.0))
+            else:
+                overhead_duration.observe((route,), elapsed)
+            if bytes_in:
+                request_bytes.inc((route,), bytes_in)
+            if bytes_out:
+                response_bytes.inc((route,), bytes_out)
+            if diagnostics.slow_log.observe(scope, route, status, elapsed, upstream):
+                slow_requests.inc((route,))
+            if eventlog.ACCESS_LOG and eventlog.access_logger.isEnabledFor(logging.INFO):
+                trace = scope.get("state", {}).get("trace")
+                client = scope.get("client")
+                eventlog.emit(
+                    eventlog.access_logger, "http_request",
+                    route=route,
+                    method=scope["method"],
+                    path=scope["path"],
+                    status=status,
+                    duration_ms=round(elapsed * 1000, 3),
+                    upstream_ms=round(upstream * 1000, 3) if upstream is not None else None,
+                    bytes_in=bytes_in,
+                    bytes_out=bytes_out,
+                    client=client[0] if client else None,
+                    request_id=trace.request_id if trace is not None else None,
+                )
@@ -0,0 +1,551 @@
+"""Collection valuation and the portfolio value series behind the value charts.
+
+/api/prices/update values collections one user at a time, summing price
+times quantity in a JavaScript loop, and /api/prices/snapshot reads a
+user's rows from collection_value_snapshots each time a profile page draws
+its chart. Here every collection_items row and every cards_cache price are
+read once, as columns. Card keys are matched to prices with one sort and a
+binary search (np.searchsorted), and the totals per user and game come
+from one bincount. Today's collection_value_snapshots rows for all users
+are then written with a single INSERT ... SELECT FROM unnest.
+
+Each valuation is also merged into a columnar series that is held in
+memory and saved to PORTFOLIO_STORE, an .npz file replaced atomically. The
+series has one row per user and day, holding the total, the card count and
+the value of each game. Rows are sorted by user then day, with an offsets
+array over users, so one user's series is a slice and a date range within
+it is two binary searches. No query touches the database. The prices of
+the last PORTFOLIO_PRICE_DAYS valuations are kept as a days x cards
+matrix. Together with each user's holdings from the latest valuation, that
+gives the cards whose value moved most in a collection.
+
+When the file does not exist yet, the series is seeded from the totals
+already in collection_value_snapshots. The Next.js cron route and the
+price worker CLI keep writing that table on their own. So on load, and
+every PORTFOLIO_SYNC_INTERVAL seconds after that, rows dated after the
+series' last day are added to it as totals only. Until a valuation runs,
+charts therefore follow the cron.
+
+Valuations run on POST /_gateway/jobs/valuation and after every price
+refresh the gateway runs. With PORTFOLIO_DAILY_VALUATION set, the sync loop
+also runs one whenever none has run yet today. Only one process should
+have this set, because every run reads all of collection_items.
+
+    GET  /api/prices/snapshot                                 chart points, as the Next.js route
+    GET  /api/prices/portfolio?days=&resolution=&movers=      daily|weekly|monthly, per game, movers
+    POST /_gateway/jobs/valuation                             value every collection now
+"""
+import asyncio
+import datetime
+import logging
+import os
+import time
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+import eventlog
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "")
+PORTFOLIO_STORE = os.environ.get(
+    "PORTFOLIO_STORE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "portfolio.npz"))
+# Valuations whose card prices are kept for movers
+PORTFOLIO_PRICE_DAYS = int(os.environ.get("PORTFOLIO_PRICE_DAYS", "35"))
+# Seconds between checks for collection_value_snapshots rows newer than the series; 0 disables
+PORTFOLIO_SYNC_INTERVAL = float(os.environ.get("PORTFOLIO_SYNC_INTERVAL", "300"))
+PORTFOLIO_DAILY_VALUATION = os.environ.get("PORTFOLIO_DAILY_VALUATION", "").lower() in ("1", "true", "yes")
+# Rows per cursor fetch when reading collection_items
+VALUATION_FETCH_ROWS = 10000
+
+RESOLUTIONS = ("daily", "weekly", "monthly")
+
+logger = logging.getLogger("gateway.portfolio")
+
+EPOCH = datetime.date(1970, 1, 1)
+
+
+def day_number(date: datetime.date) -> int:
+    return (date - EPOCH).days
+
+
+def dates(days: np.ndarray) -> List[str]:
+    return days.astype("datetime64[D]").astype(str).tolist()
+
+
+def buckets(days: np.ndarray, resolution: str) -> np.ndarray:
+    """The period of each day: itself, its Monday-based week or its month"""
+    if resolution == "weekly":
+        # 1970-01-01 was a Thursday
+        return (days + 3) // 7
+    if resolution == "monthly":
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    return days
+
+
+def card_keys(games: Sequence[str], card_ids: Sequence[str]) -> np.ndarray:
+    return np.char.add(np.char.add(np.asarray(games, dtype=str), ":"), np.asarray(card_ids, dtype=str))
+
+
+def factorize(keys: Sequence) -> Tuple[list, np.ndarray]:
+    """The sorted distinct keys and each key's index among them.
+
+    Hashing finds the distinct keys and only those are sorted; np.unique
+    would sort every row's string, which costs more than the rest of a
+    valuation together.
+    """
+    first = {key: i for i, key in enumerate(dict.fromkeys(keys))}
+    codes = np.fromiter(map(first.__getitem__, keys), dtype=np.int64, count=len(keys))
+    distinct = sorted(first)
+    rank = np.empty(len(distinct), dtype=np.int64)
+    rank[[first[key] for key in distinct]] = np.arange(len(distinct))
+    return distinct, rank[codes]
+
+
+class Valuation(NamedTuple):
+    """Every collection valued on one day"""
+    day: int
+    users: np.ndarray            # sorted user IDs
+    games: np.ndarray            # sorted games
+    values: np.ndarray           # EUR per user and game, NaN for games without cards
+    counts: np.ndarray           # collection_items rows per user
+    cards: np.ndarray            # sorted "game:card_id" keys
+    names: np.ndarray            # per card
+    prices: np.ndarray           # EUR per card, NaN when unpriced
+    holding_offsets: np.ndarray  # per user, into the two below
+    holding_cards: np.ndarray
+    holding_quantities: np.ndarray
+
+    @property
+    def totals(self) -> np.ndarray:
+        return np.round(np.nansum(self.values, axis=1), 2)
+
+
+def value(day: int, user_ids: Sequence[str], card_ids: Sequence[str], games: Sequence[str],
+          quantities: Sequence[Optional[int]], names: Sequence[Optional[str]],
+          price_card_ids: Sequence[str], price_games: Sequence[str],
+          price_values: Sequence[Optional[float]]) -> Valuation:
+    """Value collection_items rows (as columns) against cards_cache prices (as columns).
+
+    As the snapshot query did: a missing or zero quantity counts once, and
+    cards without a price are worth nothing.
+    """
+    users, user_index = factorize(user_ids)
+    users = np.asarray(users, dtype=str)
+    game_names, game_index = factorize(games)
+    game_names = np.asarray(game_names, dtype=str)
+    ids, id_index = factorize(card_ids)
+    # A card is its (card_id, game) pair; pairs are factorised as integers
+    pairs, card_index = np.unique(id_index * len(game_names) + game_index, return_inverse=True)
+    cards = card_keys(game_names[pairs % max(len(game_names), 1)],
+                      np.asarray(ids, dtype=str)[pairs // max(len(game_names), 1)])
+    # Sorted as "game:card_id" strings, for the searches below and in merged()
+    order = np.argsort(cards, kind="stable")
+    rank = np.empty(len(cards), dtype=np.int64)
+    rank[order] = np.arange(len(cards))
+    cards, card_index = cards[order], rank[card_index]
+    quantity = np.array([q or 1 for q in quantities], dtype=np.int64)
+
+    # The join: price keys sorted once, each card found by binary search
+    price_keys = card_keys(price_games, price_card_ids)
+    order = np.argsort(price_keys, kind="stable")
+    price_keys = price_keys[order]
+    price_table = np.array([np.nan if p is None else p for p in price_values], dtype=np.float64)[order]
+    prices = np.full(len(cards), np.nan)
+    if len(price_keys):
+        position = np.minimum(np.searchsorted(price_keys, cards), len(price_keys) - 1)
+        found = price_keys[position] == cards
+        prices[found] = price_table[position[found]]
+
+    line = np.nan_to_num(prices[card_index]) * quantity
+    count, width = len(users), len(game_names)
+    cells = user_index * width + game_index
+    values = np.bincount(cells, weights=line, minlength=count * width).astype(np.float64).reshape(count, width)
+    # NaN for the games a user has no cards of
+    values[np.bincount(cells, minlength=count * width).reshape(count, width) == 0] = np.nan
+    counts = np.bincount(user_index, minlength=count)
+
+    # Holdings: quantity per (user, card), rows of one card added together
+    holding, holding_index = np.unique(user_index * len(cards) + card_index, return_inverse=True)
+    holding_quantities = np.bincount(holding_index, weights=quantity).astype(np.int32)
+    holding_users = holding // max(len(cards), 1)
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(holding_users, minlength=count))))
+    card_names = np.empty(len(cards), dtype=object)
+    card_names[card_index] = [name or "" for name in names]
+    return Valuation(day, users, game_names, np.round(values, 2), counts, cards, card_names.astype(str),
+                     prices.astype(np.float32), offsets.astype(np.int64),
+                     (holding % max(len(cards), 1)).astype(np.int32), holding_quantities)
+
+
+class Portfolio:
+    """The value series of every user, plus recent prices and the latest holdings"""
+
+    def __init__(self, users=None, offsets=None, days=None, totals=None, counts=None, games=None,
+                 game_values=None, cards=None, names=None, price_days=None, prices=None,
+                 holding_offsets=None, holding_cards=None, holding_quantities=None):
+        self.users = users if users is not None else np.array([], dtype=str)
+        self.offsets = offsets if offsets is not None else np.zeros(len(self.users) + 1, dtype=np.int64)
+        self.days = days if days is not None else np.array([], dtype=np.int32)
+        self.totals = totals if totals is not None else np.array([], dtype=np.float64)
+        self.counts = counts if counts is not None else np.array([], dtype=np.int32)
+        self.games = games if games is not None else np.array([], dtype=str)
+        self.game_values = game_values if game_values is not None else \
+            np.full((len(self.days), len(self.games)), np.nan)
+        self.cards = cards if cards is not None else np.array([], dtype=str)
+        self.names = names if names is not None else np.array([], dtype=str)
+        self.price_days = price_days if price_days is not None else np.array([], dtype=np.int32)
+        self.prices = prices if prices is not None else np.zeros((0, len(self.cards)), dtype=np.float32)
+        self.holding_offsets = holding_offsets if holding_offsets is not None else \
+            np.zeros(len(self.users) + 1, dtype=np.int64)
+        self.holding_cards = holding_cards if holding_cards is not None else np.array([], dtype=np.int32)
+        self.holding_quantities = holding_quantities if holding_quantities is not None else \
+            np.array([], dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    @classmethod
+    def from_history(cls, user_ids: Sequence[str], days: Sequence[int], totals: Sequence[float],
+                     counts: Sequence[int]) -> "Portfolio":
+        """A series of totals only, as collection_value_snapshots has them"""
+        users, user_index = np.unique(np.asarray(user_ids, dtype=str), return_inverse=True)
+        days = np.asarray(days, dtype=np.int32)
+        order = np.lexsort((days, user_index))
+        return cls(users=users, offsets=_offsets(user_index[order], len(users)), days=days[order],
+                   totals=np.asarray(totals, dtype=np.float64)[order], counts=np.asarray(counts, dtype=np.int32)[order])
+
+    @classmethod
+    def load(cls, path: str) -> Optional["Portfolio"]:
+        try:
+            with np.load(path) as data:
+                return cls(**{name: data[name] for name in data.files})
+        except FileNotFoundError:
+            return None
+
+    def save(self, path: str):
+        """Write next to `path`, then swap it in"""
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as file:
+            np.savez(file, **vars(self))
+        os.replace(tmp, path)
+
+    def merged(self, valuation: Valuation, price_days: int = PORTFOLIO_PRICE_DAYS) -> "Portfolio":
+        """A new Portfolio with the valuation's day replacing any earlier rows for that day"""
+        users = np.union1d(self.users, valuation.users)
+        games = np.union1d(self.games, valuation.games)
+        keep = self.days != valuation.day
+        old_users = self._row_users(users)
+        old_values = np.full((len(self.days), len(games)), np.nan)
+        old_values[:, np.searchsorted(games, self.games)] = self.game_values
+        new_values = np.full((len(valuation.users), len(games)), np.nan)
+        new_values[:, np.searchsorted(games, valuation.games)] = valuation.values
+        user_index = np.concatenate((old_users[keep], np.searchsorted(users, valuation.users)))
+        days = np.concatenate((self.days[keep], np.full(len(valuation.users), valuation.day, dtype=np.int32)))
+        order = np.lexsort((days, user_index))
+
+        # Price history re-keyed to the new valuation's cards; older days dropped
+        position = np.minimum(np.searchsorted(self.cards, valuation.cards), max(len(self.cards) - 1, 0))
+        found = self.cards[position] == valuation.cards if len(self.cards) else np.zeros(len(valuation.cards), bool)
+        history_keep = self.price_days != valuation.day
+        history = np.full((int(history_keep.sum()), len(valuation.cards)), np.nan, dtype=np.float32)
+        history[:, found] = self.prices[history_keep][:, position[found]]
+        history_days = np.append(self.price_days[history_keep], np.int32(valuation.day))
+        history = np.vstack((history, valuation.prices[None, :]))
+        recent = np.argsort(history_days, kind="stable")[-price_days:]
+
+        holdings = np.zeros(len(users), dtype=np.int64)
+        holdings[np.searchsorted(users, valuation.users)] = np.diff(valuation.holding_offsets)
+        return Portfolio(
+            users=users, offsets=_offsets(user_index[order], len(users)), days=days[order],
+            totals=np.concatenate((self.totals[keep], valuation.totals))[order],
+            counts=np.concatenate((self.counts[keep], valuation.counts.astype(np.int32)))[order],
+            games=games, game_values=np.vstack((old_values[keep], new_values))[order],
+            cards=valuation.cards, names=valuation.names,
+            price_days=history_days[recent].astype(np.int32), prices=history[recent],
+            holding_offsets=np.concatenate(([0], np.cumsum(holdings))),
+            holding_cards=valuation.holding_cards, holding_quantities=valuation.holding_quantities,
+        )
+
+    def extended(self, history: "Portfolio") -> "Portfolio":
+        """A new Portfolio with the rows of a totals-only series replacing any rows for the same user and day"""
+        users = np.union1d(self.users, history.users)
+        old_users, new_users = self._row_users(users), history._row_users(users)
+        keep = ~np.isin(old_users << 32 | self.days, new_users << 32 | history.days)
+        user_index = np.concatenate((old_users[keep], new_users))
+        days = np.concatenate((self.days[keep], history.days))
+        order = np.lexsort((days, user_index))
+        new_values = np.full((len(history), len(self.games)), np.nan)
+        holdings = np.zeros(len(users), dtype=np.int64)
+        holdings[np.searchsorted(users, self.users)] = np.diff(self.holding_offsets)
+        return Portfolio(
+            users=users, offsets=_offsets(user_index[order], len(users)), days=days[order],
+            totals=np.concatenate((self.totals[keep], history.totals))[order],
+            counts=np.concatenate((self.counts[keep], history.counts))[order],
+            games=self.games, game_values=np.vstack((self.game_values[keep], new_values))[order],
+            cards=self.cards, names=self.names, price_days=self.price_days, prices=self.prices,
+            holding_offsets=np.concatenate(([0], np.cumsum(holdings))),
+            holding_cards=self.holding_cards, holding_quantities=self.holding_quantities,
+        )
+
+    def _row_users(self, users: np.ndarray) -> np.ndarray:
+        """The position in `users` of each row's user"""
+        rows = np.repeat(np.arange(len(self.users)), np.diff(self.offsets))
+        return np.searchsorted(users, self.users).astype(np.int64)[rows]
+
+    def _user(self, user_id: str) -> Optional[int]:
+        index = int(np.searchsorted(self.users, user_id))
+        return index if index < len(self.users) and self.users[index] == user_id else None
+
+    def has(self, user_id: str) -> bool:
+        index = self._user(user_id)
+        return index is not None and self.offsets[index + 1] > self.offsets[index]
+
+    def rows(self, user_id: str, start: Optional[int] = None, end: Optional[int] = None,
+             resolution: str = "daily") -> np.ndarray:
+        """Row numbers of the user's series between two days, the last of each period"""
+        index = self._user(user_id)
+        if index is None:
+            return np.array([], dtype=np.int64)
+        lo, hi = int(self.offsets[index]), int(self.offsets[index + 1])
+        days = self.days[lo:hi]
+        first = lo + (int(np.searchsorted(days, start, "left")) if start is not None else 0)
+        last = lo + (int(np.searchsorted(days, end, "right")) if end is not None else hi - lo)
+        rows = np.arange(first, last)
+        if resolution != "daily" and len(rows):
+            period = buckets(self.days[rows], resolution)
+            rows = rows[np.append(period[1:] != period[:-1], True)]
+        return rows
+
+    def points(self, rows: np.ndarray) -> List[dict]:
+        games = self.games.tolist()
+        return [{"date": date, "value": round(float(total), 2), "cardCount": int(count),
+                 "games": {game: round(float(v), 2) for game, v in zip(games, values) if not np.isnan(v)}}
+                for date, total, count, values in zip(dates(self.days[rows]), self.totals[rows],
+                                                      self.counts[rows], self.game_values[rows])]
+
+    def movers(self, user_id: str, since: int, limit: int = 10) -> List[dict]:
+        """The user's cards by the size of their value change since `since` (or the oldest price kept)"""
+        index = self._user(user_id)
+        if index is None or not len(self.price_days):
+            return []
+        lo, hi = int(self.holding_offsets[index]), int(self.holding_offsets[index + 1])
+        cards, quantities = self.holding_cards[lo:hi], self.holding_quantities[lo:hi]
+        then = max(int(np.searchsorted(self.price_days, since, "right")) - 1, 0)
+        now_prices = self.prices[-1, cards].astype(np.float64)
+        then_prices = self.prices[then, cards].astype(np.float64)
+        change = (now_prices - then_prices) * quantities
+        known = ~np.isnan(change)
+        order = np.flatnonzero(known)[np.argsort(-np.abs(change[known]), kind="stable")[:limit]]
+        movers = []
+        for i in order:
+            if not change[i]:
+                break
+            game, card_id = str(self.cards[cards[i]]).split(":", 1)
+            movers.append({"cardId": card_id, "game": game, "name": str(self.names[cards[i]]),
+                           "quantity": int(quantities[i]), "price": round(float(now_prices[i]), 2),
+                           "previousPrice": round(float(then_prices[i]), 2), "change": round(float(change[i]), 2)})
+        return movers
+
+
+def _offsets(user_index: np.ndarray, count: int) -> np.ndarray:
+    return np.concatenate(([0], np.cumsum(np.bincount(user_index, minlength=count)))).astype(np.int64)
+
+
+class PostgresValuationStore:
+    """collection_items, cards_cache prices and collection_value_snapshots (asyncpg)"""
+
+    def __init__(self, dsn: str = DATABASE_URL):
+        self.dsn = dsn
+        self.pool = None
+
+    async def open(self):
+        import asyncpg
+
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=2)
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def today(self) -> datetime.date:
+        return await self.pool.fetchval("SELECT CURRENT_DATE")
+
+    async def items(self) -> Tuple[list, list, list, list, list]:
+        """user_id, card_id, game, quantity and card name columns of collection_items"""
+        columns: Tuple[list, list, list, list, list] = ([], [], [], [], [])
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                async for row in connection.cursor(
+                    "SELECT user_id, card_id, game, quantity, card_data->>'name' FROM collection_items",
+                    prefetch=VALUATION_FETCH_ROWS,
+                ):
+                    for column, field in zip(columns, row):
+                        column.append(field)
+        return columns
+
+    async def prices(self) -> Tuple[list, list, list]:
+        """card_id, game and EUR price columns of cards_cache, as the snapshot query read them"""
+        rows = await self.pool.fetch(
+            """
+            SELECT card_id, game,
+                   CASE WHEN pricing_data->>'eur' ~ '^[0-9]+(\\.[0-9]+)?$'
+                        THEN (pricing_data->>'eur')::float8 END
+            FROM cards_cache WHERE pricing_data IS NOT NULL
+            """
+        )
+        return [row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows]
+
+    async def write_snapshots(self, day: datetime.date, users: List[str], totals: List[float],
+                              counts: List[int]) -> int:
+        """Every user's snapshot for `day` in one statement"""
+        status = await self.pool.execute(
+            """
+            INSERT INTO collection_value_snapshots (user_id, total_value_eur, card_count, snapshot_date)
+            SELECT user_id, ROUND(total::numeric, 2), card_count, $4
+            FROM unnest($1::text[], $2::float8[], $3::int[]) AS s(user_id, total, card_count)
+            ON CONFLICT (user_id, snapshot_date) DO UPDATE SET
+              total_value_eur = EXCLUDED.total_value_eur,
+              card_count = EXCLUDED.card_count
+            """,
+            users, totals, counts, day,
+        )
+        return int(status.rsplit(" ", 1)[-1])
+
+    async def history(self, after: Optional[int] = None) -> Tuple[list, list, list, list]:
+        """user_id, day, total and card count columns of the snapshots, or of those from day `after` on"""
+        query = "SELECT user_id, snapshot_date, total_value_eur::float8, card_count FROM collection_value_snapshots"
+        if after is None:
+            rows = await self.pool.fetch(query)
+        else:
+            rows = await self.pool.fetch(f"{query} WHERE snapshot_date >= $1", EPOCH + datetime.timedelta(days=after))
+        return ([row[0] for row in rows], [day_number(row[1]) for row in rows], [row[2] for row in rows],
+                [row[3] for row in rows])
+
+
+class PortfolioService:
+    """Runs valuations and answers series queries from the latest Portfolio"""
+
+    def __init__(self, store=None, path: Optional[str] = None):
+        self.store = store
+        self.path = path
+        self.portfolio: Optional[Portfolio] = None
+        self.last: Optional[dict] = None
+        self.task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self.store is not None or bool(DATABASE_URL)
+
+    async def open(self):
+        if self.store is None:
+            store = PostgresValuationStore()
+            await store.open()
+            self.store = store
+
+    def start(self, interval: float = PORTFOLIO_SYNC_INTERVAL):
+        if interval <= 0 or not self.available or (self.task is not None and not self.task.done()):
+            return
+        self.task = asyncio.get_running_loop().create_task(self._run(interval))
+
+    async def _run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if PORTFOLIO_DAILY_VALUATION and await self.due():
+                    await self.snapshot()
+                else:
+                    await self.sync()
+            except Exception as e:
+                eventlog.emit(logger, "portfolio_sync_error", logging.WARNING, error=f"{type(e).__name__}: {e}")
+
+    async def load(self) -> Portfolio:
+        """The series from PORTFOLIO_STORE with newer collection_value_snapshots rows, or seeded from them"""
+        if self.portfolio is None:
+            async with self._lock:
+                if self.portfolio is None:
+                    path = self.path or PORTFOLIO_STORE
+                    portfolio = await asyncio.to_thread(Portfolio.load, path)
+                    portfolio = portfolio if portfolio is not None else Portfolio()
+                    self.portfolio = await self._catch_up(portfolio) if self.available else portfolio
+        return self.portfolio
+
+    async def sync(self) -> int:
+        """Add the collection_value_snapshots rows from the series' last day on; returns the rows added"""
+        await self.load()
+        async with self._lock:
+            before = len(self.portfolio)
+            self.portfolio = await self._catch_up(self.portfolio)
+            return len(self.portfolio) - before
+
+    async def _catch_up(self, portfolio: Portfolio) -> Portfolio:
+        await self.open()
+        last = int(portfolio.days.max()) if len(portfolio) else None
+        history = Portfolio.from_history(*await self.store.history(last))
+        if not len(history):
+            return portfolio
+        eventlog.emit(logger, "portfolio_sync", rows=len(history), users=len(history.users))
+        return await asyncio.to_thread(portfolio.extended, history)
+
+    async def due(self) -> bool:
+        """Whether no valuation has run today"""
+        portfolio = await self.load()
+        await self.open()
+        today = day_number(await self.store.today())
+        return not len(portfolio.price_days) or int(portfolio.price_days.max()) < today
+
+    async def snapshot(self) -> int:
+        """Value every collection, write today's snapshots and add them to the series; returns rows written"""
+        await self.load()
+        await self.open()
+        async with self._lock:
+            start = time.perf_counter()
+            today = await self.store.today()
+            items = await self.store.items()
+            prices = await self.store.prices()
+            read = time.perf_counter()
+            valuation = await asyncio.to_thread(value, day_number(today), *items, *prices)
+            written = await self.store.write_snapshots(today, valuation.users.tolist(), valuation.totals.tolist(),
+                                                       valuation.counts.tolist())
+            portfolio = await asyncio.to_thread(self.portfolio.merged, valuation)
+            await asyncio.to_thread(portfolio.save, self.path or PORTFOLIO_STORE)
+            self.portfolio = portfolio
+            self.last = {"date": today.isoformat(), "users": len(valuation.users), "items": len(items[0]),
+                         "cards": len(valuation.cards), "written": written,
+                         "read_ms": round((read - start) * 1000, 1),
+                         "duration_ms": round((time.perf_counter() - start) * 1000, 1)}
+            eventlog.emit(logger, "valuation", **self.last)
+            return written
+
+    async def series(self, user_id: str, days: Optional[int] = None, resolution: str = "daily",
+                     movers: int = 10) -> dict:
+        portfolio = await self.load()
+        end = int(portfolio.days.max()) if len(portfolio) else 0
+        start = end - days + 1 if days else None
+        rows = portfolio.rows(user_id, start, end, resolution)
+        points = portfolio.points(rows)
+        first, last = (points[0]["value"], points[-1]["value"]) if points else (0.0, 0.0)
+        return {
+            "resolution": resolution,
+            "series": points,
+            "change": {"value": round(last - first, 2),
+                       "percent": round((last - first) / first * 100, 2) if first else None},
+            "games": points[-1]["games"] if points else {},
+            "movers": portfolio.movers(user_id, start if start is not None else 0, movers) if movers else [],
+        }
+
+    def status(self) -> dict:
+        portfolio = self.portfolio
+        return {"loaded": portfolio is not None, "rows": len(portfolio) if portfolio is not None else 0,
+                "users": len(portfolio.users) if portfolio is not None else 0, "last": self.last}
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if isinstance(self.store, PostgresValuationStore):
+            await self.store.close()
+
+
+service = PortfolioService()
@@ -0,0 +1,520 @@
+"""Price refresh worker: the job behind /api/prices/update, done in bulk.
+
+The Next.js route fetches one card at a time with a fixed sleep between
+requests, then writes one row per card and reads and writes once per user,
+all inside a single HTTP request. This worker does the same job as a
+resumable batch job:
+
+  * reads the distinct (card_id, game) pairs from collection_items,
+  * fetches prices concurrently over one keep-alive httpx pool, with each
+    provider (Scryfall for MTG, Scrydex for Pokémon) behind its own token
+    bucket so bursts never exceed its rate limit,
+  * upserts the prices into cards_cache in multi-row batches, and
+  * writes every user's collection_value_snapshots row for today with a
+    single INSERT ... SELECT ... GROUP BY (run from the gateway, the
+    snapshot is taken by portfolio.py instead, which also keeps the value
+    series the charts read).
+
+After each run starts, its start time (database clock) is saved to
+PRICE_REFRESH_STATE. `--resume` continues an interrupted run by skipping
+the cards whose cards_cache row was written after that time. Prices that
+could not be fetched are left untouched rather than zeroed, so the next run
+picks them up again.
+
+    cd backend && DATABASE_URL=postgres://... python price_worker.py [--resume]
+
+The gateway can also run it in the background: POST /_gateway/jobs/price-refresh.
+
+Environment:
+
+    DATABASE_URL          Postgres DSN (asyncpg)
+    SCRYFALL_URL          default https://api.scryfall.com
+    SCRYDEX_URL           default https://api.scrydex.com
+    SCRYDEX_API_KEY       Pokémon prices are skipped without these two
+    SCRYDEX_TEAM_ID
+    PRICE_SCRYFALL_RATE   requests per second (default 10, Scryfall's limit)
+    PRICE_SCRYDEX_RATE    requests per second (default 10)
+    PRICE_CONCURRENCY     requests in flight across providers (default 16)
+    PRICE_BATCH_SIZE      rows per cards_cache upsert (default 500)
+    PRICE_REFRESH_STATE   checkpoint file (default price-refresh.json)
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+import card_store
+import eventlog
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "")
+SCRYFALL_URL = os.environ.get("SCRYFALL_URL", "https://api.scryfall.com")
+SCRYDEX_URL = os.environ.get("SCRYDEX_URL", "https://api.scrydex.com")
+SCRYDEX_API_KEY = os.environ.get("SCRYDEX_API_KEY", "")
+SCRYDEX_TEAM_ID = os.environ.get("SCRYDEX_TEAM_ID", "")
+SCRYFALL_RATE = float(os.environ.get("PRICE_SCRYFALL_RATE", "10"))
+SCRYDEX_RATE = float(os.environ.get("PRICE_SCRYDEX_RATE", "10"))
+CONCURRENCY = int(os.environ.get("PRICE_CONCURRENCY", "16"))
+BATCH_SIZE = int(os.environ.get("PRICE_BATCH_SIZE", "500"))
+STATE_FILE = os.environ.get("PRICE_REFRESH_STATE", "price-refresh.json")
+
+# Same conversion as the Next.js route; Scrydex reports USD
+USD_TO_EUR = 0.92
+MAX_ATTEMPTS = 3
+PROGRESS_INTERVAL = 10.0
+
+logger = logging.getLogger("gateway.price_worker")
+
+Card = Tuple[str, str]  # (card_id, game)
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average and bursts of `burst`.
+
+    Tokens may go negative: each caller takes its token immediately and
+    sleeps until the bucket would have refilled to it, so waiters are served
+    in arrival order without polling.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.clock = clock
+        self.updated = clock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+def scryfall_price(data: dict) -> float:
+    try:
+        return float((data.get("prices") or {}).get("eur") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def scrydex_price(data: dict) -> float:
+    card = data.get("data", data)
+    for variant in card.get("variants") or []:
+        prices = variant.get("prices") or {}
+        for price in prices if isinstance(prices, list) else prices.values():
+            if not isinstance(price, dict):
+                continue
+            value = price.get("market") or price.get("mid") or price.get("value") or price.get("price")
+            if value:
+                try:
+                    return float(value) * USD_TO_EUR
+                except (TypeError, ValueError):
+                    continue
+    return 0.0
+
+
+class Provider:
+    """A price API for one game, with its own rate limit"""
+
+    def __init__(
+        self,
+        name: str,
+        url: Callable[[str], str],
+        parse: Callable[[dict], float],
+        rate: float,
+        headers: Optional[Dict[str, str]] = None,
+        lookup: Optional[Callable[[str], Optional[float]]] = None,
+    ):
+        self.name = name
+        self.url = url
+        self.parse = parse
+        self.bucket = TokenBucket(rate)
+        self.headers = headers or {}
+        # Local price source tried first; None means "not known here"
+        self.lookup = lookup
+
+
+def default_providers(
+    scryfall_url: str = SCRYFALL_URL,
+    scrydex_url: str = SCRYDEX_URL,
+    scryfall_rate: float = SCRYFALL_RATE,
+    scrydex_rate: float = SCRYDEX_RATE,
+) -> Dict[str, Provider]:
+    """game -> provider; Pokémon is left out without Scrydex credentials.
+
+    MTG prices come from the local card store (card_store.py) when there is
+    one, falling back to the Scryfall API for cards it doesn't know.
+    """
+    store = card_store.current()
+    providers = {
+        "mtg": Provider(
+            "scryfall",
+            lambda card_id: f"{scryfall_url.rstrip('/')}/cards/{card_id}",
+            scryfall_price,
+            scryfall_rate,
+            lookup=store.price_eur if store else None,
+        ),
+    }
+    if SCRYDEX_API_KEY and SCRYDEX_TEAM_ID:
+        providers["pokemon"] = Provider(
+            "scrydex",
+            lambda card_id: f"{scrydex_url.rstrip('/')}/pokemon/v1/cards/{card_id}?include=prices",
+            scrydex_price,
+            scrydex_rate,
+            {"X-Api-Key": SCRYDEX_API_KEY, "X-Team-ID": SCRYDEX_TEAM_ID},
+        )
+    return providers
+
+
+class PostgresStore:
+    """The worker's queries against the app database (asyncpg)"""
+
+    def __init__(self, dsn: str = DATABASE_URL):
+        self.dsn = dsn
+        self.pool = None
+
+    async def open(self):
+        import asyncpg
+
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=2)
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+
+    async def now(self) -> datetime:
+        return await self.pool.fetchval("SELECT NOW()")
+
+    async def cards(self, games: Iterable[str], refreshed_before: Optional[datetime] = None) -> List[Card]:
+        """Distinct collection cards, minus those priced since `refreshed_before`"""
+        rows = await self.pool.fetch(
+            """
+            SELECT DISTINCT ci.card_id, ci.game
+            FROM collection_items ci
+            LEFT JOIN cards_cache cc ON cc.card_id = ci.card_id AND cc.game = ci.game
+            WHERE ci.game = ANY($1::text[])
+              AND ($2::timestamptz IS NULL OR cc.cached_at IS NULL OR cc.cached_at < $2)
+            ORDER BY ci.game, ci.card_id
+            """,
+            list(games), refreshed_before,
+        )
+        return [(row["card_id"], row["game"]) for row in rows]
+
+    async def upsert_prices(self, rows: List[Tuple[str, str, float]], updated_at: str):
+        """One multi-row upsert; pricing_data has the same shape the route wrote"""
+        card_ids, games, prices = zip(*rows)
+        await self.pool.execute(
+            """
+            INSERT INTO cards_cache (card_id, game, card_data, pricing_data, cached_at, expires_at)
+            SELECT card_id, game, '{}', jsonb_build_object('eur', eur, 'updatedAt', $4::text),
+                   NOW(), NOW() + INTERVAL '7 days'
+            FROM unnest($1::text[], $2::text[], $3::float8[]) AS t(card_id, game, eur)
+            ON CONFLICT (card_id, game) DO UPDATE SET
+              pricing_data = EXCLUDED.pricing_data,
+              cached_at = EXCLUDED.cached_at,
+              expires_at = EXCLUDED.expires_at
+            """,
+            list(card_ids), list(games), list(prices), updated_at,
+        )
+
+    async def snapshot_values(self) -> int:
+        """Today's collection value for every user in one statement; returns rows written"""
+        status = await self.pool.execute(
+            """
+            INSERT INTO collection_value_snapshots (user_id, total_value_eur, card_count, snapshot_date)
+            SELECT ci.user_id,
+                   ROUND(SUM(CASE WHEN cc.pricing_data->>'eur' ~ '^[0-9]+(\\.[0-9]+)?$'
+                                  THEN (cc.pricing_data->>'eur')::numeric ELSE 0 END
+                             * COALESCE(NULLIF(ci.quantity, 0), 1)), 2),
+                   COUNT(*),
+                   CURRENT_DATE
+            FROM collection_items ci
+            LEFT JOIN cards_cache cc ON cc.card_id = ci.card_id AND cc.game = ci.game
+            GROUP BY ci.user_id
+            ON CONFLICT (user_id, snapshot_date) DO UPDATE SET
+              total_value_eur = EXCLUDED.total_value_eur,
+              card_count = EXCLUDED.card_count
+            """
+        )
+        return int(status.rsplit(" ", 1)[-1])
+
+
+class Progress:
+    """Counters for one run, reported as it goes and at the end"""
+
+    def __init__(self):
+        self.state = "starting"
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+        self.total = 0
+        self.priced = 0
+        self.failed = 0
+        self.written = 0
+        self.batches = 0
+        self.snapshots = 0
+        self.resumed = False
+        self.requests: Counter = Counter()
+        self.local: Counter = Counter()
+        self.retries: Counter = Counter()
+        self.error: Optional[str] = None
+
+    def fail(self, error: BaseException):
+        """Record why the run stopped; a cancellation is not an error"""
+        cancelled = isinstance(error, asyncio.CancelledError)
+        self.state = "cancelled" if cancelled else "failed"
+        self.error = None if cancelled else repr(error)
+        self.finished = time.monotonic()
+
+    def as_dict(self) -> dict:
+        elapsed = (self.finished or time.monotonic()) - self.started
+        done = self.priced + self.failed
+        rate = done / elapsed if elapsed > 0 else 0.0
+        return {
+            "state": self.state,
+            "resumed": self.resumed,
+            "total": self.total,
+            "priced": self.priced,
+            "failed": self.failed,
+            "written": self.written,
+            "batches": self.batches,
+            "snapshots": self.snapshots,
+            "requests": dict(self.requests),
+            "local": dict(self.local),
+            "retries": dict(self.retries),
+            "seconds": round(elapsed, 3),
+            "cards_per_s": round(rate, 2),
+            "eta_s": round((self.total - done) / rate, 1) if rate and self.state == "fetching" else None,
+            "error": self.error,
+        }
+
+
+def read_state(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_state(path: str, state: dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+class PriceRefresh:
+    """One run of the worker; `run()` may be cancelled and later resumed"""
+
+    def __init__(
+        self,
+        store,
+        client: httpx.AsyncClient,
+        providers: Dict[str, Provider],
+        concurrency: int = CONCURRENCY,
+        batch_size: int = BATCH_SIZE,
+        state_file: Optional[str] = STATE_FILE,
+        progress: Optional[Progress] = None,
+        snapshot: Optional[Callable[[], Awaitable[int]]] = None,
+    ):
+        self.store = store
+        self.client = client
+        self.providers = providers
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.state_file = state_file
+        self.progress = progress or Progress()
+        # Writes the collection snapshots once prices are in; store.snapshot_values by default
+        self.snapshot = snapshot or store.snapshot_values
+        self.pending: List[Tuple[str, str, float]] = []
+
+    async def fetch_price(self, provider: Provider, card_id: str) -> Optional[float]:
+        """The card's EUR price, 0.0 when it has none, None when it could not be fetched"""
+        if provider.lookup is not None:
+            price = provider.lookup(card_id)
+            if price is not None:
+                self.progress.local[provider.name] += 1
+                return price
+        for attempt in range(MAX_ATTEMPTS):
+            if attempt:
+                self.progress.retries[provider.name] += 1
+            await provider.bucket.acquire()
+            self.progress.requests[provider.name] += 1
+            try:
+                response = await self.client.get(provider.url(card_id), headers=provider.headers)
+            except httpx.HTTPError:
+                await asyncio.sleep(0.5 * 2 ** attempt)
+                continue
+            if response.status_code == 404:
+                return 0.0
+            if response.status_code == 429 or response.status_code >= 500:
+                try:
+                    delay = float(response.headers.get("retry-after", ""))
+                except ValueError:
+                    delay = 0.5 * 2 ** attempt
+                await asyncio.sleep(delay)
+                continue
+            if response.status_code != 200:
+                return None
+            try:
+                return provider.parse(response.json())
+            except (ValueError, AttributeError):
+                return None
+        return None
+
+    async def flush(self):
+        if not self.pending:
+            return
+        rows, self.pending = self.pending, []
+        updated_at = datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+        await self.store.upsert_prices(rows, updated_at)
+        self.progress.written += len(rows)
+        self.progress.batches += 1
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            try:
+                card_id, game = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            price = await self.fetch_price(self.providers[game], card_id)
+            if price is None:
+                self.progress.failed += 1
+                continue
+            self.progress.priced += 1
+            self.pending.append((card_id, game, round(price, 2)))
+            if len(self.pending) >= self.batch_size:
+                await self.flush()
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            eventlog.emit(logger, "price_refresh_progress", **self.progress.as_dict())
+
+    async def run(self, resume: bool = False) -> dict:
+        progress = self.progress
+        state = read_state(self.state_file) if self.state_file and resume else {}
+        refreshed_before = None
+        if state.get("status") == "running" and state.get("started_at"):
+            refreshed_before = datetime.fromisoformat(state["started_at"])
+            progress.resumed = True
+        else:
+            state = {"started_at": (await self.store.now()).isoformat(), "status": "running"}
+            if self.state_file:
+                write_state(self.state_file, state)
+
+        cards = await self.store.cards(list(self.providers), refreshed_before)
+        progress.total = len(cards)
+        progress.state = "fetching"
+        eventlog.emit(logger, "price_refresh_start", cards=len(cards), resumed=progress.resumed,
+                      started_at=state["started_at"])
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for card in cards:
+            queue.put_nowait(card)
+        reporter = asyncio.get_running_loop().create_task(self._report())
+        try:
+            await asyncio.gather(*(self._worker(queue) for _ in range(max(1, self.concurrency))))
+            await self.flush()
+            progress.state = "snapshotting"
+            progress.snapshots = await self.snapshot()
+        except BaseException as e:
+            progress.fail(e)
+            raise
+        finally:
+            reporter.cancel()
+            progress.finished = time.monotonic()
+        progress.state = "done"
+        if self.state_file:
+            write_state(self.state_file, dict(state, status="done", progress=progress.as_dict()))
+        eventlog.emit(logger, "price_refresh_done", **progress.as_dict())
+        return progress.as_dict()
+
+
+async def refresh(resume: bool = False, progress: Optional[Progress] = None, store=None,
+                  snapshot: Optional[Callable[[], Awaitable[int]]] = None) -> dict:
+    """Run the worker against DATABASE_URL and the real price APIs"""
+    progress = progress or Progress()
+    store = store or PostgresStore()
+    try:
+        await store.open()
+        limits = httpx.Limits(max_connections=CONCURRENCY, max_keepalive_connections=CONCURRENCY)
+        try:
+            async with httpx.AsyncClient(limits=limits, timeout=8.0, http2=True) as client:
+                job = PriceRefresh(store, client, default_providers(), progress=progress, snapshot=snapshot)
+                return await job.run(resume=resume)
+        finally:
+            await store.close()
+    except BaseException as e:
+        # run() records its own failures once it is fetching; these are from
+        # opening the store, setting up the providers or listing the cards
+        if progress.state == "starting":
+            progress.fail(e)
+        raise
+
+
+class PriceRefreshJob:
+    """Runs at most one refresh in the background of the gateway process"""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.progress: Optional[Progress] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self, resume: bool = False, snapshot: Optional[Callable[[], Awaitable[int]]] = None) -> bool:
+        """False if a refresh is already running"""
+        if self.running:
+            return False
+        self.progress = Progress()
+        self.task = asyncio.get_running_loop().create_task(
+            refresh(resume=resume, progress=self.progress, snapshot=snapshot))
+        # Failures are recorded in progress; don't let the task warn about them
+        self.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return True
+
+    def status(self) -> dict:
+        if self.progress is None:
+            return {"state": "idle"}
+        return self.progress.as_dict()
+
+    async def stop(self):
+        if self.running:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+
+job = PriceRefreshJob()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resume", action="store_true", help="continue the last interrupted run")
+    args = parser.parse_args()
+    if not DATABASE_URL:
+        raise SystemExit("DATABASE_URL is not set")
+    eventlog.start()
+    try:
+        result = asyncio.run(refresh(resume=args.resume))
+    finally:
+        eventlog.stop()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
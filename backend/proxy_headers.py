@@ -0,0 +1,70 @@
+"""Header filtering for the Next.js proxy.
+
+Headers travel as raw (name, value) byte pairs end to end: ASGI hands us
+request headers with lowercased names, and httpx exposes upstream response
+headers the same way via `Headers.raw`. Keeping them as lists avoids building
+dicts per request and preserves repeated headers such as Set-Cookie.
+"""
+from typing import FrozenSet, Iterable, List, Optional, Tuple
+
+import gateway_auth
+
+RawHeaders = List[Tuple[bytes, bytes]]
+
+# RFC 7230 section 6.1 hop-by-hop headers, plus the obsolete `trailers` spelling
+HOP_BY_HOP: FrozenSet[bytes] = frozenset({
+    b"connection",
+    b"keep-alive",
+    b"proxy-authenticate",
+    b"proxy-authorization",
+    b"proxy-connection",
+    b"te",
+    b"trailer",
+    b"trailers",
+    b"transfer-encoding",
+    b"upgrade",
+})
+
+# httpx sets host and content-length for the upstream request itself, and
+# tracing.py re-issues traceparent and x-request-id for every request
+REQUEST_EXCLUDED: FrozenSet[bytes] = HOP_BY_HOP | {
+    b"host", b"content-length", b"traceparent", b"x-request-id",
+} | {name.encode() for name in gateway_auth.TRUSTED_HEADERS}
+
+# The body is re-encoded by the gateway (httpx decompresses upstream content)
+RESPONSE_EXCLUDED: FrozenSet[bytes] = HOP_BY_HOP | {b"content-encoding", b"content-length"}
+
+
+def _connection_tokens(headers: Iterable[Tuple[bytes, bytes]]) -> FrozenSet[bytes]:
+    """Header names listed in Connection, which are hop-by-hop for this message"""
+    tokens = set()
+    for name, value in headers:
+        if name == b"connection":
+            tokens.update(token.strip().lower() for token in value.split(b","))
+    return frozenset(tokens)
+
+
+def filter_request_headers(
+    headers: RawHeaders, extra: Optional[RawHeaders] = None
+) -> RawHeaders:
+    """Drop hop-by-hop and gateway-owned headers from ASGI request headers"""
+    excluded = REQUEST_EXCLUDED
+    for name, _ in headers:
+        if name == b"connection":
+            excluded = excluded | _connection_tokens(headers)
+            break
+    filtered = [(name, value) for name, value in headers if name not in excluded]
+    if extra:
+        filtered.extend(extra)
+    return filtered
+
+
+def filter_response_headers(headers: RawHeaders) -> RawHeaders:
+    """Lowercase and drop hop-by-hop headers from upstream response headers"""
+    lowered = [(name.lower(), value) for name, value in headers]
+    excluded = RESPONSE_EXCLUDED
+    for name, _ in lowered:
+        if name == b"connection":
+            excluded = excluded | _connection_tokens(lowered)
+            break
+    return [(name, value) for name, value in lowered if name not in excluded]
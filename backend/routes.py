@@ -0,0 +1,145 @@
+"""Map raw request paths to Next.js route templates.
+
+The table is built from the app/ directory layout: every `route.ts` and
+`page.tsx` becomes a template such as `/api/feed/{postId}/reactions`, so
+`/api/feed/post_123/reactions` can be labelled, cached, rate limited or timed
+out per route without one series per post. Templates live in a segment trie;
+matching walks one node per path segment, preferring static segments over
+dynamic ones like Next.js does.
+"""
+import os
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+ROUTE_FILES = ("route.ts", "route.js", "page.tsx", "page.jsx", "page.ts", "page.js")
+
+DEFAULT_APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+
+
+class RouteMatch(NamedTuple):
+    template: str
+    params: Dict[str, str]
+
+
+class _Node:
+    __slots__ = ("static", "param", "param_name", "catch_all", "catch_all_name", "optional_catch_all", "template")
+
+    def __init__(self):
+        self.static: Dict[str, "_Node"] = {}
+        self.param: Optional["_Node"] = None
+        self.param_name: Optional[str] = None
+        # [...name] matches one or more remaining segments, [[...name]] zero or more
+        self.catch_all: Optional[str] = None
+        self.catch_all_name: Optional[str] = None
+        self.optional_catch_all = False
+        self.template: Optional[str] = None
+
+
+def _template_segment(segment: str) -> str:
+    if segment.startswith("[[...") and segment.endswith("]]"):
+        return "{" + segment[5:-2] + "*}"
+    if segment.startswith("[...") and segment.endswith("]"):
+        return "{" + segment[4:-1] + "+}"
+    if segment.startswith("[") and segment.endswith("]"):
+        return "{" + segment[1:-1] + "}"
+    return segment
+
+
+class RouteTable:
+    def __init__(self, templates: Iterable[str] = ()):
+        self.root = _Node()
+        self.templates: List[str] = []
+        for template in templates:
+            self.add(template)
+
+    def add(self, template: str):
+        """Add a template like /api/decks/{deckId}/cards or /blog/{slug+}"""
+        node = self.root
+        for segment in template.strip("/").split("/"):
+            if not segment:
+                continue
+            if segment.startswith("{") and segment.endswith("*}"):
+                node.catch_all = template
+                node.catch_all_name = segment[1:-2]
+                node.optional_catch_all = True
+                break
+            if segment.startswith("{") and segment.endswith("+}"):
+                node.catch_all = template
+                node.catch_all_name = segment[1:-2]
+                break
+            if segment.startswith("{") and segment.endswith("}"):
+                if node.param is None:
+                    node.param = _Node()
+                    node.param_name = segment[1:-1]
+                node = node.param
+            else:
+                node = node.static.setdefault(segment, _Node())
+        else:
+            node.template = template
+        self.templates.append(template)
+
+    def match(self, path: str) -> Optional[RouteMatch]:
+        segments = [segment for segment in path.split("/") if segment]
+        return self._match(self.root, segments, 0, {})
+
+    def _match(self, node: _Node, segments: List[str], index: int, params: Dict[str, str]) -> Optional[RouteMatch]:
+        if index == len(segments):
+            if node.template is not None:
+                return RouteMatch(node.template, params)
+            if node.catch_all is not None and node.optional_catch_all:
+                return RouteMatch(node.catch_all, params)
+            return None
+
+        segment = segments[index]
+        child = node.static.get(segment)
+        if child is not None:
+            found = self._match(child, segments, index + 1, params)
+            if found is not None:
+                return found
+        if node.param is not None:
+            found = self._match(node.param, segments, index + 1, {**params, node.param_name: segment})
+            if found is not None:
+                return found
+        if node.catch_all is not None:
+            return RouteMatch(node.catch_all, {**params, node.catch_all_name: "/".join(segments[index:])})
+        return None
+
+    def template_for(self, path: str) -> Optional[str]:
+        found = self.match(path)
+        return found.template if found is not None else None
+
+
+def templates_from_app_dir(app_dir: str = DEFAULT_APP_DIR) -> List[str]:
+    """Collect route templates from a Next.js app/ directory"""
+    templates = []
+    for directory, _, files in os.walk(app_dir):
+        if not any(name in ROUTE_FILES for name in files):
+            continue
+        relative = os.path.relpath(directory, app_dir)
+        segments = [] if relative == "." else relative.split(os.sep)
+        # Route groups like (marketing) and private folders like _components
+        # don't appear in URLs
+        if any(segment.startswith("_") for segment in segments):
+            continue
+        segments = [s for s in segments if not (s.startswith("(") and s.endswith(")"))]
+        templates.append("/" + "/".join(_template_segment(s) for s in segments))
+    return sorted(templates)
+
+
+def templates_from_file(path: str) -> List[str]:
+    """Read one template per line, ignoring blank lines and # comments"""
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def load_route_table() -> RouteTable:
+    """Build the table from ROUTES_FILE if set, else ROUTES_APP_DIR (default: the repo's app/ dir)"""
+    routes_file = os.environ.get("ROUTES_FILE")
+    if routes_file:
+        return RouteTable(templates_from_file(routes_file))
+    app_dir = os.environ.get("ROUTES_APP_DIR", DEFAULT_APP_DIR)
+    if not os.path.isdir(app_dir):
+        return RouteTable()
+    return RouteTable(templates_from_app_dir(app_dir))
+
+
+route_table = load_route_table()
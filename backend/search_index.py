@@ -0,0 +1,944 @@
+"""In-memory card search for the gateway's search routes.
+
+/api/search, /api/search/pokemon, /api/search/lorcana and /api/cards/mtg
+otherwise send every keystroke to Scryfall or ScryDex through Next.js. The
+index keeps one segment per game, each holding:
+
+    documents  one per printing: ID, name, set code, collector number,
+               rarity, language, release date, and the card as the route
+               returns it (MTG cards are read back from the card store)
+    names      distinct normalised names with the printings of each
+    words      sorted (word, name) pairs, so any word of a name can be
+               matched by prefix with a binary search
+    trigrams   per trigram, the names containing it
+
+A query matches names in which every query word starts a word ("lig bol"
+finds Lightning Bolt). Only when that finds next to nothing does it fall back
+to trigram overlap, which tolerates typos ("ligthning blot"). Names rank
+exact > whole-name prefix > word prefixes > fuzzy, shorter names first, and
+expand to their printings, newest first, filtered by set, collector number,
+rarity and language. "2xm 117" and set:/cn:/r:/game:/lang: terms filter
+too, and a bare set code lists the set.
+
+Sources, all applied incrementally on the event loop in small batches:
+
+- MTG from the local card store (card_store.py): when an ingest replaces
+  the store, cards are diffed by content hash and only changes are
+  re-indexed. Cards are read from the store per hit, so prices are current.
+- Pokemon from the ScryDex responses Next.js caches in api_cache, when
+  DATABASE_URL is set; only rows that changed since the last sync are read.
+- Every card search response proxied through the gateway, which is also how
+  Lorcana (which Next.js does not cache) gets in.
+
+The cache-fed segments only know cards someone has searched for, so one
+hit says nothing about the others. MTG searches are answered from the index
+whenever it has results, once the card store is indexed. Other searches
+are answered only for queries, with the same route and filters, that an
+earlier proxied response answered in full: every card was indexed and no
+page was left out. Everything else is proxied. SEARCH_MAX_COMPLETE caps
+the queries remembered.
+SEARCH_MAX_DOCS caps printings per game and SEARCH_MAX_BYTES the stored card
+JSON across games; what does not fit is dropped and counted.
+"""
+import asyncio
+import collections
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import sys
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from operator import itemgetter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import card_store
+import eventlog
+import set_codes
+from set_codes import normalize_number
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "")
+# Printings per game, and bytes of stored card JSON across all games
+SEARCH_MAX_DOCS = int(os.environ.get("SEARCH_MAX_DOCS", "300000"))
+SEARCH_MAX_BYTES = int(os.environ.get("SEARCH_MAX_BYTES", str(64 << 20)))
+# Queries remembered as answered in full by a proxied response
+SEARCH_MAX_COMPLETE = int(os.environ.get("SEARCH_MAX_COMPLETE", "50000"))
+# Seconds between syncs with the card store and api_cache; 0 disables them
+SEARCH_SYNC_INTERVAL = float(os.environ.get("SEARCH_SYNC_INTERVAL", "60"))
+
+GAMES = ("mtg", "pokemon", "lorcana")
+
+# Names whose words are scanned for one query word (a one-letter query
+# matches a large part of the index)
+PREFIX_SCAN = 300
+# Typo matching runs when prefix matching found fewer names than this
+FUZZY_BELOW = 3
+FUZZY_CANDIDATES = 50
+# Shortest word corrected for typos
+FUZZY_WORD = 4
+# Share of the query's trigrams a trigram match needs
+FUZZY_MIN = 0.4
+# Name postings counted per fuzzy query
+FUZZY_BUDGET = 10000
+# Documents added per event loop iteration
+APPLY_BATCH = 500
+# Response bodies waiting to be indexed
+MAX_PENDING = 32
+
+logger = logging.getLogger("gateway.search")
+
+_APOSTROPHES = str.maketrans("", "", "'\u2019`")
+_NON_WORD = re.compile(r"[\W_]+")
+_NUMBER = re.compile(r"^[a-z]*\d+[a-z]*$")
+_SYNTAX = re.compile(r"""[:<>=!"()]|(?:^|\s)-""")
+_LAST = "\U0010ffff"
+
+OPERATORS = {
+    "set": "set", "s": "set", "e": "set",
+    "cn": "number", "number": "number",
+    "r": "rarity", "rarity": "rarity",
+    "game": "game",
+    "lang": "lang",
+}
+
+
+def normalize(text: str) -> str:
+    """Casefolded, without accents or punctuation: "Jötun's Grunt!" -> "jotuns grunt" """
+    text = text.casefold().translate(_APOSTROPHES)
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def trigrams(name: str) -> Set[str]:
+    padded = f" {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def parse_query(q: str) -> Tuple[str, Dict[str, str]]:
+    """Split set:/cn:/r:/game:/lang: terms off a query"""
+    terms, filters = [], {}
+    for token in q.split():
+        key, sep, value = token.partition(":")
+        if sep and value and key.lower() in OPERATORS:
+            filters[OPERATORS[key.lower()]] = value
+        else:
+            terms.append(token)
+    return " ".join(terms), filters
+
+
+def query_key(route: str, q: str, games: Iterable[str], **filters) -> tuple:
+    """A search as the complete-answer memo keys it: route, games, normalised terms and filters"""
+    terms, operators = parse_query(q)
+    operators.update((name, value) for name, value in filters.items() if value)
+    return (route, tuple(games), normalize(terms),
+            tuple(sorted((name, str(value).casefold()) for name, value in operators.items())))
+
+
+def is_plain(q: str) -> bool:
+    """True for names plus the terms parse_query handles, False for other Scryfall syntax"""
+    return not _SYNTAX.search(parse_query(q)[0])
+
+
+class Document(NamedTuple):
+    id: str
+    name: str
+    set: str = ""
+    number: str = ""
+    rarity: str = ""
+    lang: str = ""
+    released: str = ""
+    # JSON as the search routes return the card; None when read from the card store
+    card: Optional[bytes] = None
+    # Card store content hash, so unchanged cards are skipped
+    version: bytes = b""
+
+
+def document(game: str, card: dict, rarity: Optional[str] = None, version: bytes = b"",
+             keep_card: bool = True) -> Optional[Document]:
+    """The document for a card in the shape one of the search routes returns"""
+    card_id, name = card.get("id"), card.get("name")
+    if not card_id or not isinstance(name, str) or not name:
+        return None
+    if game == "mtg":
+        set_code, number, released = card.get("set"), card.get("collector_number"), card.get("released_at")
+    elif game == "pokemon":
+        expansion = card.get("set") if isinstance(card.get("set"), dict) else card.get("expansion") or {}
+        set_code, number = expansion.get("id"), card.get("number")
+        released = expansion.get("releaseDate") or expansion.get("release_date")
+    else:
+        expansion = card.get("expansion") or {}
+        set_code = card.get("set_code") or expansion.get("id")
+        number = card.get("collector_number") or card.get("number")
+        released = expansion.get("releaseDate") or expansion.get("release_date")
+    lang = str(card.get("lang") or card.get("language_code") or "").lower()
+    if keep_card:
+        if game == "mtg":
+            card = dict(card_store.compact_card(card), prices=card.get("prices"))
+        if card.get("game") != game:
+            card = dict(card, game=game)
+    # Names, sets, numbers, rarities and dates repeat across printings; interning
+    # keeps one copy of each
+    return Document(
+        # The Pokemon route keeps English and Japanese copies of an ID apart
+        id=f"{card_id}-{lang}" if game == "pokemon" and lang else str(card_id),
+        name=sys.intern(name),
+        set=sys.intern(str(set_code or "").lower()),
+        number=sys.intern(normalize_number(number)),
+        rarity=sys.intern(str(rarity or card.get("rarity") or "").lower()),
+        lang=sys.intern(lang),
+        released=sys.intern(str(released or "")),
+        card=json.dumps(card, separators=(",", ":")).encode() if keep_card else None,
+        version=version,
+    )
+
+
+class Filters(NamedTuple):
+    set: str = ""
+    number: str = ""
+    rarity: str = ""
+    langs: frozenset = frozenset()
+
+    def match(self, doc: Document) -> bool:
+        return ((not self.set or doc.set == self.set)
+                and (not self.number or doc.number == self.number)
+                and (not self.rarity or doc.rarity == self.rarity)
+                and (not self.langs or not doc.lang or doc.lang in self.langs))
+
+
+NO_FILTERS = Filters()
+
+
+def _number_order(doc: Document):
+    digits = re.match(r"\D*(\d+)", doc.number)
+    return (int(digits.group(1)) if digits else 1 << 30, doc.number)
+
+
+class Segment:
+    """One game's documents and name indexes.
+
+    A live segment is only changed on the event loop thread, so searches never
+    see it half-updated; a rebuild fills a new segment in a worker thread and
+    swaps it in.
+    """
+
+    def __init__(self, game: str, max_docs: int = SEARCH_MAX_DOCS):
+        self.game = game
+        self.max_docs = max_docs
+        self.docs: List[Optional[Document]] = []
+        self.doc_names = array("i")
+        self.by_id: Dict[str, int] = {}
+        self.by_set: Dict[str, List[int]] = {}
+        self.free: List[int] = []
+        self.name_ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.name_docs: List[List[int]] = []
+        # Sorted (name, name ID) and (word, name ID) pairs for prefix ranges
+        self.sorted_names: List[Tuple[str, int]] = []
+        self.words: List[Tuple[str, int]] = []
+        self.pending_names: List[Tuple[str, int]] = []
+        self.pending_words: List[Tuple[str, int]] = []
+        # Names per word, and a word one deleted letter away from each
+        # string, for correcting single typos
+        self.word_counts: Dict[str, int] = {}
+        self.deletes: Dict[str, str] = {}
+        self.grams: Dict[str, array] = {}
+        self.card_bytes = 0
+        # Bumped on every change, so caches of the segment know when to go
+        self.version = 0
+        self.numbers_cache: Dict[str, Dict[str, int]] = {}
+        self.numbers_version = 0
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def _name(self, name: str) -> int:
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+            self.name_docs.append([])
+            self.pending_names.append((name, name_id))
+            for word in set(name.split()):
+                self.pending_words.append((word, name_id))
+                count = self.word_counts.get(word, 0)
+                self.word_counts[word] = count + 1
+                if not count and len(word) >= FUZZY_WORD:
+                    for i in range(len(word)):
+                        self.deletes.setdefault(word[:i] + word[i + 1:], word)
+            for gram in trigrams(name):
+                posting = self.grams.get(gram)
+                if posting is None:
+                    posting = self.grams[gram] = array("i")
+                posting.append(name_id)
+        return name_id
+
+    def flush(self):
+        """Merge names added since the last flush into the sorted lists"""
+        for pending, merged in ((self.pending_names, self.sorted_names), (self.pending_words, self.words)):
+            if len(pending) < 32:
+                for entry in pending:
+                    insort(merged, entry)
+            else:
+                # Timsort merges the sorted run and the sorted tail in linear time
+                pending.sort()
+                merged.extend(pending)
+                merged.sort()
+            pending.clear()
+
+    def add(self, doc: Document) -> int:
+        """Insert or replace a printing; returns the change in stored card bytes, or None when full"""
+        slot = self.by_id.get(doc.id)
+        if slot is not None:
+            old = self.docs[slot]
+            if old == doc:
+                return 0
+            if (old.name, old.set) == (doc.name, doc.set):
+                self.docs[slot] = doc
+                self.version += 1
+                delta = len(doc.card or b"") - len(old.card or b"")
+                self.card_bytes += delta
+                return delta
+            delta = -self.remove(doc.id)
+        elif len(self.by_id) >= self.max_docs:
+            return None
+        else:
+            delta = 0
+        name_id = self._name(normalize(doc.name))
+        if self.free:
+            slot = self.free.pop()
+            self.docs[slot] = doc
+            self.doc_names[slot] = name_id
+        else:
+            slot = len(self.docs)
+            self.docs.append(doc)
+            self.doc_names.append(name_id)
+        self.by_id[doc.id] = slot
+        self.name_docs[name_id].append(slot)
+        self.by_set.setdefault(doc.set, []).append(slot)
+        self.card_bytes += len(doc.card or b"")
+        self.version += 1
+        return delta + len(doc.card or b"")
+
+    def remove(self, doc_id: str) -> int:
+        """Drop a printing (its name stays indexed); returns the card bytes freed"""
+        slot = self.by_id.pop(doc_id, None)
+        if slot is None:
+            return 0
+        doc = self.docs[slot]
+        self.name_docs[self.doc_names[slot]].remove(slot)
+        self.by_set[doc.set].remove(slot)
+        self.docs[slot] = None
+        self.free.append(slot)
+        self.version += 1
+        self.card_bytes -= len(doc.card or b"")
+        return len(doc.card or b"")
+
+    def numbers(self, set_code: str) -> Dict[str, int]:
+        """Collector number -> slot in one set, English printings first; cached until the segment changes"""
+        if self.numbers_version != self.version:
+            self.numbers_cache = {}
+            self.numbers_version = self.version
+        numbers = self.numbers_cache.get(set_code)
+        if numbers is None:
+            numbers = {}
+            docs = self.docs
+            for slot in self.by_set.get(set_code, ()):
+                doc = docs[slot]
+                if doc.number not in numbers or doc.lang in ("", "en"):
+                    numbers[doc.number] = slot
+            self.numbers_cache[set_code] = numbers
+        return numbers
+
+    def correct(self, word: str) -> str:
+        """The most common indexed word one typo away, or `word` itself"""
+        if word in self.word_counts or len(word) < FUZZY_WORD:
+            return word
+        # An extra, missing, wrong or swapped letter leaves the same string
+        # after deleting one letter from either side
+        candidates = {self.deletes.get(word)}
+        for i in range(len(word)):
+            deleted = word[:i] + word[i + 1:]
+            candidates.add(deleted if deleted in self.word_counts else None)
+            candidates.add(self.deletes.get(deleted))
+        candidates.discard(None)
+        return max(candidates, key=lambda w: (self.word_counts[w], w), default=word)
+
+    def _prefix_matches(self, words: List[str], text: str, scores: Dict[int, float], scale: float):
+        """Score names starting with `text`, then names in which every word starts a word"""
+        names = self.names
+        budget = PREFIX_SCAN
+        lo = bisect_left(self.sorted_names, (text,))
+        hi = bisect_left(self.sorted_names, (text + _LAST,), lo)
+        for name, name_id in self.sorted_names[lo:min(hi, lo + budget)]:
+            scores.setdefault(name_id, ((3.0 if name == text else 2.0) + len(text) / len(name)) * scale)
+        budget -= hi - lo
+        ranges = []
+        for word in set(words):
+            lo = bisect_left(self.words, (word,))
+            hi = bisect_left(self.words, (word + _LAST,), lo)
+            if lo == hi:
+                return
+            ranges.append((hi - lo, lo, word))
+        if budget <= 0:
+            return
+        # Scan the rarest word's range and check the others per name
+        ranges.sort()
+        count, lo, _ = ranges[0]
+        others = None
+        if len(ranges) > 1:
+            others = re.compile("".join(rf"(?=.*\b{re.escape(word)})" for _, _, word in ranges[1:])).match
+        for _, name_id in self.words[lo:lo + min(count, budget)]:
+            if name_id in scores:
+                continue
+            name = names[name_id]
+            if others is None or others(name) is not None:
+                scores[name_id] = (1.0 + len(text) / len(name)) * scale
+
+    def _trigram_matches(self, text: str, scores: Dict[int, float]):
+        query = trigrams(text)
+        # A name sharing FUZZY_MIN of the query's trigrams has at least one of
+        # its rarest len - needed + 1, so only those postings are counted
+        needed = max(1, math.ceil(len(query) * FUZZY_MIN))
+        postings = sorted((self.grams[g] for g in query if g in self.grams), key=len)
+        counts = collections.Counter()
+        budget = FUZZY_BUDGET
+        for posting in postings[:len(query) - needed + 1]:
+            if len(posting) > budget and counts:
+                break
+            counts.update(posting)
+            budget -= len(posting)
+        for name_id, _ in counts.most_common(FUZZY_CANDIDATES):
+            if name_id in scores:
+                continue
+            name_grams = trigrams(self.names[name_id])
+            shared = len(query & name_grams)
+            if shared >= needed:
+                scores[name_id] = 0.25 * (0.7 * shared / len(query) + 0.3 * shared / len(name_grams))
+
+    def match_names(self, words: List[str], text: str) -> List[Tuple[float, int, str, int]]:
+        """Names matching a normalised query, best first, as (-score, length, name, name ID).
+
+        Scores: exact 3+, whole-name prefix 2+, word prefixes 1+, the same
+        with single typos corrected 0.25 to 1, trigram overlap below 0.25.
+        """
+        if not self.names:
+            return []
+        if self.pending_words or self.pending_names:
+            self.flush()
+        scores: Dict[int, float] = {}
+        self._prefix_matches(words, text, scores, 1.0)
+        if len(scores) < FUZZY_BELOW:
+            corrected = [self.correct(word) for word in words]
+            if corrected != words:
+                self._prefix_matches(corrected, " ".join(corrected), scores, 0.25)
+        if not scores and len(text) >= 3:
+            self._trigram_matches(text, scores)
+        names = self.names
+        ranked = [(-score, len(names[name_id]), names[name_id], name_id) for name_id, score in scores.items()]
+        ranked.sort()
+        return ranked
+
+    def set_matches(self, words: List[str], text: str, filters: Filters) -> List[Tuple[tuple, int]]:
+        """(sort key, slot) of the set's printings whose names match every query word by prefix"""
+        match = re.compile("".join(rf"(?=.*\b{re.escape(word)})" for word in words)).match
+        names, docs = self.names, self.docs
+        found = []
+        for slot in self.by_set.get(filters.set, ()):
+            name = names[self.doc_names[slot]]
+            if match(name) is not None and filters.match(docs[slot]):
+                base = 3.0 if name == text else 2.0 if name.startswith(text) else 1.0
+                found.append(((-(base + len(text) / len(name)), len(name), name, _number_order(docs[slot])), slot))
+        found.sort()
+        return found
+
+    def printings(self, name_id: int, filters: Filters) -> List[int]:
+        """A name's printings, newest first"""
+        docs = self.docs
+        slots = self.name_docs[name_id]
+        if filters != NO_FILTERS:
+            slots = [slot for slot in slots if filters.match(docs[slot])]
+        return sorted(slots, key=lambda slot: docs[slot].released, reverse=True)
+
+    def listing(self, filters: Filters) -> List[int]:
+        """A set's printings in collector number order"""
+        slots = [slot for slot in self.by_set.get(filters.set, ()) if filters.match(self.docs[slot])]
+        slots.sort(key=lambda slot: _number_order(self.docs[slot]))
+        return slots
+
+
+class Results(NamedTuple):
+    total: int
+    hits: List[Tuple[str, Document]]
+
+
+class SearchIndex:
+    """The per-game segments, searched together"""
+
+    def __init__(self, max_docs: int = SEARCH_MAX_DOCS, max_bytes: int = SEARCH_MAX_BYTES):
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.segments: Dict[str, Segment] = {game: Segment(game, max_docs) for game in GAMES}
+        self.dropped = collections.Counter()
+
+    def card_bytes(self) -> int:
+        return sum(segment.card_bytes for segment in self.segments.values())
+
+    def add(self, game: str, docs: Iterable[Document]) -> int:
+        """Insert or replace printings; returns how many were dropped for lack of room"""
+        segment = self.segments[game]
+        stored = self.card_bytes()
+        dropped = 0
+        for doc in docs:
+            if doc.card is not None and stored + len(doc.card) > self.max_bytes and doc.id not in segment.by_id:
+                dropped += 1
+                continue
+            delta = segment.add(doc)
+            if delta is None:
+                dropped += 1
+            else:
+                stored += delta
+        segment.flush()
+        self.dropped[game] += dropped
+        return dropped
+
+    def remove(self, game: str, doc_ids: Iterable[str]):
+        segment = self.segments[game]
+        for doc_id in doc_ids:
+            segment.remove(doc_id)
+
+    def replace(self, segment: Segment):
+        self.segments[segment.game] = segment
+
+    def search(self, q: str, games: Iterable[str] = GAMES, set: Optional[str] = None,
+               number: Optional[str] = None, rarity: Optional[str] = None, lang: Optional[str] = None,
+               limit: int = 20, offset: int = 0) -> Results:
+        """Printings matching a query, best first"""
+        text, terms = parse_query(q or "")
+        games = [game for game in games if game in self.segments]
+        if terms.get("game"):
+            games = [game for game in games if game == terms["game"].lower()]
+        set_code = (terms.get("set") or set or "").strip().lower()
+        number = terms.get("number") or number or ""
+        langs = terms.get("lang") or lang or ""
+        langs = frozenset() if langs in ("", "all") else frozenset(langs.lower().split(","))
+
+        # An export's or another tool's code for a set the index knows by another one
+        if set_code and not any(set_code in self.segments[game].by_set for game in games):
+            set_code = next((code for game in games
+                             for code in set_codes.codes.same(game, set_code, self.segments[game].by_set)), set_code)
+
+        # "2xm 117": a set code and a collector number, in either order
+        tokens = text.lower().split()
+        if not set_code and not number and len(tokens) == 2:
+            for code, cn in (tokens, tokens[::-1]):
+                if _NUMBER.match(cn) and any(self.segments[game].by_set.get(code) for game in games):
+                    set_code, number, text = code, cn, ""
+                    break
+
+        filters = Filters(set_code, normalize_number(number), (terms.get("rarity") or rarity or "").lower(), langs)
+        norm = normalize(text)
+        limit += offset
+        hits: List[Tuple[str, Document]] = []
+        total = 0
+        listing = not norm
+        words = norm.split()
+        if words and filters.set:
+            # Scanning one set's printings beats expanding every matching name
+            for _, game, slot in heapq.merge(*(
+                [(key, game, slot) for key, slot in self.segments[game].set_matches(words, norm, filters)]
+                for game in games
+            )):
+                if len(hits) < limit:
+                    hits.append((game, self.segments[game].docs[slot]))
+                total += 1
+        if words and not total:
+            ranked = [(key, game) for game in games for key in self.segments[game].match_names(words, norm)]
+            if len(games) > 1:
+                # Sorted runs per game; timsort merges them in linear time
+                ranked.sort(key=itemgetter(0))
+            position = 0
+            for (_, _, _, name_id), game in ranked:
+                if len(hits) >= limit:
+                    break
+                segment = self.segments[game]
+                slots = segment.printings(name_id, filters)
+                hits.extend((game, segment.docs[slot]) for slot in slots[:limit - len(hits)])
+                total += len(slots)
+                position += 1
+            # Past the page only the count is needed
+            for (_, _, _, name_id), game in ranked[position:]:
+                segment = self.segments[game]
+                if filters == NO_FILTERS:
+                    total += len(segment.name_docs[name_id])
+                else:
+                    total += sum(1 for slot in segment.name_docs[name_id] if filters.match(segment.docs[slot]))
+            # A bare set code lists the set when no name matches it
+            if not total and len(tokens) == 1 and not filters.set:
+                filters = filters._replace(set=tokens[0])
+                listing = True
+        if listing and filters.set:
+            for game in games:
+                segment = self.segments[game]
+                slots = segment.listing(filters)
+                hits.extend((game, segment.docs[slot]) for slot in slots[:limit - len(hits)])
+                total += len(slots)
+        return Results(total, hits[offset:])
+
+    def cards(self, hits: List[Tuple[str, Document]]) -> List[bytes]:
+        """The hits as JSON, in the shape the search routes return"""
+        store = None
+        out = []
+        for game, doc in hits:
+            if doc.card is not None:
+                out.append(doc.card)
+                continue
+            store = store or card_store.current()
+            card = store.get_json(doc.id) if store is not None else None
+            if card is not None:
+                out.append(card[:-1] + b',"game":"mtg"}')
+        return out
+
+    def stats(self) -> dict:
+        return {
+            game: {
+                "documents": len(segment),
+                "names": len(segment.names),
+                "trigrams": len(segment.grams),
+                "card_bytes": segment.card_bytes,
+                "dropped": self.dropped[game],
+            }
+            for game, segment in self.segments.items()
+        }
+
+
+def _pokemon_price(variants) -> Optional[float]:
+    """extractPrice from lib/pokemon-api.ts: the first variant price, in USD"""
+    for variant in variants if isinstance(variants, list) else []:
+        prices = variant.get("prices") if isinstance(variant, dict) else None
+        prices = prices if isinstance(prices, list) else list((prices or {}).values())
+        for price in prices:
+            if not isinstance(price, dict):
+                continue
+            raw = next((price[key] for key in ("market", "mid", "low", "price") if price.get(key) is not None), None)
+            if raw is None:
+                continue
+            try:
+                value = float(raw)
+            except (TypeError, ValueError):
+                return None
+            if str(price.get("currency") or "").upper() == "JPY":
+                return round(value * 0.0067, 4)
+            return value
+    return None
+
+
+def pokemon_card(card: dict) -> dict:
+    """mapScrydexCard from lib/pokemon-api.ts, plus the game the route adds"""
+    images = card.get("images") if isinstance(card.get("images"), list) else []
+    front = next((image for image in images if image.get("type") == "front"), images[0] if images else {})
+    price = _pokemon_price(card.get("variants") or [])
+    lang = str(card.get("languageCode") or card.get("language_code")
+               or ("JA" if card.get("language") == "Japanese" else "")).lower()
+    own, expansion = card.get("set") or {}, card.get("expansion") or {}
+    card_set = {
+        "id": own.get("id") or expansion.get("id") or "",
+        "name": own.get("name") or expansion.get("name") or "",
+        "series": own.get("series") or expansion.get("series") or "",
+        "printedTotal": own.get("printedTotal") or expansion.get("printed_total") or expansion.get("printedTotal"),
+        "total": own.get("total") or expansion.get("total"),
+        "releaseDate": own.get("releaseDate") or expansion.get("release_date") or expansion.get("releaseDate"),
+    }
+    mapped = {
+        "id": card.get("id"),
+        "name": card.get("name"),
+        "supertype": card.get("supertype"),
+        "subtypes": card.get("subtypes") or [],
+        "hp": card.get("hp"),
+        "types": card.get("types") or [],
+        "attacks": card.get("attacks") or [],
+        "weaknesses": card.get("weaknesses") or [],
+        "resistances": card.get("resistances") or [],
+        "retreatCost": card.get("retreat_cost") or card.get("retreatCost") or [],
+        "convertedRetreatCost": card.get("converted_retreat_cost") or card.get("convertedRetreatCost"),
+        "set": {key: value for key, value in card_set.items() if value is not None},
+        "number": card.get("number") or "",
+        "images": {"small": front.get("small") or "", "large": front.get("large") or front.get("medium") or ""},
+        "lang": lang,
+        "language_code": lang.upper(),
+        "translation": card.get("translation"),
+        "pricing": {"usd": price} if price else None,
+        "prices": {"usd": price} if price else None,
+        "game": "pokemon",
+    }
+    # JSON.stringify leaves out undefined fields
+    return {key: value for key, value in mapped.items() if value is not None or key in ("pricing", "prices")}
+
+
+def response_documents(body: bytes, game: Optional[str], games: Set[str]) -> Dict[str, List[Document]]:
+    """Documents for the cards in a search route's response.
+
+    `game` is the route's game; /api/search (None) tags each card with one.
+    Its Lorcana cards are ScryDex's raw shape rather than what the Lorcana
+    route returns, so those are left to that route.
+    """
+    return response_answer(body, game, games)[0]
+
+
+def response_answer(body: bytes, game: Optional[str], games: Set[str],
+                    limit: Optional[int] = None) -> Tuple[Dict[str, List[Document]], bool]:
+    """response_documents(), and whether the response is the query's full answer.
+
+    It is when every card in it has a document (MTG cards left out of `games`
+    count, as the card store has them all) and it lists every match: as many
+    cards as its totalCount or, for routes without one, fewer than `limit`.
+    """
+    data = json.loads(body)
+    cards = (data.get("cards") or data.get("results") or []) if isinstance(data, dict) else []
+    cards = cards if isinstance(cards, list) else []
+    found = collections.defaultdict(list)
+    covered = 0
+    for card in cards:
+        if not isinstance(card, dict):
+            continue
+        card_game = game or card.get("game")
+        if card_game == "mtg" and "mtg" not in games:
+            covered += 1
+            continue
+        if card_game not in games or (game is None and card_game == "lorcana"):
+            continue
+        doc = document(card_game, card)
+        if doc is not None:
+            found[card_game].append(doc)
+            covered += 1
+    total = data.get("totalCount") if isinstance(data, dict) else None
+    if isinstance(total, int) and not isinstance(total, bool):
+        listed = len(cards) >= total
+    else:
+        listed = limit is not None and len(cards) < limit
+    return found, bool(cards) and covered == len(cards) and listed
+
+
+def cache_documents(text: str) -> List[Document]:
+    """Documents for a cached ScryDex response (a card list or a single card)"""
+    data = json.loads(text)
+    cards = data.get("data") if isinstance(data, dict) else None
+    cards = [cards] if isinstance(cards, dict) else cards if isinstance(cards, list) else []
+    docs = (document("pokemon", pokemon_card(card), rarity=card.get("rarity")) for card in cards if isinstance(card, dict))
+    return [doc for doc in docs if doc is not None]
+
+
+def store_update(store: card_store.CardStore, known: Dict[str, bytes], max_docs: int = SEARCH_MAX_DOCS):
+    """What changed in the card store, given the indexed ID -> content hash.
+
+    Returns a whole new segment when nothing was indexed yet or most cards
+    changed, otherwise (documents to add, IDs to remove). Runs in a worker
+    thread.
+    """
+    versions = dict(store.versions())
+    changed = [card_id for card_id, version in versions.items() if known.get(card_id) != version]
+    removed = [card_id for card_id in known if card_id not in versions]
+    if not known or len(changed) + len(removed) > len(known) // 4:
+        segment = Segment("mtg", max_docs)
+        for (card_id, version), card in zip(versions.items(), store.cards()):
+            doc = document("mtg", card, version=version, keep_card=False)
+            if doc is not None:
+                segment.add(doc)
+        segment.flush()
+        return segment
+    docs = (document("mtg", store.get(card_id), version=versions[card_id], keep_card=False) for card_id in changed)
+    return [doc for doc in docs if doc is not None], removed
+
+
+class CacheSource:
+    """The Pokemon responses Next.js cached in api_cache (see lib/api-cache.ts)"""
+
+    def __init__(self, dsn: str = DATABASE_URL):
+        self.dsn = dsn
+        self.pool = None
+        # cache_key -> expires_at of the version already indexed; a refetch
+        # by Next.js moves expires_at
+        self.seen: Dict[str, object] = {}
+
+    async def open(self):
+        import asyncpg
+
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=1)
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def changed(self, batch: int = 50):
+        """Yield the bodies of rows written since the last call"""
+        rows = await self.pool.fetch(
+            "SELECT cache_key, expires_at FROM api_cache WHERE cache_key LIKE 'scrydex:%/pokemon/v1/%cards%'"
+        )
+        keys = [row["cache_key"] for row in rows if self.seen.get(row["cache_key"]) != row["expires_at"]]
+        for start in range(0, len(keys), batch):
+            for row in await self.pool.fetch(
+                "SELECT cache_key, expires_at, response_data::text AS data FROM api_cache WHERE cache_key = ANY($1::text[])",
+                keys[start:start + batch],
+            ):
+                yield row["data"]
+                self.seen[row["cache_key"]] = row["expires_at"]
+
+
+class SearchService:
+    """Keeps the index in step with its sources, in the background of the gateway"""
+
+    def __init__(self, index: Optional[SearchIndex] = None, cache: Optional[CacheSource] = None):
+        self.index = index or SearchIndex()
+        self.cache = cache
+        self.task: Optional[asyncio.Task] = None
+        self.pending: Set[asyncio.Task] = set()
+        # (path, inode, mtime) of the card store the MTG segment was built from
+        self.store_key = None
+        self.syncing = False
+        self.last_sync: Optional[dict] = None
+        # query_key() -> None, oldest first, for searches a proxied response answered in full
+        self.complete: "collections.OrderedDict[tuple, None]" = collections.OrderedDict()
+
+    def start(self, interval: float = SEARCH_SYNC_INTERVAL):
+        if interval <= 0 or (self.task is not None and not self.task.done()):
+            return
+        if self.cache is None and DATABASE_URL:
+            self.cache = CacheSource()
+        self.task = asyncio.get_running_loop().create_task(self._run(interval))
+
+    async def stop(self):
+        tasks = [task for task in (self.task, *self.pending) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.task = None
+        if self.cache is not None:
+            await self.cache.close()
+
+    async def _run(self, interval: float):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                eventlog.emit(logger, "search_sync_error", logging.WARNING, error=f"{type(e).__name__}: {e}")
+            await asyncio.sleep(interval)
+
+    async def sync(self) -> dict:
+        """Bring the index up to date with the card store and api_cache"""
+        if self.syncing:
+            return {"error": "Sync already running"}
+        self.syncing = True
+        started = time.perf_counter()
+        try:
+            summary = {"mtg": await self.sync_store(), "pokemon": await self.sync_cache()}
+        finally:
+            self.syncing = False
+        summary["seconds"] = round(time.perf_counter() - started, 3)
+        self.last_sync = summary
+        if summary["mtg"] or summary["pokemon"]:
+            eventlog.emit(logger, "search_sync", **summary)
+        return summary
+
+    async def sync_store(self) -> Optional[dict]:
+        store = card_store.current()
+        if store is None:
+            return None
+        key = (store.path, store.stat.st_ino, store.stat.st_mtime_ns)
+        if key == self.store_key:
+            return None
+        known = {doc.id: doc.version for doc in self.index.segments["mtg"].docs if doc is not None}
+        update = await asyncio.to_thread(store_update, store, known, self.index.max_docs)
+        if isinstance(update, Segment):
+            self.index.replace(update)
+            result = {"rebuilt": len(update)}
+        else:
+            docs, removed = update
+            await self.apply("mtg", docs, removed)
+            result = {"updated": len(docs), "removed": len(removed)}
+        self.store_key = key
+        return result
+
+    async def sync_cache(self) -> Optional[dict]:
+        if self.cache is None:
+            return None
+        if self.cache.pool is None:
+            await self.cache.open()
+        responses = cards = 0
+        async for text in self.cache.changed():
+            docs = await asyncio.to_thread(cache_documents, text)
+            await self.apply("pokemon", docs)
+            responses += 1
+            cards += len(docs)
+        return {"responses": responses, "cards": cards} if responses else None
+
+    async def apply(self, game: str, docs: List[Document], removed: Iterable[str] = ()) -> int:
+        """Change a live segment in batches, yielding to requests in between; returns the documents dropped"""
+        removed = list(removed)
+        for start in range(0, len(removed), APPLY_BATCH):
+            self.index.remove(game, removed[start:start + APPLY_BATCH])
+            await asyncio.sleep(0)
+        dropped = 0
+        for start in range(0, len(docs), APPLY_BATCH):
+            dropped += self.index.add(game, docs[start:start + APPLY_BATCH])
+            await asyncio.sleep(0)
+        return dropped
+
+    def answers(self, key: tuple) -> bool:
+        """Whether the index holds the full answer to a query_key() search"""
+        _, games, _, _ = key
+        if games == ("mtg",) and self.store_key is not None:
+            return True
+        if key not in self.complete:
+            return False
+        self.complete.move_to_end(key)
+        return True
+
+    def learn(self, game: Optional[str], body: bytes, key: Optional[tuple] = None, limit: Optional[int] = None):
+        """Index the cards in a search response from Next.js, in the background.
+
+        With the query_key() of the search, a response that answered it in
+        full (see response_answer) lets the index answer it from then on.
+        """
+        if not body or len(self.pending) >= MAX_PENDING:
+            return
+        # Once the card store is indexed it has every MTG card already
+        games = {g for g in GAMES if g != "mtg" or self.store_key is None}
+        task = asyncio.get_running_loop().create_task(self._learn(body, game, games, key, limit))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def _learn(self, body: bytes, game: Optional[str], games: Set[str], key: Optional[tuple] = None,
+                     limit: Optional[int] = None):
+        try:
+            found, complete = await asyncio.to_thread(response_answer, body, game, games, limit)
+        except ValueError as e:
+            eventlog.emit(logger, "search_learn_error", logging.DEBUG, error=str(e))
+            return
+        dropped = 0
+        for card_game, docs in found.items():
+            dropped += await self.apply(card_game, docs)
+        if key is not None and complete and not dropped:
+            self.complete[key] = None
+            self.complete.move_to_end(key)
+            while len(self.complete) > SEARCH_MAX_COMPLETE:
+                self.complete.popitem(last=False)
+
+    def status(self) -> dict:
+        return {
+            "segments": self.index.stats(),
+            "card_bytes": self.index.card_bytes(),
+            "max_bytes": self.index.max_bytes,
+            "store_indexed": self.store_key is not None,
+            "cache": self.cache is not None,
+            "pending": len(self.pending),
+            "complete_queries": len(self.complete),
+            "last_sync": self.last_sync,
+        }
+
+
+service = SearchService()
@@ -1,13 +1,64 @@
 from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.responses import StreamingResponse
+import asyncio
+import hmac
 import httpx
+import logging
 import os
 import json
-from typing import Dict, Set
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Set, Tuple
 from dataclasses import dataclass, field
 
-app = FastAPI()
+import api_cache
+import card_store
+import collection_import
+import deck_analytics
+import deck_lists
+import diagnostics
+import eventlog
+import gateway_auth
+import metrics
+import playtest
+import portfolio
+import price_worker
+import proxy_headers
+import search_index
+import tracing
+import upstream
+
+# Next.js server URL (internal)
+NEXTJS_URL = os.environ.get("NEXTJS_URL", "http://localhost:3000")
+
+# Keep-alive connection pools to Next.js, one per traffic class
+upstreams = upstream.create_pools(NEXTJS_URL)
+
+# Event loop lag histogram, plus blocked-callback stacks when GATEWAY_DEBUG is set
+loop_monitor = diagnostics.LoopMonitor(metrics.event_loop_lag, metrics.event_loop_blocked)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    eventlog.start()
+    loop_monitor.start()
+    search_index.service.start()
+    portfolio.service.start()
+    await api_cache.cache.start()
+    yield
+    await collection_import.jobs.stop()
+    await deck_lists.decks.stop()
+    await portfolio.service.stop()
+    await api_cache.cache.stop()
+    await search_index.service.stop()
+    await price_worker.job.stop()
+    await loop_monitor.stop()
+    await upstream.close_pools(upstreams)
+    await tracing.tracer.aclose()
+    await asyncio.to_thread(eventlog.stop)
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -18,8 +69,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Next.js server URL (internal)
-NEXTJS_URL = "http://localhost:3000"
+# Added last so it wraps everything, including CORS preflight responses
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Optional bearer token required to scrape /metrics
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+signaling_logger = logging.getLogger("gateway.signaling")
 
 # WebRTC Signaling Server State
 class SignalingServer:
@@ -34,7 +90,7 @@ class SignalingServer:
     async def connect(self, websocket: WebSocket, user_id: str):
         await websocket.accept()
         self.connections[user_id] = websocket
-        print(f"User {user_id} connected to signaling server")
+        eventlog.emit(signaling_logger, "ws_connect", user_id=user_id, connections=len(self.connections))
     
     def disconnect(self, user_id: str):
         if user_id in self.connections:
@@ -49,7 +105,7 @@ class SignalingServer:
                     del self.rooms[room_id]
             del self.user_rooms[user_id]
         
-        print(f"User {user_id} disconnected from signaling server")
+        eventlog.emit(signaling_logger, "ws_disconnect", user_id=user_id, connections=len(self.connections))
     
     async def join_room(self, user_id: str, room_id: str):
         # Leave current room if any
@@ -72,7 +128,8 @@ class SignalingServer:
                     "room_id": room_id
                 })
         
-        print(f"User {user_id} joined room {room_id}")
+        eventlog.emit(signaling_logger, "room_join", user_id=user_id, room_id=room_id,
+                      room_size=len(self.rooms[room_id]))
         return list(self.rooms[room_id] - {user_id})
     
     async def leave_room(self, user_id: str):
@@ -96,7 +153,8 @@ class SignalingServer:
                 del self.rooms[room_id]
         
         del self.user_rooms[user_id]
-        print(f"User {user_id} left room {room_id}")
+        eventlog.emit(signaling_logger, "room_leave", user_id=user_id, room_id=room_id,
+                      room_size=len(self.rooms.get(room_id, ())))
     
     async def send_to_user(self, target_user_id: str, message: dict):
         if target_user_id in self.connections:
@@ -106,6 +164,70 @@ class SignalingServer:
 
 signaling = SignalingServer()
 
+metrics.registry.register(metrics.Gauge(
+    "signaling_connections", "Open signaling WebSocket connections",
+    collect=lambda: {(): len(signaling.connections)},
+))
+metrics.registry.register(metrics.Gauge(
+    "signaling_rooms", "Active call rooms",
+    collect=lambda: {(): len(signaling.rooms)},
+))
+metrics.registry.register(metrics.Gauge(
+    "signaling_room_members", "Users currently in a call room",
+    collect=lambda: {(): len(signaling.user_rooms)},
+))
+metrics.registry.register(metrics.Gauge(
+    "gateway_log_records_dropped", "Log records dropped because the log queue was full",
+    collect=lambda: {(): eventlog.dropped()},
+))
+metrics.registry.register(metrics.Gauge(
+    "price_refresh_cards", "Cards in the current or last price refresh, by outcome", ("outcome",),
+    collect=lambda: {
+        (outcome,): price_worker.job.status().get(outcome, 0)
+        for outcome in ("total", "priced", "failed", "written")
+    } if price_worker.job.progress else {},
+))
+metrics.registry.register(metrics.Gauge(
+    "search_index_documents", "Printings in the local search index, by game", ("game",),
+    collect=lambda: {(game,): len(segment) for game, segment in search_index.service.index.segments.items()},
+))
+metrics.registry.register(metrics.Gauge(
+    "search_index_card_bytes", "Bytes of card JSON held by the local search index",
+    collect=lambda: {(): search_index.service.index.card_bytes()},
+))
+search_duration = metrics.registry.register(metrics.Histogram(
+    "search_index_query_seconds", "Time to search the local index, by route", ("route",),
+    buckets=metrics.OVERHEAD_BUCKETS,
+))
+metrics.registry.register(metrics.Gauge(
+    "api_cache_lookups", "API cache lookups since start, by where they were answered", ("source",),
+    collect=lambda: {(source,): count for source, count in api_cache.cache.lookups.items()},
+))
+metrics.registry.register(metrics.Gauge(
+    "api_cache_l1_bytes", "Bytes held by the in-process API cache",
+    collect=lambda: {(): api_cache.cache.l1.bytes},
+))
+metrics.registry.register(metrics.Gauge(
+    "api_cache_l1_evictions", "Entries evicted from the in-process API cache since start",
+    collect=lambda: {(): api_cache.cache.l1.evictions},
+))
+metrics.registry.register(metrics.Gauge(
+    "deck_analytics_results", "Deck analytics results since start, by whether they were cached", ("source",),
+    collect=lambda: {("cache",): deck_analytics.analytics.hits, ("computed",): deck_analytics.analytics.misses},
+))
+metrics.registry.register(metrics.Gauge(
+    "deck_playtest_results", "Deck playtest results since start, by whether they were cached", ("source",),
+    collect=lambda: {("cache",): playtest.playtests.hits, ("computed",): playtest.playtests.misses},
+))
+metrics.registry.register(metrics.Gauge(
+    "gateway_upstream_pool", "Upstream connection pool state", ("pool", "state"),
+    collect=lambda: {
+        (name, state): value
+        for name, pool in upstreams.items()
+        for state, value in pool.stats().items()
+    },
+))
+
 # WebSocket endpoint for video call signaling (both with and without /api prefix for compatibility)
 @app.websocket("/ws/signaling/{user_id}")
 @app.websocket("/api/ws/signaling/{user_id}")
@@ -116,6 +238,7 @@ async def websocket_signaling(websocket: WebSocket, user_id: str):
         while True:
             data = await websocket.receive_json()
             message_type = data.get("type")
+            eventlog.emit(signaling_logger, f"signal.{message_type}", user_id=user_id, target=data.get("target"))
             
             if message_type == "join_room":
                 room_id = data.get("room_id")
@@ -205,85 +328,721 @@ async def websocket_signaling(websocket: WebSocket, user_id: str):
     except WebSocketDisconnect:
         signaling.disconnect(user_id)
     except Exception as e:
-        print(f"WebSocket error for user {user_id}: {e}")
+        eventlog.emit(signaling_logger, "ws_error", logging.WARNING, user_id=user_id,
+                      error=f"{type(e).__name__}: {e}")
         signaling.disconnect(user_id)
 
-async def proxy_request(request: Request, path: str):
+async def proxy_request(
+    request: Request,
+    path: str,
+    extra_headers: Optional[Dict[str, str]] = None,
+    pool: str = "pages",
+):
     """Common proxy logic for all requests"""
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        # Build the target URL
-        url = f"{NEXTJS_URL}/{path}"
-        
-        # Get query params
-        query_params = str(request.query_params)
-        if query_params:
-            url = f"{url}?{query_params}"
-        
-        # Get headers (filter some that shouldn't be proxied)
-        headers = {}
-        for key, value in request.headers.items():
-            if key.lower() not in ['host', 'content-length']:
-                headers[key] = value
-        
-        # Get body for POST/PUT requests
-        body = await request.body()
-        
-        # Forward cookies
-        cookies = {}
-        for cookie_name, cookie_value in request.cookies.items():
-            cookies[cookie_name] = cookie_value
-        
+    client = upstreams[pool].client
+    trace = tracing.tracer.start(request.headers.get("traceparent"), request.headers.get("x-request-id"))
+    
+    # Build the target URL (relative to the pool's base URL)
+    url = f"/{path}"
+    
+    # Get query params
+    query_string = request.scope["query_string"]
+    if query_string:
+        url = f"{url}?{query_string.decode('latin-1')}"
+    
+    # Get headers (hop-by-hop and gateway-owned headers are not proxied).
+    # The cookie header is forwarded as-is, so cookies need no separate handling.
+    forwarded = [(key.encode(), value.encode()) for key, value in trace.propagation_headers().items()]
+    if extra_headers:
+        forwarded.extend((key.encode(), value.encode()) for key, value in extra_headers.items())
+    headers = proxy_headers.filter_request_headers(request.scope["headers"], forwarded)
+    
+    # Get body for POST/PUT requests
+    body = await request.body()
+    
+    upstream_start_ns = time.time_ns()
+    # Read by the slow-request log once the response has been sent
+    request.state.trace = trace
+    request.state.upstream_start_ns = upstream_start_ns
+    status_code = 502
+    try:
+        # Make the proxied request
+        upstream_start = time.perf_counter()
         try:
-            # Make the proxied request
             response = await client.request(
                 method=request.method,
                 url=url,
                 headers=headers,
                 content=body if body else None,
-                cookies=cookies,
-            )
-            
-            # Build response
-            excluded_headers = ['content-encoding', 'content-length', 'transfer-encoding', 'connection']
-            response_headers = {
-                key: value for key, value in response.headers.items()
-                if key.lower() not in excluded_headers
-            }
-            
-            return Response(
-                content=response.content,
-                status_code=response.status_code,
-                headers=response_headers,
-                media_type=response.headers.get('content-type', 'text/html')
-            )
-        except httpx.TimeoutException:
-            return Response(
-                content='{"error": "Request timeout"}',
-                status_code=504,
-                media_type='application/json'
-            )
-        except Exception as e:
-            return Response(
-                content=f'{{"error": "Proxy error: {str(e)}"}}',
-                status_code=502,
-                media_type='application/json'
+                extensions={"trace": trace.httpx_hook},
             )
+        finally:
+            request.state.upstream_seconds = time.perf_counter() - upstream_start
+        
+        # Build response from the raw header list
+        response_headers = proxy_headers.filter_response_headers(response.headers.raw)
+        proxied = Response(content=response.content, status_code=response.status_code)
+        proxied.raw_headers.extend(response_headers)
+        if response.content and not any(name == b"content-type" for name, _ in response_headers):
+            proxied.raw_headers.append((b"content-type", b"text/html"))
+        status_code = response.status_code
+    except httpx.TimeoutException:
+        status_code = 504
+        proxied = Response(
+            content='{"error": "Request timeout"}',
+            status_code=504,
+            media_type='application/json'
+        )
+    except Exception as e:
+        proxied = Response(
+            content=f'{{"error": "Proxy error: {str(e)}"}}',
+            status_code=502,
+            media_type='application/json'
+        )
+    
+    proxied.raw_headers.append((b"x-request-id", trace.request_id.encode()))
+    tracing.tracer.finish(
+        trace,
+        f"gateway {request.method} {metrics.route_label(request.scope)}",
+        {
+            "http.request.method": request.method,
+            "url.path": request.url.path,
+            "http.response.status_code": status_code,
+            "http.request_id": trace.request_id,
+            "gateway.upstream_pool": pool,
+        },
+        upstream_start_ns,
+        error=status_code >= 500,
+    )
+    return proxied
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics")
+async def metrics_endpoint(request: Request):
+    """Prometheus text exposition of gateway and signaling metrics"""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        return Response(
+            content='{"error": "Not authenticated"}',
+            status_code=401,
+            media_type='application/json'
+        )
+    return Response(
+        content=metrics.registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+# Token required for the /_gateway/* admin endpoints; unset disables them
+ADMIN_TOKEN = os.environ.get("GATEWAY_ADMIN_TOKEN", "")
+
+def admin_unauthorized(request: Request) -> Optional[Response]:
+    supplied = request.headers.get("authorization", "").encode("latin-1")
+    if not ADMIN_TOKEN or not hmac.compare_digest(supplied, f"Bearer {ADMIN_TOKEN}".encode()):
+        return Response(
+            content='{"error": "Not authenticated"}',
+            status_code=401,
+            media_type='application/json'
+        )
+    return None
+
+@app.get("/_gateway/profile")
+async def profile_endpoint(request: Request, seconds: float = 10.0, format: str = "collapsed"):
+    """Sample the event loop for `seconds` and return collapsed stacks (or JSON)"""
+    unauthorized = admin_unauthorized(request)
+    if unauthorized:
+        return unauthorized
+    try:
+        result = await diagnostics.profiler.profile(max(seconds, 0.0))
+    except RuntimeError as e:
+        return Response(
+            content=json.dumps({"error": str(e)}),
+            status_code=409,
+            media_type='application/json'
+        )
+    if format == "json":
+        return result
+    lag = result["loop_lag"]
+    headers = {"x-profile-samples": str(result["samples"])}
+    for key in ("mean_ms", "p50_ms", "p99_ms", "max_ms"):
+        if key in lag:
+            headers[f"x-loop-lag-{key.replace('_ms', '')}-ms"] = str(lag[key])
+    return Response(
+        content=diagnostics.collapsed(result["stacks"]),
+        media_type="text/plain; charset=utf-8",
+        headers=headers
+    )
+
+@app.post("/_gateway/jobs/price-refresh")
+async def start_price_refresh(request: Request, resume: bool = False):
+    """Start the price refresh worker in the background (see price_worker.py)"""
+    unauthorized = admin_unauthorized(request)
+    if unauthorized:
+        return unauthorized
+    if not price_worker.DATABASE_URL:
+        return Response(
+            content='{"error": "DATABASE_URL is not set"}',
+            status_code=503,
+            media_type='application/json'
+        )
+    if not price_worker.job.start(resume=resume, snapshot=portfolio.service.snapshot):
+        return Response(
+            content=json.dumps({"error": "Price refresh already running", **price_worker.job.status()}),
+            status_code=409,
+            media_type='application/json'
+        )
+    return Response(
+        content=json.dumps(price_worker.job.status()),
+        status_code=202,
+        media_type='application/json'
+    )
+
+@app.get("/_gateway/jobs/price-refresh")
+async def price_refresh_status(request: Request):
+    """Progress of the current or last price refresh"""
+    unauthorized = admin_unauthorized(request)
+    if unauthorized:
+        return unauthorized
+    return price_worker.job.status()
+
+@app.post("/_gateway/jobs/valuation")
+async def run_valuation(request: Request):
+    """Value every collection now and write today's snapshots (see portfolio.py)"""
+    unauthorized = admin_unauthorized(request)
+    if unauthorized:
+        return unauthorized
+    if not portfolio.service.available:
+        return json_error("DATABASE_URL is not set", 503)
+    await portfolio.service.snapshot()
+    return portfolio.service.status()
+
+@app.get("/_gateway/jobs/valuation")
+async def valuation_status(request: Request):
+    """Size of the value series and the outcome of the last valuation"""
+    unauthorized = admin_unauthorized(request)
+    if unauthorized:
+        return unauthorized
+    return portfolio.service.status()
+
+@app.get("/_gateway/search")
+async def search_index_status(request: Request):
+    """Size of the local search index and the outcome of its last sync"""
+    unauthorized = admin_unauthorized(request)
+    if unauthorized:
+        return unauthorized
+    return search_index.service.status()
+
+@app.post("/_gateway/search/sync")
+async def sync_search_index(request: Request):
+    """Sync the search index with the card store and api_cache now"""
+    unauthorized = admin_unauthorized(request)
+    if unauthorized:
+        return unauthorized
+    return await search_index.service.sync()
+
+def cache_response(lookup: api_cache.Lookup) -> Response:
+    headers = {"x-cache": lookup.source}
+    if lookup.body is None:
+        return Response(
+            content='{"error": "Not found"}' if lookup.status == 404 else f'{{"error": "Upstream returned {lookup.status}"}}',
+            status_code=lookup.status,
+            media_type='application/json',
+            headers=headers
+        )
+    return Response(content=lookup.body, media_type='application/json', headers=headers)
+
+@app.get("/_gateway/cache/fetch")
+async def cache_fetch(request: Request, source: str, url: str, ttl: Optional[float] = None):
+    """fetchScryfallCached and friends for Next.js: the response from L1, L2 or upstream"""
+    unauthorized = admin_unauthorized(request)
+    if unauthorized:
+        return unauthorized
+    try:
+        lookup = await api_cache.cache.fetch(source, url, ttl)
+    except ValueError as e:
+        return Response(content=json.dumps({"error": str(e)}), status_code=400, media_type='application/json')
+    return cache_response(lookup)
+
+@app.get("/_gateway/cache")
+async def cache_get(request: Request, key: str):
+    """getFromCache for Next.js"""
+    unauthorized = admin_unauthorized(request)
+    if unauthorized:
+        return unauthorized
+    return cache_response(await api_cache.cache.get(key))
+
+@app.put("/_gateway/cache")
+async def cache_set(request: Request, key: str, ttl: float):
+    """setToCache for Next.js; the body is the JSON to cache"""
+    unauthorized = admin_unauthorized(request)
+    if unauthorized:
+        return unauthorized
+    body = await request.body()
+    try:
+        json.loads(body)
+    except ValueError:
+        return Response(content='{"error": "Body must be JSON"}', status_code=400, media_type='application/json')
+    await api_cache.cache.set(key, body, ttl)
+    return Response(status_code=204)
+
+@app.get("/_gateway/cache/stats")
+async def cache_stats(request: Request):
+    """Size, hit counts and sweeper totals of the API cache"""
+    unauthorized = admin_unauthorized(request)
+    if unauthorized:
+        return unauthorized
+    return api_cache.cache.status()
+
+@app.post("/_gateway/cache/sweep")
+async def cache_sweep(request: Request):
+    """Delete expired API cache entries now"""
+    unauthorized = admin_unauthorized(request)
+    if unauthorized:
+        return unauthorized
+    return await api_cache.cache.sweep()
+
+async def request_user(request: Request) -> Optional[str]:
+    """The caller's user ID from a bearer token or, with a database, a session cookie"""
+    authorization = request.headers.get("authorization", "")
+    if authorization.startswith("Bearer "):
+        user_id = gateway_auth.token_cache.verify(authorization[7:])
+        if user_id:
+            return user_id
+    session_token = request.cookies.get("session_token")
+    if session_token and collection_import.jobs.available:
+        return await collection_import.jobs.session_user(session_token)
+    return None
+
+async def limited_body(request: Request, max_bytes: int) -> Optional[bytes]:
+    """The request body, or None when it is larger than `max_bytes`"""
+    try:
+        if int(request.headers.get("content-length") or 0) > max_bytes:
+            return None
+    except ValueError:
+        pass
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            return None
+    return bytes(body)
+
+def json_error(message: str, status_code: int) -> Response:
+    return Response(content=json.dumps({"error": message}), status_code=status_code, media_type='application/json')
+
+@app.post("/api/collection/import/jobs")
+async def start_import_job(request: Request, gameType: Optional[str] = None):
+    """Spool a CSV export and import it in the background (see collection_import.py)"""
+    if not collection_import.jobs.available:
+        return json_error("DATABASE_URL is not set", 503)
+    user_id = await request_user(request)
+    if not user_id:
+        return json_error("Not authenticated", 401)
+    if request.headers.get("content-type", "").startswith("application/json"):
+        # The route's {csvContent, gameType} body
+        try:
+            body = json.loads(await request.body())
+        except ValueError:
+            return json_error("Invalid JSON", 400)
+        if not isinstance(body, dict) or not body.get("csvContent"):
+            return json_error("No CSV content", 400)
+        gameType = gameType or body.get("gameType")
+
+        async def chunks():
+            yield str(body["csvContent"]).encode()
+    else:
+        chunks = request.stream
+    path = await collection_import.jobs.spool(chunks(), collection_import.IMPORT_MAX_BYTES)
+    if path is None:
+        return json_error(f"Upload larger than {collection_import.IMPORT_MAX_BYTES} bytes", 413)
+    job = await collection_import.jobs.start(user_id, path, gameType)
+    return Response(content=json.dumps(job.status()), status_code=202, media_type='application/json',
+                    headers={"location": f"/api/collection/import/jobs/{job.id}"})
+
+async def import_job(request: Request, job_id: str):
+    """(job, None) for the caller's job, or (None, error response)"""
+    user_id = await request_user(request)
+    if not user_id:
+        return None, json_error("Not authenticated", 401)
+    job = collection_import.jobs.get(job_id, user_id)
+    if job is None:
+        return None, json_error("Import job not found", 404)
+    return job, None
+
+@app.get("/api/collection/import/jobs/{job_id}")
+async def import_job_status(request: Request, job_id: str):
+    job, error = await import_job(request, job_id)
+    return error or job.status()
+
+@app.get("/api/collection/import/jobs/{job_id}/events")
+async def import_job_events(request: Request, job_id: str):
+    """The job's status as server-sent events, until it finishes"""
+    job, error = await import_job(request, job_id)
+    if error:
+        return error
+    return StreamingResponse(collection_import.jobs.events(job), media_type="text/event-stream",
+                             headers={"cache-control": "no-cache"})
+
+@app.delete("/api/collection/import/jobs/{job_id}")
+async def cancel_import_job(request: Request, job_id: str):
+    job, error = await import_job(request, job_id)
+    if error:
+        return error
+    await collection_import.jobs.cancel(job)
+    return job.status()
+
+async def deck_list_body(request: Request) -> Tuple[Optional[str], Optional[str], Optional[Response]]:
+    """(list, game, None) from a text body or the editor's {decklist, game} JSON, or (None, None, error)"""
+    body = await request.body()
+    game = None
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None, None, json_error("Invalid JSON", 400)
+        if not isinstance(data, dict):
+            return None, None, json_error("No deck list", 400)
+        text, game = str(data.get("decklist") or data.get("text") or ""), data.get("game")
+    else:
+        text = body.decode("utf-8", errors="replace")
+    if not text.strip():
+        return None, None, json_error("No deck list", 400)
+    if text.count("\n") >= deck_lists.DECK_MAX_LINES:
+        return None, None, json_error(f"Deck lists are limited to {deck_lists.DECK_MAX_LINES} lines", 413)
+    return text, game, None
+
+async def parse_deck_list(text: str, game: str):
+    """Tokenise a list and match it against the index on the loop; read the cards off it"""
+    deck_list = deck_lists.parse(text)
+    matches = deck_lists.match(game, deck_list.entries)
+    cards = await asyncio.to_thread(deck_lists.load, game, deck_list.entries, matches)
+    return deck_list, cards
+
+@app.post("/api/decks/parse")
+async def parse_deck(request: Request, game: Optional[str] = None):
+    """A pasted deck list resolved against the local index (see deck_lists.py)"""
+    if not await request_user(request):
+        return json_error("Not authenticated", 401)
+    text, body_game, error = await deck_list_body(request)
+    if error:
+        return error
+    game = game or body_game or "mtg"
+    if game not in search_index.GAMES:
+        return json_error(f"Unknown game: {game}", 400)
+    deck_list, cards = await parse_deck_list(text, game)
+    return {
+        "success": True,
+        "format": deck_list.format,
+        "cards": [{"line": entry.line, "cardId": card["id"], "cardData": card, "quantity": entry.quantity,
+                   "category": entry.category, "foil": entry.foil}
+                  for entry, card in zip(deck_list.entries, cards) if card is not None],
+        "unresolved": [{"line": entry.line, "name": entry.name, "quantity": entry.quantity}
+                       for entry, card in zip(deck_list.entries, cards) if card is None],
+        "totalCards": sum(entry.quantity for entry in deck_list.entries),
+    }
+
+async def user_deck(request: Request, deck_id: str, write: bool):
+    """(deck, user_id, None) when the caller may read (or with `write`, change) the deck, else (None, None, error)"""
+    if not deck_lists.decks.available:
+        return None, None, json_error("DATABASE_URL is not set", 503)
+    user_id = await request_user(request)
+    if not user_id:
+        return None, None, json_error("Not authenticated", 401)
+    deck = await deck_lists.decks.deck(deck_id)
+    if deck is None:
+        return None, None, json_error("Deck not found", 404)
+    if deck["user_id"] != user_id and (write or not deck["is_public"]):
+        return None, None, json_error("Not authorized", 403)
+    return deck, user_id, None
+
+@app.post("/api/decks/{deck_id}/import")
+async def import_deck(request: Request, deck_id: str):
+    """Add a pasted list's cards to a deck with one write"""
+    deck, _, error = await user_deck(request, deck_id, write=True)
+    if error:
+        return error
+    text, _, error = await deck_list_body(request)
+    if error:
+        return error
+    game = deck.get("game") if deck.get("game") in search_index.GAMES else "mtg"
+    deck_list, cards = await parse_deck_list(text, game)
+    added = await deck_lists.decks.add(deck_id, deck_list, cards)
+    return {"success": True, "format": deck_list.format, "added": added,
+            "failed": [entry.name for entry, card in zip(deck_list.entries, cards) if card is None]}
+
+@app.get("/api/decks/{deck_id}/export")
+async def export_deck(request: Request, deck_id: str, format: str = "mtga"):
+    """The deck as MTGA, Archidekt or plain text, streamed as it is read"""
+    if format not in deck_lists.EXPORT_FORMATS:
+        return json_error(f"format must be one of {', '.join(deck_lists.EXPORT_FORMATS)}", 400)
+    deck, _, error = await user_deck(request, deck_id, write=False)
+    if error:
+        return error
+    filename = re.sub(r"[^\w.-]+", "_", deck.get("name") or deck_id)
+    return StreamingResponse(deck_lists.decks.export(format, deck_id, deck), media_type="text/plain; charset=utf-8",
+                             headers={"content-disposition": f'attachment; filename="{filename}.txt"'})
+
+@app.post("/api/decks/analytics")
+async def deck_analytics_batch(request: Request):
+    """Statistics and legality for one posted deck, or a batch of them as {decks: [...]}"""
+    if not await request_user(request):
+        return json_error("Not authenticated", 401)
+    body = await limited_body(request, deck_analytics.ANALYTICS_MAX_BYTES)
+    if body is None:
+        return json_error(f"Request body larger than {deck_analytics.ANALYTICS_MAX_BYTES} bytes", 413)
+    try:
+        data = await asyncio.to_thread(json.loads, body)
+    except ValueError:
+        return json_error("Invalid JSON", 400)
+    batch = isinstance(data, dict) and "decks" in data
+    items = data["decks"] if batch else [data]
+    if not isinstance(items, list):
+        return json_error("decks must be a list", 400)
+    if len(items) > deck_analytics.ANALYTICS_MAX_DECKS:
+        return json_error(f"Batches are limited to {deck_analytics.ANALYTICS_MAX_DECKS} decks", 413)
+    try:
+        decks = [deck_analytics.from_json(item) for item in items]
+    except ValueError as exc:
+        return json_error(str(exc), 400)
+    if sum(len(deck.rows) for deck in decks) > deck_analytics.ANALYTICS_MAX_TOTAL_ROWS:
+        return json_error(f"Batches are limited to {deck_analytics.ANALYTICS_MAX_TOTAL_ROWS} cards", 413)
+    results = await deck_analytics.analytics.analyse(decks)
+    return {"success": True, "decks": results} if batch else {"success": True, **results[0]}
+
+@app.get("/api/decks/community/analytics")
+async def community_deck_analytics(game: Optional[str] = None, format: Optional[str] = None):
+    """Analytics of the public decks /api/decks/community lists, computed as one batch"""
+    if not deck_lists.decks.available:
+        return json_error("DATABASE_URL is not set", 503)
+    listed = await deck_lists.decks.public_decks(game if game != "all" else None,
+                                                 format if format != "all" else None)
+    results = await deck_analytics.analytics.analyse(
+        [deck_analytics.Deck(deck.get("game") or "mtg", deck.get("format"), rows) for deck, rows in listed])
+    return {"success": True, "decks": [{"deck_id": deck["deck_id"], "name": deck["name"], **result}
+                                       for (deck, _), result in zip(listed, results)]}
+
+@app.get("/api/decks/{deck_id}/analytics")
+async def deck_analytics_endpoint(request: Request, deck_id: str):
+    """Statistics and legality of a saved deck the caller may read"""
+    deck, _, error = await user_deck(request, deck_id, write=False)
+    if error:
+        return error
+    rows = await deck_lists.decks.cards(deck_id)
+    results = await deck_analytics.analytics.analyse([deck_analytics.Deck(deck.get("game") or "mtg",
+                                                                          deck.get("format"), rows)])
+    return {"success": True, **results[0]}
+
+@app.post("/api/decks/playtest")
+async def deck_playtest(request: Request):
+    """Sampled opening hands and turns of a posted deck: {game, format, cards, hands, turns, onDraw}"""
+    user_id = await request_user(request)
+    if not user_id:
+        return json_error("Not authenticated", 401)
+    body = await limited_body(request, deck_analytics.ANALYTICS_MAX_BYTES)
+    if body is None:
+        return json_error(f"Request body larger than {deck_analytics.ANALYTICS_MAX_BYTES} bytes", 413)
+    try:
+        data = await asyncio.to_thread(json.loads, body)
+    except ValueError:
+        return json_error("Invalid JSON", 400)
+    try:
+        deck = deck_analytics.from_json(data)
+    except ValueError as exc:
+        return json_error(str(exc), 400)
+    settings = {}
+    for field in ("hands", "turns"):
+        if data.get(field) is not None:
+            if not isinstance(data[field], int) or isinstance(data[field], bool):
+                return json_error(f"{field} must be a number", 400)
+            settings[field] = data[field]
+    if not playtest.playtests.allow(user_id, settings.get("hands")):
+        return json_error("Too many playtests, try again in a minute", 429)
+    try:
+        result = await playtest.playtests.run(deck, on_draw=bool(data.get("onDraw")), **settings)
+    except ValueError as exc:
+        return json_error(str(exc), 400)
+    return {"success": True, **result}
+
+@app.get("/api/decks/{deck_id}/playtest")
+async def deck_playtest_endpoint(request: Request, deck_id: str, hands: Optional[int] = None,
+                                 turns: Optional[int] = None, draw: bool = False):
+    """Sampled opening hands and turns of a saved deck the caller may read"""
+    deck, user_id, error = await user_deck(request, deck_id, write=False)
+    if error:
+        return error
+    if not playtest.playtests.allow(user_id, hands):
+        return json_error("Too many playtests, try again in a minute", 429)
+    rows = await deck_lists.decks.cards(deck_id)
+    try:
+        result = await playtest.playtests.run(deck_analytics.Deck(deck.get("game") or "mtg", deck.get("format"), rows),
+                                              hands, turns, draw)
+    except ValueError as exc:
+        return json_error(str(exc), 400)
+    return {"success": True, **result}
+
+@app.get("/api/prices/snapshot")
+async def price_snapshots(request: Request):
+    """The value chart's points from the portfolio series; users it does not have yet go to Next.js"""
+    user_id = await request_user(request)
+    if user_id:
+        series = await portfolio.service.load()
+        if series.has(user_id):
+            return {"success": True, "snapshots": [
+                {"date": point["date"], "value": point["value"], "cardCount": point["cardCount"]}
+                for point in series.points(series.rows(user_id))]}
+    return await proxy_api("prices/snapshot", request)
+
+@app.get("/api/prices/portfolio")
+async def price_portfolio(request: Request, days: Optional[int] = None, resolution: str = "daily", movers: int = 10):
+    """The caller's collection value over the last `days`, downsampled, by game, with the biggest movers"""
+    user_id = await request_user(request)
+    if not user_id:
+        return json_error("Not authenticated", 401)
+    if resolution not in portfolio.RESOLUTIONS:
+        return json_error(f"resolution must be one of {', '.join(portfolio.RESOLUTIONS)}", 400)
+    if days is not None and days < 1:
+        return json_error("days must be positive", 400)
+    result = await portfolio.service.series(user_id, days, resolution, min(max(movers, 0), 100))
+    return {"success": True, **result}
+
+def int_param(value: Optional[str], default: int) -> int:
+    """parseInt as the search routes use it, falling back to their default"""
+    try:
+        return int(value) if value else default
+    except ValueError:
+        return default
+
+def search_locally(key: tuple, q: str, limit: int, offset: int = 0, **filters) -> Optional[Tuple[int, List[bytes]]]:
+    """(total, cards) from the local index for a query_key() search; None when the index may not
+    have the full answer or has nothing, so the route is proxied"""
+    route, games, _, _ = key
+    if not search_index.service.answers(key):
+        return None
+    start = time.perf_counter()
+    results = search_index.service.index.search(q, games=games, limit=limit, offset=offset, **filters)
+    search_duration.observe((route,), time.perf_counter() - start)
+    if not results.total:
+        return None
+    cards = search_index.service.index.cards(results.hits)
+    return (results.total, cards) if cards else None
+
+def local_search_response(key: str, cards: List[bytes], **fields) -> Response:
+    """JSON with the already serialised cards spliced in under `key`"""
+    body = b'{"' + key.encode() + b'":[' + b",".join(cards) + b"]"
+    body += b"," + json.dumps(fields).encode()[1:] if fields else b"}"
+    return Response(content=body, media_type='application/json', headers={"x-search-source": "local"})
+
+@app.get("/api/search")
+async def search(request: Request):
+    """Card searches from the local index when it has results; users, posts, decks and misses go to Next.js"""
+    params = request.query_params
+    game = params.get("game", "all")
+    if params.get("type", "cards") == "cards" and (game == "all" or game in search_index.GAMES):
+        page = max(int_param(params.get("page"), 1), 1)
+        limit = min(int_param(params.get("limit"), 200), 200)
+        filters = {"set": params.get("set"), "number": params.get("number"), "lang": params.get("lang")}
+        key = search_index.query_key("/api/search", params.get("q", ""),
+                                     search_index.GAMES if game == "all" else (game,), **filters)
+        found = search_locally(key, params.get("q", ""), limit, (page - 1) * limit, **filters)
+        if found:
+            total, cards = found
+            return local_search_response("results", cards, success=True, users=[], posts=[], decks=[],
+                                         totalCount=total, page=page, limit=limit)
+        response = await proxy_api("search", request)
+        if response.status_code == 200:
+            search_index.service.learn(None, response.body, key)
+        return response
+    return await proxy_api("search", request)
+
+@app.get("/api/search/pokemon")
+async def search_pokemon(request: Request):
+    """Pokemon searches from the local index when it has the full answer, otherwise from Next.js"""
+    params = request.query_params
+    page = max(int_param(params.get("page"), 1), 1)
+    page_size = min(int_param(params.get("pageSize"), 2000), 5000)
+    filters = {"set": params.get("set"), "number": params.get("number"), "lang": params.get("lang")}
+    key = search_index.query_key("/api/search/pokemon", params.get("q", ""), ("pokemon",), **filters)
+    found = search_locally(key, params.get("q", ""), page_size, (page - 1) * page_size, **filters)
+    if found:
+        total, cards = found
+        return local_search_response("cards", cards, totalCount=total)
+    response = await proxy_api("search/pokemon", request)
+    if response.status_code == 200:
+        search_index.service.learn("pokemon", response.body, key)
+    return response
+
+@app.get("/api/search/lorcana")
+async def search_lorcana(request: Request):
+    """Lorcana searches from the local index when it has the full answer, otherwise from Next.js"""
+    params = request.query_params
+    q = params.get("q", "").strip()
+    page_size = min(int_param(params.get("pageSize"), 20), 50)
+    key = search_index.query_key("/api/search/lorcana", q, ("lorcana",))
+    if q:
+        found = search_locally(key, q, page_size)
+        if found:
+            return local_search_response("cards", found[1])
+    response = await proxy_api("search/lorcana", request)
+    if response.status_code == 200 and q:
+        search_index.service.learn("lorcana", response.body, key, page_size)
+    return response
+
+@app.get("/api/cards/mtg")
+async def mtg_card_lookup(request: Request):
+    """Answer ID and set/number lookups from the local card store and name searches
+    from the search index; proxy everything else"""
+    store = card_store.current()
+    params = request.query_params
+    query = params.get("q", "")
+    filters = {"set": params.get("set"), "number": params.get("number")}
+    key = search_index.query_key("/api/cards/mtg", query, ("mtg",), **filters)
+    if query and search_index.is_plain(query):
+        found = search_locally(key, query, 1000, **filters)
+        if found:
+            return local_search_response("cards", found[1], success=True)
+    if store is not None and not query:
+        card = None
+        if params.get("id"):
+            card = store.get(params["id"])
+        elif params.get("set") and params.get("number"):
+            # Same fallback as the route: try the zero-padded number too
+            card = store.find(params["set"], params["number"]) or store.find(params["set"], params["number"].zfill(3))
+        if card is not None:
+            return Response(
+                content=json.dumps({"success": True, "cards": [card]}),
+                media_type='application/json',
+                headers={"x-card-source": "local"}
+            )
+    response = await proxy_api("cards/mtg", request)
+    if response.status_code == 200 and query:
+        search_index.service.learn("mtg", response.body, key)
+    return response
+
 # Proxy all API requests
 @app.api_route("/api/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
 async def proxy_api(path: str, request: Request):
     """Proxy all /api/* requests to Next.js server"""
-    return await proxy_request(request, f"api/{path}")
+    reject, user_id = gateway_auth.authenticate(
+        f"api/{path}",
+        request.method,
+        request.headers.get("authorization"),
+        request.headers.get("cookie"),
+    )
+    if reject:
+        return Response(
+            content='{"error": "Not authenticated"}',
+            status_code=401,
+            media_type='application/json'
+        )
+    extra_headers = gateway_auth.trusted_user_headers(user_id) if user_id else None
+    return await proxy_request(request, f"api/{path}", extra_headers, pool="api")
 
 # Proxy Next.js static files
 @app.api_route("/_next/{path:path}", methods=["GET"])
 async def proxy_next_static(path: str, request: Request):
     """Proxy Next.js static files"""
-    return await proxy_request(request, f"_next/{path}")
+    return await proxy_request(request, f"_next/{path}", pool="static")
 
 # Proxy all other requests (pages)
 @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
@@ -296,3 +1055,17 @@ async def proxy_pages(path: str, request: Request):
 async def proxy_root(request: Request):
     """Proxy root path to Next.js server"""
     return await proxy_request(request, "")
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # Behind an edge proxy on the same host, GATEWAY_UDS serves on a Unix
+    # domain socket instead of a TCP port
+    uvicorn.run(
+        app,
+        host=os.environ.get("GATEWAY_HOST", "0.0.0.0"),
+        port=int(os.environ.get("GATEWAY_PORT", "8001")),
+        uds=os.environ.get("GATEWAY_UDS") or None,
+        # Requests are logged by eventlog's access log instead
+        access_log=not eventlog.ACCESS_LOG,
+    )
@@ -0,0 +1,235 @@
+"""Set codes and collector numbers to cards, without the network.
+
+Exports name the same set in different ways: TCGdex says sv03 where
+Pokemon exports say OBF and ScryDex says sv3, Arena says DAR for
+Scryfall's dom and MTGO and old deck tools use two-letter codes like 7E
+and MI, and Lorcana sets go by number, abbreviation or name. Each game's
+aliases are compiled once into a dict from the folded spelling (lowercase,
+letters and digits only, and for Pokemon no zero padding) to an interned
+canonical code, so a lookup is one fold and one dict probe.
+
+resolve() turns many (set, collector number) pairs into card IDs at once:
+pairs are grouped by canonical set, each set's printings are read from a
+search index segment once, and MTG printings the index lacks are looked up
+in the card store. The collection import, deck import and the search
+routes' set filters all go through here.
+"""
+import re
+import sys
+from typing import Collection, Dict, Iterable, List, Optional, Tuple
+
+import card_store
+
+# Pokemon TCG set code mappings (common export codes -> TCGdex codes), as in
+# the Next.js import route
+POKEMON_SET_ALIASES = {
+    # Scarlet & Violet Era
+    "sv09": "sv09", "jtg": "sv09",
+    "sv08": "sv08", "ssp": "sv08",
+    "sv07": "sv07", "scr": "sv07",
+    "sv06": "sv06", "twm": "sv06",
+    "sv05": "sv05", "tef": "sv05",
+    "sv04": "sv04", "par": "sv04",
+    "sv03": "sv03", "obf": "sv03",
+    "sv02": "sv02", "pal": "sv02",
+    "sv01": "sv01", "svi": "sv01",
+    "svp": "svp",
+    # Sword & Shield Era
+    "swsh12": "swsh12", "crs": "swsh12", "sil": "swsh12",
+    "swsh11": "swsh11", "loi": "swsh11", "lor": "swsh11",
+    "swsh10": "swsh10", "asr": "swsh10",
+    "swsh9": "swsh9", "brs": "swsh9",
+    "swsh8": "swsh8", "fus": "swsh8", "fsn": "swsh8",
+    "swsh7": "swsh7", "evs": "swsh7",
+    "swsh6": "swsh6", "cre": "swsh6",
+    "swsh5": "swsh5", "bst": "swsh5",
+    "swsh4": "swsh4", "viv": "swsh4",
+    "swsh3": "swsh3", "dab": "swsh3",
+    "swsh2": "swsh2", "reb": "swsh2",
+    "swsh1": "swsh1",
+    "swshp": "swshp",
+    # Sun & Moon Era
+    "sm12": "sm12", "cec": "sm12",
+    "sm11": "sm11", "unm": "sm11",
+    "sm10": "sm10", "unb": "sm10",
+    "sm9": "sm9", "det": "sm9",
+    "sm8": "sm8", "lot": "sm8",
+    "sm7": "sm7", "cel": "sm7",
+    "sm6": "sm6", "fli": "sm6",
+    "sm5": "sm5", "ula": "sm5",
+    "sm4": "sm4", "cri": "sm4",
+    "sm3": "sm3", "bus": "sm3",
+    "sm2": "sm2", "gri": "sm2",
+    "sm1": "sm1",
+    "smp": "smp",
+    # XY Era
+    "xy12": "xy12", "evo": "xy12",
+    "xy11": "xy11", "stc": "xy11",
+    "xy10": "xy10", "fco": "xy10",
+    "xy9": "xy9", "bkp": "xy9",
+    "xy8": "xy8", "bkt": "xy8",
+    "xy7": "xy7", "aor": "xy7",
+    "xy6": "xy6", "ros": "xy6",
+    "xy5": "xy5", "prc": "xy5",
+    "xy4": "xy4", "phf": "xy4",
+    "xy3": "xy3", "ffi": "xy3",
+    "xy2": "xy2", "flf": "xy2",
+    "xy1": "xy1",
+    "xyp": "xyp",
+}
+
+# MTG codes other tools use -> Scryfall codes: Arena's, and the two-letter
+# codes of MTGO, Magic Workstation and Apprentice deck files
+MTG_SET_ALIASES = {
+    "dar": "dom",
+    "an": "arn", "aq": "atq", "lg": "leg", "dk": "drk", "fe": "fem", "hm": "hml", "ia": "ice",
+    "al": "all", "mi": "mir", "vi": "vis", "wl": "wth", "te": "tmp", "sh": "sth", "ex": "exo",
+    "us": "usg", "ul": "ulg", "ud": "uds", "mm": "mmq", "ne": "nem", "pr": "pcy", "in": "inv",
+    "ps": "pls", "ap": "apc", "od": "ody", "tr": "tor", "ju": "jud", "on": "ons", "le": "lgn",
+    "sc": "scg", "cs": "csp", "ch": "chr", "po": "por", "p2": "p02",
+    "4e": "4ed", "5e": "5ed", "6e": "6ed", "7e": "7ed", "8e": "8ed", "9e": "9ed",
+}
+
+# Lorcana sets: number, the abbreviations exports use, name
+LORCANA_SETS = (
+    (1, ("tfc",), "The First Chapter"),
+    (2, ("rof", "rotf"), "Rise of the Floodborn"),
+    (3, ("iti", "itl"), "Into the Inklands"),
+    (4, ("urr", "ur"), "Ursula's Return"),
+    (5, ("ssk", "shs"), "Shimmering Skies"),
+    (6, ("azs", "as"), "Azurite Sea"),
+    (7, ("ari", "ai"), "Archazia's Island"),
+    (8, ("roj",), "Reign of Jafar"),
+    (9, ("fab",), "Fabled"),
+)
+
+_SET_CODE_CHARS = re.compile(r"[^a-z0-9]")
+_ZERO_PADDING = re.compile(r"(?<=[a-z])0+(?=\d)")
+_LEADING_ZEROS = re.compile(r"^0+(?=\d)")
+
+Printing = Tuple[str, str]
+
+
+def map_pokemon_set_code(set_code: str) -> str:
+    """The TCGdex code for a Pokemon export's set code, as the import route maps it"""
+    code = _SET_CODE_CHARS.sub("", set_code.lower())
+    return POKEMON_SET_ALIASES.get(code, code)
+
+
+def normalize_number(number) -> str:
+    return _LEADING_ZEROS.sub("", str(number or "").strip().lower())
+
+
+def fold(game: str, code: str) -> str:
+    """A set code as the alias tables are keyed: "S&V 03" -> "sv3" for Pokemon"""
+    folded = _SET_CODE_CHARS.sub("", str(code or "").lower())
+    return _ZERO_PADDING.sub("", folded) if game == "pokemon" else folded
+
+
+def _lorcana_aliases() -> Dict[str, str]:
+    aliases = {}
+    for number, codes, name in LORCANA_SETS:
+        for alias in (str(number), f"set{number}", *codes, name):
+            aliases[alias] = str(number)
+    return aliases
+
+
+class SetCodes:
+    """Per game, a folded alias -> canonical set code table.
+
+    Canonical codes are Scryfall's for MTG, folded TCGdex codes for Pokemon
+    and set numbers for Lorcana. A code no table knows is its own canonical
+    code.
+    """
+
+    def __init__(self, aliases: Dict[str, Dict[str, str]]):
+        self.tables: Dict[str, Dict[str, str]] = {}
+        for game, table in aliases.items():
+            self.tables[game] = {sys.intern(fold(game, alias)): sys.intern(fold(game, code))
+                                 for alias, code in table.items()}
+        # Per game: the last set codes grouped, the collection they came from and its size
+        self._groups: Dict[str, Tuple[Collection[str], int, Dict[str, List[str]]]] = {}
+
+    def canonical(self, game: str, code: str) -> str:
+        folded = fold(game, code)
+        return self.tables.get(game, {}).get(folded, folded)
+
+    def groups(self, game: str, known: Collection[str]) -> Dict[str, List[str]]:
+        """The codes in `known` by canonical code.
+
+        Cached for the last collection per game while its size is unchanged;
+        an index segment's set codes are only ever added to.
+        """
+        cached = self._groups.get(game)
+        if cached is not None and cached[0] is known and cached[1] == len(known):
+            return cached[2]
+        groups: Dict[str, List[str]] = {}
+        for code in list(known):
+            groups.setdefault(self.canonical(game, code), []).append(code)
+        self._groups[game] = (known, len(known), groups)
+        return groups
+
+    def same(self, game: str, code: str, known: Collection[str]) -> List[str]:
+        """The codes among `known` (such as an index segment's sets) naming the same set as `code`"""
+        return self.groups(game, known).get(self.canonical(game, code), [])
+
+
+codes = SetCodes({"mtg": MTG_SET_ALIASES, "pokemon": POKEMON_SET_ALIASES, "lorcana": _lorcana_aliases()})
+
+
+def card_id(game: str, doc) -> str:
+    """The card ID of a search index document (Pokemon documents carry a language suffix)"""
+    if game == "pokemon" and doc.lang and doc.id.endswith(f"-{doc.lang}"):
+        return doc.id[:-len(doc.lang) - 1]
+    return doc.id
+
+
+def _wanted(game: str, printings: Iterable[Printing]) -> Dict[str, List[Tuple[Printing, str]]]:
+    """Distinct pairs grouped by canonical set, with normalised numbers"""
+    wanted: Dict[str, List[Tuple[Printing, str]]] = {}
+    for printing in dict.fromkeys(printings):
+        set_code, number = printing
+        wanted.setdefault(codes.canonical(game, set_code), []).append((printing, normalize_number(number)))
+    return wanted
+
+
+def printings(game: str, pairs: Iterable[Printing], segment) -> dict:
+    """Search index documents for (set code, collector number) pairs; English printings win"""
+    found = {}
+    groups = codes.groups(game, segment.by_set)
+    for canonical, wanted in _wanted(game, pairs).items():
+        for code in groups.get(canonical, ()):
+            numbers = segment.numbers(code)
+            for printing, number in wanted:
+                slot = numbers.get(number)
+                if slot is not None and printing not in found:
+                    found[printing] = segment.docs[slot]
+    return found
+
+
+def find_stored(store: card_store.CardStore, set_code: str, number: str) -> Optional[dict]:
+    """An MTG printing from the card store by any alias of its set"""
+    canonical = codes.canonical("mtg", set_code)
+    card = store.find(canonical, number)
+    if card is None and normalize_number(number) != number.strip().lower():
+        card = store.find(canonical, normalize_number(number))
+    return card
+
+
+def resolve(game: str, pairs: Iterable[Printing], segment=None,
+            store: Optional[card_store.CardStore] = None) -> Dict[Printing, str]:
+    """Card IDs for (set code, collector number) pairs; pairs found nowhere are left out.
+
+    `segment` is the game's search index segment and `store` the MTG card
+    store; either may be None.
+    """
+    pairs = list(dict.fromkeys(pairs))
+    found = {printing: card_id(game, doc) for printing, doc in
+             (printings(game, pairs, segment) if segment is not None else {}).items()}
+    if game == "mtg" and store is not None:
+        for printing in pairs:
+            if printing not in found:
+                card = find_stored(store, *printing)
+                if card is not None:
+                    found[printing] = card["id"]
+    return found
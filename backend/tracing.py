@@ -0,0 +1,253 @@
+"""Request IDs and W3C trace context for proxied requests, with OTLP export.
+
+Every proxied request gets a `traceparent` and an `X-Request-ID` (accepted
+from the client when well-formed, generated otherwise) which are forwarded to
+Next.js and echoed back. Upstream phase times are collected for every
+request with httpx's trace extension (the slow-request log reports them), and
+sampled requests turn them into spans:
+
+    gateway <method> <route>   whole request inside the gateway (server span)
+      upstream.queue           waiting for a pooled connection
+      upstream.connect         TCP/UDS connect and TLS handshake, if any
+      upstream.ttfb            request sent until response headers received
+      upstream.body            response body transfer
+
+Spans are exported in batches as OTLP/JSON, either appended to a file
+(TRACE_EXPORT_FILE, one ExportTraceServiceRequest per line) or POSTed to a
+collector (OTEL_EXPORTER_OTLP_TRACES_ENDPOINT, e.g.
+http://localhost:4318/v1/traces). TRACE_SAMPLE_RATE (0.0-1.0) sets the share
+of new traces that are sampled; an incoming sampled traceparent is always
+honoured. Unsampled requests only pay for ID generation and a few event
+timestamps.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "hatake-gateway")
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_EXPORT_FILE = os.environ.get("TRACE_EXPORT_FILE", "")
+TRACE_EXPORT_ENDPOINT = os.environ.get("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT", "")
+
+EXPORT_BATCH_SIZE = 512
+EXPORT_INTERVAL = 2.0
+# Spans are dropped rather than queued without bound if the exporter falls behind
+MAX_QUEUED_SPANS = 8192
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+def _random_hex(nbytes: int) -> str:
+    return random.getrandbits(nbytes * 8).to_bytes(nbytes, "big").hex()
+
+
+def parse_traceparent(value: Optional[str]):
+    """Return (trace_id, parent_span_id, sampled) or None if missing or invalid"""
+    if not value:
+        return None
+    match = TRACEPARENT_RE.match(value.strip().lower())
+    if match is None:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    if trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+def _attributes(values: Dict[str, object]) -> List[dict]:
+    attributes = []
+    for key, value in values.items():
+        if isinstance(value, bool):
+            attributes.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            attributes.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            attributes.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            attributes.append({"key": key, "value": {"stringValue": str(value)}})
+    return attributes
+
+
+def _span(trace_id, span_id, parent_id, name, kind, start_ns, end_ns, attributes=None, error=False) -> dict:
+    span = {
+        "traceId": trace_id,
+        "spanId": span_id,
+        "name": name,
+        "kind": kind,
+        "startTimeUnixNano": str(start_ns),
+        "endTimeUnixNano": str(end_ns),
+        "attributes": _attributes(attributes or {}),
+        "status": {"code": STATUS_ERROR if error else STATUS_UNSET},
+    }
+    if parent_id:
+        span["parentSpanId"] = parent_id
+    return span
+
+
+class RequestTrace:
+    """Trace context for one proxied request"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "sampled", "request_id", "start_ns", "events")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], sampled: bool, request_id: str):
+        self.trace_id = trace_id
+        self.span_id = _random_hex(8)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.request_id = request_id
+        self.start_ns = time.time_ns()
+        # httpcore trace event name -> wall clock time in ns
+        self.events: Dict[str, int] = {}
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def propagation_headers(self) -> Dict[str, str]:
+        return {"traceparent": self.traceparent, "x-request-id": self.request_id}
+
+    async def httpx_hook(self, event_name: str, info: dict):
+        """httpx `trace` extension callback; keeps the first time of each event"""
+        self.events.setdefault(event_name, time.time_ns())
+
+    def _first(self, *suffixes: str) -> Optional[int]:
+        times = [t for name, t in self.events.items() if name.endswith(suffixes)]
+        return min(times) if times else None
+
+    def _last(self, *suffixes: str) -> Optional[int]:
+        times = [t for name, t in self.events.items() if name.endswith(suffixes)]
+        return max(times) if times else None
+
+    def phases(self, upstream_start_ns: Optional[int]) -> List[Tuple[str, int, int]]:
+        """(name, start_ns, end_ns) for each upstream phase that completed"""
+        if upstream_start_ns is None:
+            return []
+        phases = []
+
+        def phase(name, start, end):
+            if start is not None and end is not None and end >= start:
+                phases.append((name, start, end))
+
+        connect_start = self._first("connect_tcp.started", "connect_unix_socket.started")
+        send_start = self._first("send_request_headers.started")
+        # Whatever happens first on the connection ends the wait for the pool
+        phase("upstream.queue", upstream_start_ns, connect_start or send_start)
+        phase("upstream.connect", connect_start, self._last("connect_tcp.complete",
+                                                           "connect_unix_socket.complete",
+                                                           "start_tls.complete"))
+        phase("upstream.ttfb", send_start, self._first("receive_response_headers.complete"))
+        phase("upstream.body", self._first("receive_response_body.started"),
+              self._last("receive_response_body.complete"))
+        return phases
+
+    def phase_durations_ms(self, upstream_start_ns: Optional[int]) -> Dict[str, float]:
+        return {name: round((end - start) / 1e6, 3) for name, start, end in self.phases(upstream_start_ns)}
+
+    def build_spans(self, name: str, attributes: Dict[str, object], upstream_start_ns: Optional[int],
+                    end_ns: int, error: bool) -> List[dict]:
+        spans = [_span(self.trace_id, self.span_id, self.parent_id, name, SPAN_KIND_SERVER,
+                       self.start_ns, end_ns, attributes, error)]
+        for child_name, start, end in self.phases(upstream_start_ns):
+            spans.append(_span(self.trace_id, _random_hex(8), self.span_id, child_name,
+                               SPAN_KIND_CLIENT if child_name == "upstream.ttfb" else SPAN_KIND_INTERNAL,
+                               start, end))
+        return spans
+
+
+class Tracer:
+    def __init__(self, sample_rate: float = TRACE_SAMPLE_RATE, export_file: str = TRACE_EXPORT_FILE,
+                 export_endpoint: str = TRACE_EXPORT_ENDPOINT):
+        self.export_file = export_file
+        self.export_endpoint = export_endpoint
+        # Without an exporter there is nowhere to send spans, so never sample
+        self.exporting = bool(export_file or export_endpoint)
+        self.sample_rate = sample_rate
+        self.queue: List[dict] = []
+        self.dropped = 0
+        self._flusher: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def start(self, traceparent: Optional[str], request_id: Optional[str]) -> RequestTrace:
+        if request_id is None or not REQUEST_ID_RE.match(request_id):
+            request_id = _random_hex(16)
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+            sampled = sampled and self.exporting
+        else:
+            trace_id, parent_id = _random_hex(16), None
+            sampled = self.exporting and random.random() < self.sample_rate
+        return RequestTrace(trace_id, parent_id, sampled, request_id)
+
+    def finish(self, trace: RequestTrace, name: str, attributes: Dict[str, object],
+               upstream_start_ns: Optional[int] = None, error: bool = False):
+        if not trace.sampled:
+            return
+        spans = trace.build_spans(name, attributes, upstream_start_ns, time.time_ns(), error)
+        if len(self.queue) + len(spans) > MAX_QUEUED_SPANS:
+            self.dropped += len(spans)
+            return
+        self.queue.extend(spans)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    def _payload(self, spans: List[dict]) -> dict:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _attributes({"service.name": SERVICE_NAME})},
+                "scopeSpans": [{"scope": {"name": "hatake.gateway"}, "spans": spans}],
+            }]
+        }
+
+    async def _export(self, spans: List[dict]):
+        payload = self._payload(spans)
+        if self.export_file:
+            line = json.dumps(payload, separators=(",", ":")) + "\n"
+            await asyncio.to_thread(self._append, line)
+        if self.export_endpoint:
+            if self._client is None:
+                self._client = httpx.AsyncClient(timeout=5.0)
+            try:
+                await self._client.post(self.export_endpoint, json=payload)
+            except httpx.HTTPError:
+                self.dropped += len(spans)
+
+    def _append(self, line: str):
+        with open(self.export_file, "a") as f:
+            f.write(line)
+
+    async def _flush_loop(self):
+        while self.queue:
+            await asyncio.sleep(EXPORT_INTERVAL)
+            await self.flush()
+
+    async def flush(self):
+        while self.queue:
+            batch, self.queue = self.queue[:EXPORT_BATCH_SIZE], self.queue[EXPORT_BATCH_SIZE:]
+            await self._export(batch)
+
+    async def aclose(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+tracer = Tracer()
@@ -0,0 +1,124 @@
+"""Pooled HTTP clients for talking to Next.js.
+
+Each pool owns one long-lived httpx.AsyncClient so connections are kept
+alive between proxied requests. Pools are configured from the environment,
+falling back to NEXTJS_URL and HTTP/1.1:
+
+    UPSTREAM_<NAME>_URL              base URL for this pool
+    UPSTREAM_<NAME>_UDS              Unix domain socket to connect through
+                                     instead of TCP (the URL then only sets
+                                     the Host header and path prefix)
+    UPSTREAM_<NAME>_HTTP             "1.1", "h2c" (HTTP/2 prior knowledge over
+                                     cleartext) or "h2" (HTTP/2 via TLS ALPN)
+    UPSTREAM_<NAME>_MAX_CONNECTIONS  connection limit for this pool
+    UPSTREAM_<NAME>_KEEPALIVE_EXPIRY seconds an idle connection is reused; keep
+                                     this below Node's 5 s keepAliveTimeout so
+                                     we never write to a socket Next.js closed
+
+NEXTJS_HTTP and NEXTJS_UDS set the defaults for every pool.
+"""
+import os
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Dict, Optional
+
+import httpx
+
+HTTP_VERSIONS = ("1.1", "h2c", "h2")
+
+POOL_NAMES = ("api", "static", "pages")
+
+
+def _no_cookie_jar() -> CookieJar:
+    # A shared client must never remember one user's Set-Cookie and replay it
+    # for the next request, so refuse to store anything.
+    return CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+
+
+class UpstreamPool:
+    """A named, lazily created connection pool to one upstream"""
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        http_version: str = "1.1",
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 4.0,
+        timeout: float = 60.0,
+        uds: Optional[str] = None,
+    ):
+        if http_version not in HTTP_VERSIONS:
+            raise ValueError(f"Unsupported upstream HTTP version for pool {name}: {http_version}")
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.http_version = http_version
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        self.uds = uds
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def from_env(cls, name: str, default_url: str) -> "UpstreamPool":
+        prefix = f"UPSTREAM_{name.upper()}_"
+        return cls(
+            name,
+            os.environ.get(prefix + "URL", default_url),
+            http_version=os.environ.get(prefix + "HTTP", os.environ.get("NEXTJS_HTTP", "1.1")),
+            max_connections=int(os.environ.get(prefix + "MAX_CONNECTIONS", "100")),
+            keepalive_expiry=float(os.environ.get(prefix + "KEEPALIVE_EXPIRY", "4.0")),
+            uds=os.environ.get(prefix + "UDS", os.environ.get("NEXTJS_UDS")) or None,
+        )
+
+    def _build_client(self) -> httpx.AsyncClient:
+        transport = httpx.AsyncHTTPTransport(
+            http1=self.http_version == "1.1" or self.http_version == "h2",
+            http2=self.http_version != "1.1",
+            limits=self.limits,
+            uds=self.uds,
+        )
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            transport=transport,
+            timeout=self.timeout,
+            cookies=_no_cookie_jar(),
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = self._build_client()
+        return self._client
+
+    def stats(self) -> Dict[str, int]:
+        """Connection counts for /metrics, read from httpcore's pool; empty if its internals change"""
+        if self._client is None:
+            return {"connections": 0, "idle": 0, "queued_requests": 0}
+        try:
+            pool = self._client._transport._pool
+            connections = pool.connections
+            return {
+                "connections": len(connections),
+                "idle": sum(1 for connection in connections if connection.is_idle()),
+                "queued_requests": sum(1 for request in pool._requests if request.is_queued()),
+            }
+        except (AttributeError, TypeError):
+            return {}
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def create_pools(default_url: str) -> Dict[str, UpstreamPool]:
+    return {name: UpstreamPool.from_env(name, default_url) for name in POOL_NAMES}
+
+
+async def close_pools(pools: Dict[str, UpstreamPool]):
+    for pool in pools.values():
+        await pool.aclose()
@@ -87,6 +87,33 @@ export async function getCacheStats(): Promise<{ total: number; size: number }>
   } catch (e) { return { total: 0, size: 0 }; }
 }
 
+// When set (e.g. http://127.0.0.1:8001), the fetch helpers below go through
+// the gateway's two-tier cache (backend/api_cache.py): hot keys are answered
+// from its memory, not-found answers are cached and concurrent misses share
+// one upstream request. Without it, or if the gateway is unreachable, they
+// use api_cache directly.
+const GATEWAY_CACHE_URL = process.env.GATEWAY_CACHE_URL;
+const GATEWAY_ADMIN_TOKEN = process.env.GATEWAY_ADMIN_TOKEN || '';
+
+// undefined means "ask api_cache and the API directly instead"
+async function fetchViaGateway(source: string, url: string, ttl?: number): Promise<any | null | undefined> {
+  if (!GATEWAY_CACHE_URL) return undefined;
+  const params = new URLSearchParams({ source, url });
+  if (ttl !== undefined) params.set('ttl', String(ttl));
+  try {
+    const res = await fetch(`${GATEWAY_CACHE_URL}/_gateway/cache/fetch?${params}`, {
+      headers: { 'Authorization': `Bearer ${GATEWAY_ADMIN_TOKEN}` },
+      cache: 'no-store',
+    });
+    if (res.ok) return await res.json();
+    // Misconfigured token or origin; anything else is the upstream's answer
+    if (res.status === 400 || res.status === 401) return undefined;
+    return null;
+  } catch (e) {
+    return undefined;
+  }
+}
+
 /**
  * Robust Scrydex Fetcher
  * Includes Neon caching, X-Team-ID header, and casing normalization.
@@ -98,6 +125,9 @@ export async function fetchScrydex(endpoint: string, queryParams: string = '', t
   const url = `https://api.scrydex.com/pokemon/v1/${cleanEndpoint}?${queryParams}${separator}casing=camel`;
   const cacheKey = `scrydex:${url}`;
 
+  const viaGateway = await fetchViaGateway('scrydex', url, ttl);
+  if (viaGateway !== undefined) return viaGateway;
+
   // 1. Check Cache
   const cached = await getFromCache(cacheKey);
   if (cached) return cached;
@@ -127,6 +157,8 @@ export async function fetchScrydex(endpoint: string, queryParams: string = '', t
 
 // Compatibility helpers for Scryfall/TCGdex
 export async function fetchScryfallCached(url: string): Promise<any> {
+  const viaGateway = await fetchViaGateway('scryfall', url);
+  if (viaGateway !== undefined) return viaGateway;
   const cacheKey = `scryfall:${url}`;
   const cached = await getFromCache(cacheKey);
   if (cached) return cached;
@@ -141,6 +173,8 @@ export async function fetchScryfallCached(url: string): Promise<any> {
 }
 
 export async function fetchTCGdexCached(url: string): Promise<any> {
+  const viaGateway = await fetchViaGateway('tcgdex', url);
+  if (viaGateway !== undefined) return viaGateway;
   const cacheKey = `tcgdex:${url}`;
   const cached = await getFromCache(cacheKey);
   if (cached) return cached;
@@ -1,5 +1,6 @@
 import jwt from 'jsonwebtoken';
 import bcrypt from 'bcryptjs';
+import { createHmac, timingSafeEqual } from 'crypto';
 import { config } from './config';
 import sql from './db';
 
@@ -48,15 +49,41 @@ export async function getUserFromToken(token: string): Promise<User | null> {
   const decoded = verifyToken(token);
   if (!decoded) return null;
 
+  return getUserById(decoded.user_id);
+}
+
+export async function getUserById(userId: string): Promise<User | null> {
   const result = await sql`
     SELECT user_id, email, name, picture, email_verified, is_admin
     FROM users
-    WHERE user_id = ${decoded.user_id}
+    WHERE user_id = ${userId}
   `;
 
   return (result[0] as User) || null;
 }
 
+// The Python gateway (backend/gateway_auth.py) verifies Bearer tokens itself and
+// forwards the user id with an HMAC over it, so we can skip jwt.verify here.
+export function getGatewayUserId(request: Request): string | null {
+  const userId = request.headers.get('x-gateway-user-id');
+  const expires = request.headers.get('x-gateway-user-expires');
+  const signature = request.headers.get('x-gateway-user-signature');
+  if (!userId || !expires || !signature) return null;
+  const expiresAt = Number(expires);
+  if (!Number.isFinite(expiresAt) || expiresAt * 1000 < Date.now()) return null;
+
+  const expected = createHmac('sha256', config.jwt.secret)
+    .update(`${userId}.${expires}`)
+    .digest('hex');
+  if (
+    expected.length !== signature.length ||
+    !timingSafeEqual(Buffer.from(expected), Buffer.from(signature))
+  ) {
+    return null;
+  }
+  return userId;
+}
+
 export async function createSession(
   userId: string,
   sessionToken: string,
@@ -91,7 +118,14 @@ export async function deleteSession(sessionToken: string) {
 
 // Helper to get user from either cookie or Bearer token
 export async function getUserFromRequest(request: Request): Promise<User | null> {
-  // First try Bearer token from Authorization header
+  // Identity already verified by the gateway
+  const gatewayUserId = getGatewayUserId(request);
+  if (gatewayUserId) {
+    const user = await getUserById(gatewayUserId);
+    if (user) return user;
+  }
+
+  // Then try Bearer token from Authorization header
   const authHeader = request.headers.get('Authorization');
   if (authHeader?.startsWith('Bearer ')) {
     const token = authHeader.substring(7);
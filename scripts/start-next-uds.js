@@ -0,0 +1,24 @@
+// Serve the production Next.js build on a Unix domain socket so the Python
+// gateway (backend/upstream.py) can reach it without TCP loopback.
+// Point the gateway at it with NEXTJS_UDS=<same path>.
+const fs = require('fs');
+const http = require('http');
+const next = require('next');
+
+const socketPath = process.env.NEXTJS_UDS || '/tmp/hatake-next.sock';
+
+const app = next({ dev: false });
+const handle = app.getRequestHandler();
+
+app.prepare().then(() => {
+  // A stale socket file from a previous run would make listen() fail
+  if (fs.existsSync(socketPath)) {
+    fs.unlinkSync(socketPath);
+  }
+
+  const server = http.createServer((req, res) => handle(req, res));
+  server.listen(socketPath, () => {
+    fs.chmodSync(socketPath, 0o660);
+    console.log(`> Next.js ready on unix:${socketPath}`);
+  });
+});
@@ -0,0 +1,335 @@
+"""
+Shared fixtures for the test suites.
+
+The gateway tests (test_gateway_*.py) run backend/server.py in-process
+against StubNextHandler, a local stand-in for Next.js, so they need no
+network or database. The helpers several backend suites share live here
+too: make_jwt, FakeDeckStore and the deck suites' card data.
+
+The API suites (test_iteration*.py and friends) run against a live
+deployment:
+
+    BASE_URL       where to send requests (default http://localhost:3000;
+                   REACT_APP_BACKEND_URL is honoured for older setups)
+    TEST_EMAIL     account to log in as (default test@test.com)
+    TEST_PASSWORD  its password (default password)
+
+They log in once per worker process through the session-scoped
+`auth_session`/`auth_token` fixtures, and name the records they create with
+`unique_name()`, which is unique per run and per pytest-xdist worker, so
+`pytest -n 4` is safe. `--timing-report=path.json` writes per-test and
+per-module timings together with the number of HTTP requests and logins.
+"""
+
+import base64
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+import gateway_auth  # noqa: E402
+
+SESSION_COOKIE = "session_token=session_abc; Path=/; Expires=Sun, 25 Oct 2026 12:00:00 GMT; HttpOnly; SameSite=lax"
+CSRF_COOKIE = "csrf_token=csrf_xyz; Path=/; SameSite=strict"
+CLEARED_COOKIE = "session_token=; Path=/; Expires=Thu, 01 Jan 1970 00:00:00 GMT"
+
+
+class StubNextHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the Next.js auth routes"""
+
+    protocol_version = "HTTP/1.1"
+    received = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, cookies=(), extra=()):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for cookie in cookies:
+            self.send_header("Set-Cookie", cookie)
+        for name, value in extra:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        StubNextHandler.received.append((self.path, self.headers.items()))
+
+        if self.path == "/api/auth/login":
+            self._send(200, {"success": True, "user": {"email": body.get("email")}},
+                       cookies=(SESSION_COOKIE, CSRF_COOKIE))
+        elif self.path == "/api/auth/logout":
+            self._send(200, {"success": True}, cookies=(CLEARED_COOKIE, "csrf_token=; Max-Age=0"))
+        elif self.path == "/api/auth/session":
+            self._send(200, {"success": True, "session_token": "session_oauth"},
+                       cookies=("session_token=session_oauth; Path=/; HttpOnly",))
+        else:
+            self._send(404, {"error": "Not found"})
+
+    def do_GET(self):
+        StubNextHandler.received.append((self.path, self.headers.items()))
+        self._send(200, {"headers": self.headers.items()},
+                   extra=(("X-Trace", "a"), ("X-Trace", "b"), ("Keep-Alive", "timeout=5"),
+                          ("Connection", "keep-alive, X-Internal"), ("X-Internal", "secret")))
+
+
+@pytest.fixture(scope="module")
+def client():
+    """TestClient for the gateway with every upstream pool pointed at the stub"""
+    from starlette.testclient import TestClient
+
+    import server
+    import upstream
+
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), StubNextHandler)
+    thread = threading.Thread(target=stub.serve_forever, daemon=True)
+    thread.start()
+    original_pools = dict(server.upstreams)
+    server.upstreams.update(upstream.create_pools(f"http://127.0.0.1:{stub.server_address[1]}"))
+    try:
+        with TestClient(server.app) as test_client:
+            yield test_client
+    finally:
+        server.upstreams.update(original_pools)
+        stub.shutdown()
+
+
+def make_jwt(claims, secret=gateway_auth.JWT_SECRET, alg="HS256"):
+    """A token signed as lib/auth.ts signs them"""
+    def b64(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+
+    signing_input = f"{b64({'alg': alg, 'typ': 'JWT'})}.{b64(claims)}"
+    signature = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{base64.urlsafe_b64encode(signature).rstrip(b'=').decode()}"
+
+
+class FakeDeckStore:
+    """In-memory stand-in for deck_lists.PostgresDeckStore"""
+
+    def __init__(self, decks):
+        self.decks = decks
+        self.rows = {deck_id: [] for deck_id in decks}
+        self.writes = []
+
+    async def deck(self, deck_id):
+        return self.decks.get(deck_id)
+
+    async def cards(self, deck_id):
+        for row in sorted(self.rows[deck_id], key=lambda row: (row[3] == "sideboard", row[1].get("name", ""))):
+            yield row
+
+    async def add_cards(self, deck_id, rows):
+        self.writes.append(rows)
+        for card_id, card_data, quantity, category in rows:
+            self.rows[deck_id].append((card_id, json.loads(card_data), quantity, category))
+        return len(rows)
+
+
+# Card data as the deck suites store it in deck_cards.card_data
+ALL_LEGAL = {name: "legal" for name in ("standard", "pioneer", "modern", "legacy", "vintage", "pauper", "commander")}
+BOLT = {"name": "Lightning Bolt", "mana_cost": "{R}", "type_line": "Instant",
+        "legalities": {**ALL_LEGAL, "standard": "not_legal", "pioneer": "not_legal"}}
+TROLL = {"name": "Troll Ascetic", "mana_cost": "{1}{G}{G}", "type_line": "Creature — Troll Shaman",
+         "legalities": ALL_LEGAL}
+REAPER = {"name": "Reaper King", "mana_cost": "{2/W}{2/U}{2/B}{2/R}{2/G}", "type_line": "Legendary Artifact Creature",
+          "legalities": ALL_LEGAL}
+LOTUS = {"name": "Black Lotus", "mana_cost": "{0}", "type_line": "Artifact",
+         "legalities": {**ALL_LEGAL, "vintage": "restricted", "legacy": "banned", "modern": "not_legal"}}
+FOREST = {"name": "Forest", "type_line": "Basic Land — Forest", "legalities": ALL_LEGAL}
+PIKACHU = {"name": "Pikachu", "category": "Pokemon", "types": ["Lightning"],
+           "legal": {"standard": True, "expanded": True}}
+ENERGY = {"name": "Basic Lightning Energy", "category": "Energy"}
+SWITCH = {"name": "Switch", "category": "Trainer", "legal": {"standard": False, "expanded": True}}
+
+
+# --- Live API suites --------------------------------------------------------
+
+BASE_URL = (os.environ.get("BASE_URL") or os.environ.get("REACT_APP_BACKEND_URL") or "http://localhost:3000").rstrip("/")
+TEST_EMAIL = os.environ.get("TEST_EMAIL", "test@test.com")
+TEST_PASSWORD = os.environ.get("TEST_PASSWORD", "password")
+
+WORKER_ID = os.environ.get("PYTEST_XDIST_WORKER", "main")
+RUN_ID = os.environ.get("TEST_RUN_ID") or format(int(time.time() * 1000) % 36 ** 6, "x")
+TEST_PREFIX = f"TEST_{RUN_ID}_{WORKER_ID}_"
+
+_names = itertools.count(1)
+_login = None
+
+
+def unique_name(label: str) -> str:
+    """A name no other test, worker or run uses, e.g. TEST_5f3a1c_gw1_Deck_3"""
+    return f"{TEST_PREFIX}{label}_{next(_names)}"
+
+
+def login():
+    """Log in once per worker process; returns (session, login response data).
+
+    The session carries both the session cookie and a Bearer token, so it
+    works for cookie- and token-authenticated routes alike.
+    """
+    global _login
+    if _login is None:
+        import requests
+
+        session = requests.Session()
+        try:
+            response = session.post(f"{BASE_URL}/api/auth/login", json={"email": TEST_EMAIL, "password": TEST_PASSWORD})
+        except requests.RequestException as e:
+            _login = (None, {"error": f"Cannot reach {BASE_URL}: {e}"})
+            pytest.skip(_login[1]["error"])
+        if response.status_code != 200:
+            _login = (None, {"error": f"Cannot log in as {TEST_EMAIL}: {response.status_code} {response.text[:200]}"})
+        else:
+            data = response.json()
+            if data.get("token"):
+                session.headers["Authorization"] = f"Bearer {data['token']}"
+            _login = (session, data)
+    session, data = _login
+    if session is None:
+        pytest.skip(data["error"])
+    return session, data
+
+
+@pytest.fixture(scope="session")
+def auth_session():
+    """requests.Session logged in as TEST_EMAIL, shared by the whole worker"""
+    return login()[0]
+
+
+@pytest.fixture(scope="session")
+def auth_token():
+    return login()[1].get("token")
+
+
+@pytest.fixture(scope="session")
+def auth_headers(auth_token):
+    return {"Authorization": f"Bearer {auth_token}"}
+
+
+@pytest.fixture(scope="session")
+def user_id():
+    return login()[1].get("user", {}).get("user_id")
+
+
+# --- Timing report ----------------------------------------------------------
+
+class TimingReport:
+    """Per-test durations and HTTP request counts for the live API suites"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.current = None
+        self.durations = defaultdict(float)
+        # nodeid -> [requests, seconds in requests, logins]
+        self.http = defaultdict(lambda: [0, 0.0, 0])
+
+    def instrument(self):
+        try:
+            import requests
+        except ImportError:
+            return
+        original = requests.Session.request
+        report = self
+
+        def request(session, method, url, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(session, method, url, *args, **kwargs)
+            finally:
+                stats = report.http[report.current or "(collection)"]
+                stats[0] += 1
+                stats[1] += time.perf_counter() - start
+                stats[2] += str(url).endswith("/api/auth/login")
+
+        requests.Session.request = request
+
+    def as_dict(self):
+        modules = defaultdict(lambda: {"seconds": 0.0, "tests": 0, "requests": 0, "logins": 0})
+        for nodeid, seconds in self.durations.items():
+            module = modules[nodeid.split("::")[0]]
+            module["seconds"] += seconds
+            module["tests"] += 1
+        for nodeid, (count, _, logins) in self.http.items():
+            module = modules[nodeid.split("::")[0]]
+            module["requests"] += count
+            module["logins"] += logins
+        return {
+            "base_url": BASE_URL,
+            "worker": WORKER_ID,
+            "wall_seconds": time.perf_counter() - self.started,
+            "requests": sum(stats[0] for stats in self.http.values()),
+            "request_seconds": sum(stats[1] for stats in self.http.values()),
+            "logins": sum(stats[2] for stats in self.http.values()),
+            "modules": dict(sorted(modules.items(), key=lambda item: -item[1]["seconds"])),
+            "tests": {
+                nodeid: {"seconds": seconds, "requests": self.http[nodeid][0], "logins": self.http[nodeid][2]}
+                for nodeid, seconds in sorted(self.durations.items(), key=lambda item: -item[1])
+            },
+        }
+
+
+_timing = TimingReport()
+
+
+def pytest_addoption(parser):
+    parser.addoption("--timing-report", default=None, help="write per-test timings and HTTP counts as JSON")
+
+
+def pytest_configure(config):
+    _timing.instrument()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    _timing.current = item.nodeid
+    yield
+    _timing.current = None
+
+
+def pytest_runtest_logreport(report):
+    _timing.durations[report.nodeid] += report.duration
+
+
+def pytest_sessionfinish(session):
+    path = session.config.getoption("--timing-report")
+    if not path:
+        return
+    # Under xdist every worker writes its own file next to the requested one
+    if WORKER_ID != "main":
+        root, ext = os.path.splitext(path)
+        path = f"{root}.{WORKER_ID}{ext}"
+    with open(path, "w") as f:
+        json.dump(_timing.as_dict(), f, indent=2)
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    report = _timing.as_dict()
+    if not report["requests"] and not config.getoption("--timing-report"):
+        return
+    terminalreporter.section("timing report")
+    terminalreporter.write_line(
+        f"{report['wall_seconds']:.1f}s wall, {report['requests']} HTTP requests "
+        f"({report['request_seconds']:.1f}s), {report['logins']} logins against {BASE_URL}"
+    )
+    for module, stats in list(report["modules"].items())[:15]:
+        terminalreporter.write_line(
+            f"{stats['seconds']:8.2f}s {stats['tests']:4} tests {stats['requests']:5} requests "
+            f"{stats['logins']:3} logins  {module}"
+        )
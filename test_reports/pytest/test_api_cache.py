@@ -0,0 +1,281 @@
+"""
+API Cache Test Suite - backend/api_cache.py
+Testing features:
+1. TTLs matching CACHE_TTL in lib/api-cache.ts
+2. Byte-bounded LRU with per-entry expiry
+3. Write-through to the api_cache table, and L2 hits warming L1
+4. Negative caching and coalesced concurrent misses
+5. Batched sweeps of expired rows
+6. Loopback /_gateway/cache routes
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import api_cache
+import server
+from api_cache import LRU, ApiCache
+
+SCRYFALL = "https://api.scryfall.com/cards/2xm/117"
+SEARCH = "https://api.scryfall.com/cards/search?q=zzzz"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeL2:
+    """The PostgresL2 interface over a dict of key -> (body, seconds left)"""
+
+    def __init__(self, fail=False):
+        self.rows = {}
+        self.reads = 0
+        self.fail = fail
+        self.deletes = []
+
+    async def get(self, key):
+        self.reads += 1
+        if self.fail:
+            raise ConnectionError("database is down")
+        return self.rows.get(key)
+
+    async def set(self, key, body, ttl):
+        if self.fail:
+            raise ConnectionError("database is down")
+        self.rows[key] = (body, ttl)
+
+    async def delete_expired(self, limit):
+        expired = [key for key, (_, ttl) in self.rows.items() if ttl <= 0][:limit]
+        for key in expired:
+            del self.rows[key]
+        self.deletes.append(len(expired))
+        return len(expired)
+
+    async def close(self):
+        pass
+
+
+class Upstream:
+    """httpx transport answering like Scryfall, counting requests"""
+
+    def __init__(self, delay=0.0):
+        self.requests = []
+        self.delay = delay
+
+    async def __call__(self, request):
+        self.requests.append(request)
+        await asyncio.sleep(self.delay)
+        if "zzzz" in str(request.url):
+            return httpx.Response(404, json={"object": "error", "code": "not_found"})
+        if "busy" in str(request.url):
+            return httpx.Response(429, json={"object": "error"})
+        return httpx.Response(200, json={"name": "Lightning Bolt", "url": str(request.url)})
+
+
+def make_cache(upstream=None, l2=None, clock=None, **kwargs):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(upstream or Upstream()))
+    return ApiCache(l1=LRU(clock=clock or Clock()), l2=l2, client=client, **kwargs)
+
+
+class TestTTL:
+    """Test TTLs per source and URL"""
+
+    def test_ttl_for(self):
+        assert api_cache.ttl_for("scryfall", SCRYFALL) == 86400
+        assert api_cache.ttl_for("scryfall", SEARCH) == 3600
+        assert api_cache.ttl_for("tcgdex", "https://api.tcgdex.net/v2/en/cards/sv1-1") == 86400
+        assert api_cache.ttl_for("tcgdex", "https://api.tcgdex.net/v2/en/cards?name=pika") == 3600
+        assert api_cache.ttl_for("tcgdex", "https://api.tcgdex.net/v2/en/sets/sv1") == 86400
+        assert api_cache.ttl_for("scrydex", "https://api.scrydex.com/pokemon/v1/cards") == 3600
+
+
+class TestLRU:
+    """Test the in-process tier"""
+
+    def test_expiry(self):
+        clock = Clock()
+        lru = LRU(clock=clock)
+        lru.put("a", 200, b"{}", 10)
+        assert lru.get("a").body == b"{}"
+        clock.now += 10
+        assert lru.get("a") is None
+        assert lru.bytes == 0
+
+    def test_byte_bound_evicts_least_recently_used(self):
+        size = len("a") + 100 + api_cache.ENTRY_OVERHEAD
+        lru = LRU(max_bytes=size * 4, clock=Clock())
+        for key in "abcd":
+            lru.put(key, 200, b"x" * 100, 60)
+        lru.get("a")
+        lru.put("e", 200, b"x" * 100, 60)
+        assert list(lru.entries) == ["c", "d", "a", "e"]
+        assert lru.bytes == size * 4 and lru.evictions == 1
+
+    def test_oversized_entries_are_skipped(self):
+        lru = LRU(max_bytes=4000, clock=Clock())
+        lru.put("big", 200, b"x" * 2000, 60)
+        assert lru.get("big") is None and lru.bytes == 0
+
+    def test_purge_expired(self):
+        clock = Clock()
+        lru = LRU(clock=clock)
+        lru.put("short", 200, b"{}", 1)
+        lru.put("long", 200, b"{}", 100)
+        clock.now += 5
+        assert lru.purge_expired() == 1
+        assert list(lru.entries) == ["long"]
+
+
+class TestTiers:
+    """Test getFromCache/setToCache through both tiers"""
+
+    def test_set_writes_through(self):
+        l2 = FakeL2()
+        cache = make_cache(l2=l2)
+        asyncio.run(cache.set("scryfall:x", b'{"a":1}', 3600))
+        assert l2.rows == {"scryfall:x": (b'{"a":1}', 3600)}
+        assert asyncio.run(cache.get("scryfall:x")) == (200, b'{"a":1}', "l1")
+        assert l2.reads == 0
+
+    def test_l2_hit_warms_l1_for_the_time_left(self):
+        clock = Clock()
+        l2 = FakeL2()
+        l2.rows["scryfall:x"] = (b'{"a": 1}', 30.0)
+        cache = make_cache(l2=l2, clock=clock)
+        assert asyncio.run(cache.get("scryfall:x")).source == "l2"
+        assert asyncio.run(cache.get("scryfall:x")).source == "l1"
+        clock.now += 31
+        del l2.rows["scryfall:x"]
+        assert asyncio.run(cache.get("scryfall:x")) == (404, None, "miss")
+
+    def test_l2_errors_fall_back_to_upstream(self):
+        upstream = Upstream()
+        cache = make_cache(upstream, l2=FakeL2(fail=True))
+        assert asyncio.run(cache.fetch("scryfall", SCRYFALL)).source == "upstream"
+        assert asyncio.run(cache.fetch("scryfall", SCRYFALL)).source == "l1"
+        assert len(upstream.requests) == 1
+
+
+class TestFetch:
+    """Test cached upstream requests"""
+
+    def test_hit_after_first_fetch(self):
+        upstream, l2 = Upstream(), FakeL2()
+        cache = make_cache(upstream, l2=l2)
+        first = asyncio.run(cache.fetch("scryfall", SCRYFALL))
+        assert first.status == 200 and json.loads(first.body)["name"] == "Lightning Bolt"
+        assert asyncio.run(cache.fetch("scryfall", SCRYFALL)).source == "l1"
+        assert len(upstream.requests) == 1
+        # Same key and TTL as fetchScryfallCached
+        assert l2.rows[f"scryfall:{SCRYFALL}"][1] == 86400
+
+    def test_concurrent_misses_are_coalesced(self):
+        upstream = Upstream(delay=0.05)
+        cache = make_cache(upstream, l2=FakeL2())
+
+        async def go():
+            return await asyncio.gather(*(cache.fetch("scryfall", SCRYFALL) for _ in range(20)))
+
+        lookups = asyncio.run(go())
+        assert len(upstream.requests) == 1
+        assert {lookup.body for lookup in lookups} == {lookups[0].body}
+        assert sorted(lookup.source for lookup in lookups) == ["coalesced"] * 19 + ["upstream"]
+        assert cache.inflight == {}
+
+    def test_negative_caching(self):
+        clock, upstream, l2 = Clock(), Upstream(), FakeL2()
+        cache = make_cache(upstream, l2=l2, clock=clock, negative_ttl=60)
+        assert asyncio.run(cache.fetch("scryfall", SEARCH)) == (404, None, "upstream")
+        assert asyncio.run(cache.fetch("scryfall", SEARCH)) == (404, None, "negative")
+        assert len(upstream.requests) == 1 and l2.rows == {}
+        clock.now += 61
+        asyncio.run(cache.fetch("scryfall", SEARCH))
+        assert len(upstream.requests) == 2
+
+    def test_rate_limits_are_not_cached(self):
+        upstream = Upstream()
+        cache = make_cache(upstream)
+        for _ in range(2):
+            assert asyncio.run(cache.fetch("scryfall", "https://api.scryfall.com/busy")).status == 429
+        assert len(upstream.requests) == 2
+
+    def test_scrydex_credentials(self, monkeypatch):
+        monkeypatch.setattr(api_cache, "SCRYDEX_API_KEY", "key")
+        upstream = Upstream()
+        asyncio.run(make_cache(upstream).fetch("scrydex", "https://api.scrydex.com/pokemon/v1/cards/sv1-1"))
+        assert upstream.requests[0].headers["x-api-key"] == "key"
+        assert upstream.requests[0].headers["x-team-id"] == api_cache.SCRYDEX_TEAM_ID
+
+    def test_only_known_origins(self):
+        cache = make_cache()
+        for source, url in (("scryfall", "http://169.254.169.254/latest"), ("other", SCRYFALL),
+                            ("scryfall", "https://api.scryfall.com.evil.example/")):
+            with pytest.raises(ValueError):
+                asyncio.run(cache.fetch(source, url))
+
+
+class TestSweep:
+    """Test deleting expired rows in batches"""
+
+    def test_sweep_in_batches(self):
+        clock, l2 = Clock(), FakeL2()
+        l2.rows = {f"k{i}": (b"{}", 0) for i in range(1200)}
+        l2.rows["live"] = (b"{}", 100)
+        cache = make_cache(l2=l2, clock=clock)
+        cache.l1.put("old", 200, b"{}", 1)
+        clock.now += 2
+        assert asyncio.run(cache.sweep(batch=500)) == {"l1": 1, "l2": 1200}
+        assert l2.deletes == [500, 500, 200]
+        assert list(l2.rows) == ["live"]
+        assert cache.status()["swept"] == 1200
+
+
+class TestGatewayRoutes:
+    """Test the loopback API Next.js calls"""
+
+    @pytest.fixture
+    def cache(self, monkeypatch):
+        cache = make_cache()
+        monkeypatch.setattr(api_cache, "cache", cache)
+        monkeypatch.setattr(server, "ADMIN_TOKEN", "admin")
+        return cache
+
+    headers = {"Authorization": "Bearer admin"}
+
+    def test_requires_token(self, client, cache):
+        assert client.get("/_gateway/cache", params={"key": "x"}).status_code == 401
+        assert client.get("/_gateway/cache/fetch", params={"source": "scryfall", "url": SCRYFALL}).status_code == 401
+
+    def test_set_and_get(self, client, cache):
+        assert client.get("/_gateway/cache", params={"key": "tcgdex:x"}, headers=self.headers).status_code == 404
+        response = client.put("/_gateway/cache", params={"key": "tcgdex:x", "ttl": 60},
+                              content=b'{"id": "sv1-1"}', headers=self.headers)
+        assert response.status_code == 204
+        response = client.get("/_gateway/cache", params={"key": "tcgdex:x"}, headers=self.headers)
+        assert response.json() == {"id": "sv1-1"} and response.headers["x-cache"] == "l1"
+        assert client.put("/_gateway/cache", params={"key": "y", "ttl": 60}, content=b"not json",
+                          headers=self.headers).status_code == 400
+
+    def test_fetch(self, client, cache):
+        params = {"source": "scryfall", "url": SCRYFALL}
+        assert client.get("/_gateway/cache/fetch", params=params, headers=self.headers).headers["x-cache"] == "upstream"
+        response = client.get("/_gateway/cache/fetch", params=params, headers=self.headers)
+        assert response.headers["x-cache"] == "l1" and response.json()["name"] == "Lightning Bolt"
+        response = client.get("/_gateway/cache/fetch", params={"source": "scryfall", "url": SEARCH}, headers=self.headers)
+        assert response.status_code == 404
+        response = client.get("/_gateway/cache/fetch", params={"source": "scryfall", "url": "http://localhost/"},
+                              headers=self.headers)
+        assert response.status_code == 400
+
+    def test_stats_and_sweep(self, client, cache):
+        client.put("/_gateway/cache", params={"key": "k", "ttl": 60}, content=b"{}", headers=self.headers)
+        stats = client.get("/_gateway/cache/stats", headers=self.headers).json()
+        assert stats["l1"]["entries"] == 1 and stats["l2"] is False
+        assert client.post("/_gateway/cache/sweep", headers=self.headers).json() == {"l1": 0, "l2": 0}
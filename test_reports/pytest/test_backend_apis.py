@@ -5,15 +5,12 @@ Tests: Authentication, Decks, Trades, Calls (Video signaling)
 
 import pytest
 import requests
-import os
-import time
 
-# Get base URL from environment or use default
-BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001').rstrip('/')
+from conftest import BASE_URL, unique_name
 
 # Test data
 TEST_USER = {
-    "email": f"test_hatake_{int(time.time())}@example.com",
+    "email": f"{unique_name('hatake').lower()}@example.com",
     "password": "TestPassword123!",
     "name": "Test User Hatake"
 }
@@ -110,7 +107,7 @@ class TestAuthentication:
 class TestDecksAPI:
     """Decks CRUD endpoint tests"""
     
-    @pytest.fixture(autouse=True)
+    @pytest.fixture(autouse=True, scope="class")
     def login_user(self):
         """Ensure user is logged in before deck tests"""
         # Try login
@@ -141,7 +138,7 @@ class TestDecksAPI:
     def test_create_deck(self):
         """Test creating a new deck"""
         deck_data = {
-            "name": f"TEST_Deck_{int(time.time())}",
+            "name": unique_name("Deck"),
             "description": "Test deck for automated testing",
             "game": "mtg",
             "format": "Standard",
@@ -177,7 +174,7 @@ class TestDecksAPI:
 class TestTradesAPI:
     """Trades endpoint tests"""
     
-    @pytest.fixture(autouse=True)
+    @pytest.fixture(autouse=True, scope="class")
     def login_user(self):
         """Ensure user is logged in before trade tests"""
         response = session.post(f"{BASE_URL}/api/auth/login", json={
@@ -219,7 +216,7 @@ class TestTradesAPI:
 class TestCallsAPI:
     """Video/Audio call signaling API tests (REST polling)"""
     
-    @pytest.fixture(autouse=True)
+    @pytest.fixture(autouse=True, scope="class")
     def login_user(self):
         """Ensure user is logged in before call tests"""
         response = session.post(f"{BASE_URL}/api/auth/login", json={
@@ -296,7 +293,7 @@ class TestCallsAPI:
 class TestCollectionAPI:
     """Collection endpoint tests"""
     
-    @pytest.fixture(autouse=True)
+    @pytest.fixture(autouse=True, scope="class")
     def login_user(self):
         """Ensure user is logged in"""
         response = session.post(f"{BASE_URL}/api/auth/login", json={
@@ -325,7 +322,7 @@ class TestCollectionAPI:
 class TestMessagesAPI:
     """Messages endpoint tests"""
     
-    @pytest.fixture(autouse=True)
+    @pytest.fixture(autouse=True, scope="class")
     def login_user(self):
         """Ensure user is logged in"""
         response = session.post(f"{BASE_URL}/api/auth/login", json={
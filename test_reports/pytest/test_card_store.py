@@ -0,0 +1,232 @@
+"""
+Card Store Test Suite - backend/card_store.py
+Testing features:
+1. Streaming JSON array parser over arbitrary chunk boundaries
+2. Compact mmap-ed store: lookups by Scryfall ID and by set/collector number
+3. Prices kept apart from card data
+4. Daily change lists when a new dump replaces the store
+5. Local answers for price refresh and /api/cards/mtg lookups
+"""
+
+import asyncio
+import datetime
+import gzip
+import json
+import os
+
+import httpx
+import pytest
+
+import card_store
+import price_worker
+from conftest import StubNextHandler
+
+BOLT = {
+    "id": "f29ba16f-c8fb-42fe-aabf-87089cb214a7",
+    "name": "Lightning Bolt",
+    "set": "2xm",
+    "set_name": "Double Masters",
+    "collector_number": "117",
+    "rarity": "uncommon",
+    "type_line": "Instant",
+    "mana_cost": "{R}",
+    "prices": {"eur": "1.50", "eur_foil": None, "usd": "2.00", "usd_foil": "9.99"},
+    "image_uris": {"small": "s.jpg", "normal": "n.jpg", "border_crop": "b.jpg"},
+    "uri": "https://api.scryfall.com/cards/f29ba16f",
+    "multiverse_ids": [1, 2],
+}
+COUNTERSPELL = {
+    "id": "0d3f2b4c-8a9e-4c1b-b7e5-6a4d2c1e9f00",
+    "name": "Counterspell",
+    "set": "mh2",
+    "set_name": "Modern Horizons 2",
+    "collector_number": "267",
+    "rarity": "uncommon",
+    "prices": {"eur": "0.35"},
+}
+DFC = {
+    "id": "7d1f4d5e-5f5c-4e7a-8f5e-6b4e8c9a7f2d",
+    "name": "Delver of Secrets // Insectile Aberration",
+    "set": "isd",
+    "collector_number": "51",
+    "prices": {},
+    "card_faces": [
+        {"name": "Delver of Secrets", "image_uris": {"normal": "d.jpg", "png": "d.png", "large": "l.jpg"},
+         "flavor_text": "dropped"},
+        {"name": "Insectile Aberration"},
+    ],
+}
+
+
+def chunked(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def build(tmp_path, cards, **kwargs):
+    path = str(tmp_path / "cards.store")
+    summary = card_store.ingest([json.dumps(cards).encode()], path, **kwargs)
+    return path, summary
+
+
+class TestStreamingParser:
+    """Test the incremental JSON array parser"""
+
+    @pytest.mark.parametrize("size", [1, 3, 7, 64, 1 << 20])
+    def test_any_chunk_size(self, size):
+        cards = [BOLT, {"name": "Jötun Grunt ☃"}, COUNTERSPELL, DFC]
+        data = json.dumps(cards, indent=1, ensure_ascii=False).encode()
+        assert list(card_store.iter_json_array(chunked(data, size))) == cards
+
+    def test_empty_array(self):
+        assert list(card_store.iter_json_array([b" [ ] "])) == []
+
+    def test_truncated(self):
+        with pytest.raises(ValueError):
+            list(card_store.iter_json_array(chunked(json.dumps([BOLT, BOLT]).encode()[:-20], 16)))
+
+    def test_not_an_array(self):
+        with pytest.raises(ValueError):
+            list(card_store.iter_json_array([b'{"a": 1}']))
+
+    def test_gzip_file(self, tmp_path):
+        path = tmp_path / "cards.json.gz"
+        path.write_bytes(gzip.compress(json.dumps([BOLT, COUNTERSPELL]).encode()))
+        assert len(list(card_store.iter_json_array(card_store.iter_file(str(path), chunk_size=10)))) == 2
+
+
+class TestStore:
+    """Test lookups in a built store"""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        path, _ = build(tmp_path, [BOLT, COUNTERSPELL, DFC, {"name": "no id"}])
+        store = card_store.CardStore(path)
+        yield store
+        store.close()
+
+    def test_get_by_id(self, store):
+        assert len(store) == 3
+        card = store.get(BOLT["id"])
+        assert card["name"] == "Lightning Bolt"
+        assert card["image_uris"] == {"small": "s.jpg", "normal": "n.jpg"}
+        assert "uri" not in card and "multiverse_ids" not in card
+        assert card["prices"] == {"eur": "1.50", "eur_foil": None, "usd": "2.00", "usd_foil": "9.99"}
+        assert store.get(BOLT["id"].upper())["name"] == "Lightning Bolt"
+        assert store.get("00000000-0000-0000-0000-000000000000") is None
+        assert store.get("not-a-uuid") is None
+
+    def test_card_faces_trimmed(self, store):
+        faces = store.get(DFC["id"])["card_faces"]
+        assert faces[0] == {"name": "Delver of Secrets",
+                            "image_uris": {"normal": "d.jpg", "large": "l.jpg", "png": "d.png"}}
+        assert faces[1] == {"name": "Insectile Aberration"}
+
+    def test_find_by_set_and_number(self, store):
+        assert store.find("2XM", "117")["id"] == BOLT["id"]
+        assert store.find("mh2", "267")["name"] == "Counterspell"
+        assert store.find("2xm", "118") is None
+
+    def test_price_eur(self, store):
+        assert store.price_eur(BOLT["id"]) == 1.5
+        assert store.price_eur(COUNTERSPELL["id"]) == 0.35
+        assert store.price_eur(DFC["id"]) == 0.0
+        assert store.price_eur("00000000-0000-0000-0000-000000000000") is None
+
+    def test_iterates_all_cards(self, store):
+        assert sorted(card["name"] for card in store.cards()) == sorted(
+            [BOLT["name"], COUNTERSPELL["name"], DFC["name"]])
+
+
+class TestDailyChanges:
+    """Test replacing the store with the next day's dump"""
+
+    def test_changes_since_previous_store(self, tmp_path):
+        path, first = build(tmp_path, [BOLT, COUNTERSPELL])
+        assert sorted(first["added"]) == sorted([BOLT["id"], COUNTERSPELL["id"]])
+
+        reader = card_store.CardStore(path)
+        repriced = dict(BOLT, prices={"eur": "1.75"})
+        errata = dict(COUNTERSPELL, oracle_text="Counter target spell.")
+        _, summary = build(tmp_path, [repriced, errata, DFC])
+        assert summary["added"] == [DFC["id"]]
+        assert summary["removed"] == []
+        assert summary["changed"] == [COUNTERSPELL["id"]]
+        assert summary["prices_changed"] == 1
+
+        # The old mapping stays readable; a reopened store sees the new data
+        assert reader.price_eur(BOLT["id"]) == 1.5
+        assert card_store.CardStore(path).price_eur(BOLT["id"]) == 1.75
+        reader.close()
+
+        _, summary = build(tmp_path, [DFC])
+        assert sorted(summary["removed"]) == sorted([BOLT["id"], COUNTERSPELL["id"]])
+        written = os.listdir(card_store.changes_path(path))
+        assert len(written) == 1 and written[0].endswith(".json")
+
+    def test_current_reopens_replaced_store(self, tmp_path):
+        path, _ = build(tmp_path, [BOLT])
+        first = card_store.current(path)
+        assert card_store.current(path) is first
+        build(tmp_path, [BOLT, COUNTERSPELL])
+        assert len(card_store.current(path, recheck=0)) == 2
+        assert card_store.current(str(tmp_path / "missing.store")) is None
+
+
+class TestLocalLookups:
+    """Test serving price refresh and MTG lookups from the store"""
+
+    @pytest.fixture
+    def local_store(self, tmp_path, monkeypatch):
+        path, _ = build(tmp_path, [BOLT, COUNTERSPELL])
+        monkeypatch.setattr(card_store, "CARD_STORE", path)
+        yield path
+        card_store.current(str(tmp_path / "missing.store"))
+
+    def test_price_refresh_uses_store(self, local_store, monkeypatch):
+        monkeypatch.setattr(price_worker, "SCRYDEX_API_KEY", "")
+
+        class Store:
+            async def now(self):
+                return datetime.datetime.now(datetime.timezone.utc)
+
+            async def cards(self, games, refreshed_before=None):
+                return [(BOLT["id"], "mtg"), (COUNTERSPELL["id"], "mtg")]
+
+            async def upsert_prices(self, rows, updated_at):
+                self.rows = rows
+
+            async def snapshot_values(self):
+                return 0
+
+        async def go(store):
+            # Nothing listens here, so any HTTP request would fail the card
+            providers = price_worker.default_providers("http://127.0.0.1:9", "http://127.0.0.1:9", 0, 0)
+            async with httpx.AsyncClient() as client:
+                return await price_worker.PriceRefresh(store, client, providers, state_file=None).run()
+
+        store = Store()
+        result = asyncio.run(go(store))
+        assert result["local"] == {"scryfall": 2}
+        assert result["requests"] == {}
+        assert sorted(store.rows) == sorted([(BOLT["id"], "mtg", 1.5), (COUNTERSPELL["id"], "mtg", 0.35)])
+
+    def test_gateway_lookup_by_id(self, client, local_store):
+        StubNextHandler.received.clear()
+        response = client.get(f"/api/cards/mtg?id={BOLT['id']}")
+        assert response.status_code == 200
+        assert response.headers["x-card-source"] == "local"
+        assert response.json()["cards"][0]["name"] == "Lightning Bolt"
+        assert StubNextHandler.received == []
+
+    def test_gateway_lookup_by_set_and_number(self, client, local_store):
+        response = client.get("/api/cards/mtg?set=MH2&number=267")
+        assert response.json()["cards"][0]["id"] == COUNTERSPELL["id"]
+
+    def test_gateway_misses_and_searches_are_proxied(self, client, local_store):
+        StubNextHandler.received.clear()
+        client.get("/api/cards/mtg?id=00000000-0000-0000-0000-000000000000")
+        client.get("/api/cards/mtg?q=bolt")
+        assert [path for path, _ in StubNextHandler.received] == [
+            "/api/cards/mtg?id=00000000-0000-0000-0000-000000000000",
+            "/api/cards/mtg?q=bolt",
+        ]
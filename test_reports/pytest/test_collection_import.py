@@ -0,0 +1,341 @@
+"""
+Collection Import Test Suite - backend/collection_import.py
+Testing features:
+1. CSV parsing: format detection, BOMs, quoted commas, blank lines
+2. Row mapping to the route's card IDs and card_data
+3. Chunked jobs: deduplicated resolution, one write per chunk, progress
+4. Resolution from the card store, the API cache and Scryfall /cards/collection
+5. Import job routes: upload, status, server-sent events, cancel
+6. The COPY into collection_items
+"""
+
+import asyncio
+import io
+import json
+import threading
+import time
+
+import httpx
+import pytest
+
+import api_cache
+import card_store
+import collection_import
+import search_index
+import server
+from collection_import import ImportJobs, Resolver, ScryfallCollection
+from conftest import make_jwt
+
+BOLT = {"id": "f29ba16f-c8fb-42fe-aabf-87089cb214a7", "name": "Lightning Bolt", "set": "2xm",
+        "set_name": "Double Masters", "collector_number": "117", "rarity": "uncommon",
+        "type_line": "Instant", "mana_cost": "{R}", "prices": {"eur": "1.50"}}
+COUNTERSPELL = {"id": "0d3f2b4c-8a9e-4c1b-b7e5-6a4d2c1e9f00", "name": "Counterspell", "set": "mh2",
+                "set_name": "Modern Horizons 2", "collector_number": "267", "rarity": "uncommon",
+                "prices": {"eur": "0.35"}}
+
+MANABOX = (
+    "﻿Name,Set code,Set name,Collector number,Foil,Rarity,Quantity,ManaBox ID,Scryfall ID,Purchase price,Condition\n"
+    f"Lightning Bolt,2XM,Double Masters,117,foil,uncommon,4,1,{BOLT['id']},\"1,50\",near_mint\n"
+    "\n"
+    "Counterspell,MH2,\"Modern Horizons 2, Extras\",267,normal,uncommon,1,2,,0.35,lightly_played\n"
+    "Unknown Card,XXX,Nowhere,1,normal,common,2,3,,,\n"
+)
+POKEMON = (
+    "Name,Set Code,Edition Name,Collector Number,Quantity,Price,Condition\n"
+    "Pikachu,OBF,Obsidian Flames,025,2,1.25,NM\n"
+    "Charizard ex,sv03,Obsidian Flames,125,1,30,LP\n"
+)
+CARDMARKET = (
+    "cardmarketId,quantity,name,set,setCode,cn,condition,language,isFoil,isPlayset,isSigned,price\n"
+    "1,1,Lightning Bolt,Double Masters,2XM,,NM,English,,,,2.00\n"
+)
+
+
+def tcgdex(request):
+    """TCGdex as the API cache sees it: IDs without leading zeros"""
+    card_id = str(request.url).rsplit("/", 1)[-1]
+    if card_id in ("sv03-25", "sv03-125"):
+        return httpx.Response(200, json={"id": card_id, "localId": card_id.split("-")[1], "name": "Pikachu",
+                                         "rarity": "Common", "image": "https://assets/sv03/25",
+                                         "set": {"id": "sv03", "name": "Obsidian Flames"}})
+    return httpx.Response(404, json={"error": "not found"})
+
+
+class FakeStore:
+    def __init__(self, fail=False):
+        self.writes = []
+        self.fail = fail
+
+    async def insert_items(self, records):
+        if self.fail:
+            raise ConnectionError("database is down")
+        self.writes.append(records)
+        return len(records)
+
+    async def session_user(self, token):
+        return {"session_abc": "user_web"}.get(token)
+
+
+def spool(tmp_path, text, name="upload.csv"):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+async def run_job(jobs, path, game_type=None, chunk_rows=None):
+    job = await jobs.start("user_1", path, game_type)
+    if chunk_rows:
+        job.chunk_rows = chunk_rows
+    await job.task
+    return job
+
+
+@pytest.fixture
+def store_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "cards.store")
+    card_store.ingest([json.dumps([BOLT, COUNTERSPELL]).encode()], path, changes=False)
+    monkeypatch.setattr(card_store, "CARD_STORE", path)
+    yield path
+    card_store.current(str(tmp_path / "missing.store"))
+
+
+class TestParsing:
+    """Test reading exports"""
+
+    def test_detect_format(self):
+        assert collection_import.detect_format(["cardmarketId", "name"]) == "cardmarket"
+        assert collection_import.detect_format(["Name", "Scryfall ID"]) == "manabox"
+        assert collection_import.detect_format(["Name", "Set Code", "Edition Name"]) == "pokemon"
+        assert collection_import.detect_format(["Name"], "pokemon") == "pokemon"
+        assert collection_import.detect_format(["Name"]) == "manabox"
+
+    def test_records(self):
+        fmt, records = collection_import.iter_records(io.BytesIO(MANABOX.encode()))
+        records = list(records)
+        assert fmt == "manabox"
+        assert [line for line, _ in records] == [2, 4, 5]
+        assert records[0][1]["Name"] == "Lightning Bolt"
+        assert records[1][1]["Set name"] == "Modern Horizons 2, Extras"
+
+    def test_row_mapping(self):
+        row = collection_import.parse_row("manabox", dict(zip(
+            ["Name", "Set code", "Collector number", "Foil", "Quantity", "Purchase price", "Condition"],
+            ["Lightning Bolt", "2XM", "117", "foil", "x", "1,50", "lp"])), 2)
+        assert (row.quantity, row.price, row.foil, row.condition) == (1, 1.5, True, "Lightly Played")
+        assert collection_import.map_condition("Damaged") == "Poor"
+
+
+class TestJobs:
+    """Test running imports"""
+
+    def test_manabox_from_card_store(self, tmp_path, store_path):
+        store = FakeStore()
+        jobs = ImportJobs(store=store, resolver=Resolver())
+        job = asyncio.run(run_job(jobs, spool(tmp_path, MANABOX)))
+        status = job.status()
+        assert status["state"] == "done" and status["format"] == "manabox"
+        assert (status["rows"], status["imported"], status["unresolved"]) == (3, 3, 1)
+        assert (status["uniqueCards"], status["totalCopies"], status["percent"]) == (3, 7, 100.0)
+        bolt, counter, unknown = store.writes[0]
+        assert bolt[:3] == ("user_1", BOLT["id"], "mtg") and bolt[4:] == (4, "Near Mint", True, "Imported via CSV")
+        data = json.loads(bolt[3])
+        assert data["type_line"] == "Instant" and data["prices"]["eur"] == "1.50" and data["purchase_price"] == 1.5
+        # Found by set and number, so it gets its Scryfall ID
+        assert counter[1] == COUNTERSPELL["id"]
+        assert unknown[1] == "xxx-1"
+        assert json.loads(unknown[3])["prices"] == {"usd": "0", "eur": "0"}
+        assert not (tmp_path / "upload.csv").exists()
+
+    def test_chunks_and_deduplication(self, tmp_path, store_path):
+        store = FakeStore()
+        resolved = []
+
+        class CountingResolver(Resolver):
+            async def resolve(self, keys):
+                resolved.append(keys)
+                return await super().resolve(keys)
+
+        rows = "".join(f"Lightning Bolt,2XM,Double Masters,117,,,1,1,{BOLT['id']},1,nm\n" for _ in range(5))
+        jobs = ImportJobs(store=store, resolver=CountingResolver())
+        job = asyncio.run(run_job(jobs, spool(tmp_path, MANABOX.split("\n")[0] + "\n" + rows), chunk_rows=2))
+        assert [len(write) for write in store.writes] == [2, 2, 1]
+        assert resolved == [[("id", BOLT["id"])]]
+        assert job.status()["imported"] == 5
+
+    def test_pokemon_through_api_cache(self, tmp_path):
+        requests = []
+
+        def upstream(request):
+            requests.append(str(request.url))
+            return tcgdex(request)
+
+        cache = api_cache.ApiCache(client=httpx.AsyncClient(transport=httpx.MockTransport(upstream)))
+        store = FakeStore()
+        jobs = ImportJobs(store=store, resolver=Resolver(cache))
+        job = asyncio.run(run_job(jobs, spool(tmp_path, POKEMON)))
+        assert job.status()["unresolved"] == 0
+        pikachu, charizard = store.writes[0]
+        assert (pikachu[1], pikachu[2], pikachu[4]) == ("sv03-25", "pokemon", 2)
+        data = json.loads(pikachu[3])
+        assert data["images"]["small"] == "https://assets/sv03/25/low.webp"
+        assert data["pricing"]["cardmarket"] == {"avg": 1.25, "trend": 1.25}
+        assert charizard[1] == "sv03-125"
+        # "025" is not a TCGdex ID, "25" is
+        assert sorted(requests) == ["https://api.tcgdex.net/v2/en/cards/sv03-025",
+                                    "https://api.tcgdex.net/v2/en/cards/sv03-125",
+                                    "https://api.tcgdex.net/v2/en/cards/sv03-25"]
+
+    def test_pokemon_by_name(self, tmp_path):
+        # Neither ID exists; the name search is matched on the set name before the number
+        results = [{"id": "base1-58", "localId": "58", "name": "Pikachu", "set": {"id": "base1", "name": "Base Set"}},
+                   {"id": "sv03-27", "localId": "27", "name": "Pikachu", "set": {"id": "sv03", "name": "Obsidian Flames"}},
+                   {"id": "sv01-25", "localId": "25", "name": "Pikachu", "set": {"id": "sv01", "name": "Scarlet & Violet"}}]
+
+        def upstream(request):
+            if "name=" in str(request.url):
+                return httpx.Response(200, json=results)
+            return httpx.Response(404, json={"error": "not found"})
+
+        cache = api_cache.ApiCache(client=httpx.AsyncClient(transport=httpx.MockTransport(upstream)))
+        store = FakeStore()
+        jobs = ImportJobs(store=store, resolver=Resolver(cache))
+        text = POKEMON.split("\n")[0] + "\nPikachu,PRE,Obsidian Flames,025,1,1,NM\nPikachu,PRE,Prismatic,025,1,1,NM\n"
+        asyncio.run(run_job(jobs, spool(tmp_path, text)))
+        assert [row[1] for row in store.writes[0]] == ["sv03-27", "sv01-25"]
+
+    def test_cardmarket_names_through_scryfall_collection(self, tmp_path):
+        posted = []
+
+        def upstream(request):
+            identifiers = json.loads(request.content)["identifiers"]
+            posted.append(identifiers)
+            return httpx.Response(200, json={"data": [BOLT] if {"name": "Lightning Bolt", "set": "2xm"} in identifiers else []})
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        store = FakeStore()
+        jobs = ImportJobs(store=store, resolver=Resolver(scryfall=ScryfallCollection(client, "https://scryfall", rate=0)))
+        job = asyncio.run(run_job(jobs, spool(tmp_path, CARDMARKET)))
+        assert posted == [[{"name": "Lightning Bolt", "set": "2xm"}]]
+        assert job.status()["unresolved"] == 0
+        data = json.loads(store.writes[0][0][3])
+        assert data["set_code"] == "2XM" and data["rarity"] == "uncommon" and data["purchase_price"] == 2.0
+
+    def test_index_read_on_event_loop(self, tmp_path, store_path, monkeypatch):
+        # The index is changed on the event loop; only card store reads may run in a thread
+        threads = []
+        search = search_index.service.index.search
+        monkeypatch.setattr(search_index.service.index, "search",
+                            lambda *args, **kwargs: threads.append(threading.current_thread()) or search(*args, **kwargs))
+        jobs = ImportJobs(store=FakeStore(), resolver=Resolver())
+        asyncio.run(run_job(jobs, spool(tmp_path, CARDMARKET)))
+        assert threads == [threading.main_thread()]
+
+    def test_failed_writes_are_reported(self, tmp_path, store_path):
+        jobs = ImportJobs(store=FakeStore(fail=True), resolver=Resolver())
+        status = asyncio.run(run_job(jobs, spool(tmp_path, MANABOX))).status()
+        assert status["state"] == "done"
+        assert (status["imported"], status["failed"]) == (0, 3)
+        assert status["errors"] == ["Rows 2-5: ConnectionError: database is down"]
+
+    def test_cancel(self, tmp_path, store_path):
+        async def go():
+            jobs = ImportJobs(store=FakeStore(), resolver=Resolver(), max_running=1)
+            first = await jobs.start("user_1", spool(tmp_path, MANABOX, "a.csv"))
+            second = await jobs.start("user_1", spool(tmp_path, MANABOX, "b.csv"))
+            await jobs.cancel(second)
+            await first.task
+            return first, second
+
+        first, second = asyncio.run(go())
+        assert first.state == "done" and second.state == "cancelled"
+        assert not (tmp_path / "b.csv").exists()
+
+
+class TestPostgresStore:
+    """Test the queries against a stand-in asyncpg pool"""
+
+    def test_insert_items_copies(self):
+        copies = []
+
+        class Connection:
+            async def copy_records_to_table(self, table, records, columns):
+                copies.append((table, records, columns))
+
+        class Acquire:
+            async def __aenter__(self):
+                return Connection()
+
+            async def __aexit__(self, *exc):
+                return False
+
+        class Pool:
+            def acquire(self):
+                return Acquire()
+
+        store = collection_import.PostgresImportStore("postgres://stand-in")
+        store.pool = Pool()
+        records = [("user_1", BOLT["id"], "mtg", "{}", 4, "Near Mint", True, "Imported via CSV")]
+        assert asyncio.run(store.insert_items(records)) == 1
+        assert copies == [("collection_items", records, collection_import.PostgresImportStore.COLUMNS)]
+
+
+class TestRoutes:
+    """Test the import job routes"""
+
+    @pytest.fixture
+    def jobs(self, monkeypatch, store_path):
+        jobs = ImportJobs(store=FakeStore(), resolver=Resolver())
+        monkeypatch.setattr(collection_import, "jobs", jobs)
+        return jobs
+
+    headers = {"Authorization": f"Bearer {make_jwt({'user_id': 'user_1', 'exp': time.time() + 3600})}"}
+
+    def wait(self, client, location, headers):
+        for _ in range(100):
+            status = client.get(location, headers=headers).json()
+            if status["state"] not in ("queued", "running"):
+                return status
+            time.sleep(0.02)
+        raise AssertionError(status)
+
+    def test_upload_and_poll(self, client, jobs):
+        response = client.post("/api/collection/import/jobs", content=MANABOX.encode(),
+                               headers={**self.headers, "Content-Type": "text/csv"})
+        assert response.status_code == 202
+        status = self.wait(client, response.headers["location"], self.headers)
+        assert status["imported"] == 3
+        assert len(jobs.store.writes) == 1
+
+    def test_json_body_and_session_cookie(self, client, jobs):
+        client.cookies.set("session_token", "session_abc")
+        try:
+            response = client.post("/api/collection/import/jobs", json={"csvContent": POKEMON, "gameType": "pokemon"})
+            assert response.status_code == 202
+            status = self.wait(client, response.headers["location"], {})
+        finally:
+            client.cookies.clear()
+        assert status["format"] == "pokemon" and status["rows"] == 2
+        assert {record[0] for record in jobs.store.writes[0]} == {"user_web"}
+
+    def test_events(self, client, jobs):
+        location = client.post("/api/collection/import/jobs", content=MANABOX.encode(), headers=self.headers) \
+            .headers["location"]
+        response = client.get(f"{location}/events", headers=self.headers)
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [json.loads(line[6:]) for line in response.text.split("\n\n") if line.startswith("data: ")]
+        assert events[-1]["state"] == "done" and events[-1]["imported"] == 3
+
+    def test_auth_and_ownership(self, client, jobs):
+        assert client.post("/api/collection/import/jobs", content=MANABOX.encode()).status_code == 401
+        location = client.post("/api/collection/import/jobs", content=MANABOX.encode(), headers=self.headers) \
+            .headers["location"]
+        other = {"Authorization": f"Bearer {make_jwt({'user_id': 'user_2', 'exp': time.time() + 3600})}"}
+        assert client.get(location, headers=other).status_code == 404
+        assert client.delete(location, headers=other).status_code == 404
+
+    def test_upload_limit(self, client, jobs, monkeypatch):
+        monkeypatch.setattr(collection_import, "IMPORT_MAX_BYTES", 10)
+        response = client.post("/api/collection/import/jobs", content=MANABOX.encode(), headers=self.headers)
+        assert response.status_code == 413
+        assert client.post("/api/collection/import/jobs", json={"gameType": "mtg"},
+                           headers=self.headers).status_code == 400
@@ -0,0 +1,207 @@
+"""
+Deck Analytics Test Suite - backend/deck_analytics.py
+Testing features:
+1. Mana value, pip and type parsing as DeckAnalytics.tsx does it
+2. Curve, colour, type and size statistics per deck
+3. Format rules: deck size, copies, basic lands and energy, card legality
+4. Batches computed together give the same results as one deck at a time
+5. Results cached by deck content hash
+6. /api/decks/analytics, /api/decks/{deckId}/analytics and the community batch
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+import pytest
+
+import deck_analytics
+import deck_lists
+from conftest import BOLT, ENERGY, FOREST, LOTUS, PIKACHU, REAPER, SWITCH, TROLL, FakeDeckStore, make_jwt
+from deck_analytics import Deck, DeckAnalytics
+from deck_lists import Decks
+
+
+def run(decks):
+    return deck_analytics.analyse([(deck.game, deck.format, [deck_analytics.card(deck.game, *row) for row in deck.rows])
+                                   for deck in decks])
+
+
+class TestParsing:
+    """Test mana cost and type line parsing"""
+
+    def test_mana_value(self):
+        assert deck_analytics.mana("{1}{G}{G}") == (3, (0, 0, 0, 0, 2, 0), 0b10000)
+        # parseInt("2/W") is 2, as getCMC counts it; X counts nothing
+        assert deck_analytics.mana("{2/W}{X}{C}")[0] == 3
+        assert deck_analytics.mana("{W/U}{10}")[0] == 11
+        assert deck_analytics.mana("") == (0, (0,) * 6, 0)
+        # Posted mana costs are clamped rather than overflowing the int64 columns
+        assert deck_analytics.mana("{1000000}")[0] == deck_analytics.MAX_MANA_VALUE
+        assert deck_analytics.mana("{" + "9" * 30 + "}{R}")[0] == deck_analytics.MAX_MANA_VALUE
+        assert deck_analytics.mana("{-5}{R}")[0] == 0
+
+    def test_primary_type(self):
+        mask = deck_analytics.types("Legendary Artifact Creature")
+        assert deck_analytics.TYPES[deck_analytics._PRIMARY[mask]] == "Creature"
+        assert deck_analytics._PRIMARY[deck_analytics.types("Tribal Kindred")] == deck_analytics.OTHER
+
+
+class TestAnalyse:
+    """Test statistics and legality of single decks"""
+
+    def test_statistics(self):
+        [result] = run([Deck("mtg", "Modern", [
+            ("bolt", BOLT, 4, "main"), ("troll", TROLL, 2, None), ("reaper", REAPER, 1, "main"),
+            ("forest", FOREST, 20, "main"), ("bolt-sb", BOLT, 3, "sideboard"),
+        ])])
+        assert result["manaCurve"] == {"0": 0, "1": 7, "2": 0, "3": 2, "4": 0, "5": 0, "6": 1}
+        assert result["colorDistribution"] == {"R": 7, "G": 4}
+        assert result["typeDistribution"] == {"Creature": 3, "Instant": 7, "Land": 20}
+        assert result["colors"] == "RG"
+        assert result["stats"] == {"totalMain": 27, "totalSideboard": 3, "uniqueCards": 5, "averageCMC": "2.86"}
+        assert result["legalityIssues"] == ["Deck has 27 cards (minimum: 60)"]
+        assert result["legalFormats"] == ["modern", "legacy", "vintage", "pauper", "commander"]
+
+    def test_copies_and_legality(self):
+        rows = [("lotus", LOTUS, 2, "main"), ("bolt", BOLT, 3, "main"), ("bolt-2", BOLT, 2, "main"),
+                ("forest", FOREST, 53, "main")]
+        vintage, legacy, standard = run([Deck("mtg", "Vintage", rows), Deck("mtg", "Legacy", rows),
+                                         Deck("mtg", "Standard", rows)])
+        assert vintage["legalityIssues"] == ["Black Lotus: 2 copies (max: 1)", "Lightning Bolt: 5 copies (max: 4)"]
+        assert legacy["legalityIssues"] == ["Black Lotus: not legal in Legacy", "Lightning Bolt: 5 copies (max: 4)"]
+        assert standard["legalityIssues"] == ["Lightning Bolt: not legal in Standard",
+                                              "Lightning Bolt: 5 copies (max: 4)"]
+        assert vintage["legalFormats"] == ["vintage", "pauper", "commander"]
+
+    def test_commander(self):
+        rows = [("troll", TROLL, 1, "commander"), ("reaper", REAPER, 2, "main"), ("forest", FOREST, 97, "main")]
+        [result] = run([Deck("mtg", "Commander", rows)])
+        assert result["stats"]["totalMain"] == 100
+        assert result["legalityIssues"] == ["Reaper King: 2 copies (max: 1)"]
+
+    def test_pokemon(self):
+        [result] = run([Deck("pokemon", "Standard", [
+            ("pikachu", PIKACHU, 5, "main"), ("energy", ENERGY, 20, "main"), ("switch", SWITCH, 4, "main"),
+        ])])
+        assert result["pokemonTypeDistribution"] == {"Lightning": 5, "Energy": 20, "Trainer": 4}
+        assert result["manaCurve"] == {} and result["stats"]["averageCMC"] == "N/A"
+        assert result["legalityIssues"] == ["Deck has 29 cards (required: 60)", "Pikachu: 5 copies (max: 4)",
+                                            "Switch: not legal in Standard"]
+        assert result["legalFormats"] == ["expanded"]
+
+    def test_unknown_format_and_empty_deck(self):
+        unknown, empty = run([Deck("mtg", "Oathbreaker", [("bolt", BOLT, 9, "main")]), Deck("lorcana", None, [])])
+        assert unknown["legalityIssues"] == []
+        assert empty["stats"] == {"totalMain": 0, "totalSideboard": 0, "uniqueCards": 0, "averageCMC": "N/A"}
+        assert empty["legalFormats"] == []
+
+
+class TestBatch:
+    """Test that a batch gives each deck's own results"""
+
+    def test_batch_matches_single(self):
+        rng = random.Random(7)
+        cards = [BOLT, TROLL, REAPER, LOTUS, FOREST]
+        decks = [Deck("mtg", rng.choice(("Modern", "Vintage", "Commander", None)),
+                      [(f"card-{i}", rng.choice(cards), rng.randint(1, 6), rng.choice(("main", "sideboard", None)))
+                       for i in range(rng.randint(0, 12))])
+                 for _ in range(40)]
+        decks.append(Deck("pokemon", "Standard", [("pikachu", PIKACHU, 5, "main")]))
+        assert run(decks) == [run([deck])[0] for deck in decks]
+
+    def test_prepared_off_the_loop(self, monkeypatch):
+        threads = []
+        content_hash = deck_analytics.content_hash
+        monkeypatch.setattr(deck_analytics, "content_hash",
+                            lambda *deck: threads.append(threading.get_ident()) or content_hash(*deck))
+        asyncio.run(DeckAnalytics().analyse([Deck("mtg", "Modern", [("bolt", BOLT, 4, "main")])]))
+        assert threads and threading.get_ident() not in threads
+
+    def test_cache(self):
+        analytics = DeckAnalytics()
+        deck = Deck("mtg", "Modern", [("bolt", BOLT, 4, "main")])
+        first = asyncio.run(analytics.analyse([deck]))
+        assert asyncio.run(analytics.analyse([deck, Deck("mtg", "Modern", [("bolt", BOLT, 4, "main")])])) == first * 2
+        assert (analytics.hits, analytics.misses) == (2, 1)
+        changed = asyncio.run(analytics.analyse([Deck("mtg", "Modern", [("bolt", BOLT, 5, "main")])]))
+        assert changed[0]["legalityIssues"] == ["Deck has 5 cards (minimum: 60)", "Lightning Bolt: 5 copies (max: 4)"]
+        assert analytics.stats()["entries"] == 2
+
+
+class CommunityDeckStore(FakeDeckStore):
+    async def public_decks(self, game, fmt, limit):
+        return [({"deck_id": deck_id, "name": deck["name"], "game": deck["game"], "format": deck["format"]},
+                 self.rows[deck_id])
+                for deck_id, deck in self.decks.items()
+                if deck["is_public"] and game in (None, deck["game"]) and fmt in (None, deck["format"])][:limit]
+
+
+class TestEndpoints:
+    """Test the analytics routes"""
+
+    @pytest.fixture
+    def decks(self, monkeypatch):
+        store = CommunityDeckStore({
+            "deck_1": {"user_id": "user_1", "is_public": False, "name": "Burn", "format": "Modern", "game": "mtg"},
+            "deck_2": {"user_id": "user_2", "is_public": True, "name": "Lotus", "format": "Vintage", "game": "mtg"},
+            "deck_3": {"user_id": "user_2", "is_public": False, "name": "Hidden", "format": "Vintage", "game": "mtg"},
+        })
+        store.rows["deck_1"] = [("bolt", BOLT, 4, "main")]
+        store.rows["deck_2"] = [("lotus", LOTUS, 2, "main")]
+        decks = Decks(store=store)
+        monkeypatch.setattr(deck_lists, "decks", decks)
+        monkeypatch.setattr(deck_analytics, "analytics", DeckAnalytics())
+        return decks
+
+    headers = {"Authorization": f"Bearer {make_jwt({'user_id': 'user_1', 'exp': time.time() + 3600})}"}
+
+    def test_post(self, client, decks):
+        data = client.post("/api/decks/analytics", headers=self.headers, json={
+            "game": "mtg", "format": "Modern", "cards": [{"card_id": "bolt", "card_data": BOLT, "quantity": 4}]}).json()
+        assert data["success"] and data["manaCurve"]["1"] == 4 and data["stats"]["totalMain"] == 4
+
+        batch = client.post("/api/decks/analytics", headers=self.headers, json={"decks": [
+            {"game": "mtg", "cards": [{"cardId": "bolt", "cardData": BOLT, "quantity": 2}]},
+            {"game": "pokemon", "format": "Standard", "cards": [{"card_id": "p", "card_data": PIKACHU}]},
+        ]}).json()
+        assert [deck["stats"]["totalMain"] for deck in batch["decks"]] == [2, 1]
+        assert batch["decks"][1]["pokemonTypeDistribution"] == {"Lightning": 1}
+
+    def test_post_errors(self, client, decks, monkeypatch):
+        def post(**kwargs):
+            return client.post("/api/decks/analytics", headers=self.headers, **kwargs)
+
+        assert client.post("/api/decks/analytics", json={"cards": []}).status_code == 401
+        assert post(content=b"{").status_code == 400
+        assert post(json={"cards": "bolt"}).status_code == 400
+        assert post(json={"cards": [{"quantity": "many"}]}).status_code == 400
+        for quantity in (-4, deck_analytics.ANALYTICS_MAX_QUANTITY + 1, 10 ** 30):
+            assert post(json={"cards": [{"card_data": BOLT, "quantity": quantity}]}).json()["error"] == \
+                f"quantity must be between 1 and {deck_analytics.ANALYTICS_MAX_QUANTITY}"
+        assert post(content=b'{"cards": [{"quantity": 1e400}]}').json()["error"] == "quantity must be a number"
+        huge = {**BOLT, "mana_cost": "{" + "9" * 30 + "}"}
+        data = post(json={"cards": [{"card_data": huge, "quantity": deck_analytics.ANALYTICS_MAX_QUANTITY}]}).json()
+        assert data["manaCurve"]["6"] == deck_analytics.ANALYTICS_MAX_QUANTITY
+        monkeypatch.setattr(deck_analytics, "ANALYTICS_MAX_DECKS", 1)
+        assert post(json={"decks": [{"cards": []}] * 2}).status_code == 413
+        monkeypatch.setattr(deck_analytics, "ANALYTICS_MAX_TOTAL_ROWS", 1)
+        assert post(json={"cards": [{"card_data": BOLT}, {"card_data": FOREST}]}).status_code == 413
+        monkeypatch.setattr(deck_analytics, "ANALYTICS_MAX_BYTES", 100)
+        assert post(json={"cards": [{"card_data": BOLT}]}).json()["error"] == "Request body larger than 100 bytes"
+
+    def test_saved_deck(self, client, decks):
+        data = client.get("/api/decks/deck_1/analytics", headers=self.headers).json()
+        assert data["legalityIssues"] == ["Deck has 4 cards (minimum: 60)"]
+        assert client.get("/api/decks/deck_2/analytics", headers=self.headers).json()["stats"]["totalMain"] == 2
+        assert client.get("/api/decks/deck_3/analytics", headers=self.headers).status_code == 403
+        assert client.get("/api/decks/deck_1/analytics").status_code == 401
+
+    def test_community(self, client, decks):
+        data = client.get("/api/decks/community/analytics?game=all").json()
+        assert [(deck["deck_id"], deck["legalityIssues"]) for deck in data["decks"]] == [
+            ("deck_2", ["Deck has 2 cards (minimum: 60)", "Black Lotus: 2 copies (max: 1)"])]
+        assert client.get("/api/decks/community/analytics?format=Modern").json()["decks"] == []
+        client.get("/api/decks/community/analytics")
+        assert deck_analytics.analytics.hits == 1
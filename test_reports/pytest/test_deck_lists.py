@@ -0,0 +1,241 @@
+"""
+Deck Lists Test Suite - backend/deck_lists.py
+Testing features:
+1. One-pass tokenising of MTGA, Archidekt and plain-text lists
+2. Bulk resolution against the local index: set and number, aliases,
+   names, double-faced cards, the card store fallback
+3. Exports as the deck editor writes them, streamed
+4. /api/decks/parse, /api/decks/{deckId}/import and /export
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+import card_store
+import deck_lists
+import search_index
+from conftest import FakeDeckStore, make_jwt
+from deck_lists import Decks, Entry
+from search_index import SearchIndex
+
+BOLT = {"id": "f29ba16f-c8fb-42fe-aabf-87089cb214a7", "name": "Lightning Bolt", "set": "2xm",
+        "collector_number": "117", "rarity": "uncommon", "released_at": "2020-08-07", "type_line": "Instant"}
+BOLT_OLD = {"id": "8a1d3b1e-0c3e-4e43-9a24-6b0f1c2d3e01", "name": "Lightning Bolt", "set": "lea",
+            "collector_number": "161", "rarity": "common", "released_at": "1993-08-05", "type_line": "Instant"}
+ELVES = {"id": "1e0a1b2c-3d4e-4f50-8a6b-7c8d9e0f1a2b", "name": "Llanowar Elves", "set": "dom",
+         "collector_number": "168", "rarity": "common", "released_at": "2018-04-27"}
+FABLE = {"id": "2e0a1b2c-3d4e-4f50-8a6b-7c8d9e0f1a2b", "name": "Fable of the Mirror-Breaker // Reflection of Kiki-Jiki",
+         "set": "neo", "collector_number": "141", "rarity": "rare", "released_at": "2022-02-18"}
+NEGATE = {"id": "3e0a1b2c-3d4e-4f50-8a6b-7c8d9e0f1a2b", "name": "Negate", "set": "c21",
+          "collector_number": "263", "rarity": "common", "released_at": "2021-04-23"}
+# In the card store only, as before the index has synced
+SOL_RING = {"id": "4e0a1b2c-3d4e-4f50-8a6b-7c8d9e0f1a2b", "name": "Sol Ring", "set": "c21",
+            "collector_number": "125", "rarity": "uncommon", "released_at": "2021-04-23"}
+
+MTGA = """About
+Name Burn
+
+Deck
+4 Lightning Bolt (2XM) 117
+1 Fable of the Mirror-Breaker (NEO) 141
+2 Llanowar Elves (DAR) 168
+
+Sideboard
+3 Negate (C21) 263
+"""
+
+ARCHIDEKT = """1x Sol Ring (C21) 125 *F* [Ramp]
+1 Lightning Bolt [2XM] 117
+1x Island [Maybeboard]
+1x Negate (C21) 263 [Sideboard]
+1x Atraxa, Grand Unifier (ONE) 196 [Commander{top}]
+"""
+
+TEXT = """// Burn
+Commander: 1x Lightning Bolt
+4x Llanowar Elves
+Fable of the Mirror-Breaker
+# comment
+SB: 2 Negate
+"""
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    path = str(tmp_path / "cards.store")
+    card_store.ingest([json.dumps([BOLT, BOLT_OLD, ELVES, FABLE, NEGATE, SOL_RING]).encode()], path, changes=False)
+    monkeypatch.setattr(card_store, "CARD_STORE", path)
+    index = SearchIndex()
+    index.add("mtg", [search_index.document("mtg", card, keep_card=False)
+                      for card in (BOLT, BOLT_OLD, ELVES, FABLE, NEGATE)])
+    monkeypatch.setattr(search_index.service, "index", index)
+    yield index
+    card_store.current(str(tmp_path / "missing.store"))
+
+
+class TestParse:
+    """Test tokenising deck lists"""
+
+    def test_mtga(self):
+        deck_list = deck_lists.parse(MTGA)
+        assert deck_list.format == "mtga"
+        assert deck_list.entries == [
+            Entry(5, 4, "Lightning Bolt", "2XM", "117"),
+            Entry(6, 1, "Fable of the Mirror-Breaker", "NEO", "141"),
+            Entry(7, 2, "Llanowar Elves", "DAR", "168"),
+            Entry(10, 3, "Negate", "C21", "263", "sideboard"),
+        ]
+
+    def test_archidekt(self):
+        deck_list = deck_lists.parse(ARCHIDEKT)
+        assert deck_list.format == "archidekt"
+        assert [(e.name, e.set_code, e.number, e.category, e.foil) for e in deck_list.entries] == [
+            ("Sol Ring", "C21", "125", "main", True),
+            ("Lightning Bolt", "2XM", "117", "main", False),
+            ("Negate", "C21", "263", "sideboard", False),
+            ("Atraxa, Grand Unifier", "ONE", "196", "main", False),
+        ]
+
+    def test_plain_text(self):
+        deck_list = deck_lists.parse(TEXT)
+        assert deck_list.format == "text"
+        assert [(e.quantity, e.name, e.category) for e in deck_list.entries] == [
+            (1, "Lightning Bolt", "main"), (4, "Llanowar Elves", "main"),
+            (1, "Fable of the Mirror-Breaker", "main"), (2, "Negate", "sideboard"),
+        ]
+
+    def test_not_section_headers(self):
+        entries = deck_lists.parse("Commander's Sphere\n0 Island\nDeck:\n1 Deckhand").entries
+        assert [(e.name, e.quantity) for e in entries] == [("Commander's Sphere", 1), ("Deckhand", 1)]
+
+
+class TestResolve:
+    """Test resolving a whole list at once"""
+
+    def test_mtga_list(self, index):
+        deck_list = deck_lists.parse(MTGA)
+        cards = deck_lists.resolve("mtg", deck_list.entries)
+        assert [card["id"] for card in cards] == [BOLT["id"], FABLE["id"], ELVES["id"], NEGATE["id"]]
+        assert cards[0]["game"] == "mtg" and cards[0]["type_line"] == "Instant"
+
+    def test_names_and_store_fallback(self, index):
+        cards = deck_lists.resolve("mtg", deck_lists.parse(ARCHIDEKT + TEXT).entries)
+        ids = [card and card["id"] for card in cards]
+        # Sol Ring from the store, Atraxa unknown, the text list by name (newest Bolt, Fable by front face)
+        assert ids == [SOL_RING["id"], BOLT["id"], NEGATE["id"], None,
+                       BOLT["id"], ELVES["id"], FABLE["id"], NEGATE["id"]]
+
+    def test_set_without_number_and_wrong_number(self, index):
+        entries = [Entry(1, 1, "Lightning Bolt", "LEA"), Entry(2, 1, "Lightning Bolt", "2XM", "168")]
+        assert [card["id"] for card in deck_lists.resolve("mtg", entries)] == [BOLT_OLD["id"], BOLT["id"]]
+
+    def test_load_reads_only_the_matches(self, index):
+        entries = deck_lists.parse(MTGA).entries
+        matches = deck_lists.match("mtg", entries)
+        # The index may change on the event loop while load() runs in a thread
+        index.remove("mtg", [BOLT["id"]])
+        assert deck_lists.load("mtg", entries, matches)[0]["id"] == BOLT["id"]
+
+    def test_rows_merge_duplicates(self, index):
+        deck_list = deck_lists.parse("4 Lightning Bolt\nSideboard\n2 Lightning Bolt (2XM) 117\n1 Nothing Real")
+        rows = deck_lists.deck_rows(deck_list.entries, deck_lists.resolve("mtg", deck_list.entries))
+        assert [(card_id, quantity, category) for card_id, _, quantity, category in rows] == [(BOLT["id"], 6, "main")]
+
+
+class TestExport:
+    """Test exportDecklist's formats"""
+
+    deck = {"name": "Burn", "format": "Modern", "main_total": 5}
+    rows = [
+        ("c1", {"name": "Lightning Bolt", "set": "2xm", "collector_number": "117"}, 4, "main"),
+        ("c2", {"name": "Pikachu", "set": {"id": "sv03"}}, 1, None),
+        ("c3", {"name": "Negate", "set": "c21", "collector_number": "263"}, 3, "sideboard"),
+    ]
+
+    def render(self, fmt):
+        async def rows():
+            for row in self.rows:
+                yield row
+
+        async def collect():
+            return "".join([chunk async for chunk in deck_lists.export(fmt, self.deck, rows())])
+
+        return asyncio.run(collect())
+
+    def test_formats(self):
+        assert self.render("mtga") == ("Deck\n4 Lightning Bolt (2XM) 117\n1 Pikachu\n"
+                                       "\nSideboard\n3 Negate (C21) 263\n")
+        assert self.render("archidekt") == ("4x Lightning Bolt (2XM) 117\n1x Pikachu (XXX) 1\n"
+                                            "\nSideboard\n3x Negate (C21) 263\n")
+        assert self.render("text") == ("// Burn\n// Format: Modern\n// Total: 5 cards\n\n"
+                                       "4 Lightning Bolt\n1 Pikachu\n\nSideboard:\n3 Negate\n")
+
+    def test_round_trip(self, index):
+        deck_list = deck_lists.parse(self.render("mtga"))
+        assert [(e.name, e.set_code, e.number, e.category) for e in deck_list.entries] == [
+            ("Lightning Bolt", "2XM", "117", "main"), ("Pikachu", "", "", "main"), ("Negate", "C21", "263", "sideboard")]
+
+
+class TestRoutes:
+    """Test the deck list routes"""
+
+    @pytest.fixture
+    def decks(self, monkeypatch, index):
+        decks = Decks(store=FakeDeckStore({
+            "deck_1": {"user_id": "user_1", "is_public": False, "name": "Burn / Modern", "format": "Modern",
+                       "game": "mtg", "main_total": 0},
+            "deck_2": {"user_id": "user_2", "is_public": True, "name": "Public", "format": "",
+                       "game": "mtg", "main_total": 0},
+        }))
+        monkeypatch.setattr(deck_lists, "decks", decks)
+        return decks
+
+    headers = {"Authorization": f"Bearer {make_jwt({'user_id': 'user_1', 'exp': time.time() + 3600})}"}
+
+    def test_parse(self, client, index):
+        assert client.post("/api/decks/parse", content=ARCHIDEKT.encode()).status_code == 401
+        response = client.post("/api/decks/parse", content=ARCHIDEKT.encode(),
+                               headers={**self.headers, "Content-Type": "text/plain"})
+        data = response.json()
+        assert data["success"] and data["format"] == "archidekt" and data["totalCards"] == 4
+        assert [(card["cardId"], card["quantity"], card["category"]) for card in data["cards"]] == [
+            (SOL_RING["id"], 1, "main"), (BOLT["id"], 1, "main"), (NEGATE["id"], 1, "sideboard")]
+        assert data["cards"][0]["foil"] is True
+        assert data["unresolved"] == [{"line": 5, "name": "Atraxa, Grand Unifier", "quantity": 1}]
+
+    def test_parse_json_body(self, client, index):
+        data = client.post("/api/decks/parse", json={"decklist": "4 Lightning Bolt", "game": "mtg"},
+                           headers=self.headers).json()
+        assert data["cards"][0]["cardData"]["name"] == "Lightning Bolt"
+        assert client.post("/api/decks/parse", json={"decklist": ""}, headers=self.headers).status_code == 400
+        assert client.post("/api/decks/parse?game=chess", content=b"1 Pawn", headers=self.headers).status_code == 400
+
+    def test_line_limit(self, client, index, monkeypatch):
+        monkeypatch.setattr(deck_lists, "DECK_MAX_LINES", 3)
+        assert client.post("/api/decks/parse", content=MTGA.encode(), headers=self.headers).status_code == 413
+
+    def test_import(self, client, decks):
+        response = client.post("/api/decks/deck_1/import", content=MTGA.encode(), headers=self.headers)
+        assert response.json() == {"success": True, "format": "mtga", "added": 4, "failed": []}
+        assert len(decks.store.writes) == 1
+        assert {row[0] for row in decks.store.writes[0]} == {BOLT["id"], FABLE["id"], ELVES["id"], NEGATE["id"]}
+
+    def test_import_access(self, client, decks):
+        assert client.post("/api/decks/deck_1/import", content=MTGA.encode()).status_code == 401
+        assert client.post("/api/decks/nope/import", content=MTGA.encode(), headers=self.headers).status_code == 404
+        assert client.post("/api/decks/deck_2/import", content=MTGA.encode(), headers=self.headers).status_code == 403
+
+    def test_export(self, client, decks):
+        client.post("/api/decks/deck_1/import", content=MTGA.encode(), headers=self.headers)
+        response = client.get("/api/decks/deck_1/export", params={"format": "archidekt"}, headers=self.headers)
+        assert response.status_code == 200
+        assert response.headers["content-disposition"] == 'attachment; filename="Burn_Modern.txt"'
+        assert response.text.splitlines() == [
+            "1x Fable of the Mirror-Breaker // Reflection of Kiki-Jiki (NEO) 141", "4x Lightning Bolt (2XM) 117",
+            "2x Llanowar Elves (DOM) 168", "", "Sideboard", "3x Negate (C21) 263"]
+        assert client.get("/api/decks/deck_1/export", params={"format": "pdf"}, headers=self.headers).status_code == 400
+        # Public decks can be exported by anyone signed in
+        assert client.get("/api/decks/deck_2/export", headers=self.headers).text == "Deck\n"
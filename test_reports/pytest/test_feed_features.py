@@ -5,9 +5,8 @@ Tests: Comments, Replies (threaded), Emoji Reactions on Posts and Comments
 
 import pytest
 import requests
-import time
 
-BASE_URL = "http://localhost:3000"
+from conftest import BASE_URL, unique_name
 
 # Test data
 TEST_USER = {
@@ -23,9 +22,9 @@ session = requests.Session()
 session.headers.update({"Content-Type": "application/json"})
 
 
-@pytest.fixture(autouse=True)
+@pytest.fixture(autouse=True, scope="module")
 def login_user():
-    """Ensure user is logged in before tests"""
+    """Log the module session in once before the tests"""
     response = session.post(f"{BASE_URL}/api/auth/login", json=TEST_USER)
     if response.status_code != 200:
         pytest.skip("Login failed - skipping tests")
@@ -49,7 +48,7 @@ class TestComments:
     
     def test_create_comment(self, login_user):
         """Test POST /api/feed/{postId}/comments - creates a new comment"""
-        comment_content = f"TEST_comment_{int(time.time())}"
+        comment_content = unique_name("comment")
         response = session.post(
             f"{BASE_URL}/api/feed/{POST_ID}/comments",
             json={"content": comment_content}
@@ -71,7 +70,7 @@ class TestComments:
     
     def test_create_reply_to_comment(self, login_user):
         """Test POST /api/feed/{postId}/comments with parentCommentId - creates a reply"""
-        reply_content = f"TEST_reply_{int(time.time())}"
+        reply_content = unique_name("reply")
         response = session.post(
             f"{BASE_URL}/api/feed/{POST_ID}/comments",
             json={
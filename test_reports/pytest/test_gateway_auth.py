@@ -0,0 +1,96 @@
+"""
+Gateway Auth Test Suite - backend/gateway_auth.py
+Testing features:
+1. HS256 JWT verification compatible with jsonwebtoken (lib/auth.ts)
+2. Protected route matching and public exceptions
+3. 401 fast path for protected /api/* routes without credentials
+4. Trusted user-id header injection and stripping of spoofed headers
+"""
+
+import time
+
+import pytest
+
+import gateway_auth
+from conftest import make_jwt
+
+
+class TestJwtVerification:
+    """Test HS256 token verification"""
+
+    def test_valid_token(self):
+        token = make_jwt({"user_id": "user_1", "exp": time.time() + 60})
+        assert gateway_auth.decode_jwt(token)["user_id"] == "user_1"
+
+    def test_expired_token(self):
+        token = make_jwt({"user_id": "user_1", "exp": time.time() - 1})
+        assert gateway_auth.decode_jwt(token) is None
+
+    def test_wrong_secret(self):
+        token = make_jwt({"user_id": "user_1"}, secret="other-secret")
+        assert gateway_auth.decode_jwt(token) is None
+
+    def test_wrong_algorithm(self):
+        token = make_jwt({"user_id": "user_1"}, alg="none")
+        assert gateway_auth.decode_jwt(token) is None
+
+    @pytest.mark.parametrize("token", ["", "abc", "a.b.c", "a.b"])
+    def test_malformed_token(self, token):
+        assert gateway_auth.decode_jwt(token) is None
+
+    def test_cache_reuses_result(self):
+        cache = gateway_auth.TokenCache(max_entries=2)
+        token = make_jwt({"user_id": "user_1", "exp": time.time() + 60})
+        assert cache.verify(token) == "user_1"
+        assert cache.verify(token) == "user_1"
+        assert len(cache.entries) == 1
+
+    def test_cache_is_bounded(self):
+        cache = gateway_auth.TokenCache(max_entries=2)
+        for i in range(5):
+            cache.verify(make_jwt({"user_id": f"user_{i}"}))
+        assert len(cache.entries) == 2
+
+
+class TestProtectedRoutes:
+    """Test which /api/* paths are rejected without credentials"""
+
+    @pytest.mark.parametrize("path", [
+        "api/decks", "api/decks/deck_1/cards", "api/feed", "api/users/search",
+        "api/collection", "api/messages/conv_1",
+    ])
+    def test_protected(self, path):
+        assert gateway_auth.is_protected_path(path)
+
+    @pytest.mark.parametrize("path", [
+        "api/decks/community", "api/collection/public/user_1", "api/users/search/user_1",
+        "api/feed/post_1/comments", "api/search", "api/auth/login", "api/marketplace",
+        "api/decksx",
+    ])
+    def test_public(self, path):
+        assert not gateway_auth.is_protected_path(path)
+
+    def test_no_credentials_rejected(self):
+        assert gateway_auth.authenticate("api/decks", "GET", None, None) == (True, None)
+
+    def test_preflight_never_rejected(self):
+        assert gateway_auth.authenticate("api/decks", "OPTIONS", None, None) == (False, None)
+
+    def test_session_cookie_forwarded(self):
+        assert gateway_auth.authenticate("api/decks", "GET", None, "a=1; session_token=s") == (False, None)
+
+    def test_invalid_bearer_rejected(self):
+        assert gateway_auth.authenticate("api/decks", "GET", "Bearer nope", None) == (True, None)
+
+    def test_valid_bearer_accepted(self):
+        token = make_jwt({"user_id": "user_1", "exp": time.time() + 60})
+        assert gateway_auth.authenticate("api/decks", "GET", f"Bearer {token}", None) == (False, "user_1")
+
+
+class TestTrustedHeaders:
+    """Test the identity headers handed to Next.js"""
+
+    def test_signature_matches(self):
+        headers = gateway_auth.trusted_user_headers("user_1")
+        expires = int(headers[gateway_auth.USER_EXPIRES_HEADER])
+        assert headers[gateway_auth.USER_SIGNATURE_HEADER] == gateway_auth.sign_user("user_1", expires)
@@ -0,0 +1,185 @@
+"""
+Gateway Diagnostics Test Suite - backend/diagnostics.py
+Testing features:
+1. Per-route slow-request thresholds
+2. Structured slow-request log with the upstream timing breakdown
+3. Admin-guarded event loop profiler returning collapsed stacks
+4. Event loop lag measurements alongside the profile
+5. Background event loop lag histogram and blocked-callback watchdog
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+import pytest
+
+import diagnostics
+import metrics
+import server
+from conftest import StubNextHandler
+
+ADMIN_TOKEN = "admin-secret"
+
+
+@pytest.fixture(autouse=True)
+def clear_state(client):
+    StubNextHandler.received.clear()
+    client.cookies.clear()
+
+
+@pytest.fixture
+def slow_records(monkeypatch, caplog):
+    """Treat every request as slow; returns the parsed log records"""
+    monkeypatch.setattr(diagnostics, "slow_log", diagnostics.SlowRequestLog(default_ms=0))
+    caplog.set_level(logging.WARNING, logger="gateway.slow_requests")
+
+    def read():
+        return [dict(r.fields, event=r.msg) for r in caplog.records if r.name == "gateway.slow_requests"]
+
+    return read
+
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_TOKEN", ADMIN_TOKEN)
+    return {"Authorization": f"Bearer {ADMIN_TOKEN}"}
+
+
+class TestThresholds:
+    """Test slow-request threshold configuration"""
+
+    def test_parse_overrides(self):
+        assert diagnostics.parse_thresholds("/api/search=250, /api/prices/update=30000") == {
+            "/api/search": 0.25,
+            "/api/prices/update": 30.0,
+        }
+
+    @pytest.mark.parametrize("spec", ["", "nonsense", "=5", "/api/search=fast"])
+    def test_parse_ignores_invalid(self, spec):
+        assert diagnostics.parse_thresholds(spec) == {}
+
+    def test_route_override(self):
+        log = diagnostics.SlowRequestLog(default_ms=1000, routes={"/api/search": 0.25})
+        assert log.threshold("/api/search") == 0.25
+        assert log.threshold("/api/feed") == 1.0
+
+    def test_fast_request_not_logged(self, client, monkeypatch, caplog):
+        monkeypatch.setattr(diagnostics, "slow_log", diagnostics.SlowRequestLog(default_ms=60000))
+        caplog.set_level(logging.WARNING, logger="gateway.slow_requests")
+        client.get("/api/search?q=x")
+        assert not [r for r in caplog.records if r.name == "gateway.slow_requests"]
+
+
+class TestSlowRequestLog:
+    """Test the structured slow-request record"""
+
+    def test_record_has_timing_breakdown(self, client, slow_records):
+        response = client.get("/api/search?q=x", headers={"X-Request-ID": "slow-1"})
+        assert response.status_code == 200
+        record = slow_records()[-1]
+        assert record["event"] == "slow_request"
+        assert record["route"] == "/api/search"
+        assert record["status"] == 200
+        assert record["request_id"] == "slow-1"
+        assert record["upstream_ms"] <= record["duration_ms"]
+        assert record["gateway_ms"] >= 0
+        assert "upstream.ttfb" in record["phases_ms"]
+
+    def test_gateway_only_request(self, client, slow_records):
+        client.get("/health")
+        record = slow_records()[-1]
+        assert record["route"] == "/health"
+        assert "upstream_ms" not in record
+
+    def test_counted_in_metrics(self, client, slow_records):
+        client.get("/api/search?q=x")
+        assert 'gateway_slow_requests_total{route="/api/search"}' in client.get("/metrics").text
+
+
+class TestProfiler:
+    """Test the /_gateway/profile endpoint"""
+
+    def test_disabled_without_token(self, client, monkeypatch):
+        monkeypatch.setattr(server, "ADMIN_TOKEN", "")
+        assert client.get("/_gateway/profile?seconds=0").status_code == 401
+
+    def test_wrong_token(self, client, admin):
+        response = client.get("/_gateway/profile?seconds=0", headers={"Authorization": "Bearer nope"})
+        assert response.status_code == 401
+
+    def test_collapsed_stacks(self, client, admin):
+        response = client.get("/_gateway/profile?seconds=0.2", headers=admin)
+        assert response.status_code == 200
+        lines = response.text.splitlines()
+        assert lines
+        for line in lines:
+            stack, count = line.rsplit(" ", 1)
+            assert int(count) > 0
+            assert stack
+        assert int(response.headers["x-profile-samples"]) == sum(int(line.rsplit(" ", 1)[1]) for line in lines)
+        assert float(response.headers["x-loop-lag-max-ms"]) >= 0
+
+    def test_json_format(self, client, admin):
+        data = client.get("/_gateway/profile?seconds=0.2&format=json", headers=admin).json()
+        assert data["samples"] > 0
+        assert data["loop_lag"]["samples"] > 0
+        assert data["loop_lag"]["p99_ms"] <= data["loop_lag"]["max_ms"]
+
+    def test_lag_summary(self):
+        summary = diagnostics.lag_summary([0.001, 0.002, 0.010])
+        assert summary["samples"] == 3
+        assert summary["max_ms"] == 10.0
+        assert diagnostics.lag_summary([]) == {"samples": 0}
+
+
+def block_the_loop():
+    time.sleep(0.3)
+
+
+async def run_monitor(monitor):
+    monitor.start()
+    await asyncio.sleep(0.05)
+    block_the_loop()
+    await asyncio.sleep(0.15)
+    await monitor.stop()
+
+
+class TestLoopMonitor:
+    """Test the background event loop monitor"""
+
+    def test_lag_histogram(self):
+        histogram = metrics.Histogram("lag", "lag", buckets=metrics.LOOP_LAG_BUCKETS)
+        asyncio.run(run_monitor(diagnostics.LoopMonitor(histogram, interval=0.01, debug=False)))
+        series = histogram.series[()]
+        # The blocked interval lands in a bucket above 250ms
+        assert sum(series[:-1]) > 1
+        assert sum(series[metrics.LOOP_LAG_BUCKETS.index(0.25) + 1:-1]) == 1
+
+    def test_blocked_stack_reported_in_debug(self, caplog):
+        caplog.set_level(logging.WARNING, logger="gateway.event_loop")
+        histogram = metrics.Histogram("lag", "lag", buckets=metrics.LOOP_LAG_BUCKETS)
+        blocked = metrics.Counter("blocked", "blocked")
+        threads = []
+        count = blocked.inc
+        blocked.inc = lambda *args: threads.append(threading.get_ident()) or count(*args)
+        monitor = diagnostics.LoopMonitor(histogram, blocked, interval=0.01, block_threshold=0.1, debug=True)
+        asyncio.run(run_monitor(monitor))
+        # The watchdog thread hands the count to the loop thread
+        assert threads == [threading.get_ident()]
+        reports = [dict(r.fields, event=r.msg) for r in caplog.records if r.name == "gateway.event_loop"]
+        assert len(reports) == 1
+        assert reports[0]["event"] == "event_loop_blocked"
+        assert reports[0]["blocked_ms"] >= 100
+        assert "block_the_loop" in reports[0]["stack"]
+        assert blocked.values[()] == 1
+
+    def test_no_watchdog_without_debug(self, caplog):
+        caplog.set_level(logging.WARNING, logger="gateway.event_loop")
+        histogram = metrics.Histogram("lag", "lag", buckets=metrics.LOOP_LAG_BUCKETS)
+        asyncio.run(run_monitor(diagnostics.LoopMonitor(histogram, interval=0.01, block_threshold=0.1, debug=False)))
+        assert not [r for r in caplog.records if r.name == "gateway.event_loop"]
+
+    def test_exported(self, client):
+        assert "gateway_event_loop_lag_seconds_bucket" in client.get("/metrics").text
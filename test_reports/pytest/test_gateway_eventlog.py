@@ -0,0 +1,157 @@
+"""
+Gateway Event Log Test Suite - backend/eventlog.py
+Testing features:
+1. JSON formatting of structured events
+2. Even sampling of high-volume events such as signal.ice_candidate
+3. Non-blocking queue handler: batched writes, drops when full, flush on stop
+4. Size-based rotation of the log file
+5. Access log for proxied requests and signaling connect/room/relay events
+"""
+
+import io
+import json
+import logging
+
+import pytest
+
+import eventlog
+from conftest import StubNextHandler
+
+
+@pytest.fixture(autouse=True)
+def clear_state(client):
+    StubNextHandler.received.clear()
+    client.cookies.clear()
+
+
+@pytest.fixture
+def events(caplog):
+    """Capture gateway.* events as dicts"""
+    caplog.set_level(logging.INFO, logger="gateway")
+
+    def read(logger=None):
+        return [
+            dict(r.fields, event=r.msg)
+            for r in caplog.records
+            if hasattr(r, "fields") and (logger is None or r.name == logger)
+        ]
+
+    return read
+
+
+def make_record(event, **fields):
+    record = logging.LogRecord("gateway.test", logging.INFO, __file__, 1, event, None, None)
+    record.fields = fields
+    return record
+
+
+class TestFormatting:
+    """Test JSON output"""
+
+    def test_event_fields(self):
+        line = eventlog.JsonFormatter().format(make_record("ws_connect", user_id="user_1"))
+        data = json.loads(line)
+        assert data["event"] == "ws_connect"
+        assert data["user_id"] == "user_1"
+        assert data["level"] == "info"
+        assert data["logger"] == "gateway.test"
+        assert data["ts"].endswith("Z")
+
+
+class TestSampling:
+    """Test sampling of high-volume events"""
+
+    def test_parse_rates(self):
+        assert eventlog.parse_sample_rates("signal.ice_candidate=0.01, signal.ping=0, x=7, bad") == {
+            "signal.ice_candidate": 0.01,
+            "signal.ping": 0.0,
+            "x": 1.0,
+        }
+
+    @pytest.mark.parametrize("rate,kept", [(0.0, 0), (0.01, 10), (0.25, 250), (1.0, 1000)])
+    def test_keeps_exact_share(self, rate, kept):
+        sampler = eventlog.Sampler({})
+        assert sum(sampler.keep("e", rate) for _ in range(1000)) == kept
+
+    def test_first_record_kept(self):
+        assert eventlog.Sampler({}).keep("e", 0.01)
+
+    def test_emit_applies_sampling(self, monkeypatch, events):
+        monkeypatch.setattr(eventlog, "sampler", eventlog.Sampler({"noisy": 0.1}))
+        logger = logging.getLogger("gateway.test")
+        for _ in range(100):
+            eventlog.emit(logger, "noisy")
+            eventlog.emit(logger, "quiet")
+        recorded = events("gateway.test")
+        assert sum(1 for e in recorded if e["event"] == "noisy") == 10
+        assert sum(1 for e in recorded if e["event"] == "quiet") == 100
+        assert all(e["sample_rate"] == 0.1 for e in recorded if e["event"] == "noisy")
+
+
+class TestQueueHandler:
+    """Test the non-blocking handler and its writer thread"""
+
+    def test_batches_and_flushes_on_stop(self):
+        writes = []
+
+        class Sink:
+            def write(self, data):
+                writes.append(data)
+
+            def close(self):
+                pass
+
+        handler = eventlog.QueueHandler(Sink(), batch_size=50)
+        for i in range(120):
+            handler.emit(make_record("e", i=i))
+        handler.start()
+        handler.stop()
+        lines = [json.loads(line) for data in writes for line in data.splitlines()]
+        assert [line["i"] for line in lines] == list(range(120))
+        assert len(writes) == 3
+
+    def test_drops_when_full(self):
+        handler = eventlog.QueueHandler(eventlog.StreamSink(io.StringIO()), maxsize=5)
+        for i in range(8):
+            handler.emit(make_record("e", i=i))
+        assert handler.dropped == 3
+
+    def test_rotating_file(self, tmp_path):
+        path = tmp_path / "gateway.log"
+        sink = eventlog.RotatingFileSink(str(path), max_bytes=100, backup_count=2)
+        for _ in range(3):
+            sink.write("x" * 60 + "\n")
+        sink.close()
+        assert (tmp_path / "gateway.log.1").exists()
+        assert path.read_text() == "x" * 60 + "\n"
+
+
+class TestGatewayEvents:
+    """Test the events logged by the gateway"""
+
+    def test_access_log(self, client, events):
+        response = client.get("/api/search?q=x", headers={"X-Request-ID": "access-1"})
+        record = [e for e in events("gateway.access") if e.get("request_id") == "access-1"][0]
+        assert record["event"] == "http_request"
+        assert record["route"] == "/api/search"
+        assert record["status"] == response.status_code
+        assert record["bytes_out"] == len(response.content)
+        assert record["upstream_ms"] <= record["duration_ms"]
+
+    def test_signaling_events(self, client, events):
+        with client.websocket_connect("/ws/signaling/user_a") as a:
+            with client.websocket_connect("/ws/signaling/user_b") as b:
+                a.send_json({"type": "join_room", "room_id": "room_1"})
+                assert a.receive_json()["type"] == "room_joined"
+                b.send_json({"type": "join_room", "room_id": "room_1"})
+                assert b.receive_json()["type"] == "room_joined"
+                assert a.receive_json()["type"] == "user_joined"
+                a.send_json({"type": "offer", "target": "user_b", "offer": {}})
+                assert b.receive_json()["type"] == "offer"
+        names = [e["event"] for e in events("gateway.signaling")]
+        assert names.count("ws_connect") == 2
+        assert names.count("room_join") == 2
+        assert "signal.offer" in names
+        assert names.count("ws_disconnect") == 2
+        join = [e for e in events("gateway.signaling") if e["event"] == "room_join"][-1]
+        assert join == {"event": "room_join", "user_id": "user_b", "room_id": "room_1", "room_size": 2}
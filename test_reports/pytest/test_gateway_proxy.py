@@ -0,0 +1,170 @@
+"""
+Gateway Proxy Test Suite - backend/server.py against a local stub Next.js
+Testing features:
+1. Multiple Set-Cookie headers survive /api/auth/login, /api/auth/logout, /api/auth/session
+2. Response header order and hop-by-hop filtering
+3. Request header forwarding (single cookie header, Connection-listed headers, spoofed identity)
+4. 401 fast path never reaches the upstream
+5. Pooled upstream clients never replay one user's cookies for another
+6. Upstream pools connected over a Unix domain socket
+7. /metrics exposition of request, upstream and signaling metrics
+"""
+
+import os
+import socketserver
+import tempfile
+import threading
+
+import httpx
+import pytest
+
+import server
+import upstream
+from conftest import CLEARED_COOKIE, CSRF_COOKIE, SESSION_COOKIE, StubNextHandler
+
+@pytest.fixture(autouse=True)
+def clear_state(client):
+    StubNextHandler.received.clear()
+    client.cookies.clear()
+
+
+class TestAuthCookies:
+    """Test that auth routes keep every Set-Cookie header"""
+
+    def test_login_sets_all_cookies(self, client):
+        response = client.post("/api/auth/login", json={"email": "test@test.com", "password": "password"})
+        assert response.status_code == 200
+        assert response.json()["success"] is True
+        assert response.headers.get_list("set-cookie") == [SESSION_COOKIE, CSRF_COOKIE]
+
+    def test_logout_clears_cookies(self, client):
+        response = client.post("/api/auth/logout", headers={"Cookie": "session_token=session_abc"})
+        assert response.status_code == 200
+        assert response.headers.get_list("set-cookie") == [CLEARED_COOKIE, "csrf_token=; Max-Age=0"]
+
+    def test_logout_forwards_cookie_once(self, client):
+        client.post("/api/auth/logout", headers={"Cookie": "session_token=session_abc; theme=dark"})
+        _, headers = StubNextHandler.received[-1]
+        cookies = [value for name, value in headers if name.lower() == "cookie"]
+        assert cookies == ["session_token=session_abc; theme=dark"]
+
+    def test_pooled_client_does_not_keep_cookies(self, client):
+        client.post("/api/auth/login", json={"email": "test@test.com", "password": "password"})
+        client.cookies.clear()
+        client.get("/api/search")
+        _, headers = StubNextHandler.received[-1]
+        assert "cookie" not in {name.lower() for name, _ in headers}
+
+    def test_session_sets_cookie(self, client):
+        response = client.post("/api/auth/session", json={"session_id": "oauth"})
+        assert response.status_code == 200
+        assert response.headers.get_list("set-cookie") == ["session_token=session_oauth; Path=/; HttpOnly"]
+
+
+class TestHeaderPassthrough:
+    """Test header filtering in both directions"""
+
+    def test_repeated_response_headers_kept_in_order(self, client):
+        response = client.get("/api/search")
+        assert response.headers.get_list("x-trace") == ["a", "b"]
+
+    def test_hop_by_hop_response_headers_dropped(self, client):
+        response = client.get("/api/search")
+        assert "keep-alive" not in response.headers
+        assert "x-internal" not in response.headers
+
+    def test_connection_listed_request_headers_dropped(self, client):
+        client.get("/api/search", headers={"Connection": "X-Private", "X-Private": "1", "X-Public": "2"})
+        _, headers = StubNextHandler.received[-1]
+        names = {name.lower() for name, _ in headers}
+        assert "x-private" not in names
+        assert "x-public" in names
+
+    def test_spoofed_identity_dropped(self, client):
+        client.get("/api/search", headers={"X-Gateway-User-Id": "user_admin"})
+        _, headers = StubNextHandler.received[-1]
+        assert "x-gateway-user-id" not in {name.lower() for name, _ in headers}
+
+
+class TestAuthFastPath:
+    """Test that unauthenticated protected requests stop at the gateway"""
+
+    def test_protected_route_rejected_locally(self, client):
+        response = client.get("/api/decks")
+        assert response.status_code == 401
+        assert response.json() == {"error": "Not authenticated"}
+        assert StubNextHandler.received == []
+
+
+class TestUnixSocketUpstream:
+    """Test proxying to Next.js over a Unix domain socket"""
+
+    def test_proxy_over_uds(self, client):
+        class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+
+        with tempfile.TemporaryDirectory() as tmp:
+            socket_path = os.path.join(tmp, "next.sock")
+            stub = UnixHTTPServer(socket_path, StubNextHandler)
+            threading.Thread(target=stub.serve_forever, daemon=True).start()
+            original_pool = server.upstreams["api"]
+            server.upstreams["api"] = upstream.UpstreamPool("api", "http://localhost", uds=socket_path)
+            try:
+                response = client.post("/api/auth/login", json={"email": "test@test.com", "password": "password"})
+            finally:
+                server.upstreams["api"] = original_pool
+                stub.shutdown()
+
+        assert response.status_code == 200
+        assert response.headers.get_list("set-cookie") == [SESSION_COOKIE, CSRF_COOKIE]
+
+
+class TestMetrics:
+    """Test the Prometheus /metrics endpoint"""
+
+    def test_proxied_request_recorded(self, client):
+        client.get("/api/search?q=pikachu")
+        body = client.get("/metrics").text
+        assert 'gateway_requests_total{route="/api/search",method="GET",status_class="2xx"}' in body
+        assert 'gateway_upstream_duration_seconds_count{route="/api/search"}' in body
+        assert 'gateway_overhead_seconds_bucket{route="/api/search",le="+Inf"}' in body
+        assert 'gateway_response_bytes_total{route="/api/search"}' in body
+
+    def test_dynamic_segments_use_template(self, client):
+        client.get("/api/feed/post_123/reactors")
+        body = client.get("/metrics").text
+        assert 'route="/api/feed/{postId}/reactors"' in body
+        assert "post_123" not in body
+
+    def test_unknown_paths_use_gateway_route(self, client):
+        client.get("/_next/static/chunks/main-abc123.js")
+        body = client.get("/metrics").text
+        assert 'route="/_next/{path:path}"' in body
+
+    def test_rejected_request_has_no_upstream_time(self, client):
+        before = server.metrics.upstream_duration.series.get(("/api/decks",), [0])[-1]
+        client.get("/api/decks")
+        after = server.metrics.upstream_duration.series.get(("/api/decks",), [0])[-1]
+        assert before == after
+
+    def test_gauges_present(self, client):
+        body = client.get("/metrics").text
+        assert "gateway_requests_in_flight " in body
+        assert "signaling_connections 0" in body
+        assert 'gateway_upstream_pool{pool="api",state="connections"}' in body
+
+    def test_pool_stats_without_httpcore_pool(self):
+        # A transport that is not httpcore's reports no pool state instead of failing the scrape
+        pool = upstream.UpstreamPool("test", "http://localhost")
+        pool._client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+        assert pool.stats() == {}
+
+    def test_histogram_buckets_cumulative(self):
+        histogram = server.metrics.Histogram("test_seconds", "Test", ("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(("r",), value)
+        lines = list(histogram.render())
+        assert 'test_seconds_bucket{route="r",le="0.1"} 1' in lines
+        assert 'test_seconds_bucket{route="r",le="1.0"} 2' in lines
+        assert 'test_seconds_bucket{route="r",le="+Inf"} 3' in lines
+        assert 'test_seconds_count{route="r"} 3' in lines
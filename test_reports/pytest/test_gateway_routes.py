@@ -0,0 +1,74 @@
+"""
+Gateway Route Template Test Suite - backend/routes.py
+Testing features:
+1. Templates derived from the app/ directory (route.ts and page.tsx)
+2. Static segments take precedence over dynamic ones
+3. Catch-all and optional catch-all segments
+4. Templates loaded from a config file
+"""
+
+
+import pytest
+
+import routes
+
+
+@pytest.fixture(scope="module")
+def app_table():
+    return routes.RouteTable(routes.templates_from_app_dir())
+
+
+class TestAppDirTemplates:
+    """Test the table built from this repo's app/ directory"""
+
+    @pytest.mark.parametrize("path,template", [
+        ("/api/feed/post_1/reactions", "/api/feed/{postId}/reactions"),
+        ("/api/feed/post_1/comments/c_1/reactions", "/api/feed/{postId}/comments/{commentId}/reactions"),
+        ("/api/decks/deck_1/cards", "/api/decks/{deckId}/cards"),
+        ("/api/marketplace/listing_1", "/api/marketplace/{listingId}"),
+        ("/api/marketplace/my-listings", "/api/marketplace/my-listings"),
+        ("/api/decks/community", "/api/decks/community"),
+        ("/api/users/search", "/api/users/search"),
+        ("/api/users/search/user_1", "/api/users/search/{id}"),
+        ("/api/users/user_1/collection", "/api/users/{userId}/collection"),
+        ("/decks/deck_1", "/decks/{deckId}"),
+        ("/", "/"),
+    ])
+    def test_match(self, app_table, path, template):
+        assert app_table.template_for(path) == template
+
+    def test_params(self, app_table):
+        found = app_table.match("/api/decks/deck_1/cards")
+        assert found.params == {"deckId": "deck_1"}
+
+    @pytest.mark.parametrize("path", ["/api/nothing", "/api/decks/deck_1/cards/extra", "/_next/static/a.js"])
+    def test_no_match(self, app_table, path):
+        assert app_table.match(path) is None
+
+
+class TestTrie:
+    """Test matching rules on hand-built tables"""
+
+    def test_backtracks_from_static_dead_end(self):
+        table = routes.RouteTable(["/a/static", "/a/{id}/edit"])
+        assert table.template_for("/a/static/edit") == "/a/{id}/edit"
+
+    def test_catch_all(self):
+        table = routes.RouteTable(["/docs/{slug+}"])
+        assert table.match("/docs/a/b") == ("/docs/{slug+}", {"slug": "a/b"})
+        assert table.match("/docs") is None
+
+    def test_optional_catch_all(self):
+        table = routes.RouteTable(["/shop/{slug*}"])
+        assert table.template_for("/shop") == "/shop/{slug*}"
+        assert table.template_for("/shop/a/b") == "/shop/{slug*}"
+
+    def test_dynamic_segment_syntax(self):
+        assert routes._template_segment("[...slug]") == "{slug+}"
+        assert routes._template_segment("[[...slug]]") == "{slug*}"
+        assert routes._template_segment("[id]") == "{id}"
+
+    def test_templates_from_file(self, tmp_path):
+        path = tmp_path / "routes.txt"
+        path.write_text("# API routes\n/api/decks/{deckId}\n\n/api/feed\n")
+        assert routes.templates_from_file(str(path)) == ["/api/decks/{deckId}", "/api/feed"]
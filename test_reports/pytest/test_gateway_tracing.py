@@ -0,0 +1,119 @@
+"""
+Gateway Tracing Test Suite - backend/tracing.py
+Testing features:
+1. W3C traceparent parsing and validation
+2. traceparent / X-Request-ID propagation to Next.js and back to the client
+3. Sampled requests export OTLP/JSON spans for the upstream phases
+4. Unsampled requests export nothing
+"""
+
+import asyncio
+import json
+
+import pytest
+
+import tracing
+from conftest import StubNextHandler
+
+PARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+@pytest.fixture(autouse=True)
+def clear_state(client):
+    StubNextHandler.received.clear()
+    client.cookies.clear()
+
+
+@pytest.fixture
+def exported(tmp_path, monkeypatch):
+    """Sample every request into a temporary OTLP file; returns a reader"""
+    path = tmp_path / "spans.jsonl"
+    tracer = tracing.Tracer(sample_rate=1.0, export_file=str(path))
+    monkeypatch.setattr(tracing, "tracer", tracer)
+
+    def read():
+        asyncio.run(tracer.flush())
+        if not path.exists():
+            return []
+        return [
+            span
+            for line in path.read_text().splitlines()
+            for resource in json.loads(line)["resourceSpans"]
+            for scope in resource["scopeSpans"]
+            for span in scope["spans"]
+        ]
+
+    return read
+
+
+def forwarded_header(name):
+    _, headers = StubNextHandler.received[-1]
+    values = [value for key, value in headers if key.lower() == name]
+    assert len(values) == 1
+    return values[0]
+
+
+class TestTraceparent:
+    """Test W3C traceparent parsing"""
+
+    def test_valid(self):
+        assert tracing.parse_traceparent(PARENT) == (
+            "0af7651916cd43dd8448eb211c80319c", "b7ad6b7169203331", True
+        )
+
+    def test_unsampled(self):
+        assert tracing.parse_traceparent(PARENT[:-2] + "00")[2] is False
+
+    @pytest.mark.parametrize("value", [
+        None, "", "garbage", "01-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01",
+        "00-00000000000000000000000000000000-b7ad6b7169203331-01",
+        "00-0af7651916cd43dd8448eb211c80319c-0000000000000000-01",
+    ])
+    def test_invalid(self, value):
+        assert tracing.parse_traceparent(value) is None
+
+
+class TestPropagation:
+    """Test headers sent to Next.js and returned to the client"""
+
+    def test_new_trace_started(self, client):
+        response = client.get("/api/search")
+        traceparent = tracing.parse_traceparent(forwarded_header("traceparent"))
+        assert traceparent is not None
+        assert response.headers["x-request-id"] == forwarded_header("x-request-id")
+
+    def test_incoming_trace_continued(self, client):
+        client.get("/api/search", headers={"traceparent": PARENT, "X-Request-ID": "req-123"})
+        trace_id, parent_id, _ = tracing.parse_traceparent(forwarded_header("traceparent"))
+        assert trace_id == "0af7651916cd43dd8448eb211c80319c"
+        assert parent_id != "b7ad6b7169203331"
+        assert forwarded_header("x-request-id") == "req-123"
+
+    def test_malformed_request_id_replaced(self, client):
+        response = client.get("/api/search", headers={"X-Request-ID": "bad id\twith spaces"})
+        assert response.headers["x-request-id"] != "bad id\twith spaces"
+        assert tracing.REQUEST_ID_RE.match(response.headers["x-request-id"])
+
+
+class TestExport:
+    """Test OTLP span export"""
+
+    def test_sampled_request_exports_phase_spans(self, client, exported):
+        client.get("/api/feed/post_1/reactors", headers={"traceparent": PARENT})
+        spans = exported()
+        by_name = {span["name"]: span for span in spans}
+        root = by_name["gateway GET /api/feed/{postId}/reactors"]
+        assert root["traceId"] == "0af7651916cd43dd8448eb211c80319c"
+        assert root["parentSpanId"] == "b7ad6b7169203331"
+        assert root["kind"] == tracing.SPAN_KIND_SERVER
+        for phase in ("upstream.queue", "upstream.ttfb", "upstream.body"):
+            assert by_name[phase]["parentSpanId"] == root["spanId"]
+            assert int(by_name[phase]["endTimeUnixNano"]) >= int(by_name[phase]["startTimeUnixNano"])
+
+    def test_unsampled_parent_not_exported(self, client, exported):
+        client.get("/api/search", headers={"traceparent": PARENT[:-2] + "00"})
+        assert exported() == []
+
+    def test_no_exporter_never_samples(self):
+        tracer = tracing.Tracer(sample_rate=1.0, export_file="", export_endpoint="")
+        assert tracer.start(PARENT, None).sampled is False
@@ -10,10 +10,9 @@ Testing features:
 
 import pytest
 import requests
-import time
 import json
 
-BASE_URL = "https://tcg-social-hub-1.preview.emergentagent.com"
+from conftest import BASE_URL, unique_name
 
 
 class TestAuthentication:
@@ -39,22 +38,10 @@ class TestAuthentication:
 
 class TestMarketplaceDelete:
     """Test marketplace delete feature - owners can delete their own listings"""
-    
-    @pytest.fixture(scope="class")
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate - skipping marketplace delete tests")
-        return session
-    
+
     def test_create_and_delete_listing(self, auth_session):
         """Test creating a listing and then deleting it"""
-        unique_id = f"test-delete-{int(time.time())}"
+        unique_id = unique_name("delete")
         
         # Create listing
         create_response = auth_session.post(f"{BASE_URL}/api/marketplace", json={
@@ -88,25 +75,13 @@ class TestMarketplaceDelete:
 
 class TestWishlistsCRUD:
     """Test wishlists CRUD operations"""
-    
-    @pytest.fixture(scope="class")
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate - skipping wishlists tests")
-        return session
-    
+
     def test_create_wishlist(self, auth_session):
         """Test creating a new wishlist"""
-        unique_name = f"Test Wishlist {int(time.time())}"
+        wishlist_name = unique_name("Wishlist")
         
         response = auth_session.post(f"{BASE_URL}/api/wishlists", json={
-            "name": unique_name,
+            "name": wishlist_name,
             "description": "Created for testing",
             "isPublic": True
         })
@@ -114,7 +89,7 @@ class TestWishlistsCRUD:
         data = response.json()
         assert data.get("success") == True
         assert "wishlist" in data
-        assert data["wishlist"]["name"] == unique_name
+        assert data["wishlist"]["name"] == wishlist_name
         print(f"Created wishlist: {data['wishlist']['wishlist_id']}")
         return data["wishlist"]["wishlist_id"]
     
@@ -138,9 +113,9 @@ class TestWishlistsCRUD:
     def test_wishlist_crud_full_cycle(self, auth_session):
         """Test full CRUD cycle: create, read, update, delete"""
         # CREATE
-        unique_name = f"CRUD Test {int(time.time())}"
+        wishlist_name = unique_name("CRUD")
         create_response = auth_session.post(f"{BASE_URL}/api/wishlists", json={
-            "name": unique_name,
+            "name": wishlist_name,
             "description": "Full CRUD test",
             "isPublic": False
         })
@@ -152,12 +127,12 @@ class TestWishlistsCRUD:
         get_response = auth_session.get(f"{BASE_URL}/api/wishlists/{wishlist_id}")
         assert get_response.status_code == 200
         wishlist = get_response.json().get("wishlist", {})
-        assert wishlist["name"] == unique_name
+        assert wishlist["name"] == wishlist_name
         print(f"Read wishlist: {wishlist['name']}")
         
         # UPDATE
         update_response = auth_session.put(f"{BASE_URL}/api/wishlists/{wishlist_id}", json={
-            "name": f"{unique_name} - Updated",
+            "name": f"{wishlist_name} - Updated",
             "isPublic": True
         })
         assert update_response.status_code == 200
@@ -183,19 +158,7 @@ class TestWishlistsCRUD:
 
 class TestTradeRatingsAPI:
     """Test trade ratings POST and GET endpoints"""
-    
-    @pytest.fixture(scope="class")
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate - skipping trade ratings tests")
-        return session
-    
+
     def test_get_user_ratings_empty(self, auth_session):
         """Test getting ratings for user with no ratings"""
         # Use a non-existent user ID to test empty state
@@ -279,19 +242,7 @@ class TestUserReputationAPI:
 
 class TestCSVImport:
     """Test CSV import functionality for Pokemon and MTG cards"""
-    
-    @pytest.fixture(scope="class")
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate - skipping CSV import tests")
-        return session
-    
+
     def test_csv_preview_mtg(self, auth_session):
         """Test MTG CSV preview action"""
         # ManaBox format CSV content
@@ -344,7 +295,7 @@ Charizard,sv03,Obsidian Flames,125,2,Lightly Played,25.00"""
     
     def test_csv_import_mtg(self, auth_session):
         """Test actually importing MTG cards"""
-        unique_id = str(int(time.time()))
+        unique_id = unique_name("import")
         csv_content = f"""Manabox ID,Scryfall ID,Name,Set code,Set name,Collector number,Foil,Rarity,Quantity,Mana box ID,Purchase price,Condition
 ,test-scryfall-{unique_id},Test Import Card {unique_id},tst,Test Set,001,false,common,1,,1.00,Near Mint"""
         
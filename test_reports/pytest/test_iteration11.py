@@ -13,10 +13,9 @@ Testing features:
 
 import pytest
 import requests
-import time
 import json
 
-BASE_URL = "https://tcg-social-hub-1.preview.emergentagent.com"
+from conftest import BASE_URL, TEST_PREFIX, unique_name
 
 
 class TestAuthentication:
@@ -42,25 +41,13 @@ class TestAuthentication:
 
 class TestSealedProductsCRUD:
     """Test Sealed Products CRUD operations for Pokemon and MTG"""
-    
-    @pytest.fixture(scope="class")
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate - skipping sealed products tests")
-        return session
-    
+
     def test_create_pokemon_sealed_product(self, auth_session):
         """Test creating a Pokemon sealed product"""
-        unique_name = f"TEST_Pokemon_Sealed_{int(time.time())}"
+        product_name = unique_name("Pokemon_Sealed")
         
         response = auth_session.post(f"{BASE_URL}/api/sealed", json={
-            "name": unique_name,
+            "name": product_name,
             "game": "pokemon",
             "productType": "Elite Trainer Box (ETB)",
             "setName": "Prismatic Evolutions",
@@ -83,10 +70,10 @@ class TestSealedProductsCRUD:
     
     def test_create_mtg_sealed_product(self, auth_session):
         """Test creating an MTG sealed product"""
-        unique_name = f"TEST_MTG_Sealed_{int(time.time())}"
+        product_name = unique_name("MTG_Sealed")
         
         response = auth_session.post(f"{BASE_URL}/api/sealed", json={
-            "name": unique_name,
+            "name": product_name,
             "game": "mtg",
             "productType": "Collector Booster Box",
             "setName": "Modern Horizons 3",
@@ -210,19 +197,7 @@ class TestSealedProductsCRUD:
 
 class TestSealedProductsStats:
     """Test sealed products statistics calculation"""
-    
-    @pytest.fixture(scope="class")
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate")
-        return session
-    
+
     def test_stats_calculation(self, auth_session):
         """Test that stats (total invested, current value) are calculated correctly"""
         response = auth_session.get(f"{BASE_URL}/api/sealed")
@@ -243,25 +218,13 @@ class TestSealedProductsStats:
 
 class TestDeckBuilderCards:
     """Test deck builder card operations"""
-    
-    @pytest.fixture(scope="class")
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate")
-        return session
-    
+
     def test_create_deck(self, auth_session):
         """Test creating a deck"""
-        unique_name = f"TEST_Deck_{int(time.time())}"
+        deck_name = unique_name("Deck")
         
         response = auth_session.post(f"{BASE_URL}/api/decks", json={
-            "name": unique_name,
+            "name": deck_name,
             "game": "mtg",
             "format": "Modern",
             "description": "Test deck for import/export testing"
@@ -383,22 +346,10 @@ class TestDeckBuilderCards:
 
 class TestMarketplacePricePercentage:
     """Test marketplace price percentage feature"""
-    
-    @pytest.fixture(scope="class")
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate")
-        return session
-    
+
     def test_create_listing_with_price_percentage(self, auth_session):
         """Test creating a listing with price percentage"""
-        unique_id = f"test-pct-{int(time.time())}"
+        unique_id = unique_name("pct")
         
         response = auth_session.post(f"{BASE_URL}/api/marketplace", json={
             "cardId": unique_id,
@@ -427,7 +378,7 @@ class TestMarketplacePricePercentage:
     
     def test_create_listing_with_static_price(self, auth_session):
         """Test creating a listing with static price"""
-        unique_id = f"test-static-{int(time.time())}"
+        unique_id = unique_name("static")
         
         response = auth_session.post(f"{BASE_URL}/api/marketplace", json={
             "cardId": unique_id,
@@ -464,24 +415,14 @@ class TestMarketplacePricePercentage:
 
 class TestCleanup:
     """Cleanup test data"""
-    
-    @pytest.fixture(scope="class")
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return session
-    
+
     def test_cleanup_test_sealed_products(self, auth_session):
         """Clean up test sealed products"""
         response = auth_session.get(f"{BASE_URL}/api/sealed")
         if response.status_code == 200:
             data = response.json()
             for product in data.get("products", []):
-                if product["name"].startswith("TEST_"):
+                if product["name"].startswith(TEST_PREFIX):
                     auth_session.delete(f"{BASE_URL}/api/sealed/{product['product_id']}")
                     print(f"Cleaned up: {product['name']}")
     
@@ -491,16 +432,16 @@ class TestCleanup:
         if response.status_code == 200:
             data = response.json()
             for deck in data.get("decks", []):
-                if deck["name"].startswith("TEST_"):
+                if deck["name"].startswith(TEST_PREFIX):
                     auth_session.delete(f"{BASE_URL}/api/decks/{deck['deck_id']}")
                     print(f"Cleaned up deck: {deck['name']}")
     
     def test_cleanup_test_listings(self, auth_session):
-        """Clean up test marketplace listings"""
+        """Clean up test marketplace listings (their card IDs come from unique_name)"""
         response = auth_session.get(f"{BASE_URL}/api/marketplace/my-listings")
         if response.status_code == 200:
             data = response.json()
             for listing in data.get("listings", []):
-                if listing.get("card_data", {}).get("name", "").startswith("Test"):
+                if str(listing.get("card_id") or "").startswith(TEST_PREFIX):
                     auth_session.delete(f"{BASE_URL}/api/marketplace/{listing['listing_id']}")
                     print(f"Cleaned up listing: {listing['listing_id']}")
@@ -5,15 +5,8 @@ Focus on mobile app authentication and data retrieval with Bearer token
 """
 import pytest
 import requests
-import os
 
-# Use production URL from environment
-BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://tcg-social-hub-1.preview.emergentagent.com')
-if BASE_URL.endswith('/'):
-    BASE_URL = BASE_URL.rstrip('/')
-
-TEST_USER_EMAIL = "test@test.com"
-TEST_USER_PASSWORD = "password"
+from conftest import BASE_URL, TEST_EMAIL as TEST_USER_EMAIL, TEST_PASSWORD as TEST_USER_PASSWORD
 
 
 class TestMobileAppLogin:
@@ -53,17 +46,7 @@ class TestMobileAppLogin:
 
 class TestBearerTokenAuth:
     """Test Bearer token authentication for mobile app APIs"""
-    
-    @pytest.fixture
-    def auth_token(self):
-        """Get auth token from login"""
-        response = requests.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": TEST_USER_EMAIL, "password": TEST_USER_PASSWORD}
-        )
-        assert response.status_code == 200
-        return response.json()["token"]
-    
+
     def test_collection_with_bearer_token(self, auth_token):
         """Test /api/collection with Bearer token auth"""
         response = requests.get(
@@ -113,16 +96,7 @@ class TestBearerTokenAuth:
 
 class TestCollectionData:
     """Test collection data structure and image URLs"""
-    
-    @pytest.fixture
-    def auth_token(self):
-        """Get auth token from login"""
-        response = requests.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": TEST_USER_EMAIL, "password": TEST_USER_PASSWORD}
-        )
-        return response.json()["token"]
-    
+
     def test_pokemon_card_has_image_field(self, auth_token):
         """Test that Pokemon cards have the 'image' field from TCGdex"""
         response = requests.get(
@@ -177,16 +151,7 @@ class TestCollectionData:
 
 class TestMarketplaceData:
     """Test marketplace listing data structure"""
-    
-    @pytest.fixture
-    def auth_token(self):
-        """Get auth token from login"""
-        response = requests.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": TEST_USER_EMAIL, "password": TEST_USER_PASSWORD}
-        )
-        return response.json()["token"]
-    
+
     def test_marketplace_listing_has_card_data(self, auth_token):
         """Test that marketplace listings have proper card_data with images"""
         response = requests.get(
@@ -217,16 +182,7 @@ class TestMarketplaceData:
 
 class TestFeedAPI:
     """Test feed/social API for mobile app"""
-    
-    @pytest.fixture
-    def auth_token(self):
-        """Get auth token from login"""
-        response = requests.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": TEST_USER_EMAIL, "password": TEST_USER_PASSWORD}
-        )
-        return response.json()["token"]
-    
+
     def test_feed_endpoint(self, auth_token):
         """Test /api/feed returns posts"""
         response = requests.get(
@@ -247,16 +203,7 @@ class TestFeedAPI:
 
 class TestGameFiltering:
     """Test game filtering for collection and marketplace"""
-    
-    @pytest.fixture
-    def auth_token(self):
-        """Get auth token from login"""
-        response = requests.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": TEST_USER_EMAIL, "password": TEST_USER_PASSWORD}
-        )
-        return response.json()["token"]
-    
+
     def test_collection_filter_pokemon(self, auth_token):
         """Test filtering collection by pokemon"""
         response = requests.get(
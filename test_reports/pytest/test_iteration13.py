@@ -13,26 +13,12 @@ Tests:
 """
 import pytest
 import requests
-import os
-import json
 
-BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://tcg-social-hub-1.preview.emergentagent.com')
+from conftest import BASE_URL, login
 
 class TestAuth:
     """Test authentication for subsequent tests"""
-    
-    @pytest.fixture(scope="class")
-    def auth_token(self):
-        """Login and get auth token"""
-        response = requests.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": "test@test.com", "password": "password"}
-        )
-        assert response.status_code == 200
-        data = response.json()
-        assert data.get("success") == True or "token" in data
-        return data.get("token")
-    
+
     def test_login_returns_token(self):
         """Test login returns valid token"""
         response = requests.post(
@@ -50,20 +36,11 @@ class TestFeedAPI:
     
     def get_auth_cookie(self):
         """Get session cookie from login"""
-        session = requests.Session()
-        response = session.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": "test@test.com", "password": "password"}
-        )
-        return session.cookies
+        return login()[0].cookies
     
     def test_feed_posts_have_name_field(self):
         """Test that feed posts return 'name' field for username display"""
-        session = requests.Session()
-        session.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": "test@test.com", "password": "password"}
-        )
+        session = login()[0]
         
         response = session.get(f"{BASE_URL}/api/feed?type=public")
         assert response.status_code == 200
@@ -86,11 +63,7 @@ class TestCollectionAPI:
     
     def test_collection_returns_items_with_card_data(self):
         """Test collection returns items with proper card data for value calculation"""
-        session = requests.Session()
-        session.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": "test@test.com", "password": "password"}
-        )
+        session = login()[0]
         
         response = session.get(f"{BASE_URL}/api/collection")
         assert response.status_code == 200
@@ -111,11 +84,7 @@ class TestCollectionAPI:
     
     def test_collection_pokemon_filter(self):
         """Test Pokemon filter works for collection"""
-        session = requests.Session()
-        session.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": "test@test.com", "password": "password"}
-        )
+        session = login()[0]
         
         response = session.get(f"{BASE_URL}/api/collection?game=pokemon")
         assert response.status_code == 200
@@ -129,11 +98,7 @@ class TestCollectionAPI:
     
     def test_collection_mtg_filter(self):
         """Test MTG filter works for collection"""
-        session = requests.Session()
-        session.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": "test@test.com", "password": "password"}
-        )
+        session = login()[0]
         
         response = session.get(f"{BASE_URL}/api/collection?game=mtg")
         assert response.status_code == 200
@@ -151,11 +116,7 @@ class TestSealedAPI:
     
     def test_sealed_products_list(self):
         """Test sealed products endpoint returns products"""
-        session = requests.Session()
-        session.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": "test@test.com", "password": "password"}
-        )
+        session = login()[0]
         
         response = session.get(f"{BASE_URL}/api/sealed")
         assert response.status_code == 200
@@ -172,11 +133,7 @@ class TestMessagesAPI:
     
     def test_messages_conversations(self):
         """Test messages endpoint returns conversations list"""
-        session = requests.Session()
-        session.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": "test@test.com", "password": "password"}
-        )
+        session = login()[0]
         
         response = session.get(f"{BASE_URL}/api/messages")
         assert response.status_code == 200
@@ -194,11 +151,7 @@ class TestCardSearchAPI:
     
     def test_mtg_card_search(self):
         """Test MTG card search via Scryfall API proxy"""
-        session = requests.Session()
-        session.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": "test@test.com", "password": "password"}
-        )
+        session = login()[0]
         
         # Search for Lightning Bolt - a common MTG card
         response = session.get(f"{BASE_URL}/api/cards/mtg?q=Lightning+Bolt")
@@ -225,11 +178,7 @@ class TestMarketplaceAPI:
     
     def test_marketplace_listings(self):
         """Test marketplace returns listings"""
-        session = requests.Session()
-        session.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": "test@test.com", "password": "password"}
-        )
+        session = login()[0]
         
         response = session.get(f"{BASE_URL}/api/marketplace")
         assert response.status_code == 200
@@ -10,32 +10,12 @@ Focus Areas:
 """
 import pytest
 import requests
-import os
-import json
 
-BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://tcg-social-hub-1.preview.emergentagent.com')
+from conftest import BASE_URL, login
 
 class TestAuth:
     """Test authentication for subsequent tests"""
-    
-    @pytest.fixture(scope="class")
-    def auth_session(self):
-        """Login and return authenticated session"""
-        session = requests.Session()
-        response = session.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": "test@test.com", "password": "password"}
-        )
-        assert response.status_code == 200, f"Login failed: {response.text}"
-        data = response.json()
-        assert data.get("success") == True or "token" in data
-        
-        # Store token for Bearer auth
-        token = data.get("token")
-        if token:
-            session.headers.update({"Authorization": f"Bearer {token}"})
-        return session
-    
+
     def test_login_returns_token(self):
         """Test login returns valid token"""
         response = requests.post(
@@ -53,15 +33,8 @@ class TestCollectionDeleteAPI:
     
     def get_auth_session(self):
         """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": "test@test.com", "password": "password"}
-        )
-        token = response.json().get("token")
-        if token:
-            session.headers.update({"Authorization": f"Bearer {token}"})
-        return session, token
+        session, data = login()
+        return session, data.get("token")
     
     def test_collection_delete_requires_auth(self):
         """Test DELETE /api/collection requires authentication"""
@@ -125,15 +98,8 @@ class TestFeedAPIWithReactions:
     
     def get_auth_session(self):
         """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": "test@test.com", "password": "password"}
-        )
-        token = response.json().get("token")
-        if token:
-            session.headers.update({"Authorization": f"Bearer {token}"})
-        return session, token
+        session, data = login()
+        return session, data.get("token")
     
     def test_feed_returns_posts_with_reactions(self):
         """Test GET /api/feed returns posts with reactions array"""
@@ -184,15 +150,8 @@ class TestFeedLikeAPI:
     
     def get_auth_session(self):
         """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": "test@test.com", "password": "password"}
-        )
-        token = response.json().get("token")
-        if token:
-            session.headers.update({"Authorization": f"Bearer {token}"})
-        return session, token
+        session, data = login()
+        return session, data.get("token")
     
     def test_like_requires_auth(self):
         """Test POST /api/feed/{postId}/like requires authentication"""
@@ -230,15 +189,8 @@ class TestFeedReactionsAPI:
     
     def get_auth_session(self):
         """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": "test@test.com", "password": "password"}
-        )
-        token = response.json().get("token")
-        if token:
-            session.headers.update({"Authorization": f"Bearer {token}"})
-        return session, token
+        session, data = login()
+        return session, data.get("token")
     
     def test_reactions_requires_auth(self):
         """Test POST /api/feed/{postId}/reactions requires authentication"""
@@ -388,12 +340,7 @@ class TestMarketplaceAPI:
     
     def get_auth_session(self):
         """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(
-            f"{BASE_URL}/api/auth/login",
-            json={"email": "test@test.com", "password": "password"}
-        )
-        return session
+        return login()[0]
     
     def test_marketplace_listings(self):
         """Test marketplace returns listings"""
@@ -12,29 +12,11 @@ Features to test:
 
 import pytest
 import requests
-import os
 
-BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://tcg-social-hub-1.preview.emergentagent.com')
+from conftest import BASE_URL, TEST_PREFIX, unique_name
 
 class TestAuth:
     """Authentication tests"""
-    
-    @pytest.fixture(scope="class")
-    def auth_token(self):
-        """Login and get auth token"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        assert response.status_code == 200, f"Login failed: {response.text}"
-        data = response.json()
-        assert data.get("success"), f"Login not successful: {data}"
-        return data.get("token")
-
-    @pytest.fixture(scope="class")
-    def auth_headers(self, auth_token):
-        """Get auth headers"""
-        return {"Authorization": f"Bearer {auth_token}"}
 
     def test_login_returns_token(self):
         """Test login returns valid token"""
@@ -51,17 +33,6 @@ class TestAuth:
 class TestGroupsAPI:
     """Groups API tests - verify 'groups' field in response"""
 
-    @pytest.fixture(scope="class")
-    def auth_headers(self):
-        """Login and get auth headers"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        assert response.status_code == 200
-        data = response.json()
-        return {"Authorization": f"Bearer {data.get('token')}"}
-
     def test_groups_api_returns_groups_field(self, auth_headers):
         """
         CRITICAL: Verify /api/groups?type=my returns 'groups' field (not 'myGroups')
@@ -90,17 +61,6 @@ class TestGroupsAPI:
 class TestFeedWithGroups:
     """Feed API tests with group support"""
 
-    @pytest.fixture(scope="class")
-    def auth_headers(self):
-        """Login and get auth headers"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        assert response.status_code == 200
-        data = response.json()
-        return {"Authorization": f"Bearer {data.get('token')}"}
-
     def test_feed_groups_tab(self, auth_headers):
         """Test feed groups tab returns posts"""
         response = requests.get(f"{BASE_URL}/api/feed?tab=groups", headers=auth_headers)
@@ -190,17 +150,6 @@ class TestFeedWithGroups:
 class TestDecksAPI:
     """Decks API tests including community decks and copy functionality"""
 
-    @pytest.fixture(scope="class")
-    def auth_headers(self):
-        """Login and get auth headers"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        assert response.status_code == 200
-        data = response.json()
-        return {"Authorization": f"Bearer {data.get('token')}"}
-
     def test_get_my_decks(self, auth_headers):
         """Test getting user's own decks"""
         response = requests.get(f"{BASE_URL}/api/decks", headers=auth_headers)
@@ -226,7 +175,7 @@ class TestDecksAPI:
     def test_create_deck(self, auth_headers):
         """Test creating a new deck"""
         response = requests.post(f"{BASE_URL}/api/decks", headers=auth_headers, json={
-            "name": "TEST_Deck for copy test",
+            "name": unique_name("Deck for copy test"),
             "game": "mtg",
             "format": "Standard",
             "description": "Test deck for iteration 15",
@@ -245,7 +194,7 @@ class TestDecksAPI:
         """
         # First create a public deck to copy
         create_response = requests.post(f"{BASE_URL}/api/decks", headers=auth_headers, json={
-            "name": "TEST_Original Deck for Copy",
+            "name": unique_name("Original Deck for Copy"),
             "game": "mtg",
             "format": "Modern",
             "description": "Original deck to be copied",
@@ -273,17 +222,6 @@ class TestDecksAPI:
 class TestFeedReactions:
     """Test feed reactions functionality"""
 
-    @pytest.fixture(scope="class")
-    def auth_headers(self):
-        """Login and get auth headers"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        assert response.status_code == 200
-        data = response.json()
-        return {"Authorization": f"Bearer {data.get('token')}"}
-
     def test_feed_posts_include_reactions(self, auth_headers):
         """Test that feed posts include reactions array"""
         response = requests.get(f"{BASE_URL}/api/feed?tab=public", headers=auth_headers)
@@ -299,17 +237,6 @@ class TestFeedReactions:
 class TestCleanup:
     """Cleanup test data"""
 
-    @pytest.fixture(scope="class")
-    def auth_headers(self):
-        """Login and get auth headers"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        assert response.status_code == 200
-        data = response.json()
-        return {"Authorization": f"Bearer {data.get('token')}"}
-
     def test_cleanup_test_decks(self, auth_headers):
         """Clean up test decks created during testing"""
         # Get all decks
@@ -317,7 +244,7 @@ class TestCleanup:
         if response.status_code == 200:
             decks = response.json().get("decks", [])
             for deck in decks:
-                if deck.get("name", "").startswith("TEST_"):
+                if deck.get("name", "").startswith(TEST_PREFIX):
                     delete_response = requests.delete(
                         f"{BASE_URL}/api/decks/{deck['deck_id']}", 
                         headers=auth_headers
@@ -8,10 +8,9 @@ Features tested:
 """
 import pytest
 import requests
-import os
 import base64
 
-BASE_URL = "http://localhost:3000"
+from conftest import BASE_URL
 
 class TestAuth:
     """Authentication tests"""
@@ -40,25 +39,7 @@ class TestAuth:
 
 class TestBadgeSystem:
     """Badge system API tests"""
-    
-    @pytest.fixture
-    def auth_token(self):
-        """Get auth token"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return response.json().get("token")
-    
-    @pytest.fixture
-    def user_id(self):
-        """Get user ID"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return response.json().get("user", {}).get("user_id")
-    
+
     def test_get_all_badges(self):
         """Test GET /api/badges/all returns all 26 badge definitions"""
         response = requests.get(f"{BASE_URL}/api/badges/all")
@@ -128,16 +109,7 @@ class TestBadgeSystem:
 
 class TestUploadAPI:
     """Upload API tests"""
-    
-    @pytest.fixture
-    def auth_token(self):
-        """Get auth token"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return response.json().get("token")
-    
+
     def test_upload_image(self, auth_token):
         """Test POST /api/upload accepts image and returns Cloudinary URL"""
         # Create a minimal 1x1 PNG
@@ -174,16 +146,7 @@ class TestUploadAPI:
 
 class TestBulkListingAPI:
     """Bulk listing API tests"""
-    
-    @pytest.fixture
-    def auth_token(self):
-        """Get auth token"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return response.json().get("token")
-    
+
     def test_bulk_list_single_item(self, auth_token):
         """Test POST /api/collection/bulk-list with single item"""
         response = requests.post(
@@ -301,16 +264,7 @@ class TestBulkListingAPI:
 
 class TestMessagesAPI:
     """Messages API tests"""
-    
-    @pytest.fixture
-    def auth_token(self):
-        """Get auth token"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return response.json().get("token")
-    
+
     def test_get_conversations(self, auth_token):
         """Test GET /api/messages returns conversations"""
         response = requests.get(
@@ -331,16 +285,7 @@ class TestMessagesAPI:
 
 class TestUsersSearchAPI:
     """Users search API tests for messenger widget"""
-    
-    @pytest.fixture
-    def auth_token(self):
-        """Get auth token"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return response.json().get("token")
-    
+
     def test_search_users(self, auth_token):
         """Test GET /api/users/search returns users list"""
         response = requests.get(
@@ -8,10 +8,9 @@ Features tested:
 """
 import pytest
 import requests
-import os
 import base64
 
-BASE_URL = "http://localhost:3000"
+from conftest import BASE_URL
 
 class TestAuth:
     """Authentication tests"""
@@ -40,25 +39,7 @@ class TestAuth:
 
 class TestFeedAPIBadgeShowcase:
     """Feed API tests for badge_count and top_badge fields (Iteration 17 focus)"""
-    
-    @pytest.fixture
-    def auth_token(self):
-        """Get auth token"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return response.json().get("token")
-    
-    @pytest.fixture
-    def user_id(self):
-        """Get user ID"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return response.json().get("user", {}).get("user_id")
-    
+
     def test_public_feed_returns_badge_count_and_top_badge(self, auth_token):
         """Test GET /api/feed?tab=public returns badge_count and top_badge for each post"""
         response = requests.get(
@@ -142,25 +123,7 @@ class TestFeedAPIBadgeShowcase:
 
 class TestBadgeSystem:
     """Badge system API tests"""
-    
-    @pytest.fixture
-    def auth_token(self):
-        """Get auth token"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return response.json().get("token")
-    
-    @pytest.fixture
-    def user_id(self):
-        """Get user ID"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return response.json().get("user", {}).get("user_id")
-    
+
     def test_get_all_badges(self):
         """Test GET /api/badges/all returns all badge definitions"""
         response = requests.get(f"{BASE_URL}/api/badges/all")
@@ -231,16 +194,7 @@ class TestBadgeSystem:
 
 class TestUploadAPI:
     """Upload API tests - Iteration 17 focus on error handling for missing file"""
-    
-    @pytest.fixture
-    def auth_token(self):
-        """Get auth token"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return response.json().get("token")
-    
+
     def test_upload_image(self, auth_token):
         """Test POST /api/upload accepts image and returns Cloudinary URL"""
         # Create a minimal 1x1 PNG
@@ -281,16 +235,7 @@ class TestUploadAPI:
 
 class TestDecksAPI:
     """Decks API tests"""
-    
-    @pytest.fixture
-    def auth_token(self):
-        """Get auth token"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return response.json().get("token")
-    
+
     def test_get_user_decks(self, auth_token):
         """Test GET /api/decks returns user decks"""
         response = requests.get(
@@ -324,25 +269,7 @@ class TestDecksAPI:
 
 class TestProfileBadges:
     """Profile page badges tests"""
-    
-    @pytest.fixture
-    def auth_token(self):
-        """Get auth token"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return response.json().get("token")
-    
-    @pytest.fixture
-    def user_id(self):
-        """Get user ID"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return response.json().get("user", {}).get("user_id")
-    
+
     def test_profile_stats(self, auth_token):
         """Test GET /api/profile/stats returns user stats"""
         response = requests.get(
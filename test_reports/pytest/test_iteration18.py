@@ -11,9 +11,8 @@ Features tested:
 """
 import pytest
 import requests
-import os
 
-BASE_URL = "http://localhost:3000"
+from conftest import BASE_URL
 
 
 class TestAuth:
@@ -34,20 +33,10 @@ class TestAuth:
 
 class TestMessagesAPI:
     """Messages API tests - verifying endpoints work for messenger features"""
-    
-    @pytest.fixture
-    def session_cookies(self):
-        """Get session cookies via login"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return session
-    
-    def test_get_conversations(self, session_cookies):
+
+    def test_get_conversations(self, auth_session):
         """Test GET /api/messages returns conversations with user_id for profile linking"""
-        response = session_cookies.get(f"{BASE_URL}/api/messages")
+        response = auth_session.get(f"{BASE_URL}/api/messages")
         assert response.status_code == 200
         data = response.json()
         assert data.get("success") == True
@@ -59,15 +48,15 @@ class TestMessagesAPI:
                 assert "name" in conv, "Conversation missing name"
                 assert "conversation_id" in conv, "Conversation missing conversation_id"
     
-    def test_get_messages_in_conversation(self, session_cookies):
+    def test_get_messages_in_conversation(self, auth_session):
         """Test GET /api/messages/{convId} returns messages with sender_id for avatar profile linking"""
         # First get conversations
-        conv_response = session_cookies.get(f"{BASE_URL}/api/messages")
+        conv_response = auth_session.get(f"{BASE_URL}/api/messages")
         conversations = conv_response.json().get("conversations", [])
         
         if len(conversations) > 0:
             conv_id = conversations[0]["conversation_id"]
-            response = session_cookies.get(f"{BASE_URL}/api/messages/{conv_id}")
+            response = auth_session.get(f"{BASE_URL}/api/messages/{conv_id}")
             assert response.status_code == 200
             data = response.json()
             assert data.get("success") == True
@@ -78,15 +67,15 @@ class TestMessagesAPI:
                     assert "sender_id" in msg, "Message missing sender_id for avatar link"
                     assert "name" in msg, "Message missing sender name"
     
-    def test_send_message(self, session_cookies):
+    def test_send_message(self, auth_session):
         """Test POST /api/messages can send a message"""
         # First get conversations to find a recipient
-        conv_response = session_cookies.get(f"{BASE_URL}/api/messages")
+        conv_response = auth_session.get(f"{BASE_URL}/api/messages")
         conversations = conv_response.json().get("conversations", [])
         
         if len(conversations) > 0:
             recipient_id = conversations[0]["user_id"]
-            response = session_cookies.post(f"{BASE_URL}/api/messages", json={
+            response = auth_session.post(f"{BASE_URL}/api/messages", json={
                 "recipientId": recipient_id,
                 "content": "Test message from iteration 18"
             })
@@ -97,29 +86,10 @@ class TestMessagesAPI:
 
 class TestBadgeAPIs:
     """Badge API tests - ensuring badge showcase still works"""
-    
-    @pytest.fixture
-    def session_cookies(self):
-        """Get session cookies via login"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return session
-    
-    @pytest.fixture
-    def user_id(self):
-        """Get user ID"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return response.json().get("user", {}).get("user_id")
-    
-    def test_get_user_badges(self, session_cookies, user_id):
+
+    def test_get_user_badges(self, auth_session, user_id):
         """Test GET /api/badges?userId= returns user badges"""
-        response = session_cookies.get(f"{BASE_URL}/api/badges?userId={user_id}")
+        response = auth_session.get(f"{BASE_URL}/api/badges?userId={user_id}")
         assert response.status_code == 200
         data = response.json()
         assert data.get("success") == True
@@ -127,9 +97,9 @@ class TestBadgeAPIs:
         # Test user should have badges from previous iterations
         assert len(data["badges"]) >= 4, f"Expected at least 4 badges, got {len(data['badges'])}"
     
-    def test_get_all_badge_definitions(self, session_cookies):
+    def test_get_all_badge_definitions(self, auth_session):
         """Test GET /api/badges/all returns all badge definitions"""
-        response = session_cookies.get(f"{BASE_URL}/api/badges/all")
+        response = auth_session.get(f"{BASE_URL}/api/badges/all")
         assert response.status_code == 200
         data = response.json()
         assert data.get("success") == True
@@ -137,9 +107,9 @@ class TestBadgeAPIs:
         # Should have badge definitions
         assert len(data["badges"]) > 0
     
-    def test_auto_award_badges(self, session_cookies):
+    def test_auto_award_badges(self, auth_session):
         """Test POST /api/badges triggers badge auto-award check"""
-        response = session_cookies.post(f"{BASE_URL}/api/badges", json={})
+        response = auth_session.post(f"{BASE_URL}/api/badges", json={})
         assert response.status_code == 200
         data = response.json()
         assert data.get("success") == True
@@ -147,20 +117,10 @@ class TestBadgeAPIs:
 
 class TestFeedBadgeShowcase:
     """Feed API tests for badge_count in posts"""
-    
-    @pytest.fixture
-    def session_cookies(self):
-        """Get session cookies via login"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return session
-    
-    def test_public_feed_has_badge_count(self, session_cookies):
+
+    def test_public_feed_has_badge_count(self, auth_session):
         """Test GET /api/feed?tab=public includes badge_count in posts"""
-        response = session_cookies.get(f"{BASE_URL}/api/feed?tab=public")
+        response = auth_session.get(f"{BASE_URL}/api/feed?tab=public")
         assert response.status_code == 200
         data = response.json()
         assert data.get("success") == True
@@ -173,20 +133,10 @@ class TestFeedBadgeShowcase:
 
 class TestUserSearch:
     """User search API tests - needed for starting new conversations"""
-    
-    @pytest.fixture
-    def session_cookies(self):
-        """Get session cookies via login"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return session
-    
-    def test_search_users(self, session_cookies):
+
+    def test_search_users(self, auth_session):
         """Test GET /api/users/search returns users with user_id for profile linking"""
-        response = session_cookies.get(f"{BASE_URL}/api/users/search?q=")
+        response = auth_session.get(f"{BASE_URL}/api/users/search?q=")
         assert response.status_code == 200
         data = response.json()
         assert data.get("success") == True
@@ -201,26 +151,16 @@ class TestUserSearch:
 
 class TestProfileAPI:
     """Profile API tests"""
-    
-    @pytest.fixture
-    def session_cookies(self):
-        """Get session cookies via login"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return session
-    
-    def test_profile_page_loads(self, session_cookies):
+
+    def test_profile_page_loads(self, auth_session):
         """Test GET /profile/{userId} page loads (returns HTML)"""
         # First get user_id
-        me_response = session_cookies.get(f"{BASE_URL}/api/auth/me")
+        me_response = auth_session.get(f"{BASE_URL}/api/auth/me")
         user_id = me_response.json().get("user", {}).get("user_id")
         
         if user_id:
             # Profile is a page, not an API - check it returns 200
-            response = session_cookies.get(f"{BASE_URL}/profile/{user_id}")
+            response = auth_session.get(f"{BASE_URL}/profile/{user_id}")
             assert response.status_code == 200
             # Page should contain HTML
             assert "<!DOCTYPE html>" in response.text or "<html" in response.text.lower()
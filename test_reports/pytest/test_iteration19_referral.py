@@ -4,10 +4,9 @@ Tests referral API, invite validation, profile with invite_code, badge definitio
 """
 import pytest
 import requests
-import os
 import uuid
 
-BASE_URL = "http://localhost:3000"
+from conftest import BASE_URL
 
 @pytest.fixture
 def session():
@@ -16,23 +15,6 @@ def session():
     s.headers.update({"Content-Type": "application/json"})
     return s
 
-@pytest.fixture
-def auth_session():
-    """Create authenticated session with test user"""
-    s = requests.Session()
-    s.headers.update({"Content-Type": "application/json"})
-    
-    # Login as test user
-    login_res = s.post(f"{BASE_URL}/api/auth/login", json={
-        "email": "test@test.com",
-        "password": "password"
-    })
-    
-    if login_res.status_code != 200:
-        pytest.skip("Could not authenticate test user")
-    
-    # Cookies are auto-stored in session
-    return s
 
 class TestBadgeDefinitions:
     """Tests for GET /api/badges/all - should include recruiter badge"""
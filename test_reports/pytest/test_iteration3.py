@@ -3,30 +3,13 @@ Iteration 3 Backend Tests - Testing CSV Import, MTG Proxy, Dark Mode classes
 """
 import pytest
 import requests
-import os
 
-BASE_URL = "http://localhost:3000"
-
-class TestSession:
-    """Store session across tests"""
-    cookies = None
-    user_id = None
+from conftest import BASE_URL
 
 @pytest.fixture(scope="module")
-def auth_session():
-    """Login and get authenticated session"""
-    if TestSession.cookies:
-        return TestSession.cookies
-    
-    response = requests.post(
-        f"{BASE_URL}/api/auth/login",
-        json={"email": "test@test.com", "password": "password"}
-    )
-    assert response.status_code == 200, f"Login failed: {response.text}"
-    
-    TestSession.cookies = response.cookies
-    TestSession.user_id = response.json().get('user', {}).get('user_id')
-    return TestSession.cookies
+def auth_cookies(auth_session):
+    """Cookies of the shared logged-in session"""
+    return auth_session.cookies
 
 
 class TestMTGProxyEndpoint:
@@ -79,7 +62,7 @@ class TestMTGProxyEndpoint:
 class TestCSVImportPreview:
     """Test CSV import preview functionality"""
     
-    def test_csv_preview_parses_manabox_format(self, auth_session):
+    def test_csv_preview_parses_manabox_format(self, auth_cookies):
         """Test that CSV preview correctly parses ManaBox format"""
         csv_content = """Name,Set code,Set name,Collector number,Foil,Rarity,Quantity,ManaBox ID,Scryfall ID,Purchase price,Misprint,Altered,Condition,Language,Purchase price currency
 Test Card 1,SET,Test Set,001,normal,rare,1,12345,5bd6353f-d119-40e6-895c-030a11a7a2fe,10.00,false,false,near_mint,English,USD
@@ -88,7 +71,7 @@ Test Card 2,SET,Test Set,002,foil,mythic,2,67890,,5.00,false,false,near_mint,Eng
         response = requests.post(
             f"{BASE_URL}/api/collection/import",
             json={"csvContent": csv_content, "action": "preview"},
-            cookies=auth_session
+            cookies=auth_cookies
         )
         assert response.status_code == 200
         
@@ -109,7 +92,7 @@ Test Card 2,SET,Test Set,002,foil,mythic,2,67890,,5.00,false,false,near_mint,Eng
         assert card2['foil'] is True
         assert card2['quantity'] == 2
     
-    def test_csv_preview_returns_total_counts(self, auth_session):
+    def test_csv_preview_returns_total_counts(self, auth_cookies):
         """Test that preview returns total card and quantity counts"""
         csv_content = """Name,Set code,Set name,Collector number,Foil,Rarity,Quantity,ManaBox ID,Scryfall ID,Purchase price,Misprint,Altered,Condition,Language,Purchase price currency
 Card A,SET,Test,001,normal,rare,3,1,,,0,false,false,near_mint,English,USD
@@ -118,7 +101,7 @@ Card B,SET,Test,002,normal,uncommon,2,2,,,0,false,false,near_mint,English,USD"""
         response = requests.post(
             f"{BASE_URL}/api/collection/import",
             json={"csvContent": csv_content, "action": "preview"},
-            cookies=auth_session
+            cookies=auth_cookies
         )
         
         data = response.json()
@@ -139,7 +122,7 @@ Card B,SET,Test,002,normal,uncommon,2,2,,,0,false,false,near_mint,English,USD"""
 class TestCSVImportActual:
     """Test CSV import actual import functionality"""
     
-    def test_csv_import_creates_cards_with_data(self, auth_session):
+    def test_csv_import_creates_cards_with_data(self, auth_cookies):
         """Test that CSV import creates cards with proper card_data"""
         # Use a real Scryfall ID so we get real card data
         csv_content = """Name,Set code,Set name,Collector number,Foil,Rarity,Quantity,ManaBox ID,Scryfall ID,Purchase price,Misprint,Altered,Condition,Language,Purchase price currency
@@ -148,7 +131,7 @@ Brainstorm,IMA,Iconic Masters,44,normal,common,1,TEST123,52ccc0e4-98b9-4f0b-8112
         response = requests.post(
             f"{BASE_URL}/api/collection/import",
             json={"csvContent": csv_content, "action": "import"},
-            cookies=auth_session
+            cookies=auth_cookies
         )
         assert response.status_code == 200
         
@@ -156,11 +139,11 @@ Brainstorm,IMA,Iconic Masters,44,normal,common,1,TEST123,52ccc0e4-98b9-4f0b-8112
         assert data.get('success') is True, f"Import should succeed: {data}"
         assert data.get('imported') >= 1, "Should import at least 1 card"
     
-    def test_imported_card_has_scryfall_data(self, auth_session):
+    def test_imported_card_has_scryfall_data(self, auth_cookies):
         """Verify imported card has proper card_data from Scryfall"""
         response = requests.get(
             f"{BASE_URL}/api/collection?game=mtg",
-            cookies=auth_session
+            cookies=auth_cookies
         )
         assert response.status_code == 200
         
@@ -184,12 +167,12 @@ Brainstorm,IMA,Iconic Masters,44,normal,common,1,TEST123,52ccc0e4-98b9-4f0b-8112
                     # Image URIs may be present from Scryfall fetch
                     break
     
-    def test_csv_import_invalid_action_fails(self, auth_session):
+    def test_csv_import_invalid_action_fails(self, auth_cookies):
         """Test that invalid action parameter fails"""
         response = requests.post(
             f"{BASE_URL}/api/collection/import",
             json={"csvContent": "test", "action": "invalid"},
-            cookies=auth_session
+            cookies=auth_cookies
         )
         assert response.status_code == 400
 
@@ -197,11 +180,11 @@ Brainstorm,IMA,Iconic Masters,44,normal,common,1,TEST123,52ccc0e4-98b9-4f0b-8112
 class TestCollectionPage:
     """Test collection page loads and displays data"""
     
-    def test_collection_endpoint_returns_items(self, auth_session):
+    def test_collection_endpoint_returns_items(self, auth_cookies):
         """Test that collection endpoint returns items"""
         response = requests.get(
             f"{BASE_URL}/api/collection",
-            cookies=auth_session
+            cookies=auth_cookies
         )
         assert response.status_code == 200
         
@@ -209,11 +192,11 @@ class TestCollectionPage:
         assert data.get('success') is True
         assert 'items' in data
     
-    def test_collection_filter_by_game(self, auth_session):
+    def test_collection_filter_by_game(self, auth_cookies):
         """Test collection filtering by game type"""
         response = requests.get(
             f"{BASE_URL}/api/collection?game=mtg",
-            cookies=auth_session
+            cookies=auth_cookies
         )
         assert response.status_code == 200
         
@@ -226,11 +209,11 @@ class TestCollectionPage:
 class TestFriendsEndpoint:
     """Test friends page endpoint"""
     
-    def test_friends_list_works(self, auth_session):
+    def test_friends_list_works(self, auth_cookies):
         """Test friends list endpoint"""
         response = requests.get(
             f"{BASE_URL}/api/friends",
-            cookies=auth_session
+            cookies=auth_cookies
         )
         assert response.status_code == 200
         
@@ -241,11 +224,11 @@ class TestFriendsEndpoint:
 class TestMarketplaceEndpoint:
     """Test marketplace endpoint"""
     
-    def test_marketplace_list_works(self, auth_session):
+    def test_marketplace_list_works(self, auth_cookies):
         """Test marketplace listings endpoint"""
         response = requests.get(
             f"{BASE_URL}/api/marketplace",
-            cookies=auth_session
+            cookies=auth_cookies
         )
         assert response.status_code == 200
         
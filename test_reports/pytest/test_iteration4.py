@@ -10,29 +10,16 @@ Iteration 4 - Testing new features:
 
 import pytest
 import requests
-import os
 
-BASE_URL = "http://localhost:3000"
+from conftest import BASE_URL
 
 class TestAuth:
     """Authentication tests"""
-    
-    @pytest.fixture(scope='class')
-    def session(self):
-        """Create authenticated session"""
-        sess = requests.Session()
-        # Login
-        resp = sess.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        assert resp.status_code == 200, f"Login failed: {resp.text}"
-        return sess
-    
-    def test_login(self, session):
+
+    def test_login(self, auth_session):
         """Test login endpoint"""
         # Already logged in via fixture
-        resp = session.get(f"{BASE_URL}/api/auth/me")
+        resp = auth_session.get(f"{BASE_URL}/api/auth/me")
         assert resp.status_code == 200
         data = resp.json()
         assert "user" in data
@@ -42,24 +29,13 @@ class TestAuth:
 
 class TestCSVImport:
     """CSV Import functionality tests"""
-    
-    @pytest.fixture(scope='class')
-    def session(self):
-        """Create authenticated session"""
-        sess = requests.Session()
-        resp = sess.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        assert resp.status_code == 200
-        return sess
-    
-    def test_csv_preview_manabox_format(self, session):
+
+    def test_csv_preview_manabox_format(self, auth_session):
         """Test CSV preview with ManaBox MTG format"""
         manabox_csv = '''Name,Set code,Set name,Collector number,Foil,Rarity,Quantity,ManaBox ID,Scryfall ID,Purchase price,Misprint,Altered,Condition,Language,Purchase price currency
 Lightning Bolt,2XM,Double Masters,117,,common,1,12345,f29ba16f-c8fb-42fe-aabf-87089cb214a7,0.50,false,false,near_mint,English,EUR'''
         
-        resp = session.post(f"{BASE_URL}/api/collection/import", json={
+        resp = auth_session.post(f"{BASE_URL}/api/collection/import", json={
             "csvContent": manabox_csv,
             "action": "preview"
         })
@@ -73,13 +49,13 @@ Lightning Bolt,2XM,Double Masters,117,,common,1,12345,f29ba16f-c8fb-42fe-aabf-87
         assert data["cards"][0]["currency"] == "EUR", f"Currency should be EUR from CSV, got {data['cards'][0]['currency']}"
         print("✓ ManaBox CSV preview working with correct currency (EUR)")
     
-    def test_csv_preview_pokemon_export_format(self, session):
+    def test_csv_preview_pokemon_export_format(self, auth_session):
         """Test CSV preview with Pokemon export_2026 format"""
         pokemon_csv = '''Name,Set Code,Edition Name,Collector Number,Release Date,Price,Condition,Quantity
 Pikachu ex,PRE,Prismatic Evolutions,001,2025-01-17,25.99,Near Mint,1
 Charizard,SV8,Surging Sparks,006,2024-11-08,15.50,Excellent,2'''
         
-        resp = session.post(f"{BASE_URL}/api/collection/import", json={
+        resp = auth_session.post(f"{BASE_URL}/api/collection/import", json={
             "csvContent": pokemon_csv,
             "action": "preview"
         })
@@ -94,12 +70,12 @@ Charizard,SV8,Surging Sparks,006,2024-11-08,15.50,Excellent,2'''
         assert data["cards"][1]["quantity"] == 2
         print("✓ Pokemon export_2026 CSV format detected and parsed correctly")
     
-    def test_csv_preview_sek_currency(self, session):
+    def test_csv_preview_sek_currency(self, auth_session):
         """Test CSV preview preserves SEK currency"""
         manabox_csv = '''Name,Set code,Set name,Collector number,Foil,Rarity,Quantity,ManaBox ID,Scryfall ID,Purchase price,Misprint,Altered,Condition,Language,Purchase price currency
 Sol Ring,CMD,Commander,237,,uncommon,1,99999,d3d4ee94-cb16-4a1b-a73e-83ef43d17ad9,150.00,false,false,near_mint,English,SEK'''
         
-        resp = session.post(f"{BASE_URL}/api/collection/import", json={
+        resp = auth_session.post(f"{BASE_URL}/api/collection/import", json={
             "csvContent": manabox_csv,
             "action": "preview"
         })
@@ -138,44 +114,34 @@ class TestMTGSearch:
 
 class TestCommunityPage:
     """Community page tests"""
-    
-    @pytest.fixture(scope='class')
-    def session(self):
-        """Create authenticated session"""
-        sess = requests.Session()
-        resp = sess.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return sess
-    
-    def test_friends_list(self, session):
+
+    def test_friends_list(self, auth_session):
         """Test friends API"""
-        resp = session.get(f"{BASE_URL}/api/friends")
+        resp = auth_session.get(f"{BASE_URL}/api/friends")
         assert resp.status_code == 200
         data = resp.json()
         assert "success" in data or "friends" in data
         print("✓ Friends API working")
     
-    def test_friend_requests(self, session):
+    def test_friend_requests(self, auth_session):
         """Test friend requests API"""
-        resp = session.get(f"{BASE_URL}/api/friends/requests")
+        resp = auth_session.get(f"{BASE_URL}/api/friends/requests")
         assert resp.status_code == 200
         data = resp.json()
         assert "success" in data or "requests" in data
         print("✓ Friend requests API working")
     
-    def test_groups_list(self, session):
+    def test_groups_list(self, auth_session):
         """Test groups API"""
-        resp = session.get(f"{BASE_URL}/api/groups")
+        resp = auth_session.get(f"{BASE_URL}/api/groups")
         assert resp.status_code == 200
         data = resp.json()
         assert "success" in data or "groups" in data
         print("✓ Groups API working")
     
-    def test_user_search(self, session):
+    def test_user_search(self, auth_session):
         """Test user search API"""
-        resp = session.get(f"{BASE_URL}/api/users/search?q=test")
+        resp = auth_session.get(f"{BASE_URL}/api/users/search?q=test")
         assert resp.status_code == 200
         data = resp.json()
         assert "success" in data or "users" in data
@@ -183,11 +149,11 @@ class TestCommunityPage:
 
 
 class TestAdminAPIs:
-    """Admin API tests (requires admin session)"""
+    """Admin API tests (requires admin auth_session)"""
     
     @pytest.fixture(scope='class')
     def admin_session(self):
-        """Create admin session"""
+        """Create admin auth_session"""
         sess = requests.Session()
         # Try admin login
         resp = sess.post(f"{BASE_URL}/api/auth/login", json={
@@ -239,20 +205,10 @@ class TestAPICache:
 
 class TestSettingsPage:
     """Settings page API tests"""
-    
-    @pytest.fixture(scope='class')
-    def session(self):
-        """Create authenticated session"""
-        sess = requests.Session()
-        resp = sess.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return sess
-    
-    def test_profile_update(self, session):
+
+    def test_profile_update(self, auth_session):
         """Test profile update API"""
-        resp = session.put(f"{BASE_URL}/api/profile", json={
+        resp = auth_session.put(f"{BASE_URL}/api/profile", json={
             "name": "Test User"
         })
         # Profile update should work
@@ -9,28 +9,16 @@ Iteration 5 - Testing Bug Fixes:
 
 import pytest
 import requests
-import time
 
-BASE_URL = "http://localhost:3000"
+from conftest import BASE_URL, TEST_PREFIX, unique_name
 
 
 class TestAuth:
     """Authentication setup"""
-    
-    @pytest.fixture(scope='class')
-    def session(self):
-        """Create authenticated session"""
-        sess = requests.Session()
-        resp = sess.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        assert resp.status_code == 200, f"Login failed: {resp.text}"
-        return sess
-    
-    def test_auth_me(self, session):
+
+    def test_auth_me(self, auth_session):
         """Verify user is authenticated"""
-        resp = session.get(f"{BASE_URL}/api/auth/me")
+        resp = auth_session.get(f"{BASE_URL}/api/auth/me")
         assert resp.status_code == 200
         data = resp.json()
         assert "user" in data
@@ -40,23 +28,13 @@ class TestAuth:
 
 class TestCSVImportPreview:
     """CSV Import preview functionality - tests format detection and parsing"""
-    
-    @pytest.fixture(scope='class')
-    def session(self):
-        sess = requests.Session()
-        resp = sess.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        assert resp.status_code == 200
-        return sess
-    
-    def test_manabox_format_detection(self, session):
+
+    def test_manabox_format_detection(self, auth_session):
         """Test ManaBox MTG CSV format is correctly detected"""
         csv = '''Name,Set code,Set name,Collector number,Foil,Rarity,Quantity,ManaBox ID,Scryfall ID,Purchase price,Misprint,Altered,Condition,Language,Purchase price currency
 Lightning Bolt,2XM,Double Masters,117,,common,1,12345,f29ba16f-c8fb-42fe-aabf-87089cb214a7,0.50,false,false,near_mint,English,EUR'''
         
-        resp = session.post(f"{BASE_URL}/api/collection/import", json={
+        resp = auth_session.post(f"{BASE_URL}/api/collection/import", json={
             "csvContent": csv,
             "action": "preview"
         })
@@ -68,12 +46,12 @@ Lightning Bolt,2XM,Double Masters,117,,common,1,12345,f29ba16f-c8fb-42fe-aabf-87
         assert data["cards"][0]["game"] == "mtg"
         print("✓ ManaBox format detected correctly")
     
-    def test_pokemon_format_detection(self, session):
+    def test_pokemon_format_detection(self, auth_session):
         """Test Pokemon CSV format is correctly detected"""
         csv = '''Name,Set Code,Edition Name,Collector Number,Release Date,Price,Condition,Quantity
 Pikachu ex,PRE,Prismatic Evolutions,001,2025-01-17,25.99,Near Mint,1'''
         
-        resp = session.post(f"{BASE_URL}/api/collection/import", json={
+        resp = auth_session.post(f"{BASE_URL}/api/collection/import", json={
             "csvContent": csv,
             "action": "preview"
         })
@@ -84,12 +62,12 @@ Pikachu ex,PRE,Prismatic Evolutions,001,2025-01-17,25.99,Near Mint,1'''
         assert data["cards"][0]["game"] == "pokemon"
         print("✓ Pokemon format detected correctly")
     
-    def test_currency_preserved_eur(self, session):
+    def test_currency_preserved_eur(self, auth_session):
         """Test EUR currency is preserved from CSV (not hardcoded)"""
         csv = '''Name,Set code,Set name,Collector number,Foil,Rarity,Quantity,ManaBox ID,Scryfall ID,Purchase price,Misprint,Altered,Condition,Language,Purchase price currency
 Counterspell,4ED,Fourth Edition,67,,common,1,11111,11111111-1111-1111-1111-111111111111,1.50,false,false,near_mint,English,EUR'''
         
-        resp = session.post(f"{BASE_URL}/api/collection/import", json={
+        resp = auth_session.post(f"{BASE_URL}/api/collection/import", json={
             "csvContent": csv,
             "action": "preview"
         })
@@ -98,12 +76,12 @@ Counterspell,4ED,Fourth Edition,67,,common,1,11111,11111111-1111-1111-1111-11111
         assert data["cards"][0]["currency"] == "EUR", f"Expected EUR, got {data['cards'][0]['currency']}"
         print("✓ EUR currency preserved from CSV")
     
-    def test_currency_preserved_sek(self, session):
+    def test_currency_preserved_sek(self, auth_session):
         """Test SEK currency is preserved from CSV"""
         csv = '''Name,Set code,Set name,Collector number,Foil,Rarity,Quantity,ManaBox ID,Scryfall ID,Purchase price,Misprint,Altered,Condition,Language,Purchase price currency
 Sol Ring,CMD,Commander,237,,uncommon,1,99999,d3d4ee94-cb16-4a1b-a73e-83ef43d17ad9,150.00,false,false,near_mint,English,SEK'''
         
-        resp = session.post(f"{BASE_URL}/api/collection/import", json={
+        resp = auth_session.post(f"{BASE_URL}/api/collection/import", json={
             "csvContent": csv,
             "action": "preview"
         })
@@ -115,26 +93,16 @@ Sol Ring,CMD,Commander,237,,uncommon,1,99999,d3d4ee94-cb16-4a1b-a73e-83ef43d17ad
 
 class TestCSVImportActual:
     """CSV Import actual database insertion tests"""
-    
-    @pytest.fixture(scope='class')
-    def session(self):
-        sess = requests.Session()
-        resp = sess.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        assert resp.status_code == 200
-        return sess
-    
-    def test_import_inserts_card_into_database(self, session):
+
+    def test_import_inserts_card_into_database(self, auth_session):
         """Test that import action actually inserts card into collection"""
         # Use unique name to identify this test card
-        unique_name = f"TEST_ImportCard_{int(time.time())}"
+        card_name = unique_name("ImportCard")
         csv = f'''Name,Set code,Set name,Collector number,Foil,Rarity,Quantity,ManaBox ID,Scryfall ID,Purchase price,Misprint,Altered,Condition,Language,Purchase price currency
-{unique_name},TST,Test Set,001,,common,1,12345,test-scryfall-id-{int(time.time())},5.00,false,false,near_mint,English,USD'''
+{card_name},TST,Test Set,001,,common,1,12345,test-scryfall-id-{card_name},5.00,false,false,near_mint,English,USD'''
         
         # Perform import
-        resp = session.post(f"{BASE_URL}/api/collection/import", json={
+        resp = auth_session.post(f"{BASE_URL}/api/collection/import", json={
             "csvContent": csv,
             "action": "import"
         })
@@ -144,7 +112,7 @@ class TestCSVImportActual:
         assert data["imported"] == 1, f"Expected 1 imported, got {data.get('imported')}"
         
         # Verify card exists in collection
-        resp = session.get(f"{BASE_URL}/api/collection")
+        resp = auth_session.get(f"{BASE_URL}/api/collection")
         assert resp.status_code == 200
         collection_data = resp.json()
         
@@ -152,21 +120,21 @@ class TestCSVImportActual:
         found = False
         for item in collection_data.get("items", []):
             card_data = item.get("card_data", {})
-            if card_data.get("name") == unique_name:
+            if card_data.get("name") == card_name:
                 found = True
                 break
         
-        assert found, f"Imported card '{unique_name}' not found in collection"
-        print(f"✓ Card '{unique_name}' successfully imported and persisted")
+        assert found, f"Imported card '{card_name}' not found in collection"
+        print(f"✓ Card '{card_name}' successfully imported and persisted")
     
-    def test_import_multiple_cards(self, session):
+    def test_import_multiple_cards(self, auth_session):
         """Test importing multiple cards at once"""
-        timestamp = int(time.time())
+        prefix = unique_name("MultiCard")
         csv = f'''Name,Set code,Set name,Collector number,Foil,Rarity,Quantity,ManaBox ID,Scryfall ID,Purchase price,Misprint,Altered,Condition,Language,Purchase price currency
-TEST_MultiCard1_{timestamp},TST,Test Set,001,,common,1,11111,multi-id-1-{timestamp},1.00,false,false,near_mint,English,USD
-TEST_MultiCard2_{timestamp},TST,Test Set,002,,uncommon,2,22222,multi-id-2-{timestamp},2.00,false,false,lightly_played,English,USD'''
+{prefix}_1,TST,Test Set,001,,common,1,11111,multi-id-1-{prefix},1.00,false,false,near_mint,English,USD
+{prefix}_2,TST,Test Set,002,,uncommon,2,22222,multi-id-2-{prefix},2.00,false,false,lightly_played,English,USD'''
         
-        resp = session.post(f"{BASE_URL}/api/collection/import", json={
+        resp = auth_session.post(f"{BASE_URL}/api/collection/import", json={
             "csvContent": csv,
             "action": "import"
         })
@@ -281,20 +249,10 @@ class TestSearchAPIGameFilter:
 
 class TestMessengerJSONParsing:
     """Test Messenger API handles responses gracefully"""
-    
-    @pytest.fixture(scope='class')
-    def session(self):
-        sess = requests.Session()
-        resp = sess.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        assert resp.status_code == 200
-        return sess
-    
-    def test_messages_api_returns_json(self, session):
+
+    def test_messages_api_returns_json(self, auth_session):
         """Test messages API returns valid JSON"""
-        resp = session.get(f"{BASE_URL}/api/messages")
+        resp = auth_session.get(f"{BASE_URL}/api/messages")
         assert resp.status_code == 200
         
         # Verify response is valid JSON
@@ -306,9 +264,9 @@ class TestMessengerJSONParsing:
         
         print("✓ Messages API returns valid JSON")
     
-    def test_calls_api_returns_json(self, session):
+    def test_calls_api_returns_json(self, auth_session):
         """Test calls API returns valid JSON (used by messenger widget for video calls)"""
-        resp = session.get(f"{BASE_URL}/api/calls")
+        resp = auth_session.get(f"{BASE_URL}/api/calls")
         assert resp.status_code == 200
         
         # Verify response is valid JSON
@@ -320,9 +278,9 @@ class TestMessengerJSONParsing:
         
         print("✓ Calls API returns valid JSON")
     
-    def test_calls_preview_mode_returns_json(self, session):
+    def test_calls_preview_mode_returns_json(self, auth_session):
         """Test calls API with preview mode returns valid JSON"""
-        resp = session.get(f"{BASE_URL}/api/calls?mode=preview")
+        resp = auth_session.get(f"{BASE_URL}/api/calls?mode=preview")
         assert resp.status_code == 200
         
         try:
@@ -359,20 +317,11 @@ class TestCollectionMTGSearch:
 
 class TestCleanup:
     """Cleanup test data"""
-    
-    @pytest.fixture(scope='class')
-    def session(self):
-        sess = requests.Session()
-        resp = sess.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return sess
-    
-    def test_cleanup_test_cards(self, session):
-        """Remove TEST_ prefixed cards from collection"""
+
+    def test_cleanup_test_cards(self, auth_session):
+        """Remove this run and worker's cards from the collection"""
         # Get collection
-        resp = session.get(f"{BASE_URL}/api/collection")
+        resp = auth_session.get(f"{BASE_URL}/api/collection")
         if resp.status_code != 200:
             print("⚠ Could not get collection for cleanup")
             return
@@ -385,7 +334,7 @@ class TestCleanup:
         for item in items:
             card_data = item.get("card_data", {})
             name = card_data.get("name", "")
-            if name.startswith("TEST_"):
+            if name.startswith(TEST_PREFIX):
                 test_items.append(item)
         
         # Delete test items
@@ -393,11 +342,11 @@ class TestCleanup:
         for item in test_items:
             item_id = item.get("item_id")
             if item_id:
-                resp = session.delete(f"{BASE_URL}/api/collection/{item_id}")
+                resp = auth_session.delete(f"{BASE_URL}/api/collection/{item_id}")
                 if resp.status_code in [200, 204]:
                     deleted += 1
         
-        print(f"✓ Cleanup: Deleted {deleted} TEST_ prefixed cards")
+        print(f"✓ Cleanup: Deleted {deleted} {TEST_PREFIX} prefixed cards")
 
 
 if __name__ == "__main__":
@@ -10,29 +10,12 @@ Features to test:
 
 import pytest
 import requests
-import json
-import os
 
-BASE_URL = "http://localhost:3000"
+from conftest import BASE_URL
 
 class TestMessagesTimestamps:
     """Test that messages have proper timestamps"""
-    
-    @pytest.fixture(scope="class")
-    def auth_session(self):
-        """Create authenticated session"""
-        session = requests.Session()
-        # Login with test user
-        login_resp = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        print(f"Login response: {login_resp.status_code}")
-        if login_resp.status_code == 200:
-            data = login_resp.json()
-            print(f"Login success: {data.get('success')}")
-        return session
-    
+
     def test_conversations_have_timestamps(self, auth_session):
         """Test that conversations list includes last_message_at timestamp"""
         resp = auth_session.get(f"{BASE_URL}/api/messages")
@@ -178,17 +161,7 @@ class TestSearchGameFilter:
 
 class TestCSVImport:
     """Test CSV import preview and actual import functionality"""
-    
-    @pytest.fixture(scope="class")
-    def auth_session(self):
-        """Create authenticated session"""
-        session = requests.Session()
-        login_resp = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        return session
-    
+
     def test_csv_preview_manabox_format(self, auth_session):
         """Test CSV preview with ManaBox format"""
         csv_content = '''Name,Set code,Set name,Collector number,Foil,Rarity,Quantity,ManaBox ID,Scryfall ID,Purchase price,Misprint,Altered,Condition,Language,Purchase price currency
@@ -15,9 +15,8 @@ Testing bug fixes:
 
 import pytest
 import requests
-import time
 
-BASE_URL = "http://localhost:3000"
+from conftest import BASE_URL
 
 class TestAuthentication:
     """Test authentication flows"""
@@ -42,19 +41,7 @@ class TestAuthentication:
 
 class TestBulkListAPI:
     """Test bulk listing feature for marketplace"""
-    
-    @pytest.fixture
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate - skipping bulk list tests")
-        return session
-    
+
     def test_bulk_list_endpoint_exists(self, auth_session):
         """Test that bulk list endpoint exists"""
         # Test with invalid data to see if endpoint responds
@@ -82,19 +69,7 @@ class TestBulkListAPI:
 
 class TestCSVImportAPI:
     """Test CSV import with game type selector"""
-    
-    @pytest.fixture
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate - skipping CSV import tests")
-        return session
-    
+
     def test_csv_import_preview_mtg(self, auth_session):
         """Test CSV import preview for MTG format"""
         csv_content = """Name,Set code,Set name,Collector number,Foil,Rarity,Quantity,ManaBox ID,Scryfall ID,Purchase price,Misprint,Altered,Condition,Language,Purchase price currency
@@ -139,19 +114,7 @@ Pikachu,swsh1,Sword & Shield,065,2020-02-07,5.00,Near Mint,1"""
 
 class TestTradesAPI:
     """Test trades page and detail page"""
-    
-    @pytest.fixture
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate - skipping trades tests")
-        return session
-    
+
     def test_trades_list_endpoint(self, auth_session):
         """Test trades list endpoint"""
         response = auth_session.get(f"{BASE_URL}/api/trades")
@@ -163,19 +126,7 @@ class TestTradesAPI:
 
 class TestProfileAPI:
     """Test profile page with Collection and Items for Sale sections"""
-    
-    @pytest.fixture
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate - skipping profile tests")
-        return session
-    
+
     def test_profile_stats_endpoint(self, auth_session):
         """Test profile stats endpoint"""
         response = auth_session.get(f"{BASE_URL}/api/profile/stats")
@@ -225,19 +176,7 @@ class TestShopAPI:
 
 class TestFeedAPI:
     """Test feed page with emoji reactions"""
-    
-    @pytest.fixture
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate - skipping feed tests")
-        return session
-    
+
     def test_feed_endpoint(self, auth_session):
         """Test feed endpoint"""
         response = auth_session.get(f"{BASE_URL}/api/feed?tab=public")
@@ -267,19 +206,7 @@ class TestFeedAPI:
 
 class TestMessagesAPI:
     """Test messages page with media features"""
-    
-    @pytest.fixture
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate - skipping messages tests")
-        return session
-    
+
     def test_conversations_endpoint(self, auth_session):
         """Test conversations endpoint"""
         response = auth_session.get(f"{BASE_URL}/api/messages")
@@ -291,19 +218,7 @@ class TestMessagesAPI:
 
 class TestDecksAPI:
     """Test decks page with admin deletion"""
-    
-    @pytest.fixture
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate - skipping decks tests")
-        return session
-    
+
     def test_my_decks_endpoint(self, auth_session):
         """Test my decks endpoint"""
         response = auth_session.get(f"{BASE_URL}/api/decks")
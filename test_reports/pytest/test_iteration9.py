@@ -10,10 +10,9 @@ Testing features:
 
 import pytest
 import requests
-import time
 import jwt
 
-BASE_URL = "http://localhost:3000"
+from conftest import BASE_URL, unique_name
 
 
 class TestAuthentication:
@@ -39,19 +38,7 @@ class TestAuthentication:
 
 class TestMarketplaceDeleteAPI:
     """Test marketplace delete feature - owners can delete their own listings"""
-    
-    @pytest.fixture
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate - skipping marketplace delete tests")
-        return session
-    
+
     def test_create_listing_for_deletion(self, auth_session):
         """Test creating a listing that we can then delete"""
         response = auth_session.post(f"{BASE_URL}/api/marketplace", json={
@@ -72,7 +59,7 @@ class TestMarketplaceDeleteAPI:
         """Test that owner can delete their own listing"""
         # First create a listing
         create_response = auth_session.post(f"{BASE_URL}/api/marketplace", json={
-            "cardId": f"test-delete-{int(time.time())}",
+            "cardId": unique_name("delete"),
             "game": "mtg",
             "cardData": {"name": "Owner Delete Test"},
             "price": 1.00,
@@ -129,19 +116,7 @@ class TestMarketplaceDeleteAPI:
 
 class TestCollectionAPI:
     """Test collection API with statistics for dashboard"""
-    
-    @pytest.fixture
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate - skipping collection tests")
-        return session
-    
+
     def test_get_collection(self, auth_session):
         """Test getting user's collection"""
         response = auth_session.get(f"{BASE_URL}/api/collection?game=")
@@ -191,23 +166,11 @@ class TestCollectionAPI:
 
 class TestLiveKitTokenAPI:
     """Test LiveKit token generation API"""
-    
-    @pytest.fixture
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate - skipping LiveKit tests")
-        return session
-    
+
     def test_generate_livekit_token(self, auth_session):
         """Test generating a LiveKit token"""
         response = auth_session.post(f"{BASE_URL}/api/livekit/token", json={
-            "roomName": "test-room-" + str(int(time.time())),
+            "roomName": unique_name("room"),
             "participantName": "Test User"
         })
         assert response.status_code == 200
@@ -253,19 +216,7 @@ class TestLiveKitTokenAPI:
 
 class TestDeckAnalyticsEndpoint:
     """Test deck endpoints that feed into analytics component"""
-    
-    @pytest.fixture
-    def auth_session(self):
-        """Get authenticated session"""
-        session = requests.Session()
-        response = session.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test@test.com",
-            "password": "password"
-        })
-        if response.status_code != 200:
-            pytest.skip("Cannot authenticate - skipping deck tests")
-        return session
-    
+
     def test_get_decks_list(self, auth_session):
         """Test getting list of user's decks"""
         response = auth_session.get(f"{BASE_URL}/api/decks")
@@ -5,11 +5,8 @@ Tests: Community Decks API, User Collection API, User Search, Search with Set/Nu
 
 import pytest
 import requests
-import os
-import time
 
-# Base URL for testing
-BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001').rstrip('/')
+from conftest import BASE_URL, unique_name
 
 # Test credentials - existing test user
 TEST_USER = {
@@ -19,7 +16,7 @@ TEST_USER = {
 
 # Alternative test user for signup
 SIGNUP_USER = {
-    "email": f"test_p1_{int(time.time())}@example.com",
+    "email": f"{unique_name('p1').lower()}@example.com",
     "password": "TestPassword123!",
     "name": "P1 Test User"
 }
@@ -27,13 +24,18 @@ SIGNUP_USER = {
 # Session to persist cookies
 session = requests.Session()
 session.headers.update({"Content-Type": "application/json"})
+logged_in = False
 
 def login_or_signup():
-    """Helper to login with test user, or signup if needed"""
+    """Helper to login with test user, or signup if needed (once per module)"""
+    global logged_in
+    if logged_in:
+        return True
     # First try provided test credentials
     response = session.post(f"{BASE_URL}/api/auth/login", json=TEST_USER)
     if response.status_code == 200:
         print(f"✓ Logged in as {TEST_USER['email']}")
+        logged_in = True
         return True
     
     # If that fails, try signup with new user
@@ -41,6 +43,7 @@ def login_or_signup():
     signup_response = session.post(f"{BASE_URL}/api/auth/signup", json=SIGNUP_USER)
     if signup_response.status_code == 200:
         print(f"✓ Signed up as {SIGNUP_USER['email']}")
+        logged_in = True
         return True
     
     # Try login with signup user
@@ -50,6 +53,7 @@ def login_or_signup():
     })
     if login_response.status_code == 200:
         print(f"✓ Logged in as {SIGNUP_USER['email']}")
+        logged_in = True
         return True
     
     print(f"✗ Could not authenticate. Signup response: {signup_response.text}")
@@ -284,7 +288,7 @@ class TestDecksPageTabs:
     def test_create_public_deck(self):
         """Test creating a public deck"""
         deck_data = {
-            "name": f"TEST_Public_Deck_{int(time.time())}",
+            "name": unique_name("Public_Deck"),
             "description": "Public test deck for P1 features",
             "game": "mtg",
             "format": "Standard",
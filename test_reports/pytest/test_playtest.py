@@ -0,0 +1,189 @@
+"""
+Playtest Test Suite - backend/playtest.py
+Testing features:
+1. The library as the Playtest tab builds it
+2. Vectorised shuffles: every hand is a draw without replacement
+3. Opening hand distributions and mulligan rates against the exact odds
+4. Land drops and castability by turn
+5. Results seeded and cached by deck content hash
+6. Per-user budgets of hands a minute
+7. /api/decks/playtest and /api/decks/{deckId}/playtest
+"""
+
+import asyncio
+import math
+import time
+
+import numpy as np
+import pytest
+
+import deck_analytics
+import deck_lists
+import playtest
+import server
+from conftest import BOLT, FOREST, PIKACHU, TROLL, FakeDeckStore, make_jwt
+from deck_analytics import Deck
+from deck_lists import Decks
+from playtest import Card, Playtests
+
+BASIC_PIKACHU = {**PIKACHU, "stage": "Basic"}
+
+
+def hypergeometric(successes, size, draws, hits):
+    return math.comb(successes, hits) * math.comb(size - successes, draws - hits) / math.comb(size, draws)
+
+
+class TestLibrary:
+    """Test which rows are shuffled"""
+
+    def test_library(self):
+        cards = playtest.library("mtg", [("bolt", BOLT, 4, "main"), ("troll", TROLL, 1, "commander"),
+                                         ("forest", FOREST, 20, None), ("bolt-sb", BOLT, 3, "sideboard"),
+                                         ("gone", BOLT, 0, "main")])
+        assert cards == [Card("Lightning Bolt", 1, False, False, 4), Card("Forest", 0, True, False, 20)]
+        assert playtest.library("pokemon", [("p", BASIC_PIKACHU, 2, "main")])[0].basic_pokemon
+
+    def test_limits(self):
+        cards = [Card("Forest", 0, True, False, 60)]
+        with pytest.raises(ValueError):
+            playtest.check(cards, 0, 5)
+        with pytest.raises(ValueError):
+            playtest.check(cards, 100, playtest.PLAYTEST_MAX_TURNS + 1)
+        with pytest.raises(ValueError):
+            playtest.check([], 100, 5)
+        with pytest.raises(ValueError):
+            playtest.check([Card("Forest", 0, True, False, playtest.PLAYTEST_MAX_CARDS + 1)], 100, 5)
+
+
+class TestSimulate:
+    """Test the sampled games"""
+
+    def test_deal(self):
+        drawn = playtest.deal(10, 2000, 4, np.random.default_rng(1))
+        assert drawn.shape == (2000, 4)
+        assert all(len(set(row)) == 4 for row in drawn.tolist())
+        # Every card is as likely in every position
+        assert np.abs(np.bincount(drawn.ravel(), minlength=10) / drawn.size - 0.1).max() < 0.01
+
+    def test_opening_hands(self):
+        cards = [Card("Forest", 0, True, False, 24), Card("Lightning Bolt", 1, False, False, 36)]
+        result = playtest.simulate("mtg", cards, 100000, 3, False, 1)
+        for lands, share in result["openingHand"]["lands"].items():
+            assert abs(share - hypergeometric(24, 60, 7, int(lands))) < 0.005
+        keep = sum(hypergeometric(24, 60, 7, lands) for lands in range(2, 6))
+        assert abs(result["mulliganRate"] - (1 - keep)) < 0.005
+        assert abs(result["openingHand"]["average"] - 7 * 24 / 60) < 0.02
+
+    def test_castable(self):
+        cards = [Card("Forest", 0, True, False, 3), Card("Lightning Bolt", 1, False, False, 4)]
+        # Seven cards: the opening hand is the whole deck
+        result = playtest.simulate("mtg", cards, 100, 4, False, 1)
+        assert result["openingHand"]["lands"]["3"] == 1.0 and result["mulliganRate"] == 0.0
+        assert result["landDrops"] == [1.0, 1.0, 1.0, 0.0]
+        assert result["castable"] == [{"name": "Lightning Bolt", "manaValue": 1, "copies": 4,
+                                       "byTurn": [1.0, 1.0, 1.0, 1.0]}]
+
+        cards = [Card("Forest", 0, True, False, 20), Card("Troll Ascetic", 3, False, False, 1),
+                 Card("Filler", 1, False, False, 39)]
+        result = playtest.simulate("mtg", cards, 50000, 5, True, 2)
+        [_, troll] = result["castable"]
+        assert troll["byTurn"][:2] == [0.0, 0.0]
+        # By turn 5 on the draw: among the 12 cards seen, with 3 lands in the other 11
+        exact = 12 / 60 * (1 - sum(hypergeometric(20, 59, 11, lands) for lands in range(3)))
+        assert abs(troll["byTurn"][4] - exact) < 0.005
+
+    def test_pokemon(self):
+        cards = [Card("Pikachu", 0, False, True, 4), Card("Switch", 0, False, False, 56)]
+        result = playtest.simulate("pokemon", cards, 100000, 2, False, 1)
+        assert abs(result["mulliganRate"] - hypergeometric(4, 60, 7, 0)) < 0.005
+        assert set(result["openingHand"]["basicPokemon"]) == {str(i) for i in range(8)}
+        assert result["castable"] == [] and result["landDrops"] == []
+
+
+class TestPlaytests:
+    """Test seeding and caching"""
+
+    def test_cache(self):
+        playtests = Playtests()
+        deck = Deck("mtg", "Modern", [("bolt", BOLT, 36, "main"), ("forest", FOREST, 24, "main")])
+        first = asyncio.run(playtests.run(deck, hands=500, turns=3))
+        assert asyncio.run(playtests.run(Deck("mtg", "Modern", list(deck.rows)), hands=500, turns=3)) == first
+        assert (playtests.hits, playtests.misses) == (1, 1)
+        # Other settings are another result, seeded from another hash
+        assert asyncio.run(playtests.run(deck, hands=500, turns=3, on_draw=True))["onDraw"]
+        assert playtests.stats()["entries"] == 2
+        # Not cached: the same seed gives the same numbers
+        assert asyncio.run(Playtests().run(deck, hands=500, turns=3)) == first
+
+    def test_user_budget(self, monkeypatch):
+        playtests = Playtests(user_hands=25000)
+        assert playtests.allow("user_1", 20000) and not playtests.allow("user_1", 10000)
+        # Settings beyond the limits count as the most hands allowed
+        assert not playtests.allow("user_1", 10 ** 9) and playtests.allow("user_2", 10 ** 9)
+        assert playtests.allow("user_1", 5000) and playtests.stats()["limited"] == 2
+        clock = time.monotonic() + 60
+        monkeypatch.setattr(time, "monotonic", lambda: clock)
+        assert playtests.allow("user_1", 20000)
+
+
+class TestEndpoints:
+    """Test the playtest routes"""
+
+    @pytest.fixture
+    def decks(self, monkeypatch):
+        store = FakeDeckStore({
+            "deck_1": {"user_id": "user_1", "is_public": False, "name": "Burn", "format": "Modern", "game": "mtg"},
+            "deck_2": {"user_id": "user_2", "is_public": False, "name": "Hidden", "format": "Modern", "game": "mtg"},
+        })
+        store.rows["deck_1"] = [("bolt", BOLT, 4, "main"), ("forest", FOREST, 4, "main")]
+        decks = Decks(store=store)
+        monkeypatch.setattr(deck_lists, "decks", decks)
+        monkeypatch.setattr(playtest, "playtests", Playtests())
+        return decks
+
+    headers = {"Authorization": f"Bearer {make_jwt({'user_id': 'user_1', 'exp': time.time() + 3600})}"}
+
+    def test_post(self, client, decks):
+        data = client.post("/api/decks/playtest", headers=self.headers, json={
+            "game": "pokemon", "hands": 1000, "turns": 2, "onDraw": True,
+            "cards": [{"card_id": "p", "card_data": BASIC_PIKACHU, "quantity": 7}]}).json()
+        assert data["success"] and data["hands"] == 1000 and data["onDraw"]
+        assert data["mulliganRate"] == 0.0 and data["openingHand"]["basicPokemon"]["7"] == 1.0
+
+    def test_post_errors(self, client, decks, monkeypatch):
+        cards = [{"card_id": "bolt", "card_data": BOLT, "quantity": 4}]
+
+        def post(**kwargs):
+            return client.post("/api/decks/playtest", headers=self.headers, **kwargs)
+
+        assert client.post("/api/decks/playtest", json={"cards": cards}).status_code == 401
+        assert post(content=b"{").status_code == 400
+        assert post(json={"cards": "bolt"}).status_code == 400
+        assert post(json={"cards": cards, "hands": "many"}).status_code == 400
+        assert post(json={"cards": cards, "turns": 99}).status_code == 400
+        assert post(json={"cards": cards, "hands": playtest.PLAYTEST_MAX_HANDS + 1}).status_code == 400
+        assert post(json={"cards": []}).json()["error"] == "The deck has no main deck cards"
+        monkeypatch.setattr(deck_analytics, "ANALYTICS_MAX_BYTES", 64)
+        assert post(json={"cards": cards}).status_code == 413
+
+    def test_rate_limit(self, client, decks, monkeypatch):
+        monkeypatch.setattr(playtest, "playtests", Playtests(user_hands=1000))
+        cards = [{"card_id": "forest", "card_data": FOREST, "quantity": 40}]
+        body = {"cards": cards, "hands": 600, "turns": 2}
+        assert client.post("/api/decks/playtest", headers=self.headers, json=body).status_code == 200
+        assert client.post("/api/decks/playtest", headers=self.headers, json=body).status_code == 429
+        assert client.get("/api/decks/deck_1/playtest?hands=600", headers=self.headers).status_code == 429
+        assert client.get("/api/decks/deck_1/playtest?hands=400&turns=2", headers=self.headers).status_code == 200
+
+    def test_saved_deck(self, client, decks, monkeypatch):
+        # The caller is looked up once, for both the deck access and the playtest budget
+        lookups = []
+        request_user = server.request_user
+        monkeypatch.setattr(server, "request_user", lambda request: lookups.append(request) or request_user(request))
+        assert client.get("/api/decks/deck_1/playtest?hands=10", headers=self.headers).status_code == 200
+        assert len(lookups) == 1
+        data = client.get("/api/decks/deck_1/playtest?hands=200&turns=2&draw=true", headers=self.headers).json()
+        assert data["onDraw"] and data["cards"] == 8 and data["castable"][0]["name"] == "Lightning Bolt"
+        assert client.get("/api/decks/deck_1/playtest?hands=0", headers=self.headers).status_code == 400
+        assert client.get("/api/decks/deck_2/playtest", headers=self.headers).status_code == 403
+        assert client.get("/api/decks/deck_1/playtest").status_code == 401
@@ -0,0 +1,261 @@
+"""
+Portfolio Test Suite - backend/portfolio.py
+Testing features:
+1. Valuation of all collections at once, with the snapshot query's rules
+2. The columnar series: merging a day, seeding from snapshots, saving
+   and catching up with snapshots written elsewhere
+3. Date ranges, weekly and monthly downsampling, per-game values
+4. Biggest movers from the kept prices
+5. One bulk snapshot write per valuation, from the price refresh too
+6. /api/prices/snapshot, /api/prices/portfolio and /_gateway/jobs/valuation
+"""
+
+import asyncio
+import datetime
+import time
+
+import numpy as np
+import pytest
+
+import portfolio
+from conftest import make_jwt
+from portfolio import Portfolio, PortfolioService
+
+DAY = portfolio.day_number(datetime.date(2026, 10, 1))
+
+
+def valuation(day, items, prices):
+    """items: (user_id, card_id, game, quantity, name); prices: (card_id, game, eur)"""
+    return portfolio.value(day, *(list(column) for column in zip(*items)),
+                           *(list(column) for column in zip(*prices)))
+
+
+ITEMS = [
+    ("u1", "bolt", "mtg", 4, "Lightning Bolt"),
+    ("u1", "bolt", "mtg", 1, "Lightning Bolt"),
+    ("u1", "pika", "pokemon", 0, "Pikachu"),
+    ("u2", "bolt", "mtg", None, "Lightning Bolt"),
+    ("u2", "island", "mtg", 20, "Island"),
+]
+PRICES = [("bolt", "mtg", 1.5), ("pika", "pokemon", 9.2), ("island", "mtg", None), ("bolt", "pokemon", 99.0)]
+
+
+class MemoryValuationStore:
+    def __init__(self, items, prices, history=()):
+        self.items_ = items
+        self.prices_ = prices
+        self.history_ = list(history)
+        self.day = datetime.date(2026, 10, 1)
+        self.writes = []
+
+    async def today(self):
+        return self.day
+
+    async def items(self):
+        return tuple(list(column) for column in zip(*self.items_))
+
+    async def prices(self):
+        return tuple(list(column) for column in zip(*self.prices_))
+
+    async def write_snapshots(self, day, users, totals, counts):
+        self.writes.append((day, users, totals, counts))
+        return len(users)
+
+    async def history(self, after=None):
+        rows = [row for row in self.history_ if after is None or row[1] >= after]
+        return tuple(list(column) for column in zip(*rows)) if rows else ([], [], [], [])
+
+
+class TestValue:
+    """Test valuing every collection in one pass"""
+
+    def test_totals(self):
+        v = valuation(DAY, ITEMS, PRICES)
+        assert v.users.tolist() == ["u1", "u2"] and v.games.tolist() == ["mtg", "pokemon"]
+        # A zero or missing quantity counts once; unpriced cards are worth nothing
+        assert v.totals.tolist() == [16.7, 1.5]
+        assert v.counts.tolist() == [3, 2]
+        assert v.values[0].tolist() == [7.5, 9.2]
+        assert np.isnan(v.values[1, 1])
+
+    def test_holdings(self):
+        v = valuation(DAY, ITEMS, PRICES)
+        u1 = slice(v.holding_offsets[0], v.holding_offsets[1])
+        assert dict(zip(v.cards[v.holding_cards[u1]].tolist(), v.holding_quantities[u1].tolist())) == {
+            "mtg:bolt": 5, "pokemon:pika": 1}
+        assert v.names[v.cards.tolist().index("mtg:island")] == "Island"
+
+    def test_empty(self):
+        v = portfolio.value(DAY, [], [], [], [], [], [], [], [])
+        assert len(v.users) == 0 and len(Portfolio().merged(v)) == 0
+
+
+class TestSeries:
+    """Test the columnar series"""
+
+    def series(self):
+        history = Portfolio.from_history(["u1", "u1", "u3"], [DAY - 30, DAY - 1, DAY - 1], [10.0, 12.0, 5.0], [1, 2, 3])
+        merged = history.merged(valuation(DAY, ITEMS, PRICES))
+        return merged.merged(valuation(DAY + 7, ITEMS[:2], [("bolt", "mtg", 2.0)]))
+
+    def test_merge(self):
+        series = self.series()
+        assert series.users.tolist() == ["u1", "u2", "u3"]
+        assert [point["value"] for point in series.points(series.rows("u1"))] == [10.0, 12.0, 16.7, 10.0]
+        assert series.points(series.rows("u1"))[2]["games"] == {"mtg": 7.5, "pokemon": 9.2}
+        assert series.points(series.rows("u1"))[0]["games"] == {}
+        assert [point["date"] for point in series.points(series.rows("u2"))] == ["2026-10-01"]
+        # Valuing a day again replaces it
+        again = series.merged(valuation(DAY + 7, ITEMS[:1], [("bolt", "mtg", 3.0)]))
+        assert [point["value"] for point in again.points(again.rows("u1"))][-1] == 12.0
+        assert len(again) == len(series)
+
+    def test_extended(self):
+        series = self.series()
+        cron = Portfolio.from_history(["u1", "u4", "u2"], [DAY + 8, DAY + 8, DAY], [11.0, 3.0, 2.5], [5, 1, 2])
+        extended = series.extended(cron)
+        assert extended.users.tolist() == ["u1", "u2", "u3", "u4"]
+        assert [point["value"] for point in extended.points(extended.rows("u1"))] == [10.0, 12.0, 16.7, 10.0, 11.0]
+        assert extended.points(extended.rows("u1"))[-1]["games"] == {}
+        # A row for the same user and day replaces it
+        assert extended.points(extended.rows("u2")) == [{"date": "2026-10-01", "value": 2.5, "cardCount": 2,
+                                                         "games": {}}]
+        assert extended.movers("u1", DAY) == series.movers("u1", DAY) and extended.movers("u4", DAY) == []
+
+    def test_ranges_and_downsampling(self):
+        series = self.series()
+        assert [p["date"] for p in series.points(series.rows("u1", DAY - 1, DAY))] == ["2026-09-30", "2026-10-01"]
+        # 2026-09-30 (Wednesday) and 2026-10-01 share a week
+        assert [p["date"] for p in series.points(series.rows("u1", resolution="weekly"))] == [
+            "2026-09-01", "2026-10-01", "2026-10-08"]
+        assert [p["date"] for p in series.points(series.rows("u1", resolution="monthly"))] == [
+            "2026-09-30", "2026-10-08"]
+        assert series.rows("nobody").tolist() == []
+
+    def test_movers(self):
+        series = self.series()
+        assert series.movers("u1", DAY) == [{"cardId": "bolt", "game": "mtg", "name": "Lightning Bolt", "quantity": 5,
+                                             "price": 2.0, "previousPrice": 1.5, "change": 2.5}]
+        assert series.movers("u2", DAY) == []
+
+    def test_price_days_kept(self):
+        series = Portfolio()
+        for day in range(5):
+            series = series.merged(valuation(DAY + day, ITEMS, PRICES), price_days=3)
+        assert series.price_days.tolist() == [DAY + 2, DAY + 3, DAY + 4]
+        assert series.prices.shape == (3, len(series.cards))
+
+    def test_save_and_load(self, tmp_path):
+        series = self.series()
+        path = str(tmp_path / "portfolio.npz")
+        series.save(path)
+        loaded = Portfolio.load(path)
+        assert loaded.points(loaded.rows("u1")) == series.points(series.rows("u1"))
+        assert loaded.movers("u1", DAY) == series.movers("u1", DAY)
+        assert Portfolio.load(str(tmp_path / "missing.npz")) is None
+
+
+class TestService:
+    """Test valuations and queries through PortfolioService"""
+
+    def test_snapshot(self, tmp_path):
+        store = MemoryValuationStore(ITEMS, PRICES, history=[("u1", DAY - 7, 8.0, 1)])
+        service = PortfolioService(store=store, path=str(tmp_path / "portfolio.npz"))
+        assert asyncio.run(service.snapshot()) == 2
+        assert store.writes == [(store.day, ["u1", "u2"], [16.7, 1.5], [3, 2])]
+        result = asyncio.run(service.series("u1"))
+        assert [point["value"] for point in result["series"]] == [8.0, 16.7]
+        assert result["change"] == {"value": 8.7, "percent": 108.75}
+        assert result["games"] == {"mtg": 7.5, "pokemon": 9.2}
+        assert service.last["users"] == 2 and service.last["items"] == 5
+
+        # The next process reads the saved series, not the database
+        reloaded = PortfolioService(store=MemoryValuationStore([], []), path=str(tmp_path / "portfolio.npz"))
+        assert asyncio.run(reloaded.series("u1", days=1))["series"][0]["value"] == 16.7
+
+    def test_cron_rows(self, tmp_path):
+        store = MemoryValuationStore(ITEMS, PRICES)
+        service = PortfolioService(store=store, path=str(tmp_path / "portfolio.npz"))
+        asyncio.run(service.snapshot())
+        assert not asyncio.run(service.due())
+        # /api/prices/update writes the next day's rows into the table only
+        store.history_ += [("u1", DAY, 16.7, 3), ("u1", DAY + 1, 18.0, 3), ("u5", DAY + 1, 4.0, 1)]
+        assert asyncio.run(service.sync()) == 2 and asyncio.run(service.sync()) == 0
+        assert [point["value"] for point in asyncio.run(service.series("u1"))["series"]] == [16.7, 18.0]
+        assert service.portfolio.has("u5")
+        # Rows the cron writes later on the last synced day, and its upserts of that day, are read again
+        store.history_ = [row for row in store.history_ if row[0] != "u1" or row[1] != DAY + 1]
+        store.history_ += [("u1", DAY + 1, 19.0, 4), ("u6", DAY + 1, 2.0, 1)]
+        assert asyncio.run(service.sync()) == 1 and service.portfolio.has("u6")
+        assert asyncio.run(service.series("u1"))["series"][-1] == {
+            "date": "2026-10-02", "value": 19.0, "cardCount": 4, "games": {}}
+        # A process starting from the saved file catches up as it loads
+        reloaded = PortfolioService(store=store, path=str(tmp_path / "portfolio.npz"))
+        assert len(asyncio.run(reloaded.load())) == len(service.portfolio)
+        store.day += datetime.timedelta(days=1)
+        assert asyncio.run(service.due())
+
+    def test_price_refresh_snapshot_hook(self, tmp_path):
+        import price_worker
+
+        store = MemoryValuationStore(ITEMS, PRICES)
+        service = PortfolioService(store=store, path=str(tmp_path / "portfolio.npz"))
+
+        class NoCards:
+            async def now(self):
+                return datetime.datetime(2026, 10, 1, tzinfo=datetime.timezone.utc)
+
+            async def cards(self, games, refreshed_before=None):
+                return []
+
+            async def snapshot_values(self):
+                raise AssertionError("the portfolio snapshot should be used")
+
+        async def run():
+            job = price_worker.PriceRefresh(NoCards(), None, {}, state_file=None, snapshot=service.snapshot)
+            return await job.run()
+
+        assert asyncio.run(run())["snapshots"] == 2
+        assert len(store.writes) == 1
+
+
+class TestEndpoints:
+    """Test the portfolio routes"""
+
+    @pytest.fixture
+    def service(self, tmp_path, monkeypatch):
+        service = PortfolioService(store=MemoryValuationStore(ITEMS, PRICES), path=str(tmp_path / "portfolio.npz"))
+        monkeypatch.setattr(portfolio, "service", service)
+        return service
+
+    headers = {"Authorization": f"Bearer {make_jwt({'user_id': 'u1', 'exp': time.time() + 3600})}"}
+
+    def test_portfolio(self, client, service):
+        assert client.get("/api/prices/portfolio").status_code == 401
+        assert client.get("/api/prices/portfolio?resolution=hourly", headers=self.headers).status_code == 400
+        assert client.get("/api/prices/portfolio", headers=self.headers).json()["series"] == []
+        asyncio.run(service.snapshot())
+        data = client.get("/api/prices/portfolio?days=30&resolution=weekly", headers=self.headers).json()
+        assert data["success"] and data["resolution"] == "weekly"
+        assert data["series"] == [{"date": "2026-10-01", "value": 16.7, "cardCount": 3,
+                                   "games": {"mtg": 7.5, "pokemon": 9.2}}]
+
+    def test_snapshot_route(self, client, service):
+        # Users the series does not have yet are answered by Next.js
+        assert "headers" in client.get("/api/prices/snapshot", headers=self.headers).json()
+        asyncio.run(service.snapshot())
+        assert client.get("/api/prices/snapshot", headers=self.headers).json() == {
+            "success": True, "snapshots": [{"date": "2026-10-01", "value": 16.7, "cardCount": 3}]}
+        # A row the Next.js cron writes later shows up once synced
+        service.store.history_.append(("u1", DAY + 1, 17.25, 3))
+        asyncio.run(service.sync())
+        assert client.get("/api/prices/snapshot", headers=self.headers).json()["snapshots"][-1] == {
+            "date": "2026-10-02", "value": 17.25, "cardCount": 3}
+
+    def test_valuation_job(self, client, service, monkeypatch):
+        import server
+
+        monkeypatch.setattr(server, "ADMIN_TOKEN", "admin")
+        assert client.post("/_gateway/jobs/valuation").status_code == 401
+        data = client.post("/_gateway/jobs/valuation", headers={"Authorization": "Bearer admin"}).json()
+        assert data["users"] == 2 and data["last"]["written"] == 2
@@ -0,0 +1,331 @@
+"""
+Price Worker Test Suite - backend/price_worker.py
+Testing features:
+1. Per-provider token bucket rate limiting
+2. Price parsing for Scryfall and Scrydex responses
+3. Concurrent fetching with retries on 429/5xx against a local price API
+4. Batched cards_cache upserts and one collection snapshot per run
+5. Resuming an interrupted run from its checkpoint
+6. Admin-guarded background job endpoints in the gateway
+"""
+
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+import price_worker
+import server
+from conftest import StubNextHandler
+
+ADMIN_TOKEN = "admin-secret"
+
+
+class StubPriceHandler(BaseHTTPRequestHandler):
+    """Local stand-in for the Scryfall and Scrydex card endpoints"""
+
+    protocol_version = "HTTP/1.1"
+    requests = []
+    throttled = set()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, extra=()):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in extra:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        StubPriceHandler.requests.append((time.monotonic(), self.path))
+        card_id = self.path.split("?")[0].rsplit("/", 1)[-1]
+        if card_id.startswith("missing"):
+            self._send(404, {"object": "error"})
+        elif card_id.startswith("broken"):
+            self._send(500, {"error": "boom"}, extra=(("Retry-After", "0"),))
+        elif card_id.startswith("throttled") and card_id not in StubPriceHandler.throttled:
+            StubPriceHandler.throttled.add(card_id)
+            self._send(429, {"error": "slow down"}, extra=(("Retry-After", "0"),))
+        elif self.path.startswith("/pokemon/"):
+            self._send(200, {"data": {"variants": [{"prices": [{"market": 10.0}]}]}})
+        else:
+            self._send(200, {"prices": {"eur": "1.50"}})
+
+
+class MemoryStore:
+    """Local stand-in for PostgresStore over an in-memory collection"""
+
+    def __init__(self, items):
+        # (user_id, card_id, game, quantity)
+        self.items = items
+        self.cache = {}
+        self.batches = []
+        self.snapshots = {}
+        self.clock = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+    async def now(self):
+        self.clock += timedelta(seconds=1)
+        return self.clock
+
+    async def cards(self, games, refreshed_before=None):
+        cards = sorted({(card_id, game) for _, card_id, game, _ in self.items if game in games})
+        return [
+            card for card in cards
+            if refreshed_before is None or card not in self.cache or self.cache[card][1] < refreshed_before
+        ]
+
+    async def upsert_prices(self, rows, updated_at):
+        self.batches.append(len(rows))
+        for card_id, game, eur in rows:
+            self.cache[(card_id, game)] = (eur, await self.now())
+
+    async def snapshot_values(self):
+        self.snapshots = {}
+        for user_id, card_id, game, quantity in self.items:
+            total, count = self.snapshots.get(user_id, (0.0, 0))
+            eur = self.cache.get((card_id, game), (0.0, None))[0]
+            self.snapshots[user_id] = (round(total + eur * quantity, 2), count + 1)
+        return len(self.snapshots)
+
+
+@pytest.fixture(scope="module")
+def price_api():
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), StubPriceHandler)
+    thread = threading.Thread(target=stub.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{stub.server_address[1]}"
+    stub.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def clear_requests(monkeypatch):
+    StubPriceHandler.requests.clear()
+    StubPriceHandler.throttled.clear()
+    monkeypatch.setattr(price_worker, "SCRYDEX_API_KEY", "key")
+    monkeypatch.setattr(price_worker, "SCRYDEX_TEAM_ID", "team")
+
+
+def run_refresh(store, price_api, tmp_path, resume=False, rate=0, batch_size=2, concurrency=4):
+    async def go():
+        providers = price_worker.default_providers(price_api, price_api, rate, rate)
+        async with httpx.AsyncClient() as client:
+            job = price_worker.PriceRefresh(
+                store, client, providers,
+                concurrency=concurrency, batch_size=batch_size, state_file=str(tmp_path / "state.json"),
+            )
+            return await job.run(resume=resume)
+
+    return asyncio.run(go())
+
+
+class TestTokenBucket:
+    """Test the per-provider rate limiter"""
+
+    def test_limits_rate(self):
+        async def go():
+            bucket = price_worker.TokenBucket(rate=50)
+            start = time.monotonic()
+            await asyncio.gather(*(bucket.acquire() for _ in range(11)))
+            return time.monotonic() - start
+
+        # One token up front, then one every 20 ms
+        assert 0.18 <= asyncio.run(go()) < 0.5
+
+    def test_unlimited(self):
+        async def go():
+            bucket = price_worker.TokenBucket(rate=0)
+            await asyncio.gather(*(bucket.acquire() for _ in range(1000)))
+
+        asyncio.run(go())
+
+    def test_provider_requests_are_spaced(self, price_api, tmp_path):
+        store = MemoryStore([("u1", f"card{i}", "mtg", 1) for i in range(6)])
+        run_refresh(store, price_api, tmp_path, rate=20, concurrency=6)
+        times = sorted(t for t, _ in StubPriceHandler.requests)
+        assert times[-1] - times[0] >= 5 / 20 * 0.9
+
+
+class TestParsing:
+    """Test extracting EUR prices from provider responses"""
+
+    def test_scryfall(self):
+        assert price_worker.scryfall_price({"prices": {"eur": "2.25"}}) == 2.25
+        assert price_worker.scryfall_price({"prices": {"eur": None}}) == 0.0
+        assert price_worker.scryfall_price({}) == 0.0
+
+    def test_scrydex_converts_usd(self):
+        data = {"data": {"variants": [{"prices": {}}, {"prices": {"holo": {"mid": "5"}}}]}}
+        assert price_worker.scrydex_price(data) == pytest.approx(5 * price_worker.USD_TO_EUR)
+        assert price_worker.scrydex_price({"data": {"variants": []}}) == 0.0
+
+
+class TestRefresh:
+    """Test a full run against the local price API and store"""
+
+    def test_prices_batches_and_snapshots(self, price_api, tmp_path):
+        store = MemoryStore([
+            ("u1", "bolt", "mtg", 4),
+            ("u1", "pika", "pokemon", 1),
+            ("u2", "bolt", "mtg", 1),
+            ("u2", "counterspell", "mtg", 2),
+            ("u2", "missing1", "mtg", 1),
+            ("u2", "elsa", "lorcana", 1),
+        ])
+        result = run_refresh(store, price_api, tmp_path)
+        assert result["state"] == "done"
+        assert result["total"] == 4
+        assert result["priced"] == 4
+        assert result["requests"] == {"scryfall": 3, "scrydex": 1}
+        assert store.cache[("bolt", "mtg")][0] == 1.5
+        assert store.cache[("pika", "pokemon")][0] == pytest.approx(9.2)
+        assert store.cache[("missing1", "mtg")][0] == 0.0
+        # Games without a provider are left alone
+        assert ("elsa", "lorcana") not in store.cache
+        assert store.batches == [2, 2]
+        assert store.snapshots == {"u1": (15.2, 2), "u2": (4.5, 4)}
+        assert result["snapshots"] == 2
+
+    def test_retries_throttled_and_skips_failures(self, price_api, tmp_path):
+        store = MemoryStore([("u1", "throttled1", "mtg", 1), ("u1", "broken1", "mtg", 1)])
+        result = run_refresh(store, price_api, tmp_path)
+        assert result["priced"] == 1
+        assert result["failed"] == 1
+        # One retry after the 429, two more for the persistent 500
+        assert result["retries"] == {"scryfall": 3}
+        # A failed fetch never overwrites the cached price with zero
+        assert ("broken1", "mtg") not in store.cache
+
+    def test_pokemon_skipped_without_credentials(self, price_api, tmp_path, monkeypatch):
+        monkeypatch.setattr(price_worker, "SCRYDEX_API_KEY", "")
+        store = MemoryStore([("u1", "pika", "pokemon", 1)])
+        result = run_refresh(store, price_api, tmp_path)
+        assert result["total"] == 0
+        assert StubPriceHandler.requests == []
+
+
+class TestResume:
+    """Test continuing an interrupted run"""
+
+    def test_resume_skips_cards_refreshed_in_the_run(self, price_api, tmp_path):
+        store = MemoryStore([("u1", f"card{i}", "mtg", 1) for i in range(5)])
+        started = datetime(2026, 10, 1, 12, tzinfo=timezone.utc)
+        price_worker.write_state(str(tmp_path / "state.json"), {"started_at": started.isoformat(), "status": "running"})
+        store.cache[("card0", "mtg")] = (1.0, started + timedelta(seconds=5))
+        store.cache[("card1", "mtg")] = (1.0, started - timedelta(days=1))
+
+        result = run_refresh(store, price_api, tmp_path, resume=True)
+        assert result["resumed"] is True
+        assert result["total"] == 4
+        assert "/cards/card0" not in [path for _, path in StubPriceHandler.requests]
+        state = price_worker.read_state(str(tmp_path / "state.json"))
+        assert state["status"] == "done"
+        assert state["started_at"] == started.isoformat()
+
+    def test_finished_run_starts_fresh(self, price_api, tmp_path):
+        store = MemoryStore([("u1", "card0", "mtg", 1)])
+        run_refresh(store, price_api, tmp_path)
+        result = run_refresh(store, price_api, tmp_path, resume=True)
+        assert result["resumed"] is False
+        assert result["total"] == 1
+
+    def test_cancelled_run_keeps_checkpoint(self, price_api, tmp_path):
+        store = MemoryStore([("u1", f"card{i}", "mtg", 1) for i in range(20)])
+
+        async def go():
+            providers = price_worker.default_providers(price_api, price_api, 50, 50)
+            async with httpx.AsyncClient() as client:
+                job = price_worker.PriceRefresh(store, client, providers, batch_size=2,
+                                                state_file=str(tmp_path / "state.json"))
+                task = asyncio.get_running_loop().create_task(job.run())
+                await asyncio.sleep(0.15)
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+                return job.progress
+
+        progress = asyncio.run(go())
+        assert progress.state == "cancelled"
+        assert price_worker.read_state(str(tmp_path / "state.json"))["status"] == "running"
+
+        result = run_refresh(store, price_api, tmp_path, resume=True)
+        assert result["resumed"] is True
+        assert result["total"] == 20 - progress.written
+        assert len(store.cache) == 20
+
+
+class TestGatewayJob:
+    """Test the background job endpoints"""
+
+    @pytest.fixture(autouse=True)
+    def clear_state(self, client):
+        StubNextHandler.received.clear()
+        client.cookies.clear()
+
+    @pytest.fixture
+    def admin(self, monkeypatch):
+        monkeypatch.setattr(server, "ADMIN_TOKEN", ADMIN_TOKEN)
+        return {"Authorization": f"Bearer {ADMIN_TOKEN}"}
+
+    def test_requires_admin_token(self, client, admin):
+        assert client.post("/_gateway/jobs/price-refresh").status_code == 401
+        assert client.get("/_gateway/jobs/price-refresh").status_code == 401
+
+    def test_requires_database(self, client, admin, monkeypatch):
+        monkeypatch.setattr(price_worker, "DATABASE_URL", "")
+        assert client.post("/_gateway/jobs/price-refresh", headers=admin).status_code == 503
+
+    def test_open_failure_reported(self, client, admin, monkeypatch):
+        class Unreachable:
+            async def open(self):
+                raise OSError("connection refused")
+
+        job = price_worker.PriceRefreshJob()
+        monkeypatch.setattr(price_worker, "job", job)
+        monkeypatch.setattr(price_worker, "PostgresStore", Unreachable)
+        monkeypatch.setattr(price_worker, "DATABASE_URL", "postgres://stand-in")
+        assert client.post("/_gateway/jobs/price-refresh", headers=admin).status_code == 202
+        for _ in range(100):
+            if client.get("/_gateway/jobs/price-refresh", headers=admin).json()["state"] != "starting":
+                break
+            time.sleep(0.01)
+        status = client.get("/_gateway/jobs/price-refresh", headers=admin).json()
+        assert status["state"] == "failed"
+        assert status["error"] == "OSError('connection refused')"
+
+    def test_start_and_status(self, client, admin, monkeypatch):
+        monkeypatch.setattr(price_worker, "DATABASE_URL", "postgres://stand-in")
+        monkeypatch.setattr(price_worker, "job", price_worker.PriceRefreshJob())
+        release = threading.Event()
+
+        async def runner(resume, progress, snapshot=None):
+            progress.state = "fetching"
+            progress.total = 3
+            while not release.is_set():
+                await asyncio.sleep(0.01)
+            progress.state = "done"
+
+        monkeypatch.setattr(price_worker, "refresh", runner)
+
+        response = client.post("/_gateway/jobs/price-refresh", headers=admin)
+        assert response.status_code == 202
+        assert client.post("/_gateway/jobs/price-refresh", headers=admin).status_code == 409
+        status = client.get("/_gateway/jobs/price-refresh", headers=admin).json()
+        assert status["state"] == "fetching"
+        assert status["total"] == 3
+        assert "price_refresh_cards{outcome=\"total\"} 3" in client.get("/metrics").text
+        release.set()
+        for _ in range(100):
+            if client.get("/_gateway/jobs/price-refresh", headers=admin).json()["state"] == "done":
+                break
+            time.sleep(0.01)
+        assert client.get("/_gateway/jobs/price-refresh", headers=admin).json()["state"] == "done"
@@ -0,0 +1,346 @@
+"""
+Search Index Test Suite - backend/search_index.py
+Testing features:
+1. Query normalisation and set:/cn:/r:/game:/lang: terms
+2. Ranking: exact, whole-name prefix, word prefixes, typos
+3. Set, collector number, rarity and language filters
+4. MTG segment built from the card store, then updated incrementally
+5. Pokemon and Lorcana learned from proxied responses and api_cache rows
+6. Document and byte caps
+7. Local answers on the gateway's search routes, for cache-fed games only
+   once a proxied response answered the same query in full
+"""
+
+import asyncio
+import json
+
+import pytest
+
+import card_store
+import search_index
+import server
+from conftest import StubNextHandler
+from search_index import SearchIndex, SearchService
+
+BOLT = {"id": "f29ba16f-c8fb-42fe-aabf-87089cb214a7",
+        "name": "Lightning Bolt", "set": "2xm", "collector_number": "117",
+        "rarity": "uncommon", "released_at": "2020-08-07", "prices": {"eur": "1.50"}}
+BOLT_OLD = {"id": "8a1d3b1e-0c3e-4e43-9a24-6b0f1c2d3e01",
+            "name": "Lightning Bolt", "set": "lea", "collector_number": "161",
+            "rarity": "common", "released_at": "1993-08-05", "prices": {"eur": "300.00"}}
+HELIX = {"id": "8a1d3b1e-0c3e-4e43-9a24-6b0f1c2d3e02",
+         "name": "Lightning Helix", "set": "2xm", "collector_number": "257",
+         "rarity": "uncommon", "released_at": "2020-08-07", "prices": {}}
+COUNTERSPELL = {"id": "0d3f2b4c-8a9e-4c1b-b7e5-6a4d2c1e9f00",
+                "name": "Counterspell", "set": "mh2", "collector_number": "267",
+                "rarity": "uncommon", "released_at": "2021-06-18", "prices": {"eur": "0.35"}}
+JOTUN = {"id": "8a1d3b1e-0c3e-4e43-9a24-6b0f1c2d3e03",
+         "name": "Jötun Grunt", "set": "csp", "collector_number": "8",
+         "rarity": "uncommon", "released_at": "2006-07-21", "prices": {}}
+
+SCRYDEX_PIKACHU = {
+    "id": "sv3pt5-25", "name": "Pikachu", "number": "025", "rarity": "Common", "language_code": "EN",
+    "expansion": {"id": "sv3pt5", "name": "151", "series": "Scarlet & Violet", "release_date": "2023/09/22"},
+    "images": [{"type": "front", "small": "s.png", "large": "l.png"}],
+    "variants": [{"name": "normal", "prices": [{"market": 1.25, "currency": "USD"}]}],
+}
+
+
+def build_index(cards, game="mtg", **kwargs):
+    index = SearchIndex(**kwargs)
+    index.add(game, [search_index.document(game, card) for card in cards])
+    return index
+
+
+def names(results):
+    return [doc.name for _, doc in results.hits]
+
+
+@pytest.fixture
+def index():
+    return build_index([BOLT, BOLT_OLD, HELIX, COUNTERSPELL, JOTUN])
+
+
+class TestQueryParsing:
+    """Test normalisation and query terms"""
+
+    def test_normalize(self):
+        assert search_index.normalize("Jötun's Grunt!") == "jotuns grunt"
+        assert search_index.normalize("Fire // Ice") == "fire ice"
+        assert search_index.normalize_number("007") == "7"
+        assert search_index.normalize_number("0") == "0"
+
+    def test_parse_query(self):
+        assert search_index.parse_query("bolt set:2XM r:uncommon") == ("bolt", {"set": "2XM", "rarity": "uncommon"})
+        assert search_index.parse_query("foo:bar") == ("foo:bar", {})
+
+    def test_is_plain(self):
+        assert search_index.is_plain("lightning bolt set:2xm")
+        assert not search_index.is_plain("t:instant")
+        assert not search_index.is_plain("bolt -c:r")
+        assert not search_index.is_plain('"lightning bolt"')
+
+
+class TestRanking:
+    """Test which names match and in what order"""
+
+    def test_exact_beats_prefix(self, index):
+        assert names(index.search("lightning"))[:3] == ["Lightning Bolt", "Lightning Bolt", "Lightning Helix"]
+        assert names(index.search("lightning helix"))[0] == "Lightning Helix"
+
+    def test_word_prefixes(self, index):
+        assert names(index.search("lig bol")) == ["Lightning Bolt", "Lightning Bolt"]
+        assert names(index.search("bolt")) == ["Lightning Bolt", "Lightning Bolt"]
+        assert names(index.search("grunt")) == ["Jötun Grunt"]
+        assert names(index.search("jotun")) == ["Jötun Grunt"]
+
+    def test_printings_newest_first(self, index):
+        assert [doc.set for _, doc in index.search("lightning bolt").hits] == ["2xm", "lea"]
+
+    def test_typos(self, index):
+        assert names(index.search("ligthning bolt"))[0] == "Lightning Bolt"
+        assert names(index.search("counterspel"))[0] == "Counterspell"
+        assert names(index.search("cuonterspell")) == ["Counterspell"]
+
+    def test_no_match(self, index):
+        assert index.search("zzzz").total == 0
+        assert index.search("").total == 0
+
+    def test_paging_and_total(self, index):
+        results = index.search("lightning", limit=1, offset=1)
+        assert results.total == 3
+        assert names(results) == ["Lightning Bolt"]
+        assert results.hits[0][1].set == "lea"
+
+
+class TestFilters:
+    """Test set, number, rarity and language filters"""
+
+    def test_set_filter(self, index):
+        assert names(index.search("lightning", set="2XM")) == ["Lightning Bolt", "Lightning Helix"]
+        assert names(index.search("lightning set:lea")) == ["Lightning Bolt"]
+
+    def test_set_and_number(self, index):
+        for q in ("2xm 117", "117 2xm", "set:2xm cn:0117"):
+            assert [doc.id for _, doc in index.search(q).hits] == [BOLT["id"]]
+        assert [doc.id for _, doc in index.search("", set="mh2", number="267").hits] == [COUNTERSPELL["id"]]
+
+    def test_set_listing(self, index):
+        assert [doc.number for _, doc in index.search("2xm").hits] == ["117", "257"]
+
+    def test_rarity(self, index):
+        assert [doc.set for _, doc in index.search("bolt r:common").hits] == ["lea"]
+
+    def test_game_and_lang(self):
+        index = build_index([SCRYDEX_PIKACHU], game="pokemon")
+        index.add("mtg", [search_index.document("mtg", BOLT)])
+        assert index.search("pikachu", lang="en").total == 1
+        assert index.search("pikachu", lang="ja").total == 0
+        assert index.search("pikachu game:mtg").total == 0
+        assert index.search("bolt", games=("pokemon",)).total == 0
+
+
+class TestCaps:
+    """Test the document and byte limits"""
+
+    def test_max_docs(self):
+        index = build_index([BOLT, BOLT_OLD, HELIX], max_docs=2)
+        assert len(index.segments["mtg"]) == 2
+        assert index.dropped["mtg"] == 1
+
+    def test_max_bytes(self):
+        index = SearchIndex(max_bytes=1)
+        assert index.add("pokemon", [search_index.document("pokemon", SCRYDEX_PIKACHU)]) == 1
+        assert index.card_bytes() == 0
+
+    def test_replace_and_remove(self, index):
+        index.add("mtg", [search_index.document("mtg", dict(BOLT, name="Lightning Strike"))])
+        assert index.search("strike").total == 1
+        assert index.search("lightning bolt").total == 1
+        index.remove("mtg", [BOLT_OLD["id"]])
+        assert index.search("lightning bolt").total == 0
+
+
+class TestCardStoreSync:
+    """Test building and updating the MTG segment from the card store"""
+
+    @pytest.fixture
+    def store_path(self, tmp_path, monkeypatch):
+        path = str(tmp_path / "cards.store")
+        monkeypatch.setattr(card_store, "CARD_STORE", path)
+        yield path
+        card_store.current(str(tmp_path / "missing.store"))
+
+    def test_rebuild_then_incremental(self, store_path):
+        card_store.ingest([json.dumps([BOLT, BOLT_OLD, HELIX, COUNTERSPELL, JOTUN]).encode()], store_path)
+        service = SearchService()
+        assert asyncio.run(service.sync())["mtg"] == {"rebuilt": 5}
+        assert asyncio.run(service.sync())["mtg"] is None
+
+        # Hits are read back from the store, prices included
+        card = json.loads(service.index.cards(service.index.search("2xm 117").hits)[0])
+        assert card["name"] == "Lightning Bolt" and card["prices"]["eur"] == "1.50" and card["game"] == "mtg"
+
+        # A repriced card is not re-indexed; renamed and removed cards are
+        cards = [dict(BOLT, prices={"eur": "2.00"}), BOLT_OLD, HELIX, COUNTERSPELL, dict(JOTUN, name="Jotun Owl Keeper")]
+        card_store.ingest([json.dumps(cards).encode()], store_path)
+        card_store.current(recheck=0)
+        assert asyncio.run(service.sync())["mtg"] == {"updated": 1, "removed": 0}
+        assert names(service.index.search("owl keeper")) == ["Jotun Owl Keeper"]
+        assert service.index.search("grunt").total == 0
+        card = json.loads(service.index.cards(service.index.search("2xm 117").hits)[0])
+        assert card["prices"]["eur"] == "2.00"
+
+    def test_no_store(self, store_path):
+        assert asyncio.run(SearchService().sync()) == {"mtg": None, "pokemon": None, "seconds": pytest.approx(0, abs=1)}
+
+
+class TestLearning:
+    """Test indexing proxied responses and cached ScryDex rows"""
+
+    def test_pokemon_card_mapping(self):
+        card = search_index.pokemon_card(SCRYDEX_PIKACHU)
+        assert card["set"]["id"] == "sv3pt5" and card["set"]["releaseDate"] == "2023/09/22"
+        assert card["images"] == {"small": "s.png", "large": "l.png"}
+        assert card["pricing"] == {"usd": 1.25}
+        assert card["lang"] == "en" and card["language_code"] == "EN"
+        assert card["game"] == "pokemon"
+
+    def test_cache_documents(self):
+        docs = search_index.cache_documents(json.dumps({"data": [SCRYDEX_PIKACHU]}))
+        assert [(doc.id, doc.set, doc.number, doc.rarity) for doc in docs] == [("sv3pt5-25-en", "sv3pt5", "25", "common")]
+        assert len(search_index.cache_documents(json.dumps({"data": SCRYDEX_PIKACHU}))) == 1
+
+    def test_cache_sync_reads_changed_rows(self):
+        class Cache:
+            pool = object()
+            rows = [json.dumps({"data": [SCRYDEX_PIKACHU]})]
+
+            async def changed(self):
+                rows, self.rows = self.rows, []
+                for row in rows:
+                    yield row
+
+        service = SearchService(cache=Cache())
+        assert asyncio.run(service.sync())["pokemon"] == {"responses": 1, "cards": 1}
+        assert asyncio.run(service.sync())["pokemon"] is None
+        assert names(service.index.search("pika")) == ["Pikachu"]
+
+    def test_learn_from_responses(self):
+        lorcana = {"id": "lor-1", "name": "Elsa - Snow Queen", "set_code": "1", "collector_number": "42",
+                   "rarity": "Legendary", "game": "lorcana"}
+        search = {"results": [dict(search_index.pokemon_card(SCRYDEX_PIKACHU)), dict(lorcana)]}
+
+        async def go(service):
+            service.learn("lorcana", json.dumps({"cards": [lorcana]}).encode())
+            service.learn(None, json.dumps(search).encode())
+            service.learn("pokemon", b"not json")
+            await asyncio.gather(*service.pending)
+
+        service = SearchService()
+        asyncio.run(go(service))
+        assert names(service.index.search("elsa")) == ["Elsa - Snow Queen"]
+        assert names(service.index.search("pikachu")) == ["Pikachu"]
+        # /api/search's Lorcana cards are not in the Lorcana route's shape
+        assert len(service.index.segments["lorcana"]) == 1
+        assert json.loads(service.index.cards(service.index.search("elsa").hits)[0])["game"] == "lorcana"
+
+
+    def test_complete_answers(self, monkeypatch):
+        pikachu = search_index.pokemon_card(SCRYDEX_PIKACHU)
+        bolt = {**BOLT, "game": "mtg"}
+        games = set(search_index.GAMES)
+
+        def answer(data, game="pokemon", games=games, limit=None):
+            return search_index.response_answer(json.dumps(data).encode(), game, games, limit)[1]
+
+        assert answer({"cards": [pikachu], "totalCount": 1})
+        # One of several matches, or a later page
+        assert not answer({"cards": [pikachu], "totalCount": 3})
+        assert not answer({"cards": [], "totalCount": 0})
+        # The Lorcana route has no total: a short page is the whole answer
+        elsa = {"id": "lor-1", "name": "Elsa", "game": "lorcana"}
+        assert answer({"cards": [elsa]}, "lorcana", limit=20) and not answer({"cards": [elsa]}, "lorcana", limit=1)
+        # /api/search leaves its Lorcana cards out, and MTG cards to the card store once it is indexed
+        assert not answer({"results": [bolt, elsa], "totalCount": 2}, None)
+        assert answer({"results": [bolt, pikachu], "totalCount": 2}, None, {"pokemon", "lorcana"})
+
+        key = search_index.query_key("/api/search/pokemon", "Pika  set:SV3PT5", ("pokemon",))
+        assert key == search_index.query_key("/api/search/pokemon", "pika", ("pokemon",), set="sv3pt5")
+        service = SearchService()
+        monkeypatch.setattr(search_index, "SEARCH_MAX_COMPLETE", 1)
+        other = search_index.query_key("/api/search/pokemon", "pikachu", ("pokemon",))
+        asyncio.run(service._learn(json.dumps({"cards": [pikachu], "totalCount": 3}).encode(), "pokemon", games, key))
+        assert not service.answers(key) and names(service.index.search("pika")) == ["Pikachu"]
+        for learned in (key, other):
+            asyncio.run(service._learn(json.dumps({"cards": [pikachu], "totalCount": 1}).encode(), "pokemon", games,
+                                       learned))
+        assert service.answers(other) and not service.answers(key)
+
+
+class TestGatewayRoutes:
+    """Test the search routes answered from the index"""
+
+    @pytest.fixture
+    def service(self, monkeypatch):
+        service = SearchService()
+        service.index.add("pokemon", search_index.cache_documents(json.dumps({"data": [SCRYDEX_PIKACHU]})))
+        service.index.add("mtg", [search_index.document("mtg", BOLT)])
+        monkeypatch.setattr(search_index, "service", service)
+        monkeypatch.setattr(server, "ADMIN_TOKEN", "admin")
+        return service
+
+    def test_partial_index_is_proxied(self, client, service):
+        StubNextHandler.received.clear()
+        # The index holds one Pikachu printing; Next.js may know more
+        assert service.index.search("pikachu", games=("pokemon",)).total == 1
+        assert "headers" in client.get("/api/search/pokemon?q=pikachu").json()
+        assert "headers" in client.get("/api/search?q=lightning&game=all").json()
+        assert [path for path, _ in StubNextHandler.received] == ["/api/search/pokemon?q=pikachu",
+                                                                  "/api/search?q=lightning&game=all"]
+
+    def test_pokemon_search(self, client, service):
+        body = json.dumps({"cards": [search_index.pokemon_card(SCRYDEX_PIKACHU)], "totalCount": 1}).encode()
+        key = search_index.query_key("/api/search/pokemon", "pika", ("pokemon",))
+        asyncio.run(service._learn(body, "pokemon", set(search_index.GAMES), key))
+        StubNextHandler.received.clear()
+        response = client.get("/api/search/pokemon?q=pika&pageSize=10")
+        assert response.status_code == 200
+        assert response.headers["x-search-source"] == "local"
+        data = response.json()
+        assert data["totalCount"] == 1 and data["cards"][0]["name"] == "Pikachu"
+        assert StubNextHandler.received == []
+
+    def test_combined_search(self, client, service):
+        service.complete[search_index.query_key("/api/search", "lightning", search_index.GAMES)] = None
+        data = client.get("/api/search?q=lightning&game=all").json()
+        assert data["success"] is True and data["totalCount"] == 1
+        assert data["results"][0]["game"] == "mtg"
+        assert (data["page"], data["limit"], data["users"]) == (1, 200, [])
+
+    def test_mtg_search(self, client, service):
+        # MTG answers on any hit once the card store is indexed
+        service.store_key = ("cards.bin", 1, 1)
+        data = client.get("/api/cards/mtg?q=bolt").json()
+        assert data == {"cards": [json.loads(search_index.service.index.cards(
+            search_index.service.index.search("bolt").hits)[0])], "success": True}
+
+    def test_misses_and_other_types_are_proxied(self, client, service):
+        StubNextHandler.received.clear()
+        client.get("/api/search/pokemon?q=charizard")
+        client.get("/api/search?q=bolt&type=users")
+        client.get("/api/cards/mtg?q=t:instant")
+        client.get("/api/search/lorcana?q=elsa")
+        assert [path for path, _ in StubNextHandler.received] == [
+            "/api/search/pokemon?q=charizard",
+            "/api/search?q=bolt&type=users",
+            "/api/cards/mtg?q=t:instant",
+            "/api/search/lorcana?q=elsa",
+        ]
+
+    def test_admin_endpoints(self, client, service):
+        assert client.get("/_gateway/search").status_code == 401
+        headers = {"Authorization": "Bearer admin"}
+        status = client.get("/_gateway/search", headers=headers).json()
+        assert status["segments"]["pokemon"]["documents"] == 1
+        assert client.post("/_gateway/search/sync", headers=headers).json()["mtg"] is None
@@ -0,0 +1,120 @@
+"""
+Set Codes Test Suite - backend/set_codes.py
+Testing features:
+1. Pokemon export codes mapped to TCGdex codes, as in the import route
+2. Case-insensitive aliases per game: Arena and MTGO codes, Pokemon
+   abbreviations and zero padding, Lorcana numbers, abbreviations and names
+3. Bulk (set, collector number) -> card ID resolution from an index segment
+   and the card store
+4. Aliased set filters in searches and imports
+"""
+
+import json
+
+import pytest
+
+import card_store
+import collection_import
+import search_index
+import set_codes
+from search_index import SearchIndex
+
+DOM = {"id": "1e0a1b2c-3d4e-4f50-8a6b-7c8d9e0f1a2b", "name": "Llanowar Elves", "set": "dom",
+       "collector_number": "168", "rarity": "common", "released_at": "2018-04-27"}
+SEVENTH = {"id": "2e0a1b2c-3d4e-4f50-8a6b-7c8d9e0f1a2b", "name": "Llanowar Elves", "set": "7ed",
+           "collector_number": "253", "rarity": "common", "released_at": "2001-04-11"}
+BOLT = {"id": "f29ba16f-c8fb-42fe-aabf-87089cb214a7", "name": "Lightning Bolt", "set": "2xm",
+        "collector_number": "117", "rarity": "uncommon", "released_at": "2020-08-07"}
+
+
+def pokemon(card_id, number, lang):
+    return {"id": card_id, "name": "Pikachu", "number": number, "language_code": lang,
+            "expansion": {"id": card_id.split("-")[0], "name": "Obsidian Flames"}}
+
+
+def lorcana(card_id, set_code, number):
+    return {"id": card_id, "name": "Elsa - Snow Queen", "game": "lorcana", "set_code": set_code,
+            "collector_number": number}
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.add("mtg", [search_index.document("mtg", card) for card in (DOM, SEVENTH)])
+    index.add("pokemon", [search_index.document("pokemon", card) for card in (
+        pokemon("sv3-25", "025", "ja"), pokemon("sv3-25", "025", "en"), pokemon("sv3-26", "026", "en"))])
+    index.add("lorcana", [search_index.document("lorcana", lorcana("tfc-42", "TFC", "42"))])
+    return index
+
+
+class TestAliases:
+    """Test compiled alias tables"""
+
+    def test_pokemon_import_codes(self):
+        assert set_codes.map_pokemon_set_code("OBF") == "sv03"
+        assert set_codes.map_pokemon_set_code("S-V 3.5") == "sv35"
+        assert set_codes.map_pokemon_set_code("SWSH12") == "swsh12"
+
+    def test_canonical(self):
+        canonical = set_codes.codes.canonical
+        assert canonical("mtg", "DAR") == canonical("mtg", "dom") == "dom"
+        assert canonical("mtg", "7E") == "7ed" and canonical("mtg", "CON_") == "con"
+        assert canonical("mtg", "2XM") == "2xm"
+        assert canonical("pokemon", "OBF") == canonical("pokemon", "sv03") == canonical("pokemon", "SV3") == "sv3"
+        assert canonical("pokemon", "sv3pt5") == "sv3pt5" and canonical("pokemon", "swsh10") == "swsh10"
+        assert canonical("lorcana", "TFC") == canonical("lorcana", "The First Chapter") == canonical("lorcana", "1")
+        assert canonical("lorcana", "Ursula's Return") == "4"
+
+    def test_same(self):
+        assert set_codes.codes.same("pokemon", "obf", ["sv2", "sv3", "sv3pt5"]) == ["sv3"]
+        assert set_codes.codes.same("lorcana", "set 1", ["tfc", "rof"]) == ["tfc"]
+        assert set_codes.codes.same("mtg", "xyz", ["dom"]) == []
+
+
+class TestResolve:
+    """Test bulk (set, collector number) resolution"""
+
+    def test_from_index(self, index):
+        found = set_codes.resolve("mtg", [("DAR", "168"), ("7E", "0253"), ("dom", "999")], index.segments["mtg"])
+        assert found == {("DAR", "168"): DOM["id"], ("7E", "0253"): SEVENTH["id"]}
+
+    def test_pokemon_prefers_english(self, index):
+        found = set_codes.resolve("pokemon", [("OBF", "25"), ("sv03", "026"), ("OBF", "25")], index.segments["pokemon"])
+        assert found == {("OBF", "25"): "sv3-25", ("sv03", "026"): "sv3-26"}
+
+    def test_index_changes_are_seen(self, index):
+        segment = index.segments["mtg"]
+        assert set_codes.resolve("mtg", [("dom", "168")], segment) == {("dom", "168"): DOM["id"]}
+        index.remove("mtg", [DOM["id"]])
+        index.add("mtg", [search_index.document("mtg", dict(DOM, id="9e0a1b2c-3d4e-4f50-8a6b-7c8d9e0f1a2b"))])
+        assert set_codes.resolve("mtg", [("dom", "168")], segment) == {("dom", "168"): "9e0a1b2c-3d4e-4f50-8a6b-7c8d9e0f1a2b"}
+        index.add("mtg", [search_index.document("mtg", dict(BOLT, set="war"))])
+        assert set_codes.codes.same("mtg", "WAR", segment.by_set) == ["war"]
+
+    def test_lorcana(self, index):
+        assert set_codes.resolve("lorcana", [("1", "42")], index.segments["lorcana"]) == {("1", "42"): "tfc-42"}
+
+    def test_card_store_fallback(self, tmp_path):
+        path = str(tmp_path / "cards.store")
+        card_store.ingest([json.dumps([DOM, BOLT]).encode()], path, changes=False)
+        store = card_store.CardStore(path)
+        try:
+            found = set_codes.resolve("mtg", [("dar", "168"), ("2XM", "117"), ("2xm", "1")], None, store)
+        finally:
+            store.close()
+        assert found == {("dar", "168"): DOM["id"], ("2XM", "117"): BOLT["id"]}
+
+
+class TestUsers:
+    """Test aliases where imports and searches use them"""
+
+    def test_search_set_filter(self, index):
+        assert [doc.id for _, doc in index.search("llanowar", set="DAR").hits] == [DOM["id"]]
+        assert [doc.id for _, doc in index.search("llanowar set:7e").hits] == [SEVENTH["id"]]
+        assert index.search("pikachu", games=("pokemon",), set="OBF").total == 3
+        assert index.search("elsa", set="The First Chapter").total == 1
+
+    def test_import_print_keys(self):
+        row = collection_import.parse_row("manabox", {"Name": "Llanowar Elves", "Set code": "DAR",
+                                                      "Collector number": "168"}, 2)
+        assert collection_import.row_key(row) == ("print", "dom", "168")